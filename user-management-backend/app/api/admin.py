@@ -15,6 +15,9 @@ from ..services.user_service import (
     deactivate_managed_api_key,
     refresh_managed_api_key_for_user
 )
+from ..utils.serialization import FastJSONRoute
+from ..services.response_cache import invalidate_catalog, TEMPLATES_TAG, COMPONENTS_TAG
+from ..services.cache_service import cache_service
 
 # Temporary imports to avoid import errors - these need to be replaced with MongoDB aggregations
 try:
@@ -48,7 +51,7 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/admin", tags=["Admin"], include_in_schema=True)
+router = APIRouter(route_class=FastJSONRoute, prefix="/admin", tags=["Admin"], include_in_schema=True)
 
 def require_admin(current_user: User = Depends(get_current_user_unified)):
     """Require admin role for access"""
@@ -329,6 +332,8 @@ async def approve_content(
                 template.approval_status = "approved"
                 template.updated_at = datetime.now(timezone.utc)
                 await template.save()
+                await invalidate_catalog(TEMPLATES_TAG)
+                await cache_service.invalidate_template(content_id)
             
             return {"message": "Template approved successfully"}
             
@@ -342,6 +347,7 @@ async def approve_content(
                 component.approval_status = "approved"
                 component.updated_at = datetime.now(timezone.utc)
                 await component.save()
+                await invalidate_catalog(COMPONENTS_TAG)
             
             return {"message": "Component approved successfully"}
         
@@ -824,3 +830,9 @@ async def system_stats(db: Any = Depends(get_database), admin: User = Depends(re
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve system statistics: {str(e)}")
+
+
+@router.get("/cache-stats")
+async def cache_stats(admin: User = Depends(require_admin)):
+    """Application cache hit/miss counters and latency for this worker."""
+    return await cache_service.get_cache_info()
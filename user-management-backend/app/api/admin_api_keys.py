@@ -6,14 +6,17 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional, List
 from pydantic import BaseModel, Field
 from datetime import datetime, timezone
+from beanie import PydanticObjectId
 
 from app.models.user import User, UserRole
 from app.models.api_key_pool import ApiKeyPool
+from app.services.key_pool_allocator import assign_pool_key, release_pool_keys, update_pool_key
 from app.auth.unified_auth import get_current_user_unified
 from app.utils.audit_logger import log_audit_event
+from app.utils.serialization import FastJSONRoute
 
 
-router = APIRouter(prefix="/admin/api-keys", tags=["Admin - API Keys"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/admin/api-keys", tags=["Admin - API Keys"])
 
 
 # Request/Response Models
@@ -136,21 +139,11 @@ async def update_api_key(
 ):
     """Update an API key's settings."""
     try:
-        key = await ApiKeyPool.get(key_id)
+        # Only the changed fields are written, so concurrent assignments aren't overwritten
+        key = await update_pool_key(PydanticObjectId(key_id), request.dict(exclude_none=True))
         if not key:
             raise HTTPException(status_code=404, detail="Key not found")
         
-        # Update fields
-        if request.max_users is not None:
-            key.max_users = request.max_users
-        if request.is_active is not None:
-            key.is_active = request.is_active
-        if request.label is not None:
-            key.label = request.label
-        
-        key.updated_at = datetime.now(timezone.utc)
-        await key.save()
-        
         # Log audit event
         await log_audit_event(
             user_id=str(current_user.id),
@@ -312,8 +305,6 @@ async def reassign_user(
 ):
     """Reassign a user from one API key to another."""
     try:
-        from beanie import PydanticObjectId
-        
         # Get source key
         source_key = await ApiKeyPool.get(key_id)
         if not source_key:
@@ -338,26 +329,22 @@ async def reassign_user(
             raise HTTPException(status_code=404, detail="User not found")
         
         user_oid = PydanticObjectId(request.user_id)
-        
-        # Remove from source key
-        if not source_key.release_user(user_oid):
+        if user_oid not in source_key.assigned_user_ids:
             raise HTTPException(status_code=400, detail="User not assigned to source key")
         
-        # Add to target key
-        if not target_key.assign_user(user_oid):
-            # Rollback source change
-            source_key.assign_user(user_oid)
+        # Take a seat on the target key before giving up the source one, so
+        # there's nothing to roll back if the target fills up meanwhile
+        target_key = await assign_pool_key(target_key.id, user_oid)
+        if not target_key:
             raise HTTPException(status_code=400, detail="Failed to assign to target key")
+        await release_pool_keys([user_oid], key_value=source_key.key_value)
+        source_key = await ApiKeyPool.get(key_id)
         
         # Update user's API key field
         if source_key.key_type == "glm":
             user.glm_api_key = target_key.key_value
         elif source_key.key_type == "bytez":
             user.bytez_api_key = target_key.key_value
-        
-        # Save all changes
-        await source_key.save()
-        await target_key.save()
         await user.save()
         
         # Log audit event
@@ -394,21 +381,15 @@ async def unassign_user(
 ):
     """Unassign a user from an API key."""
     try:
-        from beanie import PydanticObjectId
-        
         # Get key
         key = await ApiKeyPool.get(key_id)
         if not key:
             raise HTTPException(status_code=404, detail="Key not found")
         
-        user_oid = PydanticObjectId(user_id)
-        
         # Remove user
-        if not key.release_user(user_oid):
+        if not await release_pool_keys([PydanticObjectId(user_id)], key_value=key.key_value):
             raise HTTPException(status_code=404, detail="User not assigned to this key")
         
-        await key.save()
-        
         # Also clear the user's key field in their profile
         user = await User.get(user_id)
         if user:
@@ -17,8 +17,9 @@ from app.auth.api_key_auth_clean import (
 )
 from app.models.user import User
 from app.middleware.rate_limiting import apply_rate_limit
+from app.utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/api/keys", tags=["API Keys"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/api/keys", tags=["API Keys"])
 
 @router.post("/", response_model=ApiKeyCreateResponse)
 async def create_api_key(
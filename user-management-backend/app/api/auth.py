@@ -29,8 +29,9 @@ from ..services.user_service import (
     authenticate_user
 )
 from ..config import settings
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/auth", tags=["Authentication"])
 
 
 class UserInfoRequest(BaseModel):
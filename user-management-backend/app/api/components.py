@@ -1,7 +1,7 @@
 """Component API endpoints for UI component management (mirroring templates)."""
 
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from typing import List, Optional, Dict, Any
 from beanie import PydanticObjectId
 from datetime import datetime, timezone
@@ -11,8 +11,10 @@ from ..models.user import User, UserRole
 from ..auth.unified_auth import get_current_user_unified
 from ..schemas.component import ComponentCreateRequest, ComponentUpdateRequest
 from pydantic import BaseModel
+from ..utils.serialization import FastJSONRoute
+from ..services.response_cache import response_cache, invalidate_catalog, COMPONENTS_TAG
 
-router = APIRouter(prefix="/components", tags=["Components"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/components", tags=["Components"])
 logger = logging.getLogger(__name__)
 
 @router.post("/", response_model=Dict[str, Any])
@@ -51,6 +53,7 @@ async def create_component(
         
         # Use insert instead of save for new documents
         result = await component.insert()
+        await invalidate_catalog(COMPONENTS_TAG)
         
         logger.info(f"✅ Component inserted, checking result...")
         logger.debug(f"   Insert result type: {type(result)}")
@@ -101,6 +104,7 @@ async def create_component(
 
 @router.get("/", response_model=Dict[str, Any])
 async def get_all_components(
+    request: Request,
     category: Optional[str] = Query(None, description="Filter by category"),
     plan_type: Optional[str] = Query(None, description="Filter by plan type (Free/Paid)"),
     difficulty_level: Optional[str] = Query(None, description="Filter by difficulty level"),
@@ -110,6 +114,21 @@ async def get_all_components(
     limit: int = Query(20, ge=1, le=100, description="Number of components per page")
 ):
     """Get all components with optional filtering and pagination."""
+    async def build():
+        return await _list_components(category, plan_type, difficulty_level, featured, search, page, limit)
+
+    return await response_cache.serve(request, COMPONENTS_TAG, build)
+
+
+async def _list_components(
+    category: Optional[str],
+    plan_type: Optional[str],
+    difficulty_level: Optional[str],
+    featured: Optional[bool],
+    search: Optional[str],
+    page: int,
+    limit: int
+) -> Dict[str, Any]:
     try:
         logger.info(f"🔍 GET /api/components/ called with params: category={category}, plan_type={plan_type}, limit={limit}, page={page}")
         
@@ -174,8 +193,12 @@ async def get_all_components(
         )
 
 @router.get("/categories", response_model=Dict[str, Any])
-async def get_component_categories():
+async def get_component_categories(request: Request):
     """Get all unique component categories."""
+    return await response_cache.serve(request, COMPONENTS_TAG, _component_categories)
+
+
+async def _component_categories() -> Dict[str, Any]:
     try:
         logger.info("🔍 GET /api/components/categories called")
         
@@ -255,8 +278,15 @@ async def get_my_components_legacy(
     return await get_my_components(current_user, page, limit)
 
 @router.get("/{component_id}", response_model=Dict[str, Any])
-async def get_component(component_id: str):
+async def get_component(component_id: str, request: Request):
     """Get a specific component by ID."""
+    async def build():
+        return await _get_component(component_id)
+
+    return await response_cache.serve(request, COMPONENTS_TAG, build)
+
+
+async def _get_component(component_id: str) -> Dict[str, Any]:
     try:
         # Skip validation for special routes
         if component_id in ['my', 'my-components', 'favorites', 'categories', 'stats']:
@@ -341,6 +371,7 @@ async def update_component(
         setattr(component, k, v)
     component.updated_at = datetime.now(timezone.utc)
     await component.save()
+    await invalidate_catalog(COMPONENTS_TAG)
     
     return {"success": True, "component": component.to_dict(), "message": "Component updated successfully"}
 
@@ -362,4 +393,5 @@ async def delete_component(
         raise HTTPException(status_code=403, detail="Not authorized to delete this component")
     
     await component.delete()
+    await invalidate_catalog(COMPONENTS_TAG)
     return {"success": True, "message": "Component deleted successfully"}
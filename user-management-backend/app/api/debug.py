@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from ..config import settings
+from ..utils.serialization import FastJSONRoute
 # from app.auth.clerk_verifier import verify_clerk_token  # Removed - not using Clerk
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 
 class TokenPayload(BaseModel):
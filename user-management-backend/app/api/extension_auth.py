@@ -30,8 +30,9 @@ from ..auth.oauth import oauth, register_oauth_clients
 from ..services.user_service import get_or_create_user_by_oauth, update_user_last_login, get_user_by_id
 from ..config import settings
 from beanie import PydanticObjectId
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(tags=["Extension Authentication"])
+router = APIRouter(route_class=FastJSONRoute, tags=["Extension Authentication"])
 
 
 class SignInRequest(BaseModel):
@@ -1,8 +1,9 @@
 """LLM proxy API endpoints with real provider integration."""
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from pydantic import BaseModel
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
@@ -10,10 +11,14 @@ from ..database import get_database
 from ..auth.dependencies import get_current_user
 from ..auth.unified_auth import get_current_user_unified
 from ..models.user import User
+from ..services import llm_batches
 from ..services.llm_proxy_service import LLMProxyService
+from ..services.llm_scheduler import scheduler_tier
+from ..services.token_service import TokenService
+from ..utils.serialization import FastJSONRoute
 
 
-router = APIRouter(prefix="/llm", tags=["LLM Proxy"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/llm", tags=["LLM Proxy"])
 
 
 # Request/Response models
@@ -30,6 +35,11 @@ class ChatCompletionRequest(BaseModel):
     top_p: Optional[float] = 1.0
     frequency_penalty: Optional[float] = 0.0
     presence_penalty: Optional[float] = 0.0
+    seed: Optional[int] = None
+    stop: Optional[Any] = None
+    tools: Optional[List[Dict[str, Any]]] = None
+    tool_choice: Optional[Any] = None
+    response_format: Optional[Dict[str, Any]] = None
 
 
 class TextCompletionRequest(BaseModel):
@@ -44,7 +54,7 @@ class TextCompletionRequest(BaseModel):
 
 class EmbeddingsRequest(BaseModel):
     model: str
-    input: str
+    input: Union[str, List[str]]  # A list is embedded in one request, batched upstream with other requests
 
 
 # Global proxy service instance (will be initialized per request)
@@ -57,9 +67,16 @@ async def get_llm_proxy_service(db: AsyncIOMotorDatabase = Depends(get_database)
         await service.close()
 
 
+def _via_api_key(http_request: Request) -> bool:
+    """Whether the request authenticated with an API key rather than a session token"""
+    authorization = http_request.headers.get("Authorization", "")
+    return bool(http_request.headers.get("X-API-Key")) or authorization.startswith("Bearer sk_")
+
+
 @router.post("/chat/completions")
 async def chat_completions(
     request: ChatCompletionRequest,
+    http_request: Request,
     current_user: User = Depends(get_current_user_unified),
     llm_service: LLMProxyService = Depends(get_llm_proxy_service)
 ):
@@ -71,18 +88,28 @@ async def chat_completions(
             user=current_user,
             messages=messages,
             model=request.model,
+            tier=scheduler_tier(current_user, _via_api_key(http_request)),
             temperature=request.temperature,
             max_tokens=request.max_tokens,
             top_p=request.top_p,
             frequency_penalty=request.frequency_penalty,
-            presence_penalty=request.presence_penalty
+            presence_penalty=request.presence_penalty,
+            **request.model_dump(include={"seed", "stop", "tools", "tool_choice", "response_format"}, exclude_none=True)
         )
         
+        if "retry_after" in response:
+            raise HTTPException(
+                status_code=429,
+                detail=response["error"],
+                headers={"Retry-After": str(response["retry_after"])}
+            )
         if "error" in response:
             raise HTTPException(status_code=400, detail=response["error"])
         
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat completion failed: {str(e)}")
 
@@ -125,7 +152,7 @@ async def embeddings(
     try:
         response = await llm_service.embeddings(
             user=current_user,
-            input_text=request.input,
+            inputs=request.input,
             model=request.model
         )
         
@@ -134,10 +161,114 @@ async def embeddings(
         
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Embeddings failed: {str(e)}")
 
 
+@router.post("/batches")
+async def create_batch(
+    http_request: Request,
+    current_user: User = Depends(get_current_user_unified),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Submit chat completions to run in the background.
+    
+    The body is NDJSON (one request per line) or JSON {"requests": [...]}; each
+    request is a chat completion body with an optional custom_id. Tokens for the
+    whole batch are reserved now and settled when it finishes.
+    """
+    try:
+        requests = llm_batches.parse_batch(await http_request.body(), http_request.headers.get("content-type", ""))
+    except llm_batches.InvalidBatch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        batch = await llm_batches.create_batch(
+            current_user,
+            requests,
+            tier=scheduler_tier(current_user, _via_api_key(http_request)),
+            token_service=TokenService(db)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch submission failed: {str(e)}")
+    
+    return llm_batches.batch_summary(batch)
+
+
+@router.get("/batches")
+async def list_batches(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user_unified)
+):
+    """List the user's most recent batches."""
+    batches = await llm_batches.list_batches(str(current_user.id), limit)
+    return {"data": [llm_batches.batch_summary(batch) for batch in batches]}
+
+
+async def _user_batch(batch_id: str, current_user: User):
+    batch = await llm_batches.get_batch(batch_id, str(current_user.id))
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+@router.get("/batches/{batch_id}")
+async def get_batch(
+    batch_id: str,
+    current_user: User = Depends(get_current_user_unified)
+):
+    """Get a batch's status and progress."""
+    return llm_batches.batch_summary(await _user_batch(batch_id, current_user))
+
+
+@router.get("/batches/{batch_id}/results")
+async def get_batch_results(
+    batch_id: str,
+    after: int = Query(0, ge=0, description="Return results after this sequence number"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user_unified)
+):
+    """Page through finished results in the order they finished."""
+    batch = await _user_batch(batch_id, current_user)
+    results = await llm_batches.batch_results(batch_id, after, limit)
+    return {
+        "status": batch.status,
+        "data": results,
+        "next_after": results[-1]["sequence"] if results else after,
+        "has_more": len(results) == limit
+    }
+
+
+@router.get("/batches/{batch_id}/results.ndjson")
+async def stream_batch_results(
+    batch_id: str,
+    after: int = Query(0, ge=0, description="Stream results after this sequence number"),
+    follow: bool = Query(False, description="Keep streaming new results until the batch finishes"),
+    current_user: User = Depends(get_current_user_unified)
+):
+    """Stream finished results as NDJSON."""
+    await _user_batch(batch_id, current_user)
+    return StreamingResponse(
+        llm_batches.stream_results(batch_id, after, follow),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post("/batches/{batch_id}/cancel")
+async def cancel_batch(
+    batch_id: str,
+    current_user: User = Depends(get_current_user_unified)
+):
+    """Cancel a batch; results that already finished are kept and billed."""
+    batch = await llm_batches.cancel_batch(await _user_batch(batch_id, current_user))
+    return llm_batches.batch_summary(batch)
+
+
 @router.get("/models")
 async def list_models(
     current_user: User = Depends(get_current_user_unified),
@@ -16,8 +16,9 @@ from ..schemas.organization import (
     OrganizationStats
 )
 from ..services.organization import OrganizationService, OrganizationPermissionService
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/organizations", tags=["organizations"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/organizations", tags=["organizations"])
 
 
 @router.post("/", response_model=OrganizationResponse, status_code=status.HTTP_201_CREATED)
@@ -10,8 +10,9 @@ from ..auth.unified_auth import get_current_user_unified
 from ..models.user import User
 from ..services.razorpay_service import RazorpayService
 from ..services.subscription_service import SubscriptionService
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/payments", tags=["Payments"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/payments", tags=["Payments"])
 
 
 class CreateOrderRequest(BaseModel):
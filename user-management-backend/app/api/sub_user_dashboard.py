@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+"""
+Sub-user dashboard endpoints.
+
+Every endpoint answers with one or two aggregations over the parent's
+sub-users (users keyed by parent_user_id) and their token usage logs (keyed
+by user_id and created_at), instead of querying per sub-user.
+"""
+
+from fastapi import APIRouter, Depends, Query
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta, timezone
-from ..database import get_db
-from app.middleware.auth import get_current_user_from_token_from_token
-from ..services.sub_user_service import SubUserService
-from ..services.token_service import TokenService
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
+from app.middleware.auth import require_auth
 from ..models.user import User, TokenUsageLog, ApiKey
-from ..schemas.sub_user import SubUserUsageStats
-from pydantic import BaseModel
-import uuid
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/dashboard/sub-users", tags=["sub-user-dashboard"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/dashboard/sub-users", tags=["sub-user-dashboard"])
 
 class DashboardStats(BaseModel):
     total_sub_users: int
@@ -30,163 +34,194 @@ class SubUserActivity(BaseModel):
     last_active: Optional[datetime]
     status: str
 
-@router.get("/overview", response_model=DashboardStats)
-async def get_dashboard_overview(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db)
-):
-    """Get overview statistics for all sub-users"""
-    
-    service = SubUserService(db)
-    token_service = TokenService(db)
-    
-    # Get all sub-users
-    sub_users = service.get_sub_users(current_user.id)
-    
-    # Calculate stats
-    total_sub_users = len(sub_users)
-    active_sub_users = len([u for u in sub_users if u.is_active])
-    total_tokens_used = sum(u.tokens_used for u in sub_users)
-    
-    # Get API keys count
+class SubUserView(BaseModel):
+    """Sub-user fields shown on the activity list"""
+    id: PydanticObjectId = Field(alias="_id")
+    name: Optional[str] = None
+    email: str
+    is_active: bool = True
+    last_login_at: Optional[datetime] = None
+
+    class Settings:
+        projection = {"_id": 1, "name": 1, "email": 1, "is_active": 1, "last_login_at": 1}
+
+
+def _sub_users_of(parent_user_id: PydanticObjectId) -> Dict[str, Any]:
+    return {"parent_user_id": parent_user_id, "is_sub_user": True}
+
+
+def _as_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """MongoDB hands back naive UTC datetimes"""
+    if moment is not None and moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+async def _sub_user_ids(parent_user_id: PydanticObjectId) -> List[PydanticObjectId]:
+    return await User.get_pymongo_collection().distinct("_id", _sub_users_of(parent_user_id))
+
+
+async def _aggregate(model, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Run a pipeline on the model's collection. Beanie 2's Document.aggregate
+    awaits PyMongo's async aggregate(), which the app's Motor client doesn't
+    provide.
+    """
+    return await model.get_pymongo_collection().aggregate(pipeline).to_list(None)
+
+
+def _usage_percentage_expr() -> Dict[str, Any]:
+    return {"$cond": [
+        {"$gt": ["$monthly_limit", 0]},
+        {"$multiply": [{"$divide": ["$tokens_used", "$monthly_limit"]}, 100]},
+        0,
+    ]}
+
+
+async def get_overview_stats(parent_user_id: PydanticObjectId) -> DashboardStats:
+    """Totals and top consumers in one aggregation, active API keys in one count"""
+    facets = await _aggregate(User, [
+        {"$match": _sub_users_of(parent_user_id)},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "active": {"$sum": {"$cond": ["$is_active", 1, 0]}},
+                "tokens_used": {"$sum": "$tokens_used"},
+                "monthly_limit": {"$sum": "$monthly_limit"},
+                "ids": {"$push": "$_id"},
+            }}],
+            "top": [
+                {"$sort": {"tokens_used": -1}},
+                {"$limit": 5},
+                {"$project": {"name": 1, "email": 1, "tokens_used": 1, "monthly_limit": 1,
+                              "usage_percentage": _usage_percentage_expr()}},
+            ],
+        }},
+    ])
+    totals = facets[0]["totals"][0] if facets and facets[0]["totals"] else {
+        "total": 0, "active": 0, "tokens_used": 0, "monthly_limit": 0, "ids": []
+    }
+
     total_api_keys = 0
-    for sub_user in sub_users:
-        keys_count = db.query(ApiKey).filter(
-            ApiKey.user_id == sub_user.id,
-            ApiKey.is_active == True
-        ).count()
-        total_api_keys += keys_count
-    
-    # Calculate usage percentage
-    total_monthly_limit = sum(u.monthly_limit for u in sub_users)
-    monthly_usage_percentage = (total_tokens_used / total_monthly_limit * 100) if total_monthly_limit > 0 else 0
-    
-    # Get top consumers (top 5)
-    top_consumers = []
-    sorted_users = sorted(sub_users, key=lambda u: u.tokens_used, reverse=True)[:5]
-    
-    for user in sorted_users:
-        usage_percentage = (user.tokens_used / user.monthly_limit * 100) if user.monthly_limit > 0 else 0
-        top_consumers.append({
-            "user_id": str(user.id),
-            "name": user.name,
-            "email": user.email,
-            "tokens_used": user.tokens_used,
-            "monthly_limit": user.monthly_limit,
-            "usage_percentage": round(usage_percentage, 2)
-        })
-    
+    if totals["ids"]:
+        total_api_keys = await ApiKey.find({"user_id": {"$in": totals["ids"]}, "is_active": True}).count()
+
+    monthly_limit = totals["monthly_limit"]
+    monthly_usage_percentage = (totals["tokens_used"] / monthly_limit * 100) if monthly_limit > 0 else 0
+
     return DashboardStats(
-        total_sub_users=total_sub_users,
-        active_sub_users=active_sub_users,
-        total_tokens_used=total_tokens_used,
+        total_sub_users=totals["total"],
+        active_sub_users=totals["active"],
+        total_tokens_used=totals["tokens_used"],
         total_api_keys=total_api_keys,
         monthly_usage_percentage=round(monthly_usage_percentage, 2),
-        top_consumers=top_consumers
+        top_consumers=[
+            {
+                "user_id": str(user["_id"]),
+                "name": user.get("name"),
+                "email": user.get("email"),
+                "tokens_used": user.get("tokens_used", 0),
+                "monthly_limit": user.get("monthly_limit", 0),
+                "usage_percentage": round(user["usage_percentage"], 2)
+            }
+            for user in (facets[0]["top"] if facets else [])
+        ]
     )
 
-@router.get("/activity", response_model=List[SubUserActivity])
-async def get_sub_user_activity(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db),
-    days: int = Query(default=7, ge=1, le=30)
-):
-    """Get recent activity for all sub-users"""
-    
-    service = SubUserService(db)
-    sub_users = service.get_sub_users(current_user.id)
-    
-    from_date = datetime.now(timezone.utc) - timedelta(days=days)
-    today = datetime.now(timezone.utc).date()
-    
+
+async def get_activity(parent_user_id: PydanticObjectId, days: int = 7) -> List[SubUserActivity]:
+    """
+    Today's usage and last activity for every sub-user, from two aggregations
+    over the usage logs. Last activity only looks back `days` days; sub-users
+    without usage in that window fall back to their last login.
+    """
+    sub_users = await User.find(_sub_users_of(parent_user_id)).project(SubUserView).to_list()
+    if not sub_users:
+        return []
+    ids = [sub_user.id for sub_user in sub_users]
+
+    now = datetime.now(timezone.utc)
+    today_start = datetime.combine(now.date(), datetime.min.time(), tzinfo=timezone.utc)
+    from_date = now - timedelta(days=days)
+
+    today = {
+        row["_id"]: row
+        for row in await _aggregate(TokenUsageLog, [
+            {"$match": {"user_id": {"$in": ids}, "created_at": {"$gte": today_start}}},
+            {"$group": {"_id": "$user_id", "tokens": {"$sum": "$tokens_used"}, "requests": {"$sum": 1}}},
+        ])
+    }
+    # Served by the (user_id, created_at) index: one index seek per sub-user
+    last_logs = {
+        row["_id"]: row["last_active"]
+        for row in await _aggregate(TokenUsageLog, [
+            {"$match": {"user_id": {"$in": ids}, "created_at": {"$gte": from_date}}},
+            {"$sort": {"user_id": 1, "created_at": -1}},
+            {"$group": {"_id": "$user_id", "last_active": {"$first": "$created_at"}}},
+        ])
+    }
+
     activities = []
-    
     for sub_user in sub_users:
-        # Get today's usage
-        today_logs = db.query(TokenUsageLog).filter(
-            TokenUsageLog.user_id == sub_user.id,
-            TokenUsageLog.timestamp >= datetime.combine(today, datetime.min.time())
-        ).all()
-        
-        tokens_used_today = sum(log.tokens_used for log in today_logs)
-        requests_today = len(today_logs)
-        
-        # Get last activity
-        last_log = db.query(TokenUsageLog).filter(
-            TokenUsageLog.user_id == sub_user.id
-        ).order_by(TokenUsageLog.timestamp.desc()).first()
-        
-        last_active = last_log.timestamp if last_log else sub_user.last_login_at
-        
+        usage = today.get(sub_user.id, {})
+        last_active = _as_utc(last_logs.get(sub_user.id) or sub_user.last_login_at)
+
         # Determine status
         status = "active" if sub_user.is_active else "inactive"
         if sub_user.is_active and last_active:
-            hours_since_active = (datetime.now(timezone.utc) - last_active).total_seconds() / 3600
+            hours_since_active = (now - last_active).total_seconds() / 3600
             if hours_since_active > 24:
                 status = "idle"
-        
+
         activities.append(SubUserActivity(
             user_id=str(sub_user.id),
-            user_name=sub_user.name,
+            user_name=sub_user.name or "",
             user_email=sub_user.email,
-            tokens_used_today=tokens_used_today,
-            requests_today=requests_today,
+            tokens_used_today=usage.get("tokens", 0),
+            requests_today=usage.get("requests", 0),
             last_active=last_active,
             status=status
         ))
-    
+
     # Sort by last active (most recent first)
-    activities.sort(key=lambda x: x.last_active or datetime.min, reverse=True)
-    
+    activities.sort(key=lambda x: x.last_active or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
     return activities
 
-@router.get("/usage-trends")
-async def get_usage_trends(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db),
-    days: int = Query(default=30, ge=7, le=90)
-):
-    """Get usage trends for sub-users over time"""
-    
-    service = SubUserService(db)
-    sub_users = service.get_sub_users(current_user.id)
-    sub_user_ids = [str(u.id) for u in sub_users]
-    
+
+async def get_trends(parent_user_id: PydanticObjectId, days: int) -> Dict[str, Any]:
+    """Daily totals and distinct active sub-users, grouped in the database"""
+    ids = await _sub_user_ids(parent_user_id)
     from_date = datetime.now(timezone.utc) - timedelta(days=days)
-    
-    # Get usage logs for all sub-users
-    usage_logs = db.query(TokenUsageLog).filter(
-        TokenUsageLog.user_id.in_(sub_user_ids),
-        TokenUsageLog.timestamp >= from_date
-    ).all()
-    
-    # Group by date
-    daily_usage = {}
-    for log in usage_logs:
-        date_str = log.timestamp.date().isoformat()
-        if date_str not in daily_usage:
-            daily_usage[date_str] = {
-                "date": date_str,
-                "total_tokens": 0,
-                "total_requests": 0,
-                "unique_users": set()
-            }
-        daily_usage[date_str]["total_tokens"] += log.tokens_used
-        daily_usage[date_str]["total_requests"] += 1
-        daily_usage[date_str]["unique_users"].add(str(log.user_id))
-    
-    # Convert to list and add unique user counts
+
     trends = []
-    for date_str in sorted(daily_usage.keys()):
-        data = daily_usage[date_str]
-        trends.append({
-            "date": data["date"],
-            "total_tokens": data["total_tokens"],
-            "total_requests": data["total_requests"],
-            "unique_users": len(data["unique_users"]),
-            "avg_tokens_per_request": data["total_tokens"] / data["total_requests"] if data["total_requests"] > 0 else 0
-        })
-    
+    if ids:
+        daily = await _aggregate(TokenUsageLog, [
+            {"$match": {"user_id": {"$in": ids}, "created_at": {"$gte": from_date}}},
+            {"$group": {
+                "_id": {"date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "user_id": "$user_id"},
+                "tokens": {"$sum": "$tokens_used"},
+                "requests": {"$sum": 1},
+            }},
+            {"$group": {
+                "_id": "$_id.date",
+                "total_tokens": {"$sum": "$tokens"},
+                "total_requests": {"$sum": "$requests"},
+                "unique_users": {"$sum": 1},
+            }},
+            {"$sort": {"_id": 1}},
+        ])
+        trends = [
+            {
+                "date": row["_id"],
+                "total_tokens": row["total_tokens"],
+                "total_requests": row["total_requests"],
+                "unique_users": row["unique_users"],
+                "avg_tokens_per_request": row["total_tokens"] / row["total_requests"] if row["total_requests"] > 0 else 0
+            }
+            for row in daily
+        ]
+
     return {
         "period_days": days,
         "trends": trends,
@@ -198,69 +233,99 @@ async def get_usage_trends(
         }
     }
 
-@router.get("/limits-analysis")
-async def get_limits_analysis(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db)
-):
-    """Analyze sub-user limits and suggest optimizations"""
-    
-    service = SubUserService(db)
-    sub_users = service.get_sub_users(current_user.id)
-    
+
+async def get_limits(parent_user_id: PydanticObjectId) -> Dict[str, Any]:
+    """Sub-users bucketed by limit utilisation in one $facet aggregation"""
+    user_fields = {"name": 1, "email": 1, "tokens_used": 1, "monthly_limit": 1}
+    facets = await _aggregate(User, [
+        {"$match": _sub_users_of(parent_user_id)},
+        {"$project": {**user_fields, "usage_percentage": _usage_percentage_expr()}},
+        {"$facet": {
+            "over_utilized": [{"$match": {"usage_percentage": {"$gt": 90}}}],  # Users using >90% of limits
+            "under_utilized": [{"$match": {"usage_percentage": {"$lt": 10}}}],  # Users using <10% of limits
+            "optimal": [{"$match": {"usage_percentage": {"$gte": 10, "$lte": 90}}}],  # Users using 10-90%
+            "totals": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "allocated": {"$sum": "$monthly_limit"},
+                "used": {"$sum": "$tokens_used"},
+            }}],
+        }},
+    ])
+    buckets = facets[0] if facets else {}
+
+    def user_data(user: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "user_id": str(user["_id"]),
+            "name": user.get("name"),
+            "email": user.get("email"),
+            "usage_percentage": round(user["usage_percentage"], 2),
+            "tokens_used": user.get("tokens_used", 0),
+            "monthly_limit": user.get("monthly_limit", 0)
+        }
+
     analysis = {
-        "over_utilized": [],  # Users using >90% of limits
-        "under_utilized": [],  # Users using <10% of limits
-        "optimal": [],  # Users using 10-90% of limits
+        "over_utilized": [user_data(user) for user in buckets.get("over_utilized", [])],
+        "under_utilized": [user_data(user) for user in buckets.get("under_utilized", [])],
+        "optimal": [user_data(user) for user in buckets.get("optimal", [])],
         "recommendations": []
     }
-    
-    for sub_user in sub_users:
-        usage_percentage = (sub_user.tokens_used / sub_user.monthly_limit * 100) if sub_user.monthly_limit > 0 else 0
-        
-        user_data = {
-            "user_id": str(sub_user.id),
-            "name": sub_user.name,
-            "email": sub_user.email,
-            "usage_percentage": round(usage_percentage, 2),
-            "tokens_used": sub_user.tokens_used,
-            "monthly_limit": sub_user.monthly_limit
-        }
-        
-        if usage_percentage > 90:
-            analysis["over_utilized"].append(user_data)
-            analysis["recommendations"].append({
-                "user_id": str(sub_user.id),
-                "type": "increase_limit",
-                "message": f"Consider increasing limit for {sub_user.name} (currently at {usage_percentage:.1f}%)"
-            })
-        elif usage_percentage < 10:
-            analysis["under_utilized"].append(user_data)
-            analysis["recommendations"].append({
-                "user_id": str(sub_user.id),
-                "type": "decrease_limit",
-                "message": f"Consider decreasing limit for {sub_user.name} (only using {usage_percentage:.1f}%)"
-            })
-        else:
-            analysis["optimal"].append(user_data)
-    
+    for user in analysis["over_utilized"]:
+        analysis["recommendations"].append({
+            "user_id": user["user_id"],
+            "type": "increase_limit",
+            "message": f"Consider increasing limit for {user['name']} (currently at {user['usage_percentage']:.1f}%)"
+        })
+    for user in analysis["under_utilized"]:
+        analysis["recommendations"].append({
+            "user_id": user["user_id"],
+            "type": "decrease_limit",
+            "message": f"Consider decreasing limit for {user['name']} (only using {user['usage_percentage']:.1f}%)"
+        })
+
     # Add general recommendations
-    total_allocated = sum(u.monthly_limit for u in sub_users)
-    total_used = sum(u.tokens_used for u in sub_users)
-    overall_efficiency = (total_used / total_allocated * 100) if total_allocated > 0 else 0
-    
+    totals = buckets["totals"][0] if buckets.get("totals") else {"count": 0, "allocated": 0, "used": 0}
+    overall_efficiency = (totals["used"] / totals["allocated"] * 100) if totals["allocated"] > 0 else 0
+
     if overall_efficiency < 50:
         analysis["recommendations"].append({
             "type": "general",
             "message": f"Overall token efficiency is {overall_efficiency:.1f}%. Consider reallocating limits."
         })
-    
+
     analysis["summary"] = {
-        "total_sub_users": len(sub_users),
+        "total_sub_users": totals["count"],
         "over_utilized_count": len(analysis["over_utilized"]),
         "under_utilized_count": len(analysis["under_utilized"]),
         "optimal_count": len(analysis["optimal"]),
         "overall_efficiency": round(overall_efficiency, 2)
     }
-    
+
     return analysis
+
+
+@router.get("/overview", response_model=DashboardStats)
+async def get_dashboard_overview(current_user: User = Depends(require_auth)):
+    """Get overview statistics for all sub-users"""
+    return await get_overview_stats(current_user.id)
+
+@router.get("/activity", response_model=List[SubUserActivity])
+async def get_sub_user_activity(
+    current_user: User = Depends(require_auth),
+    days: int = Query(default=7, ge=1, le=30)
+):
+    """Get recent activity for all sub-users"""
+    return await get_activity(current_user.id, days)
+
+@router.get("/usage-trends")
+async def get_usage_trends(
+    current_user: User = Depends(require_auth),
+    days: int = Query(default=30, ge=7, le=90)
+):
+    """Get usage trends for sub-users over time"""
+    return await get_trends(current_user.id, days)
+
+@router.get("/limits-analysis")
+async def get_limits_analysis(current_user: User = Depends(require_auth)):
+    """Analyze sub-user limits and suggest optimizations"""
+    return await get_limits(current_user.id)
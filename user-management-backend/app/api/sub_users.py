@@ -12,8 +12,9 @@ from ..schemas.sub_user import (
 from ..schemas.api_key import ApiKeyResponse
 from ..exceptions import ValidationError, NotFoundError, PermissionError
 import uuid
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/sub-users", tags=["sub-users"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/sub-users", tags=["sub-users"])
 
 @router.post("/", response_model=SubUserResponse)
 async def create_sub_user(
@@ -16,9 +16,10 @@ from ..services.subscription_service import SubscriptionService
 from ..services.stripe_service import StripeService
 from ..services.token_service import TokenService
 from ..schemas.auth import UserResponse, SubscriptionPlanResponse
+from ..utils.serialization import FastJSONRoute
 
 
-router = APIRouter(prefix="/subscriptions", tags=["Subscriptions"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/subscriptions", tags=["Subscriptions"])
 
 
 class SubscribeRequest(BaseModel):
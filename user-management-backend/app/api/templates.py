@@ -1,6 +1,6 @@
 """Template API endpoints for template management."""
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from typing import List, Optional, Dict, Any
 from beanie import PydanticObjectId
 from datetime import datetime, timezone
@@ -9,8 +9,11 @@ from ..models.template import Template, TemplateView, TemplateLike, TemplateDown
 from ..models.user import User, UserRole
 from ..auth.unified_auth import get_current_user_unified
 from pydantic import BaseModel
+from ..utils.serialization import FastJSONRoute
+from ..services.response_cache import response_cache, invalidate_catalog, TEMPLATES_TAG
+from ..services.cache_service import cache_service
 
-router = APIRouter(prefix="/templates", tags=["Templates"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/templates", tags=["Templates"])
 
 
 class TemplateCreateRequest(BaseModel):
@@ -106,6 +109,7 @@ async def create_template(
         
         # Save to database
         await template.insert()
+        await invalidate_catalog(TEMPLATES_TAG)
         
         return {
             "success": True,
@@ -122,6 +126,7 @@ async def create_template(
 
 @router.get("/", response_model=Dict[str, Any])
 async def get_all_templates(
+    request: Request,
     category: Optional[str] = Query(None, description="Filter by category"),
     plan_type: Optional[str] = Query(None, description="Filter by plan type (Free/Paid)"),
     difficulty_level: Optional[str] = Query(None, description="Filter by difficulty level"),
@@ -131,6 +136,21 @@ async def get_all_templates(
     limit: int = Query(20, ge=1, le=100, description="Number of templates per page")
 ):
     """Get all templates with optional filtering and pagination."""
+    async def build():
+        return await _list_templates(category, plan_type, difficulty_level, featured, search, page, limit)
+
+    return await response_cache.serve(request, TEMPLATES_TAG, build)
+
+
+async def _list_templates(
+    category: Optional[str],
+    plan_type: Optional[str],
+    difficulty_level: Optional[str],
+    featured: Optional[bool],
+    search: Optional[str],
+    page: int,
+    limit: int
+) -> Dict[str, Any]:
     try:
         # Build filter query
         filter_query = {"is_active": True}
@@ -288,8 +308,12 @@ async def get_favorite_templates(
 
 
 @router.get("/categories", response_model=Dict[str, Any])
-async def get_template_categories():
+async def get_template_categories(request: Request):
     """Get all available template categories."""
+    return await response_cache.serve(request, TEMPLATES_TAG, _template_categories)
+
+
+async def _template_categories() -> Dict[str, Any]:
     try:
         # Get distinct categories from templates
         templates = await Template.find({"is_active": True}).to_list()
@@ -309,7 +333,7 @@ async def get_template_categories():
 
 
 @router.get("/{template_id}")
-async def get_template_by_id(template_id: str):
+async def get_template_by_id(template_id: str, request: Request):
     """Get a specific template by ID."""
     try:
         # Skip validation for special routes (categories removed - has its own route)
@@ -320,23 +344,37 @@ async def get_template_by_id(template_id: str):
         if not PydanticObjectId.is_valid(template_id):
             raise HTTPException(status_code=400, detail="Invalid template ID")
         
-        # Find template
-        template = await Template.find_one({"_id": PydanticObjectId(template_id)})
-        
-        if not template or not template.is_active:
-            raise HTTPException(status_code=404, detail="Template not found")
+        object_id = PydanticObjectId(template_id)
         
-        # Increment view count
-        await template.update({"$inc": {"views": 1}})
+        async def load_template():
+            # Find template
+            template = await Template.find_one({"_id": object_id})
+            
+            if not template or not template.is_active:
+                return None
+            
+            # Verify ID matches
+            if str(template.id) != template_id:
+                raise HTTPException(status_code=500, detail="Database integrity error: ID mismatch")
+            
+            return template.to_dict()
         
-        # Verify ID matches
-        if str(template.id) != template_id:
-            raise HTTPException(status_code=500, detail="Database integrity error: ID mismatch")
+        async def build():
+            template_data = await cache_service.get_or_load_template(template_id, load_template)
+            if template_data is None:
+                raise HTTPException(status_code=404, detail="Template not found")
             
-        return {
-            "success": True,
-            "template": template.to_dict()
-        }
+            return {
+                "success": True,
+                "template": template_data
+            }
+        
+        response = await response_cache.serve(request, TEMPLATES_TAG, build)
+        
+        # Increment view count (cached responses still count as views)
+        await Template.find_one({"_id": object_id}).update({"$inc": {"views": 1}})
+        
+        return response
         
     except HTTPException:
         raise
@@ -380,6 +418,8 @@ async def update_template(
         
         # Update template
         await template.update({"$set": update_data})
+        await invalidate_catalog(TEMPLATES_TAG)
+        await cache_service.invalidate_template(template_id)
         
         # Fetch updated template
         updated_template = await Template.find_one({"_id": PydanticObjectId(template_id)})
@@ -422,6 +462,8 @@ async def delete_template(
         
         # Soft delete (set is_active to False)
         await template.update({"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc)}})
+        await invalidate_catalog(TEMPLATES_TAG)
+        await cache_service.invalidate_template(template_id)
         
         return {
             "success": True,
@@ -441,8 +483,12 @@ async def delete_template(
 
 
 @router.get("/categories/list", response_model=Dict[str, Any])
-async def get_template_categories_list():
+async def get_template_categories_list(request: Request):
     """Get all available template categories (alternative endpoint)."""
+    return await response_cache.serve(request, TEMPLATES_TAG, _template_categories_list)
+
+
+async def _template_categories_list() -> Dict[str, Any]:
     try:
         # Get unique categories from templates
         categories = await Template.distinct("category", {"is_active": True})
@@ -7,8 +7,9 @@ from ..auth.unified_auth import get_current_user_unified
 from ..models.user import User, TokenUsageLog
 from ..services.token_service import TokenService, TokenPricingService
 from ..schemas.auth import TokenUsageLogResponse
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/tokens", tags=["Tokens"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/tokens", tags=["Tokens"])
 
 @router.get("/balance")
 async def get_token_balance(current_user: User = Depends(get_current_user_unified), db: AsyncIOMotorDatabase = Depends(get_database)):
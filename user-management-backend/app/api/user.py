@@ -12,8 +12,9 @@ from ..database import get_database
 from ..auth.unified_auth import get_current_user_unified
 from ..models.user import User
 from ..services.user_service import get_or_create_user_api_key
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/user", tags=["User (Singular)"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/user", tags=["User (Singular)"])
 
 
 @router.get("/api-key")
@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from ..auth.unified_auth import get_current_user_unified
 from ..services.user_service import get_or_create_user_api_key
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/user", tags=["User (compat)"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/user", tags=["User (compat)"])
 
 @router.get("/api-key")
 async def get_my_api_key(current_user=Depends(get_current_user_unified), db: AsyncIOMotorDatabase = Depends()):
@@ -21,8 +21,9 @@ from ..services.user_service import (
     ensure_managed_api_key_for_user, refresh_managed_api_key_for_user
 )
 from ..services.openrouter_keys import refresh_user_openrouter_key
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/users", tags=["Users"])
+router = APIRouter(route_class=FastJSONRoute, prefix="/users", tags=["Users"])
 
 
 @router.get("/me", response_model=UserProfile)
@@ -65,28 +66,15 @@ async def get_my_profile(
     
     if subscription in ["pro", "ultra"] and is_invalid_key:
         try:
-            from ..models.api_key_pool import ApiKeyPool
+            from ..services.key_pool_allocator import allocate_pool_key
             
-            # Find all active GLM keys and pick one with capacity
-            all_glm_keys = await ApiKeyPool.find(
-                ApiKeyPool.key_type == "glm",
-                ApiKeyPool.is_active == True
-            ).to_list()
-            
-            # Find a key with available capacity
-            available_key = None
-            for key in all_glm_keys:
-                if key.has_capacity:
-                    available_key = key
-                    break
+            # Atomically take a slot on the least-loaded GLM key with capacity
+            available_key = await allocate_pool_key(current_user.id, "glm")
             
             if available_key:
-                # Assign user to this key
-                if available_key.assign_user(current_user.id):
-                    await available_key.save()
-                    current_user.glm_api_key = available_key.key_value
-                    keys_updated = True
-                    print(f"[get_my_profile] Assigned GLM key '{available_key.label}' to {current_user.email}")
+                current_user.glm_api_key = available_key.key_value
+                keys_updated = True
+                print(f"[get_my_profile] Assigned GLM key '{available_key.label}' to {current_user.email}")
             else:
                 print(f"[get_my_profile] No available GLM keys with capacity for {current_user.email}")
         except Exception as e:
@@ -452,53 +440,27 @@ async def refresh_api_keys(
     #    ALWAYS assign a new key when refresh is called (force rotation)
     if subscription in ["pro", "ultra"]:
         try:
-            from ..models.api_key_pool import ApiKeyPool
+            from ..services.key_pool_allocator import allocate_pool_key, release_pool_keys
             
             # First, unassign from current key if exists
             current_glm_key = current_user.glm_api_key
             if current_glm_key:
-                # Find and unassign from old key
-                old_key = await ApiKeyPool.find_one(
-                    ApiKeyPool.key_value == current_glm_key,
-                    ApiKeyPool.key_type == "glm"
-                )
-                if old_key:
-                    old_key.release_user(current_user.id)
-                    await old_key.save()
+                await release_pool_keys([current_user.id], key_value=current_glm_key)
             
             # Clear user's current key
             current_user.glm_api_key = None
             await current_user.save()
             
-            # Find all active GLM keys and pick one with capacity
-            all_glm_keys = await ApiKeyPool.find(
-                ApiKeyPool.key_type == "glm",
-                ApiKeyPool.is_active == True
-            ).to_list()
-            
-            # Find a key with available capacity (prefer one user isn't already on)
-            available_key = None
-            for key in all_glm_keys:
-                if key.has_capacity and key.key_value != current_glm_key:
-                    available_key = key
-                    break
-            
-            # Fallback: any key with capacity
-            if not available_key:
-                for key in all_glm_keys:
-                    if key.has_capacity:
-                        available_key = key
-                        break
+            # Atomically take a slot on the least-loaded key, preferring a different one
+            available_key = await allocate_pool_key(
+                current_user.id, "glm", exclude_key_value=current_glm_key
+            )
             
             if available_key:
-                if available_key.assign_user(current_user.id):
-                    await available_key.save()
-                    current_user.glm_api_key = available_key.key_value
-                    await current_user.save()
-                    result["keys_updated"].append("glm")
-                    result["keys_status"]["glm"] = f"assigned from {available_key.label}"
-                else:
-                    result["keys_status"]["glm"] = "assignment_failed"
+                current_user.glm_api_key = available_key.key_value
+                await current_user.save()
+                result["keys_updated"].append("glm")
+                result["keys_status"]["glm"] = f"assigned from {available_key.label}"
             else:
                 result["keys_status"]["glm"] = "no_key_available"
         except Exception as e:
@@ -6,8 +6,9 @@ from ..database import get_database
 from ..models.user import User
 from typing import Any
 from beanie import PydanticObjectId
+from ..utils.serialization import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 
 class TokenPayload(BaseModel):
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
-from typing import List
+from typing import Dict, List
 import os
 import json
 
@@ -34,6 +34,99 @@ class Settings(BaseSettings):
     # Razorpay - Set via environment variables
     razorpay_key_id: str = ""  # Set RAZORPAY_KEY_ID env var
     razorpay_key_secret: str = ""  # Set RAZORPAY_KEY_SECRET env var
+    razorpay_webhook_secret: str = ""  # Set RAZORPAY_WEBHOOK_SECRET env var
+    payment_gateway: str = "razorpay"  # razorpay, or fake for local testing and benchmarks
+    payment_gateway_allow_fake: bool = False  # Must be set for payment_gateway=fake; never in production
+    payment_gateway_timeout_seconds: float = 10.0  # Per-request timeout for gateway calls
+    payment_gateway_max_retries: int = 3  # Retries on connection errors, 429s and 5xx
+    payment_gateway_max_connections: int = 20  # Shared connection pool size
+    
+    # Webhook inbox workers
+    webhook_workers_enabled: bool = True  # Process stored webhooks in the background
+    webhook_worker_concurrency: int = 4  # Worker tasks per process
+    webhook_max_attempts: int = 8  # Attempts before an event is dead-lettered
+    webhook_retry_base_seconds: float = 5.0  # First retry delay, doubled per attempt
+    webhook_retry_max_seconds: float = 900.0  # Retry delay cap
+    
+    # Token reservations (Redis)
+    token_reservation_ttl_seconds: int = 300  # An abandoned reservation stops counting against the balance after this
+    token_balance_snapshot_seconds: int = 300  # Reload a user's period usage and limit from MongoDB at least this often
+    token_reservation_redis_max_connections: int = 100  # Redis connections per worker; further commands wait for a free one
+    token_reservation_redis_pool_timeout_seconds: float = 2.0  # Longest wait for a free connection before the reservation fails
+    
+    # Token usage logging (write-behind)
+    usage_log_write_behind: bool = True  # Buffer usage logs and write them in bulk; False inserts each one on the request path
+    usage_log_flush_interval_ms: float = 1000.0  # Buffered logs are written at least this often
+    usage_log_flush_max_records: int = 500  # A flush starts early once this many logs are buffered
+    usage_log_wal_dir: str = "data/usage_log_wal"  # Write-ahead segments, a subdirectory per worker; relative to the backend root, keep it on a persistent volume; "" disables
+    usage_log_retry_max_seconds: float = 30.0  # Longest wait between attempts of a failed flush
+    
+    # LLM response cache (exact match, deterministic requests only)
+    llm_response_cache_enabled: bool = False  # Serve repeated temperature-0/seeded chat requests from Redis
+    llm_response_cache_scope: str = "user"  # "user" keeps entries per user, "global" shares them across users
+    llm_response_cache_ttl_seconds: Dict[str, int] = {"free": 3600, "pro": 21600, "ultra": 86400}  # Max entry age per plan
+    llm_response_cache_max_bytes: int = 262144  # Larger responses (compressed) aren't cached
+    llm_response_cache_billing_ratio: float = 0.1  # Share of the original tokens billed for a cache hit
+    llm_coalescing_enabled: bool = True  # Identical deterministic chat requests in flight share one provider call
+    
+    # LLM provider health (per worker: circuit breakers, failover, hedging)
+    llm_provider_timeout_seconds: float = 30.0  # Per upstream attempt; a timeout counts as a provider failure
+    llm_provider_connect_timeout_seconds: float = 3.0  # Connecting to a provider
+    llm_health_window_seconds: float = 60.0  # Rolling window of outcomes per (provider, model)
+    llm_breaker_min_requests: int = 10  # Calls in the window before the error rate can open a breaker
+    llm_breaker_error_rate: float = 0.5  # Error rate in the window that opens a breaker
+    llm_breaker_consecutive_failures: int = 5  # Failures in a row that open a breaker
+    llm_breaker_open_seconds: float = 30.0  # An open breaker lets one trial call through after this
+    llm_failover_models: Dict[str, Dict[str, str]] = {}  # Model -> {provider: that provider's id for it}; replaces the built-in vendor mapping for that model
+    llm_hedge_plans: List[str] = []  # Plans whose chat requests are hedged, e.g. ["ultra"]
+    llm_hedge_min_samples: int = 20  # Successful calls needed before the p95 hedge delay is used
+    llm_hedge_min_delay_seconds: float = 0.5  # Never hedge sooner than this
+    
+    # LLM admission control (per worker: fair queuing of upstream calls by tier, 429 when overloaded)
+    llm_scheduler_enabled: bool = True  # Queue upstream chat calls per provider instead of sending them all at once
+    llm_scheduler_provider_concurrency: Dict[str, int] = {}  # Provider -> upstream calls in flight per worker
+    llm_scheduler_default_concurrency: int = 64  # For providers not listed above
+    llm_scheduler_max_queue: int = 256  # Calls waiting per provider; past this the lowest-priority one gets a 429
+    llm_scheduler_tier_weights: Dict[str, float] = {"free": 1.0, "pro": 4.0, "api_key": 4.0, "ultra": 16.0}  # Share of provider slots per tier
+    llm_scheduler_user_max_in_flight: Dict[str, int] = {"free": 2, "pro": 8, "api_key": 16, "ultra": 32}  # Concurrent chat requests per user
+    llm_scheduler_queue_timeout_seconds: Dict[str, float] = {"free": 5.0, "pro": 15.0, "api_key": 15.0, "ultra": 30.0}  # Longest wait for a slot
+
+    # LLM batch jobs (/llm/batches)
+    llm_batch_workers_enabled: bool = True  # Process submitted batches inside the app
+    llm_batch_worker_concurrency: int = 2  # Batches processed at once per worker process
+    llm_batch_item_concurrency: int = 16  # Requests of one batch in flight at once
+    llm_batch_max_requests: int = 5000  # Requests one batch may hold
+    llm_batch_default_max_tokens: int = 1024  # Completion tokens reserved for a request that sets no max_tokens
+    llm_batch_reservation_ttl_seconds: int = 86400  # A batch's token hold lapses after this if it never finishes
+    llm_batch_stream_page_size: int = 500  # Results read per query when streaming NDJSON
+    llm_batch_stream_poll_seconds: float = 1.0  # How often a followed stream checks for new results
+
+    # Embeddings micro-batching
+    embedding_batch_window_ms: float = 10.0  # Inputs for one model queued this long are sent upstream together
+    embedding_batch_max_inputs: int = 256  # Inputs per upstream call; a full queue is sent at once
+    embedding_batch_max_tokens: int = 100000  # Estimated tokens per upstream call
+    embedding_max_inputs_per_request: int = 2048  # Inputs one /llm/embeddings request may send
+
+    # Embeddings cache (content-addressed: model + SHA-256 of the normalized input)
+    embedding_cache_enabled: bool = True  # Serve previously embedded inputs without calling the provider
+    embedding_cache_scope: str = "user"  # "user" keeps entries per user, "global" shares them across users (hits then reveal other users' inputs)
+    embedding_cache_backend: str = "redis"  # "redis" shares entries across workers behind the local LRU; "local" is in-process only
+    embedding_cache_dtype: str = "float16"  # Packed vector precision: "float16" or "float32"
+    embedding_cache_local_max_bytes: int = 67108864  # In-process LRU budget per worker (64 MiB)
+    embedding_cache_ttl_seconds: int = 604800  # Redis entry lifetime
+    embedding_cache_billing_ratio: float = 0.1  # Share of the estimated tokens billed for a cached input
+    
+    # Tokenizers (token estimates for reservations)
+    tokenizer_data_dir: str = "app/data/tokenizers"  # Bundled BPE files (scripts/setup/fetch_tokenizers.py); relative to the backend root
+    tokenizer_threads: int = 0  # Threads encoding large prompts; 0 = one per CPU core
+    tokenizer_thread_min_chars: int = 20000  # Shorter inputs are counted on the event loop
+    
+    # Metrics
+    metrics_enabled: bool = True  # Serve Prometheus metrics at /metrics
+    metrics_token: str = ""  # If set, /metrics requires "Authorization: Bearer <token>"
+    query_trace_enabled: bool = True  # Count MongoDB round trips per request
+    query_trace_max_queries: int = 50  # Warn when a request makes more round trips than this
+    query_trace_duplicate_threshold: int = 10  # Warn when one query shape repeats this often in a request (N+1)
     
     # Application
     app_name: str = "User Management Backend"
@@ -90,6 +183,30 @@ class Settings(BaseSettings):
     default_rate_limit_per_minute: int = 60
     pro_rate_limit_per_minute: int = 300
     enterprise_rate_limit_per_minute: int = 1000
+    
+    # Response compression
+    compression_minimum_size: int = 1024  # Bytes; smaller responses are sent uncompressed
+    
+    # Public catalog response cache (anonymous GETs)
+    catalog_cache_max_age: int = 60  # Seconds a cached response is fresh
+    catalog_cache_stale_while_revalidate: int = 300  # Seconds a stale response may be served while refreshing
+    catalog_cache_max_entries: int = 1024  # In-process entries per worker
+    
+    # Application cache (in-process L1 in front of Redis L2)
+    cache_local_max_entries: int = 4096  # L1 entries per worker
+    cache_local_ttl_seconds: int = 30  # Max L1 lifetime; bounds staleness after another worker invalidates
+    cache_serializer: str = "orjson"  # "orjson" or "msgpack"
+    cache_redis_max_connections: int = 50  # Pooled async Redis connections per worker
+    cache_early_refresh_beta: float = 1.0  # Probabilistic early refresh; higher refreshes sooner, 0 disables
+    
+    # Screenshot thumbnails
+    thumbnail_workers: int = 0  # Encoder processes; 0 = one per CPU core
+    
+    # Subscription maintenance jobs
+    subscription_jobs_enabled: bool = True  # Run the daily jobs inside the app
+    subscription_jobs_run_at: str = "02:00"  # Daily run time (UTC, HH:MM)
+    subscription_jobs_concurrency: int = 20  # Notification emails in flight at once
+    subscription_jobs_batch_size: int = 500  # Users per cursor batch and bulk update
 
 
 settings = Settings()
@@ -1,8 +1,13 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorClientSession
 from .config import settings
+from .utils.metrics import mongo_command_metrics
+from .utils import query_tracer  # noqa: F401  (registers the per-request query listener before clients exist)
 
 # MongoDB setup
-client = AsyncIOMotorClient(settings.database_url)
+client = AsyncIOMotorClient(settings.database_url, event_listeners=[mongo_command_metrics])
 db = client.user_management_db # This will be the database name from the URL or a default
 
 def get_db_client():
@@ -13,6 +18,35 @@ def get_database():
     """Dependency to get MongoDB database"""
     return db
 
+# Whether each client's deployment supports multi-document transactions
+_transaction_support: Dict[int, bool] = {}
+
+
+async def supports_transactions(motor_client: AsyncIOMotorClient) -> bool:
+    """Transactions need a replica set or sharded cluster; a standalone server rejects them"""
+    key = id(motor_client)
+    if key not in _transaction_support:
+        hello = await motor_client.admin.command("hello")
+        _transaction_support[key] = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transaction_support[key]
+
+
+@asynccontextmanager
+async def transaction(motor_client: AsyncIOMotorClient) -> AsyncIterator[Optional[AsyncIOMotorClientSession]]:
+    """
+    Run the block in a multi-document transaction and yield its session.
+
+    On a standalone server (local development) this yields None and the writes
+    run without a session, so pass the yielded value straight to session=.
+    """
+    if not await supports_transactions(motor_client):
+        yield None
+        return
+
+    async with await motor_client.start_session() as session:
+        async with session.start_transaction():
+            yield session
+
 # Redis setup (assuming it remains the same)
 import redis
 redis_client = redis.from_url(settings.redis_url, decode_responses=True)
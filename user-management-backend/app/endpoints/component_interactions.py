@@ -18,8 +18,9 @@ from app.models.interaction_schemas import (
     UserInfo, CommentSortBy, InteractionAnalytics
 )
 from app.utils.audit_logger import log_audit_event
+from app.utils.serialization import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 
 async def get_user_info_component(user_id: str, component_id: str = None) -> UserInfo:
@@ -9,13 +9,16 @@ from pydantic import BaseModel, Field
 from datetime import datetime, timezone
 
 from app.models.user import User, UserRole
-from app.models.developer_earnings import DeveloperEarnings, PayoutRequest, PayoutStatus, PayoutMethod
-from app.models.item_purchase import ItemPurchase, PurchaseStatus
+from app.models.developer_earnings import (
+    DeveloperEarnings, LedgerEntryType, PayoutRequest, PayoutStatus, PayoutMethod
+)
 from app.middleware.auth import require_auth, require_admin, require_creator_or_admin
+from app.services.earnings_ledger import get_earnings_dashboard, get_or_create_summary, record_payout
 from app.utils.audit_logger import log_audit_event, ActionType
+from app.utils.serialization import FastJSONRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 
 # Request/Response Models
@@ -57,35 +60,8 @@ async def get_developer_earnings(
     """Get developer's earnings dashboard with analytics"""
     try:
         
-        # Get or create earnings record
-        earnings = await DeveloperEarnings.find_one({"developer_id": current_user.id})
-        if not earnings:
-            earnings = DeveloperEarnings(
-                developer_id=current_user.id,
-                developer_username=current_user.username
-            )
-            await earnings.insert()
-        
-        # Get detailed analytics
-        analytics = earnings.get_analytics_summary()
-        
-        # Get recent sales
-        recent_sales = await ItemPurchase.find({
-            "developer_id": current_user.id,
-            "status": PurchaseStatus.COMPLETED
-        }).sort([("payment_completed_at", -1)]).limit(10).to_list()
-        
-        analytics["recent_sales"] = [
-            {
-                "item_title": sale.item_title,
-                "item_type": sale.item_type,
-                "amount_inr": sale.paid_amount_inr,
-                "developer_earnings_inr": sale.developer_earnings_inr,
-                "payment_date": sale.payment_completed_at.isoformat() if sale.payment_completed_at else None,
-                "buyer_username": "Anonymous"  # Keep buyer privacy
-            }
-            for sale in recent_sales
-        ]
+        # Summary, monthly rollups and recent sales from the earnings ledger
+        earnings, analytics = await get_earnings_dashboard(current_user.id, current_user.username)
         
         # Get pending payout requests
         pending_payouts = await PayoutRequest.find({
@@ -160,6 +136,13 @@ async def create_payout_request(
         # Create payout request
         request_id = f"PAYOUT_{int(datetime.now(timezone.utc).timestamp())}_{uuid.uuid4().hex[:8]}"
         
+        # Move the amount from available to pending (atomic balance check)
+        reserved = await record_payout(
+            current_user.id, request_id, request.requested_amount_inr, LedgerEntryType.PAYOUT_REQUESTED
+        )
+        if not reserved:
+            raise HTTPException(status_code=400, detail="Insufficient balance")
+        
         payout_request = PayoutRequest(
             request_id=request_id,
             developer_id=current_user.id,
@@ -173,11 +156,13 @@ async def create_payout_request(
             paypal_email=request.paypal_email
         )
         
-        await payout_request.insert()
-        
-        # Update earnings (move from available to pending)
-        earnings.process_payout_request(request.requested_amount_inr)
-        await earnings.save()
+        try:
+            await payout_request.insert()
+        except Exception:
+            await record_payout(
+                current_user.id, request_id, request.requested_amount_inr, LedgerEntryType.PAYOUT_CANCELLED
+            )
+            raise
         
         # Log audit event
         await log_audit_event(
@@ -269,12 +254,7 @@ async def update_earnings_settings(
         # Access controlled by dependency: creator or admin
         
         # Get earnings record
-        earnings = await DeveloperEarnings.find_one({"developer_id": current_user.id})
-        if not earnings:
-            earnings = DeveloperEarnings(
-                developer_id=current_user.id,
-                developer_username=current_user.username
-            )
+        earnings = await get_or_create_summary(current_user.id, current_user.username)
         
         # Update settings
         update_data = {}
@@ -392,10 +372,12 @@ async def admin_update_payout_request(
             payout_request.reject_request(current_user.id, update.rejection_reason)
             
             # Return money to developer's available balance
-            earnings = await DeveloperEarnings.find_one({"developer_id": payout_request.developer_id})
-            if earnings:
-                earnings.cancel_payout_request(payout_request.requested_amount_inr)
-                await earnings.save()
+            await record_payout(
+                payout_request.developer_id,
+                payout_request.request_id,
+                payout_request.requested_amount_inr,
+                LedgerEntryType.PAYOUT_CANCELLED
+            )
         
         await payout_request.save()
         
@@ -453,11 +435,13 @@ async def admin_complete_payout(
         payout_request.complete_payout(final_amount_paid, processing_fee)
         await payout_request.save()
         
-        # Update developer earnings
-        earnings = await DeveloperEarnings.find_one({"developer_id": payout_request.developer_id})
-        if earnings:
-            earnings.complete_payout(payout_request.requested_amount_inr)
-            await earnings.save()
+        # Update developer earnings (pending -> withdrawn)
+        await record_payout(
+            payout_request.developer_id,
+            payout_request.request_id,
+            payout_request.requested_amount_inr,
+            LedgerEntryType.PAYOUT_COMPLETED
+        )
         
         # Log audit event
         await log_audit_event(
@@ -9,14 +9,15 @@ from pydantic import BaseModel, Field
 from datetime import datetime, timezone
 
 from app.models.user import User
-from app.models.item_purchase import ItemPurchase, PurchaseStatus
+from app.models.item_purchase import ItemPurchase, PurchaseStatus, ItemType
 from app.models.shopping_cart import ShoppingCart, CartItem, CartItemType
 from app.services.payment_service import payment_service
 from app.auth.unified_auth import get_current_user_unified
 from app.utils.audit_logger import log_audit_event
+from app.utils.serialization import FastJSONRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 security = HTTPBearer()
 
 
@@ -291,15 +292,15 @@ async def checkout_cart(current_user: User = Depends(get_current_user_unified)):
         purchased_items = []
         valid_items = []
         
+        owned = await ItemPurchase.find({
+            "user_id": current_user.id,
+            "item_id": {"$in": [cart_item.item_id for cart_item in cart.items]},
+            "status": PurchaseStatus.COMPLETED
+        }).to_list()
+        owned_keys = {(purchase.item_id, ItemType(purchase.item_type).value) for purchase in owned}
+        
         for cart_item in cart.items:
-            existing_purchase = await ItemPurchase.find_one({
-                "user_id": current_user.id,
-                "item_id": cart_item.item_id,
-                "item_type": cart_item.item_type,
-                "status": PurchaseStatus.COMPLETED
-            })
-            
-            if existing_purchase:
+            if (cart_item.item_id, ItemType(cart_item.item_type).value) in owned_keys:
                 purchased_items.append(cart_item.item_title)
             else:
                 valid_items.append(cart_item)
@@ -15,8 +15,9 @@ from app.models.interaction_schemas import (
     CommentSortBy, InteractionAnalytics
 )
 from app.utils.audit_logger import log_audit_event
+from app.utils.serialization import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 
 async def get_user_info(user_id: str, template_id: str = None) -> UserInfo:
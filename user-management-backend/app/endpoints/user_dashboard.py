@@ -12,9 +12,10 @@ from app.models.template import Template
 from app.models.component import Component
 from app.services.access_control import ContentAccessService
 from app.middleware.auth import require_auth
+from app.utils.serialization import FastJSONRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 
 @router.get("/user/dashboard")
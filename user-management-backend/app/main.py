@@ -1,15 +1,17 @@
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from contextlib import asynccontextmanager
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 from .config import settings
 from .auth.oauth import register_oauth_clients
-from .middleware.rate_limiting import rate_limit_middleware, add_rate_limit_headers
+from .middleware.performance import PerformanceAndRateLimitMiddleware
+from .middleware.compression import CompressionMiddleware
+from .utils.serialization import FastJSONResponse, FastJSONRoute
+from .utils.metrics import mark_worker_dead, mongo_command_metrics, render_metrics
 from .api import auth, users, subscriptions, tokens, llm, admin, api_keys, payments, templates, extension_auth
 from .api import (
     auth,
@@ -27,8 +29,7 @@ from .api import (
 from .api import debug
 from .api import verify
 from .api import admin_api_keys, webhooks
-from typing import Callable, Dict, Any
-import time
+import hmac
 import uvicorn
 
 # Import all models that need to be registered with Beanie
@@ -39,6 +40,7 @@ from app.models.user import (
     SubscriptionPlanModel,
     OAuthProvider,
     TokenUsageLog,
+    TokenUsageDaily,
     ApiKey
 )
 from app.models.template import (
@@ -53,17 +55,26 @@ from app.models.component import (
     Component,
 )
 from app.models.item_purchase import ItemPurchase
-from app.models.developer_earnings import DeveloperEarnings, PayoutRequest
+from app.models.developer_earnings import (
+    DeveloperEarnings, PayoutRequest, EarningsLedgerEntry, DeveloperEarningsMonthly
+)
 from app.models.shopping_cart import ShoppingCart
 from app.models.audit_log import AuditLog
 from app.models.api_key_pool import ApiKeyPool
+from app.models.job_checkpoint import JobCheckpoint
+from app.models.webhook_event import WebhookEvent
+from app.models.llm_batch import LLMBatch, LLMBatchItem
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events"""
+    # Startup: Fail fast on a payment gateway that must not run here
+    from .services.payment_gateway import check_payment_gateway_settings
+    check_payment_gateway_settings()
+    
     # Startup: Initialize database and Beanie
     print("🔄 Connecting to database...")
-    client = AsyncIOMotorClient(settings.database_url)
+    client = AsyncIOMotorClient(settings.database_url, event_listeners=[mongo_command_metrics])
     database = client.get_default_database()
     
     print("🔄 Initializing Beanie...")
@@ -78,6 +89,7 @@ async def lifespan(app: FastAPI):
                 SubscriptionPlanModel,
                 OAuthProvider,
                 TokenUsageLog,
+                TokenUsageDaily,
                 ApiKey,
                 Template,
                 TemplateCategory,
@@ -88,10 +100,16 @@ async def lifespan(app: FastAPI):
                 Component,
                 ItemPurchase,
                 DeveloperEarnings,
+                EarningsLedgerEntry,
+                DeveloperEarningsMonthly,
                 PayoutRequest,
                 ShoppingCart,
                 AuditLog,
-                ApiKeyPool
+                ApiKeyPool,
+                JobCheckpoint,
+                WebhookEvent,
+                LLMBatch,
+                LLMBatchItem
             ]
         )
         print("✅ Database connected and initialized")
@@ -99,8 +117,78 @@ async def lifespan(app: FastAPI):
         print(f"❌ Error initializing Beanie: {e}")
         raise
     
+    # Startup: Backfill the API key pool's least-loaded counters
+    from .services.key_pool_allocator import sync_assigned_counts
+    try:
+        await sync_assigned_counts()
+    except Exception as e:
+        print(f"⚠️ Failed to sync API key pool counts: {e}")
+    
+    # Startup: Schedule daily subscription maintenance
+    from .services.subscription_jobs import subscription_job_scheduler
+    if settings.subscription_jobs_enabled:
+        subscription_job_scheduler.start()
+    
+    # Startup: Write token usage logs in bulk in the background
+    from .services.usage_log_writer import usage_log_writer
+    if settings.usage_log_write_behind:
+        usage_log_writer.start()
+    
+    # Startup: Process stored payment webhooks in the background
+    from .services.webhook_inbox import webhook_worker_pool
+    if settings.webhook_workers_enabled:
+        webhook_worker_pool.start()
+    
+    # Startup: Process submitted LLM batches in the background
+    from .services.llm_batches import llm_batch_worker_pool
+    if settings.llm_batch_workers_enabled:
+        llm_batch_worker_pool.start()
+    
     yield
     
+    # Shutdown: Stop the subscription job scheduler
+    await subscription_job_scheduler.stop()
+    
+    # Shutdown: Stop webhook workers (leased events are picked up again after the lease expires)
+    await webhook_worker_pool.stop()
+    
+    # Shutdown: Stop batch workers (leased batches are picked up again after the lease expires)
+    await llm_batch_worker_pool.stop()
+    
+    # Shutdown: Write buffered usage logs (what MongoDB doesn't take is left on disk for the next worker)
+    await usage_log_writer.stop()
+    
+    # Shutdown: Stop thumbnail encoder processes
+    from .services.thumbnail_service import shutdown_executor
+    shutdown_executor()
+    
+    # Shutdown: Stop tokenizer threads
+    from .services.tokenizer import tokenizers
+    tokenizers.shutdown()
+    
+    # Shutdown: Release pooled cache connections
+    from .services.cache_service import cache_service
+    await cache_service.close()
+    
+    # Shutdown: Close the token reservation store's and LLM response cache's Redis connections
+    from .services.token_reservations import token_reservation_store
+    from .services.llm_response_cache import llm_response_cache
+    await token_reservation_store.close()
+    await llm_response_cache.close()
+    
+    # Shutdown: Send queued embeddings batches and close the batcher's provider clients
+    from .services.embedding_batcher import embedding_batcher
+    from .services.embedding_cache import embedding_cache
+    await embedding_batcher.close()
+    await embedding_cache.close()
+    
+    # Shutdown: Close the payment gateway connection pool
+    from .services.payment_gateway import close_payment_gateway
+    await close_payment_gateway()
+    
+    # Shutdown: Remove this worker's live gauges from the shared metrics directory
+    mark_worker_dead()
+    
     # Shutdown: Close database connection
     print("🔄 Closing database connection...")
     client.close()
@@ -116,73 +204,20 @@ app = FastAPI(
     version="1.0.0",
     debug=settings.debug,
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc"
 )
 
+# Serialize app-level routes with orjson too (routers set route_class themselves)
+app.router.route_class = FastJSONRoute
+
 # Add session middleware for OAuth
 app.add_middleware(
     SessionMiddleware, 
     secret_key=settings.jwt_secret_key
 )
 
-# Custom middleware for performance monitoring and rate limit headers
-class PerformanceAndRateLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: Callable
-    ) -> JSONResponse:
-        # Note: Debug logging removed for production security
-        # Sensitive headers should never be logged
-
-        # Track request timing
-        start_time = time.time()
-        
-        # Apply rate limiting for non-health endpoints AND skip OPTIONS requests
-        if request.method != "OPTIONS" and not request.url.path in ["/", "/health", "/docs", "/redoc", "/openapi.json"]:
-            try:
-                from .database import get_database
-                from .middleware.rate_limiting import rate_limit_middleware
-                
-                # Get database instance
-                db = get_database()
-                
-                try:
-                    # Check rate limits
-                    rate_info = await rate_limit_middleware.check_rate_limit(request, db)
-                    request.state.rate_limit_info = rate_info
-                except Exception as e:
-                    # If rate limiting fails, allow request but log error
-                    print(f"Rate limiting error: {e}")
-                    request.state.rate_limit_info = {
-                        "limit": 100,
-                        "remaining": 99,
-                        "reset": int(time.time()) + 3600,
-                        "tier": "fallback"
-                    }
-            except Exception as e:
-                print(f"Rate limiting initialization error: {e}")
-        
-        # Process the request
-        response = await call_next(request)
-        
-        # Prevent caching of OPTIONS preflight requests
-        # This fixes CORS issues when Cloudflare caches OPTIONS with wrong origin
-        if request.method == "OPTIONS":
-            response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-        
-        # Add request processing time header
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        
-        # Add rate limit headers if present in request state
-        if hasattr(request.state, "rate_limit_info"):
-            add_rate_limit_headers(response, request.state.rate_limit_info)
-        
-        # Return the response
-        return response
-
 # Add custom middleware (Inner middleware)
 
 
@@ -252,6 +287,9 @@ if not disable_cors:
 else:
     print("⚠️ CORS Middleware DISABLED - Cloudflare handles CORS")
 
+# Compress JSON responses (inside the timing middleware so X-Process-Time includes it)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_minimum_size)
+
 # Add custom middleware (Outer middleware - wraps CORS)
 # This ensures we can add headers to responses generated by CORS middleware (like OPTIONS)
 app.add_middleware(PerformanceAndRateLimitMiddleware)
@@ -327,12 +365,15 @@ except ImportError as e:
 
 # Import and include sub-users router
 try:
-    from .api import sub_users, sub_user_dashboard
+    from .api import sub_users
     app.include_router(sub_users.router)
-    app.include_router(sub_user_dashboard.router)
 except ImportError:
     print("Warning: Sub-users router not available")
 
+# The dashboard only reads MongoDB, so it doesn't depend on the sub-users router importing
+from .api import sub_user_dashboard
+app.include_router(sub_user_dashboard.router)
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -345,6 +386,17 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus metrics (aggregated across workers when PROMETHEUS_MULTIPROC_DIR is set)"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    authorization = request.headers.get("Authorization", "").encode()
+    if settings.metrics_token and not hmac.compare_digest(authorization, f"Bearer {settings.metrics_token}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 # Backward compatibility endpoint for /auth/me
 @app.get("/auth/me")
 async def auth_me_backward_compatibility(request: Request):
@@ -8,6 +8,8 @@ from .rate_limiting import (
     add_rate_limit_headers,
 )
 
+from .performance import PerformanceAndRateLimitMiddleware
+
 from .auth import (
     get_current_user_from_token,
     require_auth,
@@ -30,6 +32,7 @@ __all__ = [
     "rate_limit_middleware",
     "apply_rate_limit",
     "add_rate_limit_headers",
+    "PerformanceAndRateLimitMiddleware",
     "get_current_user_from_token",
     "require_auth",
     "require_role",
@@ -0,0 +1,133 @@
+"""
+Request timing, metrics and rate limiting middleware.
+Implemented as pure ASGI middleware so response bodies (including streamed
+LLM responses) pass through without being buffered or wrapped.
+"""
+
+import logging
+import time
+from typing import Any, Dict
+
+from fastapi import HTTPException
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..database import get_database
+from ..config import settings
+from ..utils.metrics import http_request_duration, http_requests_in_flight, rate_limit_decisions
+from ..utils.query_tracer import report_request, trace_queries
+from .rate_limiting import rate_limit_middleware, rate_limit_headers
+
+logger = logging.getLogger(__name__)
+
+# Paths that are never rate limited
+RATE_LIMIT_EXEMPT_PATHS = frozenset(["/", "/health", "/metrics", "/docs", "/redoc", "/openapi.json"])
+
+# Route label for requests that didn't match a route (keeps raw paths out of the labels)
+UNMATCHED_ROUTE = "unmatched"
+
+# Prevent caching of OPTIONS preflight requests
+# This fixes CORS issues when Cloudflare caches OPTIONS with wrong origin
+NO_CACHE_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+
+def fallback_rate_limit_info() -> Dict[str, Any]:
+    """Rate limit info used when the rate limiter itself fails"""
+    return {
+        "limit": 100,
+        "remaining": 99,
+        "reset": int(time.time()) + 3600,
+        "tier": "fallback"
+    }
+
+
+def route_template(scope: Scope) -> str:
+    """The matched route's path template, e.g. /api/templates/{template_id}"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class PerformanceAndRateLimitMiddleware:
+    """Adds timing and rate limit headers, records request metrics and applies rate limits"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.db = get_database()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.query_trace_enabled:
+            await self._handle(scope, receive, send)
+            return
+
+        # Trace the whole request, rate limit lookups included
+        with trace_queries() as trace:
+            try:
+                await self._handle(scope, receive, send)
+            finally:
+                report_request(trace, scope["method"], route_template(scope))
+
+    async def _handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Note: Debug logging removed for production security
+        # Sensitive headers should never be logged
+
+        # Track request timing
+        start_time = time.perf_counter()
+        method = scope["method"]
+        rate_limit_info = None
+        status_code = 500
+        app = self.app
+
+        # Apply rate limiting for non-health endpoints AND skip OPTIONS requests
+        if method != "OPTIONS" and scope["path"] not in RATE_LIMIT_EXEMPT_PATHS:
+            request = Request(scope)
+            try:
+                rate_limit_info = await rate_limit_middleware.check_rate_limit(request, self.db)
+            except HTTPException as e:
+                # Over the limit (already recorded as "limited" by the limiter): answer
+                # with the 429 instead of running the endpoint
+                if isinstance(e.detail, dict):
+                    rate_limit_info = e.detail.get("rate_limit")
+                app = JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
+            except Exception as e:
+                # If the rate limiter itself fails (before recording a decision), allow
+                # the request but log the error
+                logger.error(f"Rate limiting error: {e}")
+                rate_limit_info = fallback_rate_limit_info()
+                rate_limit_decisions("fallback", "error").inc()
+            request.state.rate_limit_info = rate_limit_info
+
+        async def send_with_headers(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                if method == "OPTIONS":
+                    headers.update(NO_CACHE_HEADERS)
+
+                # Add request processing time header (time to first byte)
+                headers["X-Process-Time"] = str(time.perf_counter() - start_time)
+
+                if rate_limit_info is not None:
+                    headers.update(rate_limit_headers(rate_limit_info))
+            await send(message)
+
+        in_flight = http_requests_in_flight(method)
+        in_flight.inc()
+        try:
+            await app(scope, receive, send_with_headers)
+        finally:
+            in_flight.dec()
+            # Full duration, including streamed bodies
+            http_request_duration(method, route_template(scope), status_code).observe(
+                time.perf_counter() - start_time
+            )
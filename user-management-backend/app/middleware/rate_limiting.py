@@ -14,6 +14,7 @@ from ..database import get_database # Changed from get_db to get_database
 from ..models.user import User, ApiKey
 from ..config import settings
 from ..auth.jwt import verify_token
+from ..utils.metrics import rate_limit_decisions
 import hashlib
 
 # Redis client
@@ -316,6 +317,12 @@ class RateLimitMiddleware:
             "identifier_type": identifier.split(":")[0] if ":" in identifier else "unknown"
         })
         
+        if "error" in rate_info:
+            decision = "error"
+        else:
+            decision = "allowed" if is_allowed else "limited"
+        rate_limit_decisions(rate_limit_tier, decision).inc()
+        
         if not is_allowed:
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -348,9 +355,15 @@ async def apply_rate_limit(
     """
     return await rate_limit_middleware.check_rate_limit(request, db)
 
+def rate_limit_headers(rate_info: Dict[str, Any]) -> Dict[str, str]:
+    """Build rate limit headers from rate limit info"""
+    return {
+        "X-RateLimit-Limit": str(rate_info["limit"]),
+        "X-RateLimit-Remaining": str(rate_info["remaining"]),
+        "X-RateLimit-Reset": str(rate_info["reset"]),
+        "X-RateLimit-Tier": rate_info["tier"],
+    }
+
 def add_rate_limit_headers(response, rate_info: Dict[str, Any]):
     """Add rate limit headers to response"""
-    response.headers["X-RateLimit-Limit"] = str(rate_info["limit"])
-    response.headers["X-RateLimit-Remaining"] = str(rate_info["remaining"])
-    response.headers["X-RateLimit-Reset"] = str(rate_info["reset"])
-    response.headers["X-RateLimit-Tier"] = rate_info["tier"]
+    response.headers.update(rate_limit_headers(rate_info))
@@ -6,6 +6,7 @@ from .user import (
     SubscriptionPlan,
     UserSubscription,
     TokenUsageLog,
+    TokenUsageDaily,
     ApiKey,
     Organization,
     OrganizationMember,
@@ -19,6 +20,7 @@ __all__ = [
     "SubscriptionPlan",
     "UserSubscription",
     "TokenUsageLog",
+    "TokenUsageDaily",
     "ApiKey",
     "Organization",
     "OrganizationMember",
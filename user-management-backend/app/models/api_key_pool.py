@@ -20,6 +20,7 @@ class ApiKeyPool(Document):
     label: Optional[str] = None  # Admin-defined label for identification
     max_users: int = 10  # Maximum users that can share this key
     assigned_user_ids: List[PydanticObjectId] = Field(default_factory=list)
+    assigned_count: int = 0  # Mirrors len(assigned_user_ids); used to pick the least-loaded key
     is_active: bool = True
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
@@ -29,7 +30,8 @@ class ApiKeyPool(Document):
         indexes = [
             "key_type",
             "is_active",
-            "assigned_user_ids"
+            "assigned_user_ids",
+            [("key_type", 1), ("is_active", 1), ("assigned_count", 1)]
         ]
     
     @property
@@ -59,6 +61,7 @@ class ApiKeyPool(Document):
         if not self.has_capacity:
             return False
         self.assigned_user_ids.append(user_id)
+        self.assigned_count = len(self.assigned_user_ids)
         self.updated_at = datetime.now(UTC)
         return True
     
@@ -69,6 +72,7 @@ class ApiKeyPool(Document):
         """
         if user_id in self.assigned_user_ids:
             self.assigned_user_ids.remove(user_id)
+            self.assigned_count = len(self.assigned_user_ids)
             self.updated_at = datetime.now(UTC)
             return True
         return False
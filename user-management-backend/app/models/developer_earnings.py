@@ -8,6 +8,7 @@ from enum import Enum
 from beanie import Document
 from pydantic import Field, BaseModel
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 # Use PydanticObjectId for consistency
 try:
@@ -69,9 +70,10 @@ class DeveloperEarnings(Document):
     best_selling_item_id: Optional[PydanticObjectId] = Field(None, description="Best selling item")
     best_selling_item_type: Optional[str] = Field(None, description="Best selling item type")
     
-    # Monthly Analytics (Last 12 months)
-    monthly_earnings: Dict[str, int] = Field(default_factory=dict, description="Monthly earnings breakdown")
-    monthly_sales: Dict[str, int] = Field(default_factory=dict, description="Monthly sales count")
+    # Legacy monthly breakdowns, now kept as DeveloperEarningsMonthly rollups.
+    # Moved into rollups (and removed here) the first time the dashboard loads.
+    monthly_earnings: Dict[str, int] = Field(default_factory=dict, description="Legacy monthly earnings breakdown")
+    monthly_sales: Dict[str, int] = Field(default_factory=dict, description="Legacy monthly sales count")
     
     # Bank/Payment Information
     bank_account_number: Optional[str] = Field(None, description="Bank account number")
@@ -106,56 +108,18 @@ class DeveloperEarnings(Document):
         ]
         use_state_management = True
 
-    def add_sale_earnings(self, sale_amount: int, item_id: str, item_type: str):
-        """Add earnings from a new sale"""
-        earnings = int(sale_amount * 0.70)  # 70% to developer
-        
-        self.total_earnings_inr += earnings
-        self.available_balance_inr += earnings
-        self.total_sales_count += 1
-        
-        if item_type == "template":
-            self.template_sales_count += 1
-        else:
-            self.component_sales_count += 1
-        
-        # Update average
-        if self.total_sales_count > 0:
-            self.average_sale_amount_inr = self.total_earnings_inr // self.total_sales_count
-        
-        # Update monthly stats
-        current_month = datetime.now(timezone.utc).strftime("%Y-%m")
-        self.monthly_earnings[current_month] = self.monthly_earnings.get(current_month, 0) + earnings
-        self.monthly_sales[current_month] = self.monthly_sales.get(current_month, 0) + 1
-        
-        self.updated_at = datetime.now(timezone.utc)
-
-    def process_payout_request(self, amount: int) -> bool:
-        """Process a payout request (move from available to pending)"""
-        if amount <= self.available_balance_inr:
-            self.available_balance_inr -= amount
-            self.pending_balance_inr += amount
-            self.updated_at = datetime.now(timezone.utc)
-            return True
-        return False
+    @property
+    def average_sale_earnings_inr(self) -> int:
+        """Average developer earnings per sale (derived, so counters stay plain $inc)"""
+        return self.total_earnings_inr // self.total_sales_count if self.total_sales_count else 0
 
-    def complete_payout(self, amount: int):
-        """Complete a payout (move from pending to withdrawn)"""
-        if amount <= self.pending_balance_inr:
-            self.pending_balance_inr -= amount
-            self.withdrawn_total_inr += amount
-            self.last_payout_date = datetime.now(timezone.utc)
-            self.updated_at = datetime.now(timezone.utc)
-
-    def cancel_payout_request(self, amount: int):
-        """Cancel a payout request (move from pending back to available)"""
-        if amount <= self.pending_balance_inr:
-            self.pending_balance_inr -= amount
-            self.available_balance_inr += amount
-            self.updated_at = datetime.now(timezone.utc)
-
-    def get_analytics_summary(self) -> Dict[str, Any]:
-        """Get comprehensive analytics summary"""
+    def get_analytics_summary(self, monthly: Optional[List["DeveloperEarningsMonthly"]] = None) -> Dict[str, Any]:
+        """Get comprehensive analytics summary, with monthly figures from the rollups when given"""
+        if monthly is not None:
+            monthly_earnings = {bucket.month: bucket.earnings_inr for bucket in monthly}
+            monthly_sales = {bucket.month: bucket.sales_count for bucket in monthly}
+        else:
+            monthly_earnings, monthly_sales = self.monthly_earnings, self.monthly_sales
         return {
             "total_earnings_inr": self.total_earnings_inr,
             "available_balance_inr": self.available_balance_inr,
@@ -164,9 +128,9 @@ class DeveloperEarnings(Document):
             "total_sales_count": self.total_sales_count,
             "template_sales_count": self.template_sales_count,
             "component_sales_count": self.component_sales_count,
-            "average_sale_amount_inr": self.average_sale_amount_inr,
-            "monthly_earnings": self.monthly_earnings,
-            "monthly_sales": self.monthly_sales,
+            "average_sale_amount_inr": self.average_sale_earnings_inr,
+            "monthly_earnings": monthly_earnings,
+            "monthly_sales": monthly_sales,
             "conversion_rate": round((self.total_sales_count / max(1, self.total_sales_count)) * 100, 2),
             "last_payout_date": self.last_payout_date.isoformat() if self.last_payout_date else None
         }
@@ -184,7 +148,7 @@ class DeveloperEarnings(Document):
             "total_sales_count": self.total_sales_count,
             "template_sales_count": self.template_sales_count,
             "component_sales_count": self.component_sales_count,
-            "average_sale_amount_inr": self.average_sale_amount_inr,
+            "average_sale_amount_inr": self.average_sale_earnings_inr,
             "preferred_payout_method": self.preferred_payout_method,
             "minimum_payout_amount": self.minimum_payout_amount,
             "auto_payout_enabled": self.auto_payout_enabled,
@@ -196,6 +160,60 @@ class DeveloperEarnings(Document):
         }
 
 
+class LedgerEntryType(str, Enum):
+    """Kinds of earnings ledger entries"""
+    SALE = "sale"
+    PAYOUT_REQUESTED = "payout_requested"  # available -> pending
+    PAYOUT_CANCELLED = "payout_cancelled"  # pending -> available
+    PAYOUT_COMPLETED = "payout_completed"  # pending -> withdrawn
+
+
+class EarningsLedgerEntry(Document):
+    """
+    Append-only record of every change to a developer's earnings. The
+    DeveloperEarnings summary and the monthly rollups are derived from these;
+    (entry_type, source_id) is unique so a sale or payout is never applied twice.
+    """
+
+    developer_id: PydanticObjectId = Field(..., description="Developer user ID")
+    entry_type: LedgerEntryType = Field(..., description="Kind of entry")
+    source_id: str = Field(..., description="Purchase ID or payout request ID")
+    amount_inr: int = Field(..., description="Developer's share (sales) or payout amount")
+    gross_amount_inr: int = Field(default=0, description="Amount the buyer paid (sales)")
+    item_id: Optional[PydanticObjectId] = Field(None)
+    item_type: Optional[str] = Field(None)
+    item_title: Optional[str] = Field(None)
+    month: str = Field(..., description="Rollup bucket, YYYY-MM")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    class Settings:
+        name = "developer_earnings_ledger"
+        indexes = [
+            IndexModel([("entry_type", ASCENDING), ("source_id", ASCENDING)], unique=True),
+            [("developer_id", 1), ("created_at", -1)],
+            [("developer_id", 1), ("entry_type", 1), ("created_at", -1)],
+        ]
+
+
+class DeveloperEarningsMonthly(Document):
+    """Per-developer monthly sales rollup, updated with $inc as sales are recorded"""
+
+    developer_id: PydanticObjectId = Field(..., description="Developer user ID")
+    month: str = Field(..., description="YYYY-MM")
+    earnings_inr: int = Field(default=0)
+    gross_sales_inr: int = Field(default=0)
+    sales_count: int = Field(default=0)
+    template_sales_count: int = Field(default=0)
+    component_sales_count: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    class Settings:
+        name = "developer_earnings_monthly"
+        indexes = [
+            IndexModel([("developer_id", ASCENDING), ("month", DESCENDING)], unique=True),
+        ]
+
+
 class PayoutRequest(Document):
     """Developer payout request model"""
     
@@ -0,0 +1,34 @@
+"""
+Job checkpoint model for resumable background jobs.
+Tracks progress of a named job run and the lease that keeps a single worker
+running it at a time.
+"""
+
+from datetime import datetime, UTC
+from typing import Optional, List
+from pydantic import Field
+from beanie import Document, Indexed, PydanticObjectId
+
+
+class JobCheckpoint(Document):
+    """
+    Progress of one run of a background job (e.g. "expired_subscriptions:2025-01-31").
+    Jobs stream documents in _id order and record the last processed _id, so an
+    interrupted run resumes where it stopped.
+    """
+
+    name: Indexed(str, unique=True)
+    status: str = "running"  # running, completed, failed
+    last_id: Optional[PydanticObjectId] = None  # Last fully processed document
+    pending_ids: List[PydanticObjectId] = Field(default_factory=list)  # Batch in progress when interrupted
+    processed: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    started_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    completed_at: Optional[datetime] = None
+
+    class Settings:
+        name = "job_checkpoints"
@@ -0,0 +1,90 @@
+"""
+LLM batch job models.
+A batch is submitted once, its requests are stored as items, and the batch
+worker pool processes them in the background, writing each result back to
+its item as it completes.
+"""
+
+from datetime import datetime, UTC
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from pydantic import Field
+from beanie import Document, Indexed
+from pymongo import ASCENDING, IndexModel
+
+
+class LLMBatchStatus(str, Enum):
+    QUEUED = "queued"            # Waiting for a worker
+    IN_PROGRESS = "in_progress"  # Leased by a worker
+    CANCELLING = "cancelling"    # Cancel requested; the worker stops after in-flight items
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+
+class LLMBatchItemStatus(str, Enum):
+    PENDING = "pending"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class LLMBatch(Document):
+    """
+    One submitted batch of chat completions. Tokens for the whole batch are
+    reserved at submission (`reservation_id`) and settled with `used_tokens`
+    when it finishes.
+    """
+
+    user_id: Indexed(str)
+    tier: str = "free"
+    status: LLMBatchStatus = LLMBatchStatus.QUEUED
+    request_count: int = 0
+    succeeded_count: int = 0
+    failed_count: int = 0
+    cancelled_count: int = 0
+    result_sequence: int = 0  # Items finished so far; each finished item takes the next number
+    reserved_tokens: int = 0
+    reservation_id: Optional[str] = None
+    used_tokens: int = 0
+    cost_usd: float = 0.0
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Settings:
+        name = "llm_batches"
+        indexes = [
+            [("status", 1), ("created_at", 1)],
+            [("user_id", 1), ("created_at", -1)],
+        ]
+
+
+class LLMBatchItem(Document):
+    """One request of a batch, and its result once processed"""
+
+    batch_id: str
+    index: int
+    custom_id: Optional[str] = None
+    model: str
+    messages: List[Dict[str, Any]]
+    params: Dict[str, Any] = Field(default_factory=dict)
+    status: LLMBatchItemStatus = LLMBatchItemStatus.PENDING
+    attempts: int = 0
+    response: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    provider: Optional[str] = None
+    tokens_used: int = 0
+    cost_usd: float = 0.0
+    sequence: Optional[int] = None  # Order in which the item finished, for paging results
+    completed_at: Optional[datetime] = None
+
+    class Settings:
+        name = "llm_batch_items"
+        indexes = [
+            IndexModel([("batch_id", ASCENDING), ("index", ASCENDING)], unique=True),
+            [("batch_id", 1), ("status", 1), ("index", 1)],
+            [("batch_id", 1), ("sequence", 1)],
+        ]
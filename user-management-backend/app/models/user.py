@@ -3,6 +3,7 @@ from typing import Optional, List, Dict, Any, Union
 from pydantic import Field, EmailStr, ConfigDict, field_validator
 from beanie import Document, PydanticObjectId
 from beanie.odm.fields import Indexed # Import Indexed explicitly
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from enum import Enum
 
 class UserRole(str, Enum):
@@ -72,7 +73,8 @@ class User(Document):
             "role",
             "parent_user_id",
             "created_at",
-            "is_active"
+            "is_active",
+            [("subscription", 1), ("subscription_end_date", 1)]
         ]
     
     @field_validator('subscription', mode='before')
@@ -223,13 +225,31 @@ class TokenUsageLog(Document):
         indexes = [
             "user_id",
             "organization_id",
-            "created_at"
+            "created_at",
+            [("user_id", 1), ("created_at", -1)]  # Per-user usage windows and last activity
         ]
 
     def __repr__(self):
         return f"<TokenUsageLog(user_id='{self.user_id}', tokens='{self.tokens_used}', provider='{self.provider}')>"
 
 
+class TokenUsageDaily(Document):
+    """Per-user daily usage rollup, updated with $inc as usage logs are flushed"""
+    user_id: PydanticObjectId
+    day: str  # YYYY-MM-DD (UTC)
+    tokens_used: int = 0
+    request_count: int = 0
+    cost_usd: float = 0.0
+    flushes: List[str] = Field(default_factory=list)  # Recent usage log flushes already counted, so a replayed flush isn't counted twice
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Settings:
+        name = "token_usage_daily"
+        indexes = [
+            IndexModel([("user_id", ASCENDING), ("day", DESCENDING)], unique=True),
+        ]
+
+
 class ApiKey(Document):
     """API key model for MongoDB"""
     user_id: PydanticObjectId
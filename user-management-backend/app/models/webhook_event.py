@@ -0,0 +1,49 @@
+"""
+Webhook inbox model.
+Gateway webhooks are stored here as soon as they are verified and processed
+later by the webhook worker pool.
+"""
+
+from datetime import datetime, UTC
+from enum import Enum
+from typing import Any, Dict, Optional
+from pydantic import Field
+from beanie import Document, Indexed
+
+
+class WebhookEventStatus(str, Enum):
+    PENDING = "pending"        # Waiting for (another) attempt
+    PROCESSING = "processing"  # Leased by a worker
+    PROCESSED = "processed"
+    DEAD = "dead"              # Gave up after max attempts
+
+
+class WebhookEvent(Document):
+    """
+    One received webhook event. `event_id` is the gateway's event ID, so a
+    redelivered event hits the unique index instead of being stored twice.
+    Events sharing an `ordering_key` (the payment ID) are processed in the order
+    they were received.
+    """
+
+    event_id: Indexed(str, unique=True)
+    provider: str = "razorpay"
+    event: str
+    ordering_key: Optional[str] = None
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    status: WebhookEventStatus = WebhookEventStatus.PENDING
+    attempts: int = 0
+    last_error: Optional[str] = None
+    next_attempt_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    received_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    processed_at: Optional[datetime] = None
+
+    class Settings:
+        name = "webhook_events"
+        indexes = [
+            [("status", 1), ("next_attempt_at", 1)],
+            [("ordering_key", 1), ("status", 1)],
+            [("received_at", -1)],
+        ]
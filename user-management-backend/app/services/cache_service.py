@@ -1,319 +1,615 @@
 """
 Redis Caching Service for User Management Backend
-Provides caching functionality for user sessions, data, and frequently accessed information.
+Two-tier async cache: an in-process LRU (L1) in front of a pooled async Redis
+(L2). Loads are single-flight per key, hot keys are refreshed early with
+probabilistic expiration, and values are stored with a pluggable serializer.
 """
 
-import json
+import asyncio
+import fnmatch
+import functools
+import inspect
+import logging
+import math
+import random
 import time
-import hashlib
-from typing import Optional, Dict, Any, List, Union
-from datetime import datetime, timedelta
-import redis
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, Union
+
+import orjson
+import redis.asyncio as aioredis
+from pydantic import BaseModel
+
 from app.config import settings
+from app.utils.metrics import CACHE_L1_HIT, CACHE_L2_HIT, CACHE_MISS, Timer, redis_command_duration
+from app.utils.serialization import dumps, orjson_default
 
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; orjson is always available
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+
+class OrjsonSerializer:
+    """JSON serializer backed by orjson"""
+    name = "orjson"
+
+    def dumps(self, value: Any) -> bytes:
+        return dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackSerializer:
+    """Compact binary serializer backed by msgpack"""
+    name = "msgpack"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=orjson_default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+SERIALIZERS = {
+    "orjson": OrjsonSerializer,
+    "msgpack": MsgpackSerializer,
+}
+
+
+def get_serializer(name: str):
+    """Return a serializer by name, falling back to orjson if msgpack isn't installed"""
+    if name == "msgpack" and msgpack is None:
+        logger.warning("msgpack is not installed, caching with orjson instead")
+        name = "orjson"
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown cache serializer: {name}")
+    return SERIALIZERS[name]()
+
+
+class LRUCache:
+    """Bounded in-process cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self._data[key] = (time.monotonic() + ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def delete_matching(self, pattern: str) -> int:
+        """Delete keys matching a glob-style pattern"""
+        keys = [key for key in self._data if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheEntry:
+    """A cached value with the time it took to compute and its logical expiry"""
+    __slots__ = ("value", "delta", "expires_at")
+
+    def __init__(self, value: Any, delta: float, expires_at: float):
+        self.value = value
+        self.delta = delta
+        self.expires_at = expires_at
+
+
+class CacheStats:
+    """Hit/miss counters and recent latency samples"""
+
+    SAMPLE_SIZE = 1024
 
-class CacheService:
-    """Redis-based caching service for the application"""
-    
     def __init__(self):
-        """Initialize Redis connection with fallback handling"""
-        try:
-            self.redis = redis.Redis(
+        self.reset()
+
+    def reset(self) -> None:
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.early_refreshes = 0
+        self.coalesced = 0
+        self.redis_errors = 0
+        self._get_latency = deque(maxlen=self.SAMPLE_SIZE)
+        self._load_latency = deque(maxlen=self.SAMPLE_SIZE)
+
+    def observe_get(self, seconds: float) -> None:
+        self._get_latency.append(seconds * 1000)
+
+    def observe_load(self, seconds: float) -> None:
+        self._load_latency.append(seconds * 1000)
+
+    @staticmethod
+    def _percentiles(samples) -> Dict[str, float]:
+        if not samples:
+            return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+        ordered = sorted(samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+        return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        return {
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.l1_hits + self.l2_hits) / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "early_refreshes": self.early_refreshes,
+            "coalesced": self.coalesced,
+            "redis_errors": self.redis_errors,
+            "get_latency": self._percentiles(self._get_latency),
+            "load_latency": self._percentiles(self._load_latency),
+        }
+
+
+class CacheService:
+    """
+    Two-tier async cache for the application.
+
+    Values live in a per-worker LRU for at most `local_ttl` seconds and in
+    Redis for their full TTL, so an invalidation made by another worker is
+    visible here within `local_ttl`. Values returned from the cache are shared
+    between callers and must be treated as read-only.
+    """
+
+    # Skip Redis for this long after a connection failure
+    REDIS_RETRY_SECONDS = 30.0
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        local_ttl: Optional[float] = None,
+        serializer: Optional[str] = None,
+        early_refresh_beta: Optional[float] = None,
+    ):
+        self.local = LRUCache(max_entries or settings.cache_local_max_entries)
+        self.local_ttl = local_ttl if local_ttl is not None else settings.cache_local_ttl_seconds
+        self.serializer = get_serializer(serializer or settings.cache_serializer)
+        self.early_refresh_beta = (
+            early_refresh_beta if early_refresh_beta is not None else settings.cache_early_refresh_beta
+        )
+        self.stats = CacheStats()
+        self._pool: Optional[aioredis.ConnectionPool] = None
+        self._redis: Optional[aioredis.Redis] = None
+        self._redis_retry_at = 0.0
+        self._pending: Dict[str, "asyncio.Future[Any]"] = {}
+
+    @property
+    def connected(self) -> bool:
+        """False while Redis is being skipped after a connection failure"""
+        return time.monotonic() >= self._redis_retry_at
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        if not self.connected:
+            return None
+        if self._redis is None:
+            self._pool = aioredis.ConnectionPool(
                 host=settings.redis_host,
                 port=settings.redis_port,
-                password=settings.redis_password,
-                decode_responses=True,
-                socket_connect_timeout=5.0,
-                socket_timeout=5.0,
-                health_check_interval=30
+                password=settings.redis_password or None,
+                max_connections=settings.cache_redis_max_connections,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5,
+                health_check_interval=30,
             )
-            # Test connection
-            self.redis.ping()
-            self.connected = True
-            print("✅ Redis cache service connected successfully")
-        except Exception as e:
-            print(f"⚠️ Redis cache connection failed: {e}. Running without cache.")
-            self.connected = False
-            self.redis = None
-    
+            self._redis = aioredis.Redis(connection_pool=self._pool)
+        return self._redis
+
+    def _redis_failed(self, error: Exception) -> None:
+        self.stats.redis_errors += 1
+        logger.warning(f"Cache Redis error, using local cache only: {error}")
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+
     def _generate_key(self, prefix: str, identifier: str, suffix: str = "") -> str:
         """Generate consistent cache keys"""
         key = f"{prefix}:{identifier}"
         if suffix:
             key += f":{suffix}"
         return key
-    
-    def _serialize_data(self, data: Any) -> str:
-        """Serialize data for Redis storage"""
-        if isinstance(data, (dict, list)):
-            return json.dumps(data, default=str)
-        return str(data)
-    
-    def _deserialize_data(self, data: str) -> Any:
-        """Deserialize data from Redis"""
+
+    def _set_local(self, key: str, entry: CacheEntry) -> None:
+        ttl = min(entry.expires_at - time.monotonic(), self.local_ttl)
+        if ttl > 0:
+            self.local.set(key, entry, ttl)
+
+    async def _lookup(self, key: str) -> Optional[CacheEntry]:
+        """Find an entry in L1, then L2, recording which tier answered"""
+        entry = self.local.get(key)
+        if entry is not None:
+            self.stats.l1_hits += 1
+            CACHE_L1_HIT.inc()
+            return entry
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                pipe = redis.pipeline(transaction=False)
+                pipe.get(key)
+                pipe.pttl(key)
+                with Timer(redis_command_duration("get")):
+                    payload, pttl = await pipe.execute()
+            except Exception as e:
+                self._redis_failed(e)
+                payload, pttl = None, 0
+
+            if payload is not None and pttl > 0:
+                try:
+                    value, delta = self.serializer.loads(payload)
+                except Exception:
+                    # Written by an older format; treat as a miss and let it be replaced
+                    value = None
+                else:
+                    entry = CacheEntry(value, float(delta), time.monotonic() + pttl / 1000)
+                    self._set_local(key, entry)
+                    self.stats.l2_hits += 1
+                    CACHE_L2_HIT.inc()
+                    return entry
+
+        self.stats.misses += 1
+        CACHE_MISS.inc()
+        return None
+
+    async def _store(self, key: str, value: Any, ttl_seconds: float, delta: float = 0.0) -> bool:
+        self._set_local(key, CacheEntry(value, delta, time.monotonic() + ttl_seconds))
+
+        redis = self._get_redis()
+        if redis is None:
+            return False
+        try:
+            payload = self.serializer.dumps([value, delta])
+            with Timer(redis_command_duration("set")):
+                return bool(await redis.set(key, payload, px=max(1, int(ttl_seconds * 1000))))
+        except Exception as e:
+            self._redis_failed(e)
+            return False
+
+    def _should_refresh_early(self, entry: CacheEntry) -> bool:
+        """
+        Probabilistic early expiration (XFetch).
+
+        Each read refreshes with a probability that rises as expiry approaches
+        and with how long the value took to compute, so one caller rebuilds a
+        hot key shortly before it expires instead of every caller at once.
+        """
+        if self.early_refresh_beta <= 0 or entry.delta <= 0:
+            return False
+        jitter = -entry.delta * self.early_refresh_beta * math.log(1.0 - random.random())
+        return time.monotonic() + jitter >= entry.expires_at
+
+    async def _load_once(self, key: str, loader: Callable[[], Awaitable[Any]], ttl_seconds: float) -> Any:
+        """Run the loader and store its result, sharing one load between concurrent callers"""
+        future = self._pending.get(key)
+        if future is not None:
+            self.stats.coalesced += 1
+        else:
+            async def _run():
+                started = time.perf_counter()
+                self.stats.loads += 1
+                try:
+                    value = await loader()
+                except Exception:
+                    self.stats.load_errors += 1
+                    raise
+                delta = time.perf_counter() - started
+                self.stats.observe_load(delta)
+                if value is not None:
+                    await self._store(key, value, ttl_seconds, delta)
+                return value
+
+            future = asyncio.ensure_future(_run())
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl_seconds: float = 3600) -> Any:
+        """
+        Return the cached value for `key`, calling `loader` on a miss.
+
+        Concurrent misses for the same key share a single load. A hit close to
+        expiry may be picked to refresh the value inline; if that refresh fails
+        the cached value is returned instead. None results are not cached.
+        """
+        started = time.perf_counter()
         try:
-            return json.loads(data)
-        except (json.JSONDecodeError, TypeError):
-            return data
-    
+            entry = await self._lookup(key)
+            if entry is None:
+                return await self._load_once(key, loader, ttl_seconds)
+
+            if key not in self._pending and self._should_refresh_early(entry):
+                self.stats.early_refreshes += 1
+                try:
+                    value = await self._load_once(key, loader, ttl_seconds)
+                    if value is not None:
+                        return value
+                except Exception as e:
+                    logger.warning(f"Early refresh of {key} failed, serving cached value: {e}")
+            return entry.value
+        finally:
+            self.stats.observe_get(time.perf_counter() - started)
+
     async def set(self, key: str, value: Any, ttl_seconds: int = 3600) -> bool:
         """Set a value in cache with TTL"""
-        if not self.connected:
-            return False
-        
         try:
-            serialized_value = self._serialize_data(value)
-            return self.redis.setex(key, ttl_seconds, serialized_value)
+            return await self._store(key, value, ttl_seconds)
         except Exception as e:
             print(f"Cache set error: {e}")
             return False
-    
+
     async def get(self, key: str) -> Optional[Any]:
         """Get a value from cache"""
-        if not self.connected:
-            return None
-        
+        started = time.perf_counter()
         try:
-            value = self.redis.get(key)
-            if value is None:
-                return None
-            return self._deserialize_data(value)
+            entry = await self._lookup(key)
+            return entry.value if entry is not None else None
         except Exception as e:
             print(f"Cache get error: {e}")
             return None
-    
+        finally:
+            self.stats.observe_get(time.perf_counter() - started)
+
     async def delete(self, key: str) -> bool:
         """Delete a key from cache"""
-        if not self.connected:
+        self.local.delete(key)
+        redis = self._get_redis()
+        if redis is None:
             return False
-        
         try:
-            return bool(self.redis.delete(key))
+            return bool(await redis.delete(key))
         except Exception as e:
-            print(f"Cache delete error: {e}")
+            self._redis_failed(e)
             return False
-    
+
+    async def delete_pattern(self, pattern: str) -> int:
+        """Delete keys matching a glob-style pattern from both tiers"""
+        deleted = self.local.delete_matching(pattern)
+        redis = self._get_redis()
+        if redis is None:
+            return deleted
+        try:
+            batch = []
+            async for key in redis.scan_iter(match=pattern, count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    deleted += await redis.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += await redis.unlink(*batch)
+        except Exception as e:
+            self._redis_failed(e)
+        return deleted
+
     async def exists(self, key: str) -> bool:
         """Check if a key exists in cache"""
-        if not self.connected:
+        if self.local.get(key) is not None:
+            return True
+        redis = self._get_redis()
+        if redis is None:
             return False
-        
         try:
-            return bool(self.redis.exists(key))
+            return bool(await redis.exists(key))
         except Exception as e:
-            print(f"Cache exists error: {e}")
+            self._redis_failed(e)
             return False
-    
+
     async def increment(self, key: str, amount: int = 1, ttl_seconds: int = 3600) -> Optional[int]:
         """Increment a numeric value in cache"""
-        if not self.connected:
+        redis = self._get_redis()
+        if redis is None:
             return None
-        
         try:
-            pipe = self.redis.pipeline()
+            pipe = redis.pipeline()
             pipe.incr(key, amount)
             pipe.expire(key, ttl_seconds)
-            result = pipe.execute()
+            result = await pipe.execute()
             return result[0] if result else None
         except Exception as e:
-            print(f"Cache increment error: {e}")
+            self._redis_failed(e)
             return None
-    
+
     # User-specific caching methods
     async def cache_user_data(self, user_id: str, user_data: Dict[str, Any], ttl_seconds: int = 1800) -> bool:
         """Cache user profile data"""
         key = self._generate_key("user_data", user_id)
         return await self.set(key, user_data, ttl_seconds)
-    
+
     async def get_user_data(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get cached user profile data"""
         key = self._generate_key("user_data", user_id)
         return await self.get(key)
-    
+
     async def invalidate_user_data(self, user_id: str) -> bool:
         """Invalidate cached user data"""
         key = self._generate_key("user_data", user_id)
         return await self.delete(key)
-    
+
     async def cache_user_session(self, user_id: str, session_data: Dict[str, Any], ttl_seconds: int = 3600) -> bool:
         """Cache user session data"""
         key = self._generate_key("user_session", user_id)
         return await self.set(key, session_data, ttl_seconds)
-    
+
     async def get_user_session(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get cached user session data"""
         key = self._generate_key("user_session", user_id)
         return await self.get(key)
-    
+
     async def invalidate_user_session(self, user_id: str) -> bool:
         """Invalidate user session cache"""
         key = self._generate_key("user_session", user_id)
         return await self.delete(key)
-    
+
     # Token blacklisting
     async def blacklist_token(self, token_jti: str, ttl_seconds: int = 86400) -> bool:
         """Add token to blacklist"""
         key = self._generate_key("blacklisted_token", token_jti)
         return await self.set(key, "blacklisted", ttl_seconds)
-    
+
     async def is_token_blacklisted(self, token_jti: str) -> bool:
         """Check if token is blacklisted"""
         key = self._generate_key("blacklisted_token", token_jti)
         return await self.exists(key)
-    
+
     # Template and Component caching
     async def cache_template(self, template_id: str, template_data: Dict[str, Any], ttl_seconds: int = 3600) -> bool:
         """Cache template data"""
         key = self._generate_key("template", template_id)
         return await self.set(key, template_data, ttl_seconds)
-    
+
     async def get_template(self, template_id: str) -> Optional[Dict[str, Any]]:
         """Get cached template data"""
         key = self._generate_key("template", template_id)
         return await self.get(key)
-    
+
+    async def get_or_load_template(
+        self,
+        template_id: str,
+        loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+        ttl_seconds: int = 300,
+    ) -> Optional[Dict[str, Any]]:
+        """Get template data, loading it once on a miss"""
+        key = self._generate_key("template", template_id)
+        return await self.get_or_set(key, loader, ttl_seconds)
+
     async def invalidate_template(self, template_id: str) -> bool:
         """Invalidate template cache"""
         key = self._generate_key("template", template_id)
         return await self.delete(key)
-    
+
     async def cache_component(self, component_id: str, component_data: Dict[str, Any], ttl_seconds: int = 3600) -> bool:
         """Cache component data"""
         key = self._generate_key("component", component_id)
         return await self.set(key, component_data, ttl_seconds)
-    
+
     async def get_component(self, component_id: str) -> Optional[Dict[str, Any]]:
         """Get cached component data"""
         key = self._generate_key("component", component_id)
         return await self.get(key)
-    
+
     async def invalidate_component(self, component_id: str) -> bool:
         """Invalidate component cache"""
         key = self._generate_key("component", component_id)
         return await self.delete(key)
-    
+
     # Statistics caching
     async def cache_statistics(self, stat_type: str, data: Dict[str, Any], ttl_seconds: int = 300) -> bool:
         """Cache statistics data (short TTL due to frequent updates)"""
         key = self._generate_key("stats", stat_type)
         return await self.set(key, data, ttl_seconds)
-    
+
     async def get_statistics(self, stat_type: str) -> Optional[Dict[str, Any]]:
         """Get cached statistics"""
         key = self._generate_key("stats", stat_type)
         return await self.get(key)
-    
+
     # Cart caching
     async def cache_user_cart(self, user_id: str, cart_data: Dict[str, Any], ttl_seconds: int = 1800) -> bool:
         """Cache user shopping cart"""
         key = self._generate_key("user_cart", user_id)
         return await self.set(key, cart_data, ttl_seconds)
-    
+
     async def get_user_cart(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get cached user cart"""
         key = self._generate_key("user_cart", user_id)
         return await self.get(key)
-    
+
     async def invalidate_user_cart(self, user_id: str) -> bool:
         """Invalidate user cart cache"""
         key = self._generate_key("user_cart", user_id)
         return await self.delete(key)
-    
+
     # Template and Component list caching methods
     async def cache_templates(self, cache_key: str, data: Any, ttl: int = 3600) -> bool:
         """Cache template list data"""
-        if not self.connected:
-            return False
-        
-        try:
-            serialized_data = self._serialize_data(data)
-            return bool(self.redis.setex(cache_key, ttl, serialized_data))
-        except Exception as e:
-            print(f"Cache templates error: {e}")
-            return False
-    
+        return await self.set(cache_key, data, ttl)
+
     async def get_templates(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """Get templates from cache"""
-        if not self.connected:
-            return None
-        
-        try:
-            cached_data = self.redis.get(cache_key)
-            if cached_data:
-                return self._deserialize_data(cached_data)
-            return None
-        except Exception as e:
-            print(f"Get templates cache error: {e}")
-            return None
-    
+        return await self.get(cache_key)
+
     async def cache_components(self, cache_key: str, data: Any, ttl: int = 3600) -> bool:
         """Cache component list data"""
-        if not self.connected:
-            return False
-        
-        try:
-            serialized_data = self._serialize_data(data)
-            return bool(self.redis.setex(cache_key, ttl, serialized_data))
-        except Exception as e:
-            print(f"Cache components error: {e}")
-            return False
-    
+        return await self.set(cache_key, data, ttl)
+
     async def get_components(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """Get components from cache"""
-        if not self.connected:
-            return None
-        
-        try:
-            cached_data = self.redis.get(cache_key)
-            if cached_data:
-                return self._deserialize_data(cached_data)
-            return None
-        except Exception as e:
-            print(f"Get components cache error: {e}")
-            return None
-    
+        return await self.get(cache_key)
+
     # Bulk operations
     async def invalidate_user_all(self, user_id: str) -> bool:
         """Invalidate all cached data for a user"""
-        if not self.connected:
+        keys = [
+            f"user_data:{user_id}",
+            f"user_session:{user_id}",
+            f"user_cart:{user_id}",
+        ]
+        for key in keys:
+            self.local.delete(key)
+
+        redis = self._get_redis()
+        if redis is None:
             return False
-        
         try:
-            # Get all keys related to this user
-            patterns = [
-                f"user_data:{user_id}",
-                f"user_session:{user_id}",
-                f"user_cart:{user_id}",
-            ]
-            
-            deleted_count = 0
-            for pattern in patterns:
-                if self.redis.delete(pattern):
-                    deleted_count += 1
-            
-            return deleted_count > 0
+            return bool(await redis.delete(*keys))
         except Exception as e:
             print(f"Cache bulk invalidation error: {e}")
             return False
-    
+
     async def clear_all_cache(self) -> bool:
         """Clear all cache (use with caution)"""
-        if not self.connected:
+        self.local.clear()
+        redis = self._get_redis()
+        if redis is None:
             return False
-        
         try:
-            return self.redis.flushdb()
+            return bool(await redis.flushdb())
         except Exception as e:
             print(f"Cache clear all error: {e}")
             return False
-    
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and latency percentiles for this worker"""
+        stats = self.stats.snapshot()
+        stats["local_entries"] = len(self.local)
+        stats["serializer"] = self.serializer.name
+        return stats
+
     async def get_cache_info(self) -> Dict[str, Any]:
         """Get cache connection and usage info"""
-        if not self.connected:
-            return {"connected": False, "error": "Redis not available"}
-        
+        redis = self._get_redis()
+        if redis is None:
+            return {"connected": False, "error": "Redis not available", "stats": self.get_stats()}
+
         try:
-            info = self.redis.info()
+            info = await redis.info()
             return {
                 "connected": True,
                 "used_memory": info.get("used_memory_human", "Unknown"),
@@ -321,94 +617,111 @@ class CacheService:
                 "total_commands_processed": info.get("total_commands_processed", 0),
                 "keyspace_hits": info.get("keyspace_hits", 0),
                 "keyspace_misses": info.get("keyspace_misses", 0),
+                "stats": self.get_stats(),
             }
         except Exception as e:
-            return {"connected": False, "error": str(e)}
-    
+            self._redis_failed(e)
+            return {"connected": False, "error": str(e), "stats": self.get_stats()}
+
     # Additional cache management methods
-    
+
     async def clear_user_session(self, user_id: str) -> bool:
         """Clear user session cache"""
-        if not self.connected:
-            return False
-        
-        try:
-            key = self._generate_key("session", user_id)
-            self.redis.delete(key)
-            return True
-        except Exception as e:
-            print(f"Clear user session error: {e}")
-            return False
-    
+        await self.delete(self._generate_key("session", user_id))
+        return self.connected
+
     async def clear_user_data(self, user_id: str) -> bool:
         """Clear user data cache"""
-        if not self.connected:
-            return False
-        
-        try:
-            key = self._generate_key("user", user_id)
-            self.redis.delete(key)
-            return True
-        except Exception as e:
-            print(f"Clear user data error: {e}")
-            return False
-    
+        await self.delete(self._generate_key("user", user_id))
+        return self.connected
+
     async def clear_template_caches(self) -> bool:
         """Clear all template-related caches"""
-        if not self.connected:
-            return False
-        
-        try:
-            # Get all template cache keys
-            template_keys = self.redis.keys("templates:*")
-            template_stats_keys = self.redis.keys("template_stats:*")
-            
-            # Delete all template-related keys
-            if template_keys:
-                self.redis.delete(*template_keys)
-            if template_stats_keys:
-                self.redis.delete(*template_stats_keys)
-            
-            return True
-        except Exception as e:
-            print(f"Clear template caches error: {e}")
-            return False
-    
+        await self.delete_pattern("templates:*")
+        await self.delete_pattern("template_stats:*")
+        return self.connected
+
     async def clear_component_caches(self) -> bool:
         """Clear all component-related caches"""
-        if not self.connected:
-            return False
-        
-        try:
-            # Get all component cache keys
-            component_keys = self.redis.keys("components:*")
-            component_stats_keys = self.redis.keys("component_stats:*")
-            
-            # Delete all component-related keys
-            if component_keys:
-                self.redis.delete(*component_keys)
-            if component_stats_keys:
-                self.redis.delete(*component_stats_keys)
-            
-            return True
-        except Exception as e:
-            print(f"Clear component caches error: {e}")
-            return False
-    
+        await self.delete_pattern("components:*")
+        await self.delete_pattern("component_stats:*")
+        return self.connected
+
     async def close(self) -> None:
         """Close Redis connection"""
-        if self.redis and self.connected:
+        if self._redis is not None:
             try:
-                self.redis.close()
+                await self._redis.aclose()
+                if self._pool is not None:
+                    await self._pool.disconnect()
                 print("🔌 Redis connection closed")
             except Exception as e:
                 print(f"⚠️ Error closing Redis connection: {e}")
+            finally:
+                self._redis = None
+                self._pool = None
 
 
 # Global cache service instance
 cache_service = CacheService()
 
 
+def cached(
+    ttl_seconds: float = 300,
+    key: Optional[Union[str, Callable[..., str]]] = None,
+    model: Optional[Type[BaseModel]] = None,
+    cache: Optional[CacheService] = None,
+):
+    """
+    Cache the result of an async function or method.
+
+    `key` is either a format string over the function's arguments, e.g.
+    "plan:name:{plan_name}", or a callable taking the same arguments. Without
+    it the key is built from the function name and every argument except
+    self/cls. When `model` is set the result is cached as plain data and a new
+    model instance is built on every call, so callers may modify it. None
+    results are not cached.
+
+    The wrapped function gains `invalidate(*args, **kwargs)` and
+    `cache_key(*args, **kwargs)` helpers.
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        signature = inspect.signature(func)
+        default_prefix = f"{func.__module__}.{func.__qualname__}"
+
+        def build_key(*args, **kwargs) -> str:
+            if callable(key):
+                return key(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {name: value for name, value in bound.arguments.items() if name not in ("self", "cls")}
+            if key is not None:
+                return key.format(**arguments)
+            return ":".join([default_prefix] + [f"{name}={value}" for name, value in arguments.items()])
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async def load():
+                result = await func(*args, **kwargs)
+                if model is not None and result is not None:
+                    return result.model_dump(mode="json")
+                return result
+
+            value = await (cache or cache_service).get_or_set(build_key(*args, **kwargs), load, ttl_seconds)
+            if model is not None and value is not None:
+                return model.model_validate(value)
+            return value
+
+        async def invalidate(*args, **kwargs) -> bool:
+            return await (cache or cache_service).delete(build_key(*args, **kwargs))
+
+        wrapper.invalidate = invalidate
+        wrapper.cache_key = build_key
+        return wrapper
+
+    return decorator
+
+
 # Dependency function for FastAPI
 async def get_cache_service() -> CacheService:
     """FastAPI dependency to get cache service"""
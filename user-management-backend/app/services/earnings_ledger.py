@@ -0,0 +1,283 @@
+"""
+Event-sourced developer earnings.
+
+Every sale and payout step is appended to the earnings ledger exactly once
+(unique on entry type + source ID). Newly appended entries are then applied
+with atomic $inc updates to the developer's DeveloperEarnings summary and, for
+sales, to a DeveloperEarningsMonthly rollup per month, so concurrent sales
+never overwrite each other and no document grows with history.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.models.developer_earnings import (
+    DeveloperEarnings,
+    DeveloperEarningsMonthly,
+    EarningsLedgerEntry,
+    LedgerEntryType,
+)
+from app.models.item_purchase import ItemPurchase, ItemType
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+# How each payout step moves money between the summary's balances
+_PAYOUT_MOVES = {
+    LedgerEntryType.PAYOUT_REQUESTED: ("available_balance_inr", "pending_balance_inr"),
+    LedgerEntryType.PAYOUT_CANCELLED: ("pending_balance_inr", "available_balance_inr"),
+    LedgerEntryType.PAYOUT_COMPLETED: ("pending_balance_inr", "withdrawn_total_inr"),
+}
+
+
+def _month(moment: Optional[datetime]) -> str:
+    return (moment or datetime.now(timezone.utc)).strftime("%Y-%m")
+
+
+async def _bulk_upsert(collection, operations: List[UpdateOne], session=None):
+    """
+    Unordered bulk upsert. Concurrent first upserts of the same summary race on
+    its _id; the loser's operations are retried once and then match the winner.
+    """
+    if not operations:
+        return None
+    try:
+        return await collection.bulk_write(operations, ordered=False, session=session)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if session is not None or any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+        retry = [operations[error["index"]] for error in errors]
+        return await collection.bulk_write(retry, ordered=False)
+
+
+def _summary_upsert(developer_id: PydanticObjectId, developer_username: str, inc: Dict[str, int],
+                    now: datetime, extra_set: Optional[Dict[str, Any]] = None) -> UpdateOne:
+    return UpdateOne(
+        {"developer_id": developer_id},
+        {
+            "$inc": inc,
+            "$set": {"updated_at": now, **(extra_set or {})},
+            # New summaries use the developer ID as _id so racing upserts collide
+            "$setOnInsert": {"_id": developer_id, "developer_username": developer_username, "created_at": now},
+        },
+        upsert=True,
+    )
+
+
+async def record_sales(purchases: List[ItemPurchase], session=None) -> int:
+    """
+    Append a sale entry per completed purchase and apply the new ones to the
+    summaries and monthly rollups. Purchases already in the ledger are skipped.
+    Returns the number of sales applied.
+    """
+    if not purchases:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    entries = []
+    for purchase in purchases:
+        entries.append({
+            "developer_id": purchase.developer_id,
+            "entry_type": LedgerEntryType.SALE.value,
+            "source_id": purchase.purchase_id,
+            "amount_inr": purchase.developer_earnings_inr,
+            "gross_amount_inr": purchase.paid_amount_inr,
+            "item_id": purchase.item_id,
+            "item_type": ItemType(purchase.item_type).value,
+            "item_title": purchase.item_title,
+            "month": _month(purchase.payment_completed_at),
+            "created_at": purchase.payment_completed_at or now,
+        })
+
+    result = await EarningsLedgerEntry.get_pymongo_collection().bulk_write(
+        [
+            UpdateOne(
+                {"entry_type": entry["entry_type"], "source_id": entry["source_id"]},
+                {"$setOnInsert": entry},
+                upsert=True,
+            )
+            for entry in entries
+        ],
+        ordered=False,
+        session=session,
+    )
+    new_entries = [entries[index] for index in result.upserted_ids]
+    if not new_entries:
+        return 0
+
+    usernames = {purchase.developer_id: purchase.developer_username for purchase in purchases}
+    totals: Dict[PydanticObjectId, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    months: Dict[Tuple[PydanticObjectId, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for entry in new_entries:
+        kind = "template_sales_count" if entry["item_type"] == ItemType.TEMPLATE.value else "component_sales_count"
+        for counters in (totals[entry["developer_id"]], months[(entry["developer_id"], entry["month"])]):
+            counters["sales_count"] += 1
+            counters[kind] += 1
+            counters["earnings_inr"] += entry["amount_inr"]
+            counters["gross_sales_inr"] += entry["gross_amount_inr"]
+
+    await _bulk_upsert(
+        DeveloperEarnings.get_pymongo_collection(),
+        [
+            _summary_upsert(developer_id, usernames[developer_id], {
+                "total_earnings_inr": counters["earnings_inr"],
+                "available_balance_inr": counters["earnings_inr"],
+                "total_sales_count": counters["sales_count"],
+                "template_sales_count": counters["template_sales_count"],
+                "component_sales_count": counters["component_sales_count"],
+            }, now)
+            for developer_id, counters in totals.items()
+        ],
+        session=session,
+    )
+    await _bulk_upsert(
+        DeveloperEarningsMonthly.get_pymongo_collection(),
+        [
+            UpdateOne(
+                {"developer_id": developer_id, "month": month},
+                {"$inc": dict(counters), "$set": {"updated_at": now}},
+                upsert=True,
+            )
+            for (developer_id, month), counters in months.items()
+        ],
+        session=session,
+    )
+    return len(new_entries)
+
+
+async def record_payout(
+    developer_id: PydanticObjectId,
+    request_id: str,
+    amount_inr: int,
+    entry_type: LedgerEntryType,
+    session=None,
+) -> bool:
+    """
+    Append a payout step and move `amount_inr` between balances with a guarded
+    $inc. Returns False (and records nothing) when the source balance is too
+    low or this step was already recorded for the request.
+    """
+    source, target = _PAYOUT_MOVES[entry_type]
+    now = datetime.now(timezone.utc)
+    ledger = EarningsLedgerEntry.get_pymongo_collection()
+
+    result = await ledger.update_one(
+        {"entry_type": entry_type.value, "source_id": request_id},
+        {"$setOnInsert": {
+            "developer_id": developer_id,
+            "amount_inr": amount_inr,
+            "gross_amount_inr": 0,
+            "month": _month(now),
+            "created_at": now,
+        }},
+        upsert=True,
+        session=session,
+    )
+    if result.upserted_id is None:
+        return False
+
+    update: Dict[str, Any] = {
+        "$inc": {source: -amount_inr, target: amount_inr},
+        "$set": {"updated_at": now},
+    }
+    if entry_type == LedgerEntryType.PAYOUT_COMPLETED:
+        update["$set"]["last_payout_date"] = now
+
+    moved = await DeveloperEarnings.get_pymongo_collection().update_one(
+        {"developer_id": developer_id, source: {"$gte": amount_inr}},
+        update,
+        session=session,
+    )
+    if moved.modified_count == 0:
+        await ledger.delete_one({"_id": result.upserted_id}, session=session)
+        return False
+    return True
+
+
+async def get_or_create_summary(developer_id: PydanticObjectId, developer_username: Optional[str]) -> DeveloperEarnings:
+    """The developer's earnings summary, created empty on first access"""
+    now = datetime.now(timezone.utc)
+    await _bulk_upsert(
+        DeveloperEarnings.get_pymongo_collection(),
+        [UpdateOne(
+            {"developer_id": developer_id},
+            {"$setOnInsert": {"_id": developer_id, "developer_username": developer_username or "",
+                              "created_at": now, "updated_at": now}},
+            upsert=True,
+        )],
+    )
+    return await DeveloperEarnings.find_one({"developer_id": developer_id})
+
+
+async def _migrate_legacy_months(summary: DeveloperEarnings) -> None:
+    """Move the old in-document monthly dicts into rollups (once; the winner of the $unset does it)"""
+    if not (summary.monthly_earnings or summary.monthly_sales):
+        return
+    previous = await DeveloperEarnings.get_pymongo_collection().find_one_and_update(
+        {"_id": summary.id, "$or": [{"monthly_earnings": {"$ne": {}}}, {"monthly_sales": {"$ne": {}}}]},
+        {"$set": {"monthly_earnings": {}, "monthly_sales": {}}},
+        projection={"monthly_earnings": 1, "monthly_sales": 1},
+    )
+    if previous is None:
+        return
+    earnings, sales = previous.get("monthly_earnings") or {}, previous.get("monthly_sales") or {}
+    await DeveloperEarningsMonthly.get_pymongo_collection().bulk_write(
+        [
+            UpdateOne(
+                {"developer_id": summary.developer_id, "month": month},
+                {"$inc": {"earnings_inr": earnings.get(month, 0), "sales_count": sales.get(month, 0)},
+                 "$set": {"updated_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+            for month in set(earnings) | set(sales)
+        ],
+        ordered=False,
+    )
+    summary.monthly_earnings, summary.monthly_sales = {}, {}
+
+
+async def get_monthly_rollups(developer_id: PydanticObjectId, months: int = 12) -> List[DeveloperEarningsMonthly]:
+    """The most recent `months` monthly rollups, newest first"""
+    return await DeveloperEarningsMonthly.find(
+        {"developer_id": developer_id}
+    ).sort([("month", DESCENDING)]).limit(months).to_list()
+
+
+async def get_recent_sales(developer_id: PydanticObjectId, limit: int = 10) -> List[EarningsLedgerEntry]:
+    return await EarningsLedgerEntry.find(
+        {"developer_id": developer_id, "entry_type": LedgerEntryType.SALE.value}
+    ).sort([("created_at", DESCENDING)]).limit(limit).to_list()
+
+
+async def get_earnings_dashboard(
+    developer_id: PydanticObjectId,
+    developer_username: Optional[str],
+    months: int = 12,
+) -> Tuple[DeveloperEarnings, Dict[str, Any]]:
+    """Summary and analytics for the earnings dashboard, served from the summary, rollups and ledger"""
+    summary = await get_or_create_summary(developer_id, developer_username)
+    await _migrate_legacy_months(summary)
+    monthly = await get_monthly_rollups(developer_id, months)
+    recent_sales = await get_recent_sales(developer_id)
+
+    analytics = summary.get_analytics_summary(monthly)
+    analytics["recent_sales"] = [
+        {
+            "item_title": sale.item_title,
+            "item_type": sale.item_type,
+            "amount_inr": sale.gross_amount_inr,
+            "developer_earnings_inr": sale.amount_inr,
+            "payment_date": sale.created_at.isoformat(),
+            "buyer_username": "Anonymous"  # Keep buyer privacy
+        }
+        for sale in recent_sales
+    ]
+    return summary, analytics
@@ -0,0 +1,160 @@
+"""
+Micro-batching of embeddings requests.
+
+Indexing a repository means thousands of small embeddings requests, often
+many at once. Inputs from concurrent requests for the same (provider, model)
+are queued for up to embedding_batch_window_ms and sent upstream together,
+in calls of at most embedding_batch_max_inputs inputs and
+embedding_batch_max_tokens tokens; a full queue is sent right away. Each
+request gets its own embeddings back in order, and a share of the batch's
+reported tokens proportional to its inputs' estimated tokens, which it is
+billed for.
+
+The batcher keeps its own long-lived provider clients (one per provider), so
+upstream connections are reused across requests and a batch doesn't depend
+on the lifetime of whichever request happened to open it. Batching is per
+worker process.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from app.config import settings
+from app.services.provider_health import provider_health
+from app.utils.metrics import embedding_batch_inputs, llm_request_duration, llm_request_errors
+
+
+class _Submission:
+    """One request's inputs, filled in as the batches carrying them return"""
+
+    __slots__ = ("future", "embeddings", "tokens", "remaining")
+
+    def __init__(self, future: asyncio.Future, size: int):
+        self.future = future
+        self.embeddings: List[Optional[List[float]]] = [None] * size
+        self.tokens = 0.0
+        self.remaining = size
+
+
+# (submission, index in the submission, text, estimated tokens)
+_Item = Tuple[_Submission, int, str, int]
+
+
+class EmbeddingBatcher:
+    """Per-(provider, model) queues flushed on a short timer or when full"""
+
+    def __init__(self):
+        self._queues: Dict[Tuple[str, str], List[_Item]] = {}
+        self._queued_tokens: Dict[Tuple[str, str], int] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._clients: Dict[str, Any] = {}
+        self._batches: set = set()
+
+    def _client(self, provider_name: str, client_class: Type) -> Any:
+        client = self._clients.get(provider_name)
+        if client is None:
+            client = self._clients[provider_name] = client_class()
+        return client
+
+    async def embed(self, provider_name: str, client_class: Type, model: str,
+                    inputs: List[str], token_counts: List[int]) -> Dict[str, Any]:
+        """
+        Embeddings for `inputs`, batched with other requests for the model.
+
+        Returns {"data": [embedding, ...], "prompt_tokens": n} in input order,
+        or the provider's error response.
+        """
+        loop = asyncio.get_running_loop()
+        submission = _Submission(loop.create_future(), len(inputs))
+        self._client(provider_name, client_class)
+
+        key = (provider_name, model)
+        queue = self._queues.setdefault(key, [])
+        queue.extend((submission, index, text, tokens)
+                     for index, (text, tokens) in enumerate(zip(inputs, token_counts)))
+        self._queued_tokens[key] = self._queued_tokens.get(key, 0) + sum(token_counts)
+
+        if len(queue) >= settings.embedding_batch_max_inputs or \
+                self._queued_tokens[key] >= settings.embedding_batch_max_tokens:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(settings.embedding_batch_window_ms / 1000, self._flush, key)
+        return await submission.future
+
+    def _flush(self, key: Tuple[str, str]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._queues.pop(key, [])
+        self._queued_tokens.pop(key, None)
+
+        batch: List[_Item] = []
+        batch_tokens = 0
+        for item in items:
+            if batch and (len(batch) >= settings.embedding_batch_max_inputs
+                          or batch_tokens + item[3] > settings.embedding_batch_max_tokens):
+                self._send_soon(key, batch)
+                batch, batch_tokens = [], 0
+            batch.append(item)
+            batch_tokens += item[3]
+        if batch:
+            self._send_soon(key, batch)
+
+    def _send_soon(self, key: Tuple[str, str], batch: List[_Item]) -> None:
+        task = asyncio.ensure_future(self._send(key, batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _send(self, key: Tuple[str, str], batch: List[_Item]) -> None:
+        provider_name, model = key
+        client = self._clients[provider_name]
+        embedding_batch_inputs.observe(len(batch))
+
+        started = time.perf_counter()
+        try:
+            response = await client.embeddings([text for _, _, text, _ in batch], model)
+        except Exception as e:
+            response = {"error": f"Embeddings failed: {str(e)}", "retryable": True}
+        latency = time.perf_counter() - started
+        llm_request_duration(provider_name, model).observe(latency)
+        provider_health.record(provider_name, model, latency, not response.get("retryable"))
+
+        data = sorted(response.get("data") or [], key=lambda entry: entry.get("index", 0))
+        if "error" not in response and len(data) != len(batch):
+            response = {"error": f"Provider returned {len(data)} embeddings for {len(batch)} inputs"}
+        if "error" in response:
+            llm_request_errors(provider_name, model).inc()
+            for submission, _, _, _ in batch:
+                if not submission.future.done():
+                    submission.future.set_result(dict(response))
+            return
+
+        # Split the batch's reported tokens by each input's share of the estimate
+        estimated = sum(tokens for _, _, _, tokens in batch)
+        usage = response.get("usage") or {}
+        actual = usage.get("prompt_tokens") or usage.get("total_tokens") or estimated
+        for (submission, index, _, tokens), entry in zip(batch, data):
+            if submission.future.done():
+                continue
+            submission.embeddings[index] = entry["embedding"]
+            submission.tokens += actual * tokens / estimated if estimated else actual / len(batch)
+            submission.remaining -= 1
+            if submission.remaining == 0:
+                submission.future.set_result({
+                    "data": submission.embeddings,
+                    "prompt_tokens": max(1, round(submission.tokens)),
+                })
+
+    async def close(self) -> None:
+        for key in list(self._timers):
+            self._flush(key)
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
+
+
+# Global embeddings batcher
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,190 @@
+"""
+Content-addressed cache of embeddings.
+
+Editors re-embed the same unchanged files every time a workspace is opened.
+Each input is keyed by (scope, model, SHA-256 of the normalized text), so
+identical content hits the cache no matter which file or request it came
+from. The scope is the user unless embedding_cache_scope is "global": a
+shared cache would let one tenant find out, from the reported cache hits,
+whether another tenant embedded an exact text. Normalization only removes
+differences that don't change the content: Unicode NFC, CRLF line endings
+and trailing whitespace.
+
+Vectors are stored as packed little-endian floats (float16 by default, or
+float32 per embedding_cache_dtype) behind a one-byte dtype tag, not as JSON
+lists: a 1536-dimension vector takes 3 KB in float16 instead of ~33 KB as
+JSON. float16 keeps about three significant digits, which changes cosine
+similarities by well under 0.001.
+
+Lookups go to an in-process LRU bounded by embedding_cache_local_max_bytes,
+then to Redis (shared by every worker, entries expire after
+embedding_cache_ttl_seconds; Redis's own maxmemory policy bounds it there).
+Redis failures degrade to the local cache.
+"""
+
+import hashlib
+import logging
+import struct
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import redis.asyncio as aioredis
+
+from app.config import settings
+from app.utils.metrics import Timer, embedding_cache_local_bytes, embedding_cache_lookups, redis_command_duration
+
+logger = logging.getLogger(__name__)
+
+# One-byte tag in front of each packed vector -> struct format character
+DTYPES = {"float16": (b"h", "e"), "float32": (b"f", "f")}
+FORMATS = {tag: (fmt, struct.calcsize(fmt)) for tag, fmt in DTYPES.values()}
+
+
+def normalize(text: str) -> str:
+    """Canonical form of an input: NFC, LF line endings, no trailing whitespace"""
+    return unicodedata.normalize("NFC", text).replace("\r\n", "\n").rstrip()
+
+
+def cache_scope(user_id: Any) -> str:
+    """The user's id, or "global" when entries are shared across users"""
+    return "global" if settings.embedding_cache_scope == "global" else str(user_id)
+
+
+def embedding_key(scope: str, model: str, text: str) -> str:
+    digest = hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+    return f"emb:v2:{scope}:{model}:{digest}"
+
+
+def pack(vector: Sequence[float], dtype: str = "float16") -> bytes:
+    tag, fmt = DTYPES[dtype]
+    return tag + struct.pack(f"<{len(vector)}{fmt}", *vector)
+
+
+def unpack(blob: bytes) -> List[float]:
+    fmt, size = FORMATS[blob[:1]]
+    return list(struct.unpack(f"<{(len(blob) - 1) // size}{fmt}", blob[1:]))
+
+
+class ByteBudgetLRU:
+    """In-process LRU of packed vectors, evicting by total bytes rather than entries"""
+
+    # Rough per-entry overhead of the key, bytes object and dict slot
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+
+    @classmethod
+    def _size(cls, blob: bytes) -> int:
+        return len(blob) + cls.ENTRY_OVERHEAD
+
+    def get(self, key: str) -> Optional[bytes]:
+        blob = self._data.get(key)
+        if blob is not None:
+            self._data.move_to_end(key)
+        return blob
+
+    def set(self, key: str, blob: bytes) -> None:
+        if self._size(blob) > self.max_bytes:
+            return
+        previous = self._data.pop(key, None)
+        if previous is not None:
+            self.bytes -= self._size(previous)
+        self._data[key] = blob
+        self.bytes += self._size(blob)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.bytes -= self._size(evicted)
+        embedding_cache_local_bytes.set(self.bytes)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.bytes = 0
+        embedding_cache_local_bytes.set(0)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EmbeddingCache:
+    """Packed embeddings in a byte-bounded local LRU with Redis behind it"""
+
+    # Skip Redis for this long after a connection failure
+    REDIS_RETRY_SECONDS = 30.0
+
+    def __init__(self):
+        self.local = ByteBudgetLRU(settings.embedding_cache_local_max_bytes)
+        self._redis: Optional[aioredis.Redis] = None
+        self._redis_retry_at = 0.0
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        if settings.embedding_cache_backend != "redis" or time.monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(
+                settings.redis_url,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5,
+            )
+        return self._redis
+
+    def _redis_failed(self, error: Exception) -> None:
+        logger.warning(f"Embedding cache Redis error, using local cache only: {error}")
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+
+    async def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Cached embeddings for `keys` (from embedding_key), None for each miss"""
+        blobs: List[Optional[bytes]] = [self.local.get(key) for key in keys]
+
+        missing = [index for index, blob in enumerate(blobs) if blob is None]
+        redis = self._get_redis() if missing else None
+        if redis is not None:
+            try:
+                with Timer(redis_command_duration("embedding_cache_mget")):
+                    found = await redis.mget([keys[index] for index in missing])
+                for index, blob in zip(missing, found):
+                    if blob:
+                        blobs[index] = blob
+                        self.local.set(keys[index], blob)
+            except Exception as e:
+                self._redis_failed(e)
+
+        vectors = [unpack(blob) if blob else None for blob in blobs]
+        hits = sum(1 for vector in vectors if vector is not None)
+        if hits:
+            embedding_cache_lookups("hit").inc(hits)
+        if hits < len(vectors):
+            embedding_cache_lookups("miss").inc(len(vectors) - hits)
+        return vectors
+
+    async def set_many(self, entries: Dict[str, List[float]]) -> None:
+        """Store embeddings by cache key"""
+        if not entries:
+            return
+        blobs = {key: pack(vector, settings.embedding_cache_dtype) for key, vector in entries.items()}
+        for key, blob in blobs.items():
+            self.local.set(key, blob)
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                with Timer(redis_command_duration("embedding_cache_set")):
+                    async with redis.pipeline(transaction=False) as pipe:
+                        for key, blob in blobs.items():
+                            pipe.set(key, blob, ex=settings.embedding_cache_ttl_seconds)
+                        await pipe.execute()
+            except Exception as e:
+                self._redis_failed(e)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+# Global embeddings cache
+embedding_cache = EmbeddingCache()
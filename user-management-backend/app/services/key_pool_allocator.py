@@ -0,0 +1,136 @@
+"""
+Atomic allocation of shared API keys from the ApiKeyPool.
+
+Each allocation is a single find_one_and_update that only matches a key whose
+assigned_user_ids is still below max_users, so concurrent activations can never
+over-assign a key. Keys are picked least-loaded first using the denormalized
+assigned_count, which every pool write keeps in step with the array.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from beanie import PydanticObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from app.models.api_key_pool import ApiKeyPool
+
+logger = logging.getLogger(__name__)
+
+# Keeps a key's assigned_count equal to the size of its assigned_user_ids
+_SYNC_ASSIGNED_COUNT = {"$set": {"assigned_count": {"$size": {"$ifNull": ["$assigned_user_ids", []]}}}}
+
+
+async def allocate_pool_key(
+    user_id: PydanticObjectId,
+    key_type: str,
+    exclude_key_value: Optional[str] = None,
+) -> Optional[ApiKeyPool]:
+    """
+    Assign the user to the least-loaded active key of `key_type` with spare capacity.
+
+    A key the user already holds is returned as-is. `exclude_key_value` skips
+    one key (e.g. the one being rotated away from) unless no other key has room.
+    Returns None when every key is full.
+    """
+    existing = await ApiKeyPool.find_one({
+        "key_type": key_type,
+        "is_active": True,
+        "assigned_user_ids": user_id
+    })
+    if existing and existing.key_value != exclude_key_value:
+        return existing
+
+    collection = ApiKeyPool.get_pymongo_collection()
+    base_filter = {
+        "key_type": key_type,
+        "is_active": True,
+        "assigned_user_ids": {"$ne": user_id},
+        "$expr": {"$lt": [{"$size": {"$ifNull": ["$assigned_user_ids", []]}}, "$max_users"]},
+    }
+    filters = [base_filter]
+    if exclude_key_value is not None:
+        filters.insert(0, {**base_filter, "key_value": {"$ne": exclude_key_value}})
+
+    for query in filters:
+        document = await collection.find_one_and_update(
+            query,
+            {
+                "$addToSet": {"assigned_user_ids": user_id},
+                "$inc": {"assigned_count": 1},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+            },
+            sort=[("assigned_count", ASCENDING), ("_id", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if document is not None:
+            return ApiKeyPool.model_validate(document)
+
+    logger.warning(f"No {key_type} key with capacity available for user {user_id}")
+    return None
+
+
+async def assign_pool_key(key_id: PydanticObjectId, user_id: PydanticObjectId) -> Optional[ApiKeyPool]:
+    """
+    Assign the user to one specific key. Returns None when the key is inactive,
+    full or already holds the user.
+    """
+    document = await ApiKeyPool.get_pymongo_collection().find_one_and_update(
+        {
+            "_id": key_id,
+            "is_active": True,
+            "assigned_user_ids": {"$ne": user_id},
+            "$expr": {"$lt": [{"$size": {"$ifNull": ["$assigned_user_ids", []]}}, "$max_users"]},
+        },
+        {
+            "$addToSet": {"assigned_user_ids": user_id},
+            "$inc": {"assigned_count": 1},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    return ApiKeyPool.model_validate(document) if document else None
+
+
+async def release_pool_keys(user_ids: List[PydanticObjectId], key_value: Optional[str] = None) -> int:
+    """
+    Remove users from every key that holds them (or only from `key_value`).
+    Returns the number of keys modified.
+    """
+    if not user_ids:
+        return 0
+    query = {"assigned_user_ids": {"$in": user_ids}}
+    if key_value is not None:
+        query["key_value"] = key_value
+
+    result = await ApiKeyPool.get_pymongo_collection().update_many(
+        query,
+        [
+            {"$set": {
+                "assigned_user_ids": {"$filter": {
+                    "input": "$assigned_user_ids",
+                    "cond": {"$not": [{"$in": ["$$this", user_ids]}]},
+                }},
+                "updated_at": datetime.now(timezone.utc),
+            }},
+            _SYNC_ASSIGNED_COUNT,
+        ],
+    )
+    return result.modified_count
+
+
+async def update_pool_key(key_id: PydanticObjectId, changes: Dict[str, Any]) -> Optional[ApiKeyPool]:
+    """Change a key's settings (label, max_users, is_active) without touching its assignments"""
+    document = await ApiKeyPool.get_pymongo_collection().find_one_and_update(
+        {"_id": key_id},
+        {"$set": {**changes, "updated_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    return ApiKeyPool.model_validate(document) if document else None
+
+
+async def sync_assigned_counts() -> int:
+    """Recompute assigned_count for every key, e.g. for keys created before it existed"""
+    result = await ApiKeyPool.get_pymongo_collection().update_many({}, [_SYNC_ASSIGNED_COUNT])
+    return result.modified_count
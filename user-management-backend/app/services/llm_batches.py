@@ -0,0 +1,528 @@
+"""
+Asynchronous batch chat completions.
+
+Editor features like bulk docstring generation send hundreds of completions;
+holding a connection open for each ties up the client and the API. Instead a
+batch is submitted once (JSON or NDJSON), its requests are stored as
+llm_batch_items, and it is queued.
+
+A pool of background workers leases one batch at a time and sends its pending
+items, llm_batch_item_concurrency at a time, through the same provider
+routing as interactive requests: scheduler slots at the batch owner's tier,
+failover and circuit breakers. Each result is written to its item as soon as
+it completes and numbered in completion order, so results can be paged or
+streamed as NDJSON while the batch runs. Retryable failures are retried with
+backoff. The worker renews its lease while it works; if it dies, another
+worker picks the batch up once the lease expires and carries on with the
+items still pending.
+
+Tokens are reserved once for the whole batch at submission (prompt tokens
+plus max_tokens, or llm_batch_default_max_tokens, per request) and settled
+with the tokens actually used when it finishes. Once usage reaches the
+reservation, the remaining items fail rather than overdraw it.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+from beanie import PydanticObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from app.config import settings
+from app.models.llm_batch import LLMBatch, LLMBatchItem, LLMBatchItemStatus, LLMBatchStatus
+from app.models.user import User
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.tokenizer import tokenizers
+from app.services.token_service import TokenService
+from app.utils.metrics import llm_batch_items
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+INSERT_CHUNK = 1000
+FINISHED = (LLMBatchStatus.COMPLETED, LLMBatchStatus.CANCELLED)
+
+# Chat completion parameters a batch request may set, as on /llm/chat/completions
+BATCH_PARAMS = (
+    "temperature", "max_tokens", "top_p", "frequency_penalty", "presence_penalty",
+    "seed", "stop", "tools", "tool_choice", "response_format",
+)
+
+
+class InvalidBatch(Exception):
+    """The submitted batch can't be parsed or has an invalid request"""
+
+
+# ---------------------------------------------------------------------------
+# Submission
+# ---------------------------------------------------------------------------
+
+def parse_batch(body: bytes, content_type: str = "") -> List[Dict[str, Any]]:
+    """
+    Requests from a submitted batch: a JSON object {"requests": [...]}, or
+    NDJSON with one request per line. A request is a chat completion body
+    ({"model", "messages", ...}) with an optional "custom_id", or an OpenAI
+    batch line ({"custom_id", "body": {...}}).
+    """
+    try:
+        if content_type.split(";")[0].strip() == "application/json":
+            document = orjson.loads(body)
+            lines = document.get("requests") if isinstance(document, dict) else None
+            if not isinstance(lines, list):
+                raise InvalidBatch('Expected {"requests": [...]}')
+        else:
+            lines = [orjson.loads(line) for line in body.splitlines() if line.strip()]
+    except orjson.JSONDecodeError as e:
+        raise InvalidBatch(f"Invalid JSON: {e}")
+
+    if not lines:
+        raise InvalidBatch("The batch has no requests")
+    if len(lines) > settings.llm_batch_max_requests:
+        raise InvalidBatch(f"At most {settings.llm_batch_max_requests} requests per batch")
+
+    requests = []
+    for index, line in enumerate(lines):
+        request = line.get("body", line) if isinstance(line, dict) else None
+        if not isinstance(request, dict):
+            raise InvalidBatch(f"Request {index}: expected an object")
+        model, messages = request.get("model"), request.get("messages")
+        if not isinstance(model, str) or not model:
+            raise InvalidBatch(f"Request {index}: model is required")
+        if not isinstance(messages, list) or not messages or \
+                not all(isinstance(message, dict) and "role" in message for message in messages):
+            raise InvalidBatch(f"Request {index}: messages must be a non-empty list of messages")
+        if request.get("stream"):
+            raise InvalidBatch(f"Request {index}: streaming isn't supported in batches")
+        custom_id = line.get("custom_id")
+        requests.append({
+            "custom_id": str(custom_id) if custom_id is not None else None,
+            "model": model,
+            "messages": messages,
+            "params": {name: request[name] for name in BATCH_PARAMS if request.get(name) is not None},
+        })
+    return requests
+
+
+async def estimate_tokens(requests: List[Dict[str, Any]]) -> int:
+    """Most tokens the batch can use: each prompt plus its completion limit"""
+    total = 0
+    for request in requests:
+        total += await tokenizers.count_messages(request["model"], request["messages"])
+        total += request["params"].get("max_tokens") or settings.llm_batch_default_max_tokens
+    return total
+
+
+async def enqueue_batch(user_id: str, tier: str, requests: List[Dict[str, Any]], reserved_tokens: int = 0,
+                        reservation_id: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> LLMBatch:
+    """Store a batch and its items and wake the workers"""
+    batch = LLMBatch(
+        id=PydanticObjectId(),
+        user_id=user_id,
+        tier=tier,
+        request_count=len(requests),
+        reserved_tokens=reserved_tokens,
+        reservation_id=reservation_id,
+        metadata=metadata or {},
+    )
+    # Items go in first, so a worker never sees a batch that is still being stored
+    items = [LLMBatchItem(batch_id=str(batch.id), index=index, **request) for index, request in enumerate(requests)]
+    try:
+        for start in range(0, len(items), INSERT_CHUNK):
+            await LLMBatchItem.insert_many(items[start:start + INSERT_CHUNK])
+        await batch.insert()
+    except Exception:
+        await LLMBatchItem.get_pymongo_collection().delete_many({"batch_id": str(batch.id)})
+        raise
+    llm_batch_worker_pool.notify()
+    return batch
+
+
+async def create_batch(user: User, requests: List[Dict[str, Any]], tier: str, token_service: TokenService,
+                       metadata: Optional[Dict[str, Any]] = None) -> LLMBatch:
+    """Reserve tokens for the whole batch and queue it; raises ValueError without enough tokens"""
+    estimated = await estimate_tokens(requests)
+    reservation_id = await token_service.reserve_tokens_advanced(user, estimated, "batch", {
+        "model": requests[0]["model"],
+        "request_count": len(requests)
+    }, ttl_seconds=settings.llm_batch_reservation_ttl_seconds)
+    try:
+        return await enqueue_batch(str(user.id), tier, requests, estimated, reservation_id, metadata)
+    except Exception:
+        await token_service.release_reserved_tokens(reservation_id)
+        raise
+
+
+# ---------------------------------------------------------------------------
+# Reading and cancelling
+# ---------------------------------------------------------------------------
+
+def batch_summary(batch: LLMBatch) -> Dict[str, Any]:
+    return {
+        "id": str(batch.id),
+        "object": "batch",
+        "status": batch.status,
+        "request_counts": {
+            "total": batch.request_count,
+            "succeeded": batch.succeeded_count,
+            "failed": batch.failed_count,
+            "cancelled": batch.cancelled_count,
+        },
+        "reserved_tokens": batch.reserved_tokens,
+        "used_tokens": batch.used_tokens,
+        "cost_usd": round(batch.cost_usd, 6),
+        "metadata": batch.metadata,
+        "created_at": batch.created_at,
+        "started_at": batch.started_at,
+        "completed_at": batch.completed_at,
+    }
+
+
+def item_result(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "sequence": item.get("sequence"),
+        "index": item["index"],
+        "custom_id": item.get("custom_id"),
+        "status": item["status"],
+        "response": item.get("response"),
+        "error": item.get("error"),
+        "tokens_used": item.get("tokens_used", 0),
+    }
+
+
+async def get_batch(batch_id: str, user_id: str) -> Optional[LLMBatch]:
+    """The user's batch, or None if it doesn't exist or belongs to someone else"""
+    try:
+        batch = await LLMBatch.get(PydanticObjectId(batch_id))
+    except Exception:
+        return None
+    return batch if batch and batch.user_id == user_id else None
+
+
+async def list_batches(user_id: str, limit: int = 20) -> List[LLMBatch]:
+    return await LLMBatch.find({"user_id": user_id}).sort("-created_at").limit(limit).to_list()
+
+
+async def batch_results(batch_id: str, after: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    """Finished items in the order they finished, starting after sequence number `after`"""
+    cursor = LLMBatchItem.get_pymongo_collection().find(
+        {"batch_id": batch_id, "sequence": {"$gt": after}},
+        projection={"messages": 0, "params": 0},
+        sort=[("sequence", ASCENDING)],
+        limit=limit,
+    )
+    return [item_result(item) async for item in cursor]
+
+
+async def stream_results(batch_id: str, after: int = 0, follow: bool = False) -> AsyncIterator[bytes]:
+    """NDJSON lines of finished items; with `follow`, keep going until the batch finishes"""
+    while True:
+        status = None
+        if follow:
+            document = await LLMBatch.get_pymongo_collection().find_one(
+                {"_id": PydanticObjectId(batch_id)}, projection={"status": 1}
+            )
+            status = document["status"] if document else LLMBatchStatus.CANCELLED
+        page = await batch_results(batch_id, after, settings.llm_batch_stream_page_size)
+        for result in page:
+            yield orjson.dumps(result) + b"\n"
+        if page:
+            after = page[-1]["sequence"]
+            continue
+        if not follow or status in FINISHED:
+            return
+        await asyncio.sleep(settings.llm_batch_stream_poll_seconds)
+
+
+async def cancel_batch(batch: LLMBatch) -> Optional[LLMBatch]:
+    """Ask the workers to stop the batch; items already finished keep their results"""
+    await LLMBatch.get_pymongo_collection().update_one(
+        {"_id": batch.id, "status": {"$in": [LLMBatchStatus.QUEUED, LLMBatchStatus.IN_PROGRESS]}},
+        {"$set": {"status": LLMBatchStatus.CANCELLING}},
+    )
+    llm_batch_worker_pool.notify()
+    return await LLMBatch.get(batch.id)
+
+
+# ---------------------------------------------------------------------------
+# Processing
+# ---------------------------------------------------------------------------
+
+async def _claim_next(worker_id: str) -> Optional[LLMBatch]:
+    """Lease the oldest batch waiting for a worker (or whose lease expired)"""
+    now = datetime.now(timezone.utc)
+    document = await LLMBatch.get_pymongo_collection().find_one_and_update(
+        {"$or": [
+            {"status": {"$in": [LLMBatchStatus.QUEUED, LLMBatchStatus.CANCELLING]}, "lease_owner": None},
+            {"status": {"$in": [LLMBatchStatus.IN_PROGRESS, LLMBatchStatus.CANCELLING]},
+             "lease_expires_at": {"$lt": now}},
+        ]},
+        {"$set": {"lease_owner": worker_id, "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS)}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if document is None:
+        return None
+    if document["status"] == LLMBatchStatus.QUEUED:
+        await LLMBatch.get_pymongo_collection().update_one(
+            {"_id": document["_id"], "lease_owner": worker_id, "status": LLMBatchStatus.QUEUED},
+            {"$set": {"status": LLMBatchStatus.IN_PROGRESS, "started_at": now}},
+        )
+    return LLMBatch.model_validate(document)
+
+
+async def _renew_lease(batch_id: PydanticObjectId, worker_id: str) -> Optional[Dict[str, Any]]:
+    """Extend the lease; returns the batch's progress, or None if the lease was lost"""
+    return await LLMBatch.get_pymongo_collection().find_one_and_update(
+        {"_id": batch_id, "lease_owner": worker_id},
+        {"$set": {"lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=LEASE_SECONDS)}},
+        projection={"status": 1, "used_tokens": 1, "reserved_tokens": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _close_pending(batch: LLMBatch, status: str, error: str) -> None:
+    """Finish every item still pending with `status`, numbering them after the finished ones"""
+    pending = await LLMBatchItem.get_pymongo_collection().find(
+        {"batch_id": str(batch.id), "status": LLMBatchItemStatus.PENDING},
+        projection={"_id": 1},
+        sort=[("index", ASCENDING)],
+    ).to_list(None)
+    if not pending:
+        return
+    counter = "cancelled_count" if status == LLMBatchItemStatus.CANCELLED else "failed_count"
+    state = await LLMBatch.get_pymongo_collection().find_one_and_update(
+        {"_id": batch.id},
+        {"$inc": {"result_sequence": len(pending), counter: len(pending)}},
+        projection={"result_sequence": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    first = state["result_sequence"] - len(pending) + 1
+    now = datetime.now(timezone.utc)
+    await LLMBatchItem.get_pymongo_collection().bulk_write([
+        UpdateOne({"_id": item["_id"], "status": LLMBatchItemStatus.PENDING}, {"$set": {
+            "status": status, "error": error, "sequence": first + offset, "completed_at": now,
+        }})
+        for offset, item in enumerate(pending)
+    ], ordered=False)
+    llm_batch_items(status).inc(len(pending))
+
+
+class LLMBatchWorkerPool:
+    """Background workers processing queued batches"""
+
+    def __init__(self, concurrency: int = 2, poll_interval: float = 1.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._service = None
+
+    def _proxy(self):
+        """One long-lived proxy service, so batches share provider connections"""
+        if self._service is None:
+            from app.services.llm_proxy_service import LLMProxyService
+            self._service = LLMProxyService(None)
+        return self._service
+
+    def notify(self):
+        """Wake idle workers after a submission (other processes are picked up by polling)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def process_next(self, worker_id: str = WORKER_ID) -> bool:
+        """Process one batch to the end. Returns False when none was waiting."""
+        batch = await _claim_next(worker_id)
+        if batch is None:
+            return False
+
+        keeper = asyncio.create_task(self._keep_lease(batch.id, worker_id))
+        try:
+            while True:
+                state = await _renew_lease(batch.id, worker_id)
+                if state is None or keeper.done():
+                    logger.warning(f"Lost the lease on batch {batch.id}; another worker will carry on")
+                    return True
+                if state["status"] == LLMBatchStatus.CANCELLING:
+                    await _close_pending(batch, LLMBatchItemStatus.CANCELLED, "Batch cancelled")
+                    break
+                if state["reserved_tokens"] and state["used_tokens"] >= state["reserved_tokens"]:
+                    await _close_pending(batch, LLMBatchItemStatus.FAILED, "The batch used up its token reservation")
+                    break
+
+                items = await LLMBatchItem.find(
+                    {"batch_id": str(batch.id), "status": LLMBatchItemStatus.PENDING}
+                ).sort("index").limit(settings.llm_batch_item_concurrency * 4).to_list()
+                if not items:
+                    break
+                slots = asyncio.Semaphore(settings.llm_batch_item_concurrency)
+
+                async def run(item: LLMBatchItem):
+                    async with slots:
+                        await self._run_item(batch, item)
+
+                await asyncio.gather(*(run(item) for item in items))
+            await self._finish(batch, worker_id)
+        finally:
+            keeper.cancel()
+        return True
+
+    async def _keep_lease(self, batch_id: PydanticObjectId, worker_id: str):
+        """Renew the lease while items are in flight; returns when it is lost"""
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 4)
+            try:
+                if await _renew_lease(batch_id, worker_id) is None:
+                    return
+            except Exception as e:
+                logger.warning(f"Could not renew the lease on batch {batch_id}: {e}")
+
+    async def _run_item(self, batch: LLMBatch, item: LLMBatchItem):
+        service = self._proxy()
+        response: Dict[str, Any] = {}
+        provider = None
+        attempts = 0
+        while attempts < MAX_ATTEMPTS:
+            attempts += 1
+            try:
+                response, provider = await service._call_routes(item.model, item.messages, dict(item.params),
+                                                                tier=batch.tier)
+            except LLMOverloaded as e:
+                response, delay = e.as_error(), e.retry_after
+            except Exception as e:
+                response, delay = {"error": f"Request failed: {str(e)}", "retryable": True}, 2 ** attempts
+            else:
+                if "error" not in response or not response.get("retryable"):
+                    break
+                delay = 2 ** attempts
+            if attempts < MAX_ATTEMPTS:
+                await asyncio.sleep(delay)
+
+        succeeded = "error" not in response
+        usage = response.get("usage") or {} if succeeded else {}
+        tokens = usage.get("total_tokens", 0)
+        cost = float(service.pricing_service.calculate_cost(
+            provider, item.model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        )) if succeeded else 0.0
+        status = LLMBatchItemStatus.SUCCEEDED if succeeded else LLMBatchItemStatus.FAILED
+        llm_batch_items(status).inc()
+
+        state = await LLMBatch.get_pymongo_collection().find_one_and_update(
+            {"_id": batch.id},
+            {"$inc": {
+                "result_sequence": 1,
+                "succeeded_count" if succeeded else "failed_count": 1,
+                "used_tokens": tokens,
+                "cost_usd": cost,
+            }},
+            projection={"result_sequence": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        await LLMBatchItem.get_pymongo_collection().update_one({"_id": item.id}, {"$set": {
+            "status": status,
+            "attempts": item.attempts + attempts,
+            "response": response if succeeded else None,
+            "error": None if succeeded else str(response.get("error")),
+            "provider": provider,
+            "tokens_used": tokens,
+            "cost_usd": cost,
+            "sequence": state["result_sequence"],
+            "completed_at": datetime.now(timezone.utc),
+        }})
+
+    async def _finish(self, batch: LLMBatch, worker_id: str):
+        """Recount the items, settle the reservation with what was used and close the batch"""
+        rows = await LLMBatchItem.get_pymongo_collection().aggregate([
+            {"$match": {"batch_id": str(batch.id)}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1},
+                        "tokens": {"$sum": "$tokens_used"}, "cost": {"$sum": "$cost_usd"}}},
+        ]).to_list(None)
+        counts = {row["_id"]: row["count"] for row in rows}
+        used_tokens = sum(row["tokens"] for row in rows)
+        cost = sum(row["cost"] for row in rows)
+
+        if batch.reservation_id:
+            token_service = self._proxy().token_service
+            if used_tokens > 0:
+                # Settling twice charges once, so a batch finished again after a lost lease isn't double-billed
+                await token_service.consume_reserved_tokens(
+                    reservation_id=batch.reservation_id,
+                    actual_tokens=used_tokens,
+                    cost_usd=cost,
+                    response_metadata={"provider": "batch", "batch_id": str(batch.id),
+                                       "request_count": batch.request_count}
+                )
+            else:
+                await token_service.release_reserved_tokens(batch.reservation_id)
+
+        state = await LLMBatch.get_pymongo_collection().find_one({"_id": batch.id}, projection={"status": 1})
+        cancelled = state is not None and state["status"] == LLMBatchStatus.CANCELLING
+        await LLMBatch.get_pymongo_collection().update_one({"_id": batch.id, "lease_owner": worker_id}, {"$set": {
+            "status": LLMBatchStatus.CANCELLED if cancelled else LLMBatchStatus.COMPLETED,
+            "succeeded_count": counts.get(LLMBatchItemStatus.SUCCEEDED, 0),
+            "failed_count": counts.get(LLMBatchItemStatus.FAILED, 0),
+            "cancelled_count": counts.get(LLMBatchItemStatus.CANCELLED, 0),
+            "used_tokens": used_tokens,
+            "cost_usd": cost,
+            "completed_at": datetime.now(timezone.utc),
+            "lease_owner": None,
+            "lease_expires_at": None,
+        }})
+        logger.info(f"Batch {batch.id} {'cancelled' if cancelled else 'completed'}: "
+                    f"{counts.get(LLMBatchItemStatus.SUCCEEDED, 0)}/{batch.request_count} succeeded, "
+                    f"{used_tokens} tokens")
+
+    async def _worker(self, index: int):
+        worker_id = f"{WORKER_ID}:{index}"
+        while True:
+            try:
+                if await self.process_next(worker_id):
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Batch worker error: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        print(f"📦 LLM batch workers started ({self.concurrency})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        if self._service is not None:
+            await self._service.close()
+            self._service = None
+
+    async def drain(self) -> int:
+        """Process waiting batches with `concurrency` workers until none are left"""
+        processed = 0
+
+        async def work(index: int):
+            nonlocal processed
+            while await self.process_next(f"{WORKER_ID}:drain:{index}"):
+                processed += 1
+
+        await asyncio.gather(*(work(i) for i in range(self.concurrency)))
+        return processed
+
+
+llm_batch_worker_pool = LLMBatchWorkerPool(concurrency=settings.llm_batch_worker_concurrency)
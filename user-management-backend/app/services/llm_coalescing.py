@@ -0,0 +1,65 @@
+"""
+Single-flight coalescing of identical in-flight LLM calls.
+
+When a client retries after its own timeout, or several users fire the same
+request at once, the proxy would otherwise make one provider call each.
+Instead, a deterministic request (see llm_response_cache.is_deterministic)
+that matches one already waiting on the provider attaches to that call. Every
+caller still reserves and is billed for its own tokens; only the upstream call
+is shared.
+
+The upstream call runs as its own task, so a caller that goes away doesn't
+cancel it for the others, and each caller gets its own copy of the response.
+Coalescing is per worker process: identical requests on other workers are
+caught by the response cache when it's enabled.
+"""
+
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.llm_response_cache import cache_key, is_deterministic
+from app.utils.metrics import llm_coalesced_requests
+
+
+class SingleFlight:
+    """In-flight calls by request key; later identical calls await the first"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def key_for(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Optional[str]:
+        """The coalescing key for a request, or None when it must get its own call"""
+        if not settings.llm_coalescing_enabled or not is_deterministic(params):
+            return None
+        return cache_key("inflight", model, messages, params)
+
+    def pending(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """The result of `call()`, or of the identical call already in flight; True if shared"""
+        flight = self._inflight.get(key)
+        shared = flight is not None
+        if shared:
+            llm_coalesced_requests.inc()
+        else:
+            flight = asyncio.ensure_future(call())
+            self._inflight[key] = flight
+            flight.add_done_callback(lambda done: self._finished(key, done))
+
+        result = await asyncio.shield(flight)
+        return copy.deepcopy(result), shared
+
+    def _finished(self, key: str, flight: asyncio.Future) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # Mark a failure as retrieved even if every caller has gone away
+        if not flight.cancelled():
+            flight.exception()
+
+
+# Global registry of in-flight chat completions
+llm_inflight = SingleFlight()
@@ -3,15 +3,44 @@
 import httpx
 import json
 import asyncio
+import math
 import time
 from datetime import datetime
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, Union
 from decimal import Decimal
 from sqlalchemy.orm import Session
 
 from ..config import settings
 from ..models.user import User, TokenUsageLog
 from .token_service import TokenService, TokenPricingService
+from .cache_service import cache_service
+from .embedding_batcher import embedding_batcher
+from .embedding_cache import cache_scope, embedding_cache, embedding_key
+from .llm_coalescing import llm_inflight
+from .llm_response_cache import llm_response_cache
+from .llm_scheduler import LLMOverloaded, QUEUE_FULL, llm_scheduler, scheduler_tier
+from .provider_health import provider_health
+from .tokenizer import tokenizers
+from ..utils.metrics import (
+    llm_failovers,
+    llm_hedged_requests,
+    llm_request_duration,
+    llm_request_errors,
+    llm_tokens,
+)
+
+# Aggregated model catalog, shared by every request and worker
+MODEL_CATALOG_CACHE_KEY = "llm:models"
+MODEL_CATALOG_TTL = 60
+
+# OpenRouter names models "<vendor>/<model>"; used to fail an unprefixed model over to it
+OPENROUTER_VENDORS = (
+    ("gpt", "openai"),
+    ("o1", "openai"),
+    ("o3", "openai"),
+    ("claude", "anthropic"),
+    ("gemini", "google"),
+)
 
 
 class LLMProviderClient:
@@ -20,7 +49,19 @@ class LLMProviderClient:
     def __init__(self, base_url: str, api_key: str):
         self.base_url = base_url
         self.api_key = api_key
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(
+            settings.llm_provider_timeout_seconds, connect=settings.llm_provider_connect_timeout_seconds
+        ))
+    
+    @staticmethod
+    def _error(message: str, error: Exception) -> Dict[str, Any]:
+        """Error response; retryable when the provider (not the request) is at fault."""
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            retryable = status == 429 or status >= 500
+        else:
+            retryable = isinstance(error, httpx.TransportError)
+        return {"error": f"{message}: {str(error)}", "retryable": retryable}
     
     async def close(self):
         """Close the HTTP client."""
@@ -38,9 +79,26 @@ class LLMProviderClient:
         """Create a text completion."""
         raise NotImplementedError
     
-    async def embeddings(self, input_text: str, model: str, **kwargs) -> Dict[str, Any]:
-        """Create embeddings."""
+    async def embeddings(self, inputs: List[str], model: str, **kwargs) -> Dict[str, Any]:
+        """Create embeddings for a batch of inputs."""
         raise NotImplementedError
+    
+    async def _openai_embeddings(self, label: str, inputs: List[str], model: str, **kwargs) -> Dict[str, Any]:
+        """POST /embeddings on an OpenAI-compatible API."""
+        try:
+            response = await self.client.post(
+                f"{self.base_url}/embeddings",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={"model": model, "input": inputs, **kwargs}
+            )
+            response.raise_for_status()
+            return response.json()
+            
+        except Exception as e:
+            return self._error(f"{label} embeddings failed", e)
 
 
 class OpenRouterClient(LLMProviderClient):
@@ -48,7 +106,7 @@ class OpenRouterClient(LLMProviderClient):
     
     def __init__(self):
         super().__init__(
-            base_url="https://openrouter.ai/api/v1",
+            base_url=settings.openrouter_api_base,
             api_key=settings.openrouter_api_key
         )
     
@@ -95,7 +153,11 @@ class OpenRouterClient(LLMProviderClient):
             return response.json()
             
         except Exception as e:
-            return {"error": f"OpenRouter chat completion failed: {str(e)}"}
+            return self._error("OpenRouter chat completion failed", e)
+    
+    async def embeddings(self, inputs: List[str], model: str, **kwargs) -> Dict[str, Any]:
+        """Create OpenRouter embeddings."""
+        return await self._openai_embeddings("OpenRouter", inputs, model, **kwargs)
 
 
 class GlamaClient(LLMProviderClient):
@@ -127,6 +189,10 @@ class GlamaClient(LLMProviderClient):
             
         except Exception as e:
             return [{"error": f"Failed to fetch Glama models: {str(e)}"}]
+    
+    async def embeddings(self, inputs: List[str], model: str, **kwargs) -> Dict[str, Any]:
+        """Create Glama embeddings."""
+        return await self._openai_embeddings("Glama", inputs, model, **kwargs)
 
 
 class RequestyClient(LLMProviderClient):
@@ -158,6 +224,10 @@ class RequestyClient(LLMProviderClient):
             
         except Exception as e:
             return [{"error": f"Failed to fetch Requesty models: {str(e)}"}]
+    
+    async def embeddings(self, inputs: List[str], model: str, **kwargs) -> Dict[str, Any]:
+        """Create Requesty embeddings."""
+        return await self._openai_embeddings("Requesty", inputs, model, **kwargs)
 
 
 class AIMLClient(LLMProviderClient):
@@ -189,6 +259,10 @@ class AIMLClient(LLMProviderClient):
             
         except Exception as e:
             return [{"error": f"Failed to fetch AIML models: {str(e)}"}]
+    
+    async def embeddings(self, inputs: List[str], model: str, **kwargs) -> Dict[str, Any]:
+        """Create AIML embeddings."""
+        return await self._openai_embeddings("AIML", inputs, model, **kwargs)
 
 
 class A4FClient(LLMProviderClient):
@@ -196,7 +270,7 @@ class A4FClient(LLMProviderClient):
     
     def __init__(self):
         super().__init__(
-            base_url="https://api.a4f.co/v1",
+            base_url=settings.a4f_base_url,
             api_key=settings.a4f_api_key
         )
     
@@ -246,14 +320,17 @@ class A4FClient(LLMProviderClient):
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
                 },
-                json=payload,
-                timeout=30.0
+                json=payload
             )
             response.raise_for_status()
             return response.json()
             
         except Exception as e:
-            return {"error": f"A4F chat completion failed: {str(e)}"}
+            return self._error("A4F chat completion failed", e)
+    
+    async def embeddings(self, inputs: List[str], model: str, **kwargs) -> Dict[str, Any]:
+        """Create A4F embeddings."""
+        return await self._openai_embeddings("A4F", inputs, model, **kwargs)
 
 
 class LLMProxyService:
@@ -271,17 +348,23 @@ class LLMProxyService:
             "aiml": AIMLClient(),
             "a4f": A4FClient()
         }
-        
-        # Simple cache for models with 60-second TTL
-        self._models_cache = None
-        self._cache_timestamp = 0
-        self._cache_ttl = 60  # 60 seconds
+        # Upstream calls started here that other requests may be attached to
+        self._flights: set = set()
     
     async def close(self):
-        """Close all provider clients."""
+        """Close all provider clients, once calls other requests share have finished."""
+        pending = [flight for flight in self._flights if not flight.done()]
+        if pending:
+            asyncio.ensure_future(self._close_after(pending))
+            return
         for provider in self.providers.values():
             await provider.close()
     
+    async def _close_after(self, flights: List[asyncio.Future]):
+        await asyncio.gather(*flights, return_exceptions=True)
+        self._flights.clear()
+        await self.close()
+    
     def get_provider_from_model(self, model: str) -> Tuple[str, LLMProviderClient]:
         """Determine provider from model name with A4F prioritization for popular models."""
         # First check for explicit provider prefixes
@@ -304,15 +387,29 @@ class LLMProxyService:
         # Default to OpenRouter for other models
         return "openrouter", self.providers["openrouter"]
     
-    async def list_all_models(self) -> Dict[str, Any]:
-        """List models from all providers with concurrent requests, aggressive timeout, and caching."""
-        current_time = time.time()
-        
-        # Check if we have a valid cache
-        if (self._models_cache is not None and 
-            current_time - self._cache_timestamp < self._cache_ttl):
-            return self._models_cache
+    def get_routes(self, model: str) -> List[Tuple[str, LLMProviderClient, str]]:
+        """Providers that can serve a model, preferred first, with each one's id for it."""
+        provider_name, provider_client = self.get_provider_from_model(model)
+        routes = [(provider_name, provider_client, model)]
         
+        alternates = settings.llm_failover_models.get(model)
+        if alternates is None:
+            bare = model.split("/", 1)[-1]
+            vendor = next((v for prefix, v in OPENROUTER_VENDORS if bare.lower().startswith(prefix)), None)
+            alternates = {"a4f": bare, "openrouter": f"{vendor}/{bare}"} if vendor else {}
+        for name, provider_model in alternates.items():
+            client = self.providers.get(name)
+            # Only clients that implement chat completions can take over
+            if name != provider_name and client and type(client).chat_completion is not LLMProviderClient.chat_completion:
+                routes.append((name, client, provider_model))
+        return routes
+    
+    async def list_all_models(self) -> Dict[str, Any]:
+        """List models from all providers, cached across requests."""
+        return await cache_service.get_or_set(MODEL_CATALOG_CACHE_KEY, self._fetch_all_models, MODEL_CATALOG_TTL)
+    
+    async def _fetch_all_models(self) -> Dict[str, Any]:
+        """Fetch models from all providers with concurrent requests and aggressive timeouts."""
         all_models = []
         provider_status = {}
         
@@ -377,94 +474,375 @@ class LLMProxyService:
             if not provider_status:
                 provider_status = {name: "fallback" for name in self.providers.keys()}
         
-        result = {
+        return {
             "models": all_models,
             "provider_status": provider_status,
             "total_models": len(all_models)
         }
-        
-        # Cache the result
-        self._models_cache = result
-        self._cache_timestamp = current_time
-        
-        return result
     
     async def estimate_tokens(self, text: str, model: str) -> int:
-        """Estimate token count for text (rough approximation)."""
-        # Simple approximation: ~4 characters per token
-        return max(1, len(text) // 4)
+        """Count tokens in text with the model family's tokenizer."""
+        return max(1, await tokenizers.count_text(model, text))
     
-    async def chat_completion(self, user: User, messages: List[Dict[str, Any]], model: str, **kwargs) -> Dict[str, Any]:
-        """Process chat completion with token management."""
+    async def chat_completion(self, user: User, messages: List[Dict[str, Any]], model: str,
+                              tier: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """Process chat completion with token management; `tier` defaults to the user's plan."""
         try:
-            # Estimate tokens needed
-            total_text = " ".join([msg.get("content", "") for msg in messages])
-            estimated_tokens = await self.estimate_tokens(total_text, model)
+            # Estimate tokens needed: the prompt plus the longest completion asked for
+            estimated_tokens = await tokenizers.count_messages(model, messages) + (kwargs.get("max_tokens") or 0)
+            provider_name, provider_client = self.get_provider_from_model(model)
             
-            # Check if user has sufficient tokens
-            if not self.token_service.can_use_tokens(user, estimated_tokens):
+            # Deterministic requests may be answered from the response cache
+            cache_key = llm_response_cache.key_for(user.id, model, messages, kwargs)
+            if cache_key:
+                plan = getattr(user.subscription, "value", user.subscription)
+                cached = await llm_response_cache.get(cache_key, plan)
+                if cached is not None:
+                    return await self._serve_cached(user, cached, model, provider_name)
+            
+            # Reserve tokens (held against the balance for every worker until settled)
+            try:
+                reservation_id = await self.token_service.reserve_tokens_advanced(user, estimated_tokens, "chat_completion", {
+                    "model": model,
+                    "message_count": len(messages)
+                })
+            except ValueError:
                 return {
                     "error": "Insufficient tokens",
                     "details": "Your current plan doesn't have enough tokens for this request",
                     "required_tokens": estimated_tokens,
-                    "available_tokens": self.token_service.get_available_tokens(user)
+                    "available_tokens": await self.token_service.get_available_tokens(user)
                 }
             
-            # Reserve tokens
-            reservation_id = self.token_service.reserve_tokens(user, estimated_tokens, "chat_completion", {
-                "model": model,
-                "message_count": len(messages)
-            })
-            
             try:
-                # Route to appropriate provider
-                provider_name, provider_client = self.get_provider_from_model(model)
-                
-                # Make the API call
-                response = await provider_client.chat_completion(messages, model, **kwargs)
+                # Make the API call, or attach to an identical one already in flight
+                flight_key = llm_inflight.key_for(model, messages, kwargs)
+                hedge = getattr(user.subscription, "value", user.subscription) in settings.llm_hedge_plans
+                tier = tier or scheduler_tier(user)
+                with llm_scheduler.admit(user.id, tier):
+                    if flight_key:
+                        (response, provider_name), coalesced = await llm_inflight.run(flight_key, lambda: self._start_flight(
+                            self._call_routes(model, messages, kwargs, hedge, tier)
+                        ))
+                    else:
+                        response, provider_name = await self._call_routes(model, messages, kwargs, hedge, tier)
+                        coalesced = False
                 
                 if "error" in response:
                     # Release reserved tokens on error
-                    self.token_service.release_reserved_tokens(reservation_id)
+                    await self.token_service.release_reserved_tokens(reservation_id)
+                    response.pop("retryable", None)
                     return response
                 
                 # Calculate actual tokens used
-                actual_tokens = response.get("usage", {}).get("total_tokens", estimated_tokens)
-                cost = self.pricing_service.calculate_cost(provider_name, model, actual_tokens, "chat")
+                usage = response.get("usage", {})
+                actual_tokens = usage.get("total_tokens", estimated_tokens)
+                cost = self.pricing_service.calculate_cost(
+                    provider_name, model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+                )
                 
                 # Consume tokens and log usage
-                self.token_service.consume_reserved_tokens(
+                await self.token_service.consume_reserved_tokens(
                     reservation_id=reservation_id,
                     actual_tokens=actual_tokens,
                     cost_usd=cost,
                     response_metadata={
+                        "provider": provider_name,
                         "completion_tokens": response.get("usage", {}).get("completion_tokens", 0),
                         "prompt_tokens": response.get("usage", {}).get("prompt_tokens", 0)
                     }
                 )
                 
+                if cache_key and not coalesced:
+                    await llm_response_cache.set(cache_key, response)
+                
                 # Add usage info to response
                 response["_usage_info"] = {
                     "tokens_used": actual_tokens,
                     "cost_usd": float(cost),
                     "provider": provider_name,
-                    "remaining_tokens": self.token_service.get_available_tokens(user)
+                    "remaining_tokens": await self.token_service.get_available_tokens(user)
                 }
+                if cache_key:
+                    response["_usage_info"]["cache"] = "miss"
+                if coalesced:
+                    response["_usage_info"]["coalesced"] = True
                 
                 return response
                 
+            except LLMOverloaded as e:
+                await self.token_service.release_reserved_tokens(reservation_id)
+                return e.as_error()
             except Exception as e:
                 # Release reserved tokens on error
-                self.token_service.release_reserved_tokens(reservation_id)
+                await self.token_service.release_reserved_tokens(reservation_id)
                 return {"error": f"Request failed: {str(e)}"}
         
         except Exception as e:
             return {"error": f"Token management error: {str(e)}"}
     
+    async def _call_provider(self, provider_name: str, provider_client: LLMProviderClient,
+                             messages: List[Dict[str, Any]], model: str, kwargs: Dict[str, Any],
+                             tier: Optional[str] = None) -> Dict[str, Any]:
+        """One upstream chat completion, once the scheduler gives it one of the provider's slots."""
+        async with llm_scheduler.slot(provider_name, tier):
+            return await self._send_to_provider(provider_name, provider_client, messages, model, kwargs)
+    
+    async def _send_to_provider(self, provider_name: str, provider_client: LLMProviderClient,
+                                messages: List[Dict[str, Any]], model: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """One upstream chat completion, recorded in the provider metrics and health."""
+        started = time.perf_counter()
+        try:
+            response = await provider_client.chat_completion(messages, model, **kwargs)
+        except asyncio.CancelledError:
+            provider_health.cancelled(provider_name, model)
+            raise
+        finally:
+            llm_request_duration(provider_name, model).observe(time.perf_counter() - started)
+        provider_health.record(provider_name, model, time.perf_counter() - started, not response.get("retryable"))
+        
+        if "error" in response:
+            llm_request_errors(provider_name, model).inc()
+        else:
+            usage = response.get("usage", {})
+            llm_tokens(provider_name, model, "prompt").inc(usage.get("prompt_tokens", 0))
+            llm_tokens(provider_name, model, "completion").inc(usage.get("completion_tokens", 0))
+        return response
+    
+    async def _call_routes(self, model: str, messages: List[Dict[str, Any]], kwargs: Dict[str, Any],
+                           hedge: bool = False, tier: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+        """Call the model's preferred provider, failing over while providers fail, have open circuits or full queues."""
+        routes = self.get_routes(model)
+        response = None
+        failed_provider = None
+        overloaded = None
+        for index, (name, client, provider_model) in enumerate(routes):
+            if not provider_health.allow(name, provider_model):
+                failed_provider = failed_provider or name
+                continue
+            if failed_provider:
+                llm_failovers(failed_provider, name).inc()
+            
+            try:
+                if hedge:
+                    backup = routes[index + 1] if index + 1 < len(routes) else (name, client, provider_model)
+                    response, used = await self._hedged_call((name, client, provider_model), backup, messages, kwargs, tier)
+                else:
+                    response, used = await self._call_provider(name, client, messages, provider_model, kwargs, tier), name
+            except LLMOverloaded as e:
+                # The call never reached this provider; its circuit claim is released unused
+                provider_health.cancelled(name, provider_model)
+                if e.reason != QUEUE_FULL:
+                    raise
+                overloaded = overloaded or e
+                failed_provider = name
+                continue
+            if "error" not in response or not response.get("retryable"):
+                return response, used
+            failed_provider = name
+        
+        if response is None and overloaded is not None:
+            raise overloaded
+        if response is None:
+            response = {"error": f"All providers for {model} are temporarily unavailable", "retryable": True}
+        return response, routes[0][0]
+    
+    async def _hedged_call(self, primary: Tuple[str, LLMProviderClient, str], backup: Tuple[str, LLMProviderClient, str],
+                           messages: List[Dict[str, Any]], kwargs: Dict[str, Any],
+                           tier: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+        """Race a second call against the first once it runs past the primary's p95 latency."""
+        name, client, provider_model = primary
+        first = asyncio.ensure_future(self._call_provider(name, client, messages, provider_model, kwargs, tier))
+        calls = {first: name}
+        try:
+            delay = provider_health.hedge_delay(name, provider_model)
+            if delay is not None:
+                await asyncio.wait({first}, timeout=delay)
+            if first.done() or delay is None or not provider_health.allow(backup[0], backup[2]):
+                return await first, name
+            
+            second = asyncio.ensure_future(self._call_provider(backup[0], backup[1], messages, backup[2], kwargs, tier))
+            calls[second] = backup[0]
+            pending = set(calls)
+            result = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call is second and isinstance(call.exception(), LLMOverloaded):
+                        # No room for the hedge; keep waiting on the primary
+                        provider_health.cancelled(backup[0], backup[2])
+                        continue
+                    response = call.result()
+                    if "error" not in response:
+                        llm_hedged_requests("hedge" if call is second else "primary").inc()
+                        return response, calls[call]
+                    result = (response, calls[call])
+            return result
+        finally:
+            for call in calls:
+                if not call.done():
+                    call.cancel()
+    
+    def _start_flight(self, call) -> asyncio.Future:
+        """Run a shared upstream call as a task this service won't close its clients under."""
+        flight = asyncio.ensure_future(call)
+        self._flights.add(flight)
+        flight.add_done_callback(self._flights.discard)
+        return flight
+    
+    async def embeddings(self, user: User, inputs: Union[str, List[str]], model: str) -> Dict[str, Any]:
+        """Create embeddings with token management; cached inputs skip the provider, the rest share upstream batches."""
+        try:
+            inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+            if not inputs:
+                return {"error": "input must not be empty"}
+            if len(inputs) > settings.embedding_max_inputs_per_request:
+                return {"error": f"At most {settings.embedding_max_inputs_per_request} inputs per request"}
+            
+            token_counts = await tokenizers.count_texts(model, inputs)
+            provider_name, provider_client = self.get_provider_from_model(model)
+            
+            # Look every input up by content within the user's scope; repeated inputs are only embedded once
+            scope = cache_scope(user.id)
+            keys = [embedding_key(scope, model, text) for text in inputs]
+            if settings.embedding_cache_enabled:
+                vectors = await embedding_cache.get_many(keys)
+            else:
+                vectors = [None] * len(inputs)
+            cached_indices = [index for index, vector in enumerate(vectors) if vector is not None]
+            misses: Dict[str, List[int]] = {}
+            for index, vector in enumerate(vectors):
+                if vector is None:
+                    misses.setdefault(keys[index], []).append(index)
+            miss_texts = [inputs[indices[0]] for indices in misses.values()]
+            miss_counts = [token_counts[indices[0]] for indices in misses.values()]
+            
+            cached_tokens = math.ceil(
+                sum(token_counts[index] for index in cached_indices) * settings.embedding_cache_billing_ratio
+            )
+            estimated_tokens = max(1, sum(miss_counts) + cached_tokens)
+            
+            try:
+                reservation_id = await self.token_service.reserve_tokens_advanced(user, estimated_tokens, "embeddings", {
+                    "model": model,
+                    "input_count": len(inputs),
+                    "cached_inputs": len(cached_indices)
+                })
+            except ValueError:
+                return {
+                    "error": "Insufficient tokens",
+                    "details": "Your current plan doesn't have enough tokens for this request",
+                    "required_tokens": estimated_tokens,
+                    "available_tokens": await self.token_service.get_available_tokens(user)
+                }
+            
+            try:
+                prompt_tokens = 0
+                if miss_texts:
+                    result = await embedding_batcher.embed(
+                        provider_name, type(provider_client), model, miss_texts, miss_counts
+                    )
+                    if "error" in result:
+                        await self.token_service.release_reserved_tokens(reservation_id)
+                        result.pop("retryable", None)
+                        return result
+                    
+                    prompt_tokens = result["prompt_tokens"]
+                    llm_tokens(provider_name, model, "prompt").inc(prompt_tokens)
+                    for indices, embedding in zip(misses.values(), result["data"]):
+                        for index in indices:
+                            vectors[index] = embedding
+                    if settings.embedding_cache_enabled:
+                        await embedding_cache.set_many(dict(zip(misses, result["data"])))
+                
+                actual_tokens = prompt_tokens + cached_tokens
+                cost = self.pricing_service.calculate_cost(provider_name, model, actual_tokens, 0)
+                if actual_tokens > 0:
+                    await self.token_service.consume_reserved_tokens(
+                        reservation_id=reservation_id,
+                        actual_tokens=actual_tokens,
+                        cost_usd=cost,
+                        response_metadata={
+                            "provider": provider_name,
+                            "prompt_tokens": actual_tokens,
+                            "cached_inputs": len(cached_indices)
+                        }
+                    )
+                else:
+                    await self.token_service.release_reserved_tokens(reservation_id)
+                
+                return {
+                    "object": "list",
+                    "model": model,
+                    "data": [
+                        {"object": "embedding", "index": index, "embedding": embedding}
+                        for index, embedding in enumerate(vectors)
+                    ],
+                    "usage": {"prompt_tokens": actual_tokens, "total_tokens": actual_tokens},
+                    "_usage_info": {
+                        "tokens_used": actual_tokens,
+                        "cost_usd": float(cost),
+                        "provider": provider_name,
+                        "cached_inputs": cached_indices,
+                        "remaining_tokens": await self.token_service.get_available_tokens(user)
+                    }
+                }
+                
+            except Exception as e:
+                await self.token_service.release_reserved_tokens(reservation_id)
+                return {"error": f"Request failed: {str(e)}"}
+        
+        except Exception as e:
+            return {"error": f"Token management error: {str(e)}"}
+    
+    async def _serve_cached(self, user: User, cached: Dict[str, Any], model: str, provider_name: str) -> Dict[str, Any]:
+        """Return a cached completion, billing a share of its original tokens."""
+        usage = cached.get("usage", {})
+        ratio = settings.llm_response_cache_billing_ratio
+        original_tokens = usage.get("total_tokens", 0)
+        billed_tokens = math.ceil(original_tokens * ratio)
+        cost = self.pricing_service.calculate_cost(
+            provider_name, model, usage.get("prompt_tokens", 0) * ratio, usage.get("completion_tokens", 0) * ratio
+        )
+        
+        if billed_tokens > 0:
+            try:
+                reservation_id = await self.token_service.reserve_tokens_advanced(user, billed_tokens, "chat_completion", {
+                    "model": model,
+                    "cache": "hit"
+                })
+            except ValueError:
+                return {
+                    "error": "Insufficient tokens",
+                    "details": "Your current plan doesn't have enough tokens for this request",
+                    "required_tokens": billed_tokens,
+                    "available_tokens": await self.token_service.get_available_tokens(user)
+                }
+            await self.token_service.consume_reserved_tokens(
+                reservation_id=reservation_id,
+                actual_tokens=billed_tokens,
+                cost_usd=cost,
+                response_metadata={"provider": provider_name, "original_tokens": original_tokens}
+            )
+        
+        llm_response_cache.record_saved(original_tokens - billed_tokens)
+        response = dict(cached)
+        response["_usage_info"] = {
+            "tokens_used": billed_tokens,
+            "cost_usd": float(cost),
+            "provider": provider_name,
+            "cache": "hit",
+            "tokens_saved": original_tokens - billed_tokens,
+            "remaining_tokens": await self.token_service.get_available_tokens(user)
+        }
+        return response
+    
     def get_provider_status(self) -> Dict[str, Any]:
         """Get status of all providers."""
         return {
             "providers": list(self.providers.keys()),
             "status": "All providers initialized",
+            "health": provider_health.snapshot(),
+            "queues": llm_scheduler.snapshot(),
             "supported_operations": ["chat_completion", "text_completion", "embeddings", "list_models"]
         }
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Exact-match cache of LLM chat completions.
+
+Only deterministic requests are cached: temperature 0, or an explicit seed,
+and never streamed. The key is a SHA-256 of the canonical JSON of everything
+that shapes the output (model, messages, sampling parameters, tools), scoped
+per user unless llm_response_cache_scope is "global".
+
+Entries are zlib-compressed JSON in Redis, with a small in-process LRU in
+front. Each entry carries the time it was stored and is kept for the longest
+plan TTL; a lookup only accepts it if it is younger than the TTL of the
+caller's plan. Entries over llm_response_cache_max_bytes (compressed) aren't
+stored. Redis failures degrade to misses.
+"""
+
+import hashlib
+import logging
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import orjson
+import redis.asyncio as aioredis
+
+from app.config import settings
+from app.services.cache_service import LRUCache
+from app.utils.metrics import Timer, llm_cache_lookups, llm_cache_saved_tokens, redis_command_duration
+
+logger = logging.getLogger(__name__)
+
+# Request parameters that change the completion, in addition to model and messages
+KEY_PARAMS = (
+    "temperature", "seed", "max_tokens", "top_p", "frequency_penalty", "presence_penalty",
+    "stop", "tools", "tool_choice", "response_format",
+)
+
+
+def is_deterministic(params: Dict[str, Any]) -> bool:
+    """Temperature 0 or a fixed seed, single choice, not streamed"""
+    if params.get("stream") or (params.get("n") or 1) != 1:
+        return False
+    return params.get("temperature") == 0 or params.get("seed") is not None
+
+
+def cache_key(scope: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """Canonical hash of a request; `scope` is a user id, or "global" to share across users"""
+    canonical = {
+        "model": model,
+        "messages": messages,
+        **{name: params[name] for name in KEY_PARAMS if params.get(name) is not None},
+    }
+    digest = hashlib.sha256(orjson.dumps(canonical, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    return f"llm:resp:v1:{scope}:{digest}"
+
+
+class LLMResponseCache:
+    """Compressed completion cache in Redis with an in-process L1"""
+
+    # Skip Redis for this long after a connection failure
+    REDIS_RETRY_SECONDS = 30.0
+
+    def __init__(self, local_max_entries: int = 256):
+        self.local = LRUCache(local_max_entries)
+        self._redis: Optional[aioredis.Redis] = None
+        self._redis_retry_at = 0.0
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        if time.monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(
+                settings.redis_url,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5,
+            )
+        return self._redis
+
+    def _redis_failed(self, error: Exception) -> None:
+        logger.warning(f"LLM response cache Redis error, using local cache only: {error}")
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+
+    @staticmethod
+    def ttl_for(plan: str) -> int:
+        ttls = settings.llm_response_cache_ttl_seconds
+        return ttls.get(plan, ttls.get("free", 0))
+
+    def key_for(self, user_id: Any, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Optional[str]:
+        """The cache key for a request, or None when it must go to the provider"""
+        if not settings.llm_response_cache_enabled or not is_deterministic(params):
+            llm_cache_lookups("bypass").inc()
+            return None
+        scope = "global" if settings.llm_response_cache_scope == "global" else str(user_id)
+        return cache_key(scope, model, messages, params)
+
+    async def get(self, key: str, plan: str) -> Optional[Dict[str, Any]]:
+        """A cached completion no older than the plan's TTL"""
+        blob = self.local.get(key)
+        if blob is None:
+            redis = self._get_redis()
+            if redis is not None:
+                try:
+                    with Timer(redis_command_duration("llm_cache_get")):
+                        blob = await redis.get(key)
+                except Exception as e:
+                    self._redis_failed(e)
+
+        entry = orjson.loads(zlib.decompress(blob)) if blob else None
+        if entry is None or time.time() - entry["stored_at"] > self.ttl_for(plan):
+            llm_cache_lookups("miss").inc()
+            return None
+
+        self.local.set(key, blob, settings.cache_local_ttl_seconds)
+        llm_cache_lookups("hit").inc()
+        return entry["response"]
+
+    async def set(self, key: str, response: Dict[str, Any]) -> bool:
+        """Store a completion for the longest plan TTL; False if it's too large"""
+        blob = zlib.compress(orjson.dumps({"stored_at": time.time(), "response": response}), 6)
+        if len(blob) > settings.llm_response_cache_max_bytes:
+            return False
+
+        ttl = max(settings.llm_response_cache_ttl_seconds.values())
+        self.local.set(key, blob, min(ttl, settings.cache_local_ttl_seconds))
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                with Timer(redis_command_duration("llm_cache_set")):
+                    await redis.set(key, blob, ex=ttl)
+            except Exception as e:
+                self._redis_failed(e)
+        return True
+
+    @staticmethod
+    def record_saved(tokens: int) -> None:
+        if tokens > 0:
+            llm_cache_saved_tokens.inc(tokens)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+# Global cache instance
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,222 @@
+"""
+Admission control for upstream LLM calls, by subscription tier.
+
+A burst of free-tier requests used to go straight to the provider and could
+use up the upstream rate limits and connections that paying users need. Two
+limits now sit in front of the providers:
+
+- per user: at most llm_scheduler_user_max_in_flight[tier] chat requests in
+  flight; more are rejected at once.
+- per provider: at most llm_scheduler_provider_concurrency calls in flight.
+  Further calls wait in a weighted fair queue: each tier is served in
+  proportion to llm_scheduler_tier_weights, so a free-tier backlog delays
+  ultra calls by a fraction of a slot rather than by its length. A call that
+  waits longer than its tier's llm_scheduler_queue_timeout_seconds is given
+  up. When llm_scheduler_max_queue calls are waiting, an arrival takes the
+  place of the lowest-priority waiter, or is rejected if it would itself be
+  the lowest.
+
+Rejections raise LLMOverloaded carrying a Retry-After estimate; the API
+answers them with 429. Tiers are the ones RateLimitMiddleware.rate_limits
+uses (free, pro, ultra, api_key). Budgets are per worker process, so a
+provider's limit should be split across workers.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.metrics import llm_scheduler_queued, llm_scheduler_rejections, llm_scheduler_wait
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FULL = "queue_full"
+DEADLINE = "deadline"
+USER_LIMIT = "user_limit"
+
+
+class LLMOverloaded(Exception):
+    """A call was refused admission; retry after `retry_after` seconds"""
+
+    def __init__(self, reason: str, retry_after: int, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def as_error(self) -> Dict[str, Any]:
+        return {"error": str(self), "retry_after": self.retry_after}
+
+
+def scheduler_tier(user: Any, via_api_key: bool = False) -> str:
+    """The user's plan, or "api_key" for API key requests when that weighs more"""
+    weights = settings.llm_scheduler_tier_weights
+    plan = str(getattr(user.subscription, "value", user.subscription))
+    if plan not in weights:
+        plan = "free"
+    if via_api_key and weights.get("api_key", 0) > weights[plan]:
+        return "api_key"
+    return plan
+
+
+class _Waiter:
+    __slots__ = ("future", "tier", "finish", "live")
+
+    def __init__(self, future: asyncio.Future, tier: str, finish: float):
+        self.future = future
+        self.tier = tier
+        self.finish = finish
+        self.live = True
+
+
+class ProviderQueue:
+    """Concurrency budget and weighted fair queue for one provider"""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.in_flight = 0
+        self.queued = 0
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        # Moving average of how long a call holds its slot, for Retry-After
+        self.service_time = 1.0
+        self._heap: List[Tuple[float, int, _Waiter]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def capacity(self) -> int:
+        return settings.llm_scheduler_provider_concurrency.get(
+            self.provider, settings.llm_scheduler_default_concurrency
+        )
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.queued + 1) / max(1, self.capacity) * self.service_time))
+
+    def _overloaded(self, reason: str, tier: str) -> LLMOverloaded:
+        llm_scheduler_rejections(tier, reason).inc()
+        if reason == DEADLINE:
+            message = f"Timed out waiting for {self.provider} capacity"
+        else:
+            message = f"{self.provider} is at capacity"
+        return LLMOverloaded(reason, self.retry_after(), message)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        waiter.live = False
+        self.queued -= 1
+        llm_scheduler_queued(self.provider).set(self.queued)
+
+    async def acquire(self, tier: str) -> None:
+        """Wait for a slot; raises LLMOverloaded when the queue is full or the wait runs out"""
+        if self.in_flight < self.capacity and not self.queued:
+            self.in_flight += 1
+            return
+
+        weights = settings.llm_scheduler_tier_weights
+        weight = weights.get(tier, weights.get("free", 1.0))
+        finish = max(self.virtual_time, self.last_finish.get(tier, 0.0)) + 1.0 / weight
+
+        if self.queued >= settings.llm_scheduler_max_queue:
+            victim = max((waiter for _, _, waiter in self._heap if waiter.live),
+                         key=lambda waiter: waiter.finish, default=None)
+            if victim is None or victim.finish <= finish:
+                raise self._overloaded(QUEUE_FULL, tier)
+            self._remove(victim)
+            victim.future.set_exception(self._overloaded(QUEUE_FULL, victim.tier))
+
+        self.last_finish[tier] = finish
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tier, finish)
+        heapq.heappush(self._heap, (finish, next(self._sequence), waiter))
+        self.queued += 1
+        llm_scheduler_queued(self.provider).set(self.queued)
+
+        timeout = settings.llm_scheduler_queue_timeout_seconds.get(tier, 10.0)
+        try:
+            await asyncio.wait({waiter.future}, timeout=timeout)
+        except asyncio.CancelledError:
+            if waiter.live:
+                self._remove(waiter)
+            elif waiter.future.done() and not waiter.future.exception():
+                self.release(0.0)
+            raise
+        if not waiter.future.done():
+            self._remove(waiter)
+            waiter.future.cancel()
+            raise self._overloaded(DEADLINE, tier)
+        waiter.future.result()
+
+    def release(self, held_seconds: float) -> None:
+        if held_seconds:
+            self.service_time = 0.8 * self.service_time + 0.2 * held_seconds
+        self.in_flight -= 1
+        while self.in_flight < self.capacity and self._heap:
+            finish, _, waiter = heapq.heappop(self._heap)
+            if not waiter.live:
+                continue
+            self._remove(waiter)
+            self.virtual_time = finish
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+
+class LLMScheduler:
+    """Per-user admission and per-provider fair queues for this worker"""
+
+    def __init__(self):
+        self._queues: Dict[str, ProviderQueue] = {}
+        self._user_in_flight: Dict[str, int] = {}
+
+    def queue(self, provider: str) -> ProviderQueue:
+        queue = self._queues.get(provider)
+        if queue is None:
+            queue = self._queues[provider] = ProviderQueue(provider)
+        return queue
+
+    @contextmanager
+    def admit(self, user_id: Any, tier: str) -> Iterator[None]:
+        """Count a request against the user's in-flight limit; raises LLMOverloaded over it"""
+        if not settings.llm_scheduler_enabled:
+            yield
+            return
+        user_id = str(user_id)
+        limit = settings.llm_scheduler_user_max_in_flight.get(tier)
+        if limit and self._user_in_flight.get(user_id, 0) >= limit:
+            llm_scheduler_rejections(tier, USER_LIMIT).inc()
+            raise LLMOverloaded(USER_LIMIT, 1, f"Too many concurrent requests (at most {limit} on the {tier} tier)")
+        self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+        try:
+            yield
+        finally:
+            self._user_in_flight[user_id] -= 1
+            if not self._user_in_flight[user_id]:
+                del self._user_in_flight[user_id]
+
+    @asynccontextmanager
+    async def slot(self, provider: str, tier: Optional[str]) -> AsyncIterator[None]:
+        """Hold one of the provider's call slots; no-op without a tier or when disabled"""
+        if tier is None or not settings.llm_scheduler_enabled:
+            yield
+            return
+        queue = self.queue(provider)
+        started = time.monotonic()
+        await queue.acquire(tier)
+        acquired = time.monotonic()
+        llm_scheduler_wait(tier).observe(acquired - started)
+        try:
+            yield
+        finally:
+            queue.release(time.monotonic() - acquired)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            provider: {"in_flight": queue.in_flight, "queued": queue.queued, "capacity": queue.capacity}
+            for provider, queue in self._queues.items()
+        }
+
+
+# Global LLM scheduler
+llm_scheduler = LLMScheduler()
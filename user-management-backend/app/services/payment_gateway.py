@@ -0,0 +1,351 @@
+"""
+Async payment gateway adapter.
+
+Talks to the Razorpay REST API over a shared httpx connection pool instead of
+the synchronous razorpay SDK, so gateway round trips never block the event
+loop. Calls have a per-request timeout and are retried with exponential
+backoff and full jitter on connection errors, 429s and 5xx responses.
+
+Payment and webhook signatures are checked locally with hmac; no network call
+is made to verify a payment.
+
+FakePaymentGateway implements the same interface in memory with configurable
+latency and failure rate, for tests and latency benchmarks.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import httpx
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+RAZORPAY_API_URL = "https://api.razorpay.com/v1"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class PaymentGatewayError(Exception):
+    """A gateway call failed; `status_code` is None for network errors"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+def sign_payment(order_id: str, payment_id: str, key_secret: str) -> str:
+    """Signature Checkout returns for a payment: HMAC-SHA256 of "order_id|payment_id" """
+    return hmac.new(
+        key_secret.encode("utf-8"),
+        f"{order_id}|{payment_id}".encode("utf-8"),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def verify_payment_signature(order_id: str, payment_id: str, signature: str, key_secret: str) -> bool:
+    """Check a Checkout payment signature locally"""
+    if not (order_id and payment_id and signature and key_secret):
+        return False
+    return hmac.compare_digest(sign_payment(order_id, payment_id, key_secret), signature)
+
+
+def verify_webhook_signature(body: bytes, signature: str, secret: str) -> bool:
+    """Check an X-Razorpay-Signature header against the raw webhook body"""
+    if not (signature and secret):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class RazorpayGateway:
+    """Razorpay REST client on a shared async connection pool"""
+
+    def __init__(
+        self,
+        key_id: str,
+        key_secret: str,
+        base_url: str = RAZORPAY_API_URL,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        max_connections: int = 20,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        self.transport = transport  # e.g. httpx.MockTransport in tests
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.key_id, self.key_secret),
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self.transport,
+            )
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: a random delay up to the exponential cap"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]] = None,
+        retry_after_send: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Send a request, retrying transient failures.
+
+        `retry_after_send=False` is for non-idempotent calls (refunds): those are
+        only retried when the request never reached the gateway.
+        """
+        client = self._get_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.request(method, path, json=json)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                error = PaymentGatewayError(f"Gateway unreachable: {e}", retryable=True)
+            except httpx.TransportError as e:
+                error = PaymentGatewayError(f"Gateway request failed: {e}", retryable=retry_after_send)
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                try:
+                    description = response.json().get("error", {}).get("description")
+                except ValueError:
+                    description = None
+                error = PaymentGatewayError(
+                    description or f"Gateway returned HTTP {response.status_code}",
+                    status_code=response.status_code,
+                    retryable=response.status_code in RETRYABLE_STATUS_CODES and (
+                        retry_after_send or response.status_code == 429
+                    ),
+                )
+
+            if not error.retryable or attempt == self.max_retries:
+                raise error
+            delay = self._backoff(attempt)
+            logger.warning(f"Razorpay {method} {path} failed ({error}); retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        raise PaymentGatewayError("Gateway retries exhausted")
+
+    async def create_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        # Unpaid duplicate orders are harmless and expire, so creation is retried
+        return await self._request("POST", "/orders", json=data)
+
+    async def fetch_order(self, order_id: str) -> Dict[str, Any]:
+        return await self._request("GET", f"/orders/{order_id}")
+
+    async def fetch_payment(self, payment_id: str) -> Dict[str, Any]:
+        return await self._request("GET", f"/payments/{payment_id}")
+
+    async def refund_payment(self, payment_id: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self._request("POST", f"/payments/{payment_id}/refund", json=data or {}, retry_after_send=False)
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        return verify_payment_signature(order_id, payment_id, signature, self.key_secret)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class FakePaymentGateway:
+    """
+    In-memory gateway with the RazorpayGateway interface.
+
+    `latency` seconds are awaited per call and `failure_rate` of calls raise a
+    retryable PaymentGatewayError. pay() simulates the customer completing
+    Checkout and returns the payment_id and signature the frontend would post.
+    """
+
+    def __init__(self, key_id: str = "rzp_test_fake", key_secret: str = "fake_secret",
+                 latency: float = 0.0, failure_rate: float = 0.0):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.payments: Dict[str, Dict[str, Any]] = {}
+        self.refunds: Dict[str, Dict[str, Any]] = {}
+        self.calls = 0
+
+    async def _call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise PaymentGatewayError("Fake gateway failure", status_code=503, retryable=True)
+
+    def _get(self, store: Dict[str, Dict[str, Any]], entity_id: str) -> Dict[str, Any]:
+        if entity_id not in store:
+            raise PaymentGatewayError(f"The id provided does not exist: {entity_id}", status_code=400)
+        return store[entity_id]
+
+    async def create_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        await self._call()
+        order = {
+            "id": f"order_{uuid.uuid4().hex[:14]}",
+            "entity": "order",
+            "amount": data["amount"],
+            "amount_paid": 0,
+            "amount_due": data["amount"],
+            "currency": data.get("currency", "INR"),
+            "receipt": data.get("receipt"),
+            "notes": data.get("notes", {}),
+            "status": "created",
+            "created_at": int(datetime.now(timezone.utc).timestamp()),
+        }
+        self.orders[order["id"]] = order
+        return order
+
+    async def fetch_order(self, order_id: str) -> Dict[str, Any]:
+        await self._call()
+        return self._get(self.orders, order_id)
+
+    async def fetch_payment(self, payment_id: str) -> Dict[str, Any]:
+        await self._call()
+        return self._get(self.payments, payment_id)
+
+    async def refund_payment(self, payment_id: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        await self._call()
+        payment = self._get(self.payments, payment_id)
+        refund = {
+            "id": f"rfnd_{uuid.uuid4().hex[:14]}",
+            "entity": "refund",
+            "payment_id": payment_id,
+            "amount": (data or {}).get("amount", payment["amount"]),
+            "currency": payment["currency"],
+            "status": "processed",
+        }
+        payment["amount_refunded"] = payment.get("amount_refunded", 0) + refund["amount"]
+        self.refunds[refund["id"]] = refund
+        return refund
+
+    def pay(self, order_id: str, method: str = "upi") -> Dict[str, str]:
+        """Capture a payment for an order, as Checkout would"""
+        order = self.orders[order_id]
+        payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+        self.payments[payment_id] = {
+            "id": payment_id,
+            "entity": "payment",
+            "order_id": order_id,
+            "amount": order["amount"],
+            "currency": order["currency"],
+            "status": "captured",
+            "method": method,
+            "notes": order["notes"],
+        }
+        order.update(status="paid", amount_paid=order["amount"], amount_due=0)
+        return {
+            "razorpay_order_id": order_id,
+            "razorpay_payment_id": payment_id,
+            "razorpay_signature": sign_payment(order_id, payment_id, self.key_secret),
+        }
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        return verify_payment_signature(order_id, payment_id, signature, self.key_secret)
+
+    def as_transport(self) -> httpx.MockTransport:
+        """
+        Serve the REST routes RazorpayGateway uses from this fake, so the real
+        adapter (retries, pooling, error mapping) can run without network access.
+        """
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            parts = request.url.path.strip("/").split("/")[1:]  # drop the /v1 prefix
+            try:
+                if request.method == "POST" and parts == ["orders"]:
+                    body = await self.create_order(json.loads(request.content))
+                elif request.method == "GET" and parts[:1] == ["orders"] and len(parts) == 2:
+                    body = await self.fetch_order(parts[1])
+                elif request.method == "GET" and parts[:1] == ["payments"] and len(parts) == 2:
+                    body = await self.fetch_payment(parts[1])
+                elif request.method == "POST" and parts[:1] == ["payments"] and parts[-1:] == ["refund"]:
+                    body = await self.refund_payment(parts[1], json.loads(request.content or b"{}"))
+                else:
+                    return httpx.Response(404, json={"error": {"description": "Not found"}})
+            except PaymentGatewayError as e:
+                return httpx.Response(e.status_code or 500, json={"error": {"description": str(e)}})
+            return httpx.Response(200, json=body)
+
+        return httpx.MockTransport(handler)
+
+    async def close(self):
+        pass
+
+
+_gateway = None
+
+
+def check_payment_gateway_settings() -> None:
+    """
+    Refuse to start with the fake gateway (and its default key secret) unless
+    payment_gateway_allow_fake is set: it accepts any payment it signed itself
+    """
+    if settings.payment_gateway == "fake" and not settings.payment_gateway_allow_fake:
+        raise RuntimeError(
+            "PAYMENT_GATEWAY=fake is for local testing and benchmarks only; "
+            "set PAYMENT_GATEWAY_ALLOW_FAKE=true to use it"
+        )
+
+
+def get_payment_gateway():
+    """
+    Shared gateway for the configured provider, or None when Razorpay keys
+    aren't set (callers fall back to mock orders, as before).
+    """
+    global _gateway
+    if _gateway is None:
+        check_payment_gateway_settings()
+        if settings.payment_gateway == "fake":
+            _gateway = FakePaymentGateway(
+                key_id=settings.razorpay_key_id or "rzp_test_fake",
+                key_secret=settings.razorpay_key_secret or "fake_secret",
+            )
+        elif settings.razorpay_key_id and settings.razorpay_key_secret:
+            _gateway = RazorpayGateway(
+                settings.razorpay_key_id,
+                settings.razorpay_key_secret,
+                timeout=settings.payment_gateway_timeout_seconds,
+                max_retries=settings.payment_gateway_max_retries,
+                max_connections=settings.payment_gateway_max_connections,
+            )
+    return _gateway
+
+
+def set_payment_gateway(gateway) -> None:
+    """Swap the shared gateway, e.g. for a FakePaymentGateway in tests"""
+    global _gateway
+    _gateway = gateway
+
+
+async def close_payment_gateway():
+    if _gateway is not None:
+        await _gateway.close()
@@ -6,43 +6,55 @@ import os
 import uuid
 import hashlib
 import hmac
-from typing import Optional, Dict, Any, List
+from collections import Counter, defaultdict
+from typing import Optional, Dict, Any, List, Set, Tuple
 from datetime import datetime, timezone
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
+from pymongo import UpdateOne
+from app.database import transaction
+from app.services.earnings_ledger import record_sales
+from app.services.payment_gateway import get_payment_gateway
 from app.models.item_purchase import ItemPurchase, PurchaseStatus, ItemType
 from app.models.shopping_cart import ShoppingCart, CartItem
-from app.models.developer_earnings import DeveloperEarnings
 from app.models.template import Template
 from app.models.component import Component
 from app.models.user import User
 from app.utils.audit_logger import log_audit_event
 from bson import ObjectId
 
-try:
-    import razorpay
-    RAZORPAY_AVAILABLE = True
-except ImportError:
-    RAZORPAY_AVAILABLE = False
-    print("Warning: razorpay package not installed. Payment functionality will be limited.")
+
+class ItemOwnerView(BaseModel):
+    """Template/Component projection for cart checkout"""
+    id: PydanticObjectId = Field(alias="_id")
+    user_id: Optional[PydanticObjectId] = None
+
+    class Settings:
+        projection = {"_id": 1, "user_id": 1}
+
+
+class DeveloperView(BaseModel):
+    """Developer fields copied onto purchase records"""
+    id: PydanticObjectId = Field(alias="_id")
+    username: Optional[str] = None
+    name: Optional[str] = None
+    email: str = ""
+
+    class Settings:
+        projection = {"_id": 1, "username": 1, "name": 1, "email": 1}
+
+    @property
+    def display_username(self) -> str:
+        return self.username or self.name or self.email.split('@')[0]
 
 
 class PaymentService:
     """Enhanced payment service for individual item purchases"""
     
     def __init__(self):
-        # Razorpay configuration - using settings from config.py
-        from ..config import settings
-        self.razorpay_key_id = settings.razorpay_key_id
-        self.razorpay_key_secret = settings.razorpay_key_secret
-        
-        # Initialize Razorpay client if available
-        if RAZORPAY_AVAILABLE:
-            try:
-                self.razorpay_client = razorpay.Client(auth=(self.razorpay_key_id, self.razorpay_key_secret))
-            except Exception as e:
-                print(f"Failed to initialize Razorpay client: {e}")
-                self.razorpay_client = None
-        else:
-            self.razorpay_client = None
+        # Async gateway client (None when Razorpay isn't configured: mock orders are used)
+        self.gateway = get_payment_gateway()
+        self.razorpay_key_id = self.gateway.key_id if self.gateway else None
     
     async def create_item_order(self, user: User, item_id: str, item_type: str) -> Dict[str, Any]:
         """
@@ -112,9 +124,9 @@ class PaymentService:
             
             # Create Razorpay order
             razorpay_order = None
-            if self.razorpay_client:
+            if self.gateway:
                 try:
-                    razorpay_order = self.razorpay_client.order.create(data=order_data)
+                    razorpay_order = await self.gateway.create_order(order_data)
                 except Exception as e:
                     print(f"Razorpay order creation failed: {e}")
                     # Continue with mock order for development
@@ -207,19 +219,17 @@ class PaymentService:
                 raise ValueError("Purchase record not found")
             
             # Verify Razorpay signature
-            if self.razorpay_client and not razorpay_order_id.startswith("mock_"):
+            if self.gateway and not razorpay_order_id.startswith("mock_"):
                 try:
-                    # Verify signature
-                    params_dict = {
-                        'razorpay_order_id': razorpay_order_id,
-                        'razorpay_payment_id': razorpay_payment_id,
-                        'razorpay_signature': razorpay_signature
-                    }
-                    self.razorpay_client.utility.verify_payment_signature(params_dict)
+                    # Verify signature locally
+                    if not self.gateway.verify_payment_signature(
+                        razorpay_order_id, razorpay_payment_id, razorpay_signature
+                    ):
+                        raise ValueError("Invalid payment signature")
                     
                     # Get payment details from Razorpay (skip for mock payments)
                     if not razorpay_payment_id.startswith("pay_mock_"):
-                        payment_details = self.razorpay_client.payment.fetch(razorpay_payment_id)
+                        payment_details = await self.gateway.fetch_payment(razorpay_payment_id)
                         
                         # Update purchase with payment details
                         purchase.payment_gateway_response = payment_details
@@ -305,56 +315,53 @@ class PaymentService:
             
             # Create Razorpay order
             razorpay_order = None
-            if self.razorpay_client:
+            if self.gateway:
                 try:
-                    razorpay_order = self.razorpay_client.order.create(data=order_data)
+                    razorpay_order = await self.gateway.create_order(order_data)
                 except Exception as e:
                     print(f"Razorpay batch order creation failed: {e}")
             
-            # Create individual purchase records for each item
-            purchase_ids = []
+            razorpay_order_id = razorpay_order["id"] if razorpay_order else f"mock_batch_{batch_purchase_id}"
+            
+            # Fetch every item and developer up front: one $in query per collection
+            owners = await self._load_item_owners(cart_items)
+            developers = await self._load_developers({owner for owner in owners.values() if owner})
+            
+            # Build one purchase record per item and insert them together
+            purchases = []
             for cart_item in cart_items:
-                # Get item details
-                if cart_item.item_type == "template":
-                    item = await Template.get(cart_item.item_id)
-                else:
-                    item = await Component.get(cart_item.item_id)
-                
-                if not item:
-                    continue
-                
-                # Get developer
-                developer = await User.get(item.user_id)
+                developer = developers.get(owners.get((ItemType(cart_item.item_type).value, cart_item.item_id)))
                 if not developer:
                     continue
                 
-                # Create individual purchase record
-                purchase_id = f"PUR_{int(datetime.now(timezone.utc).timestamp())}_{uuid.uuid4().hex[:8]}"
                 purchase = ItemPurchase(
-                    purchase_id=purchase_id,
+                    purchase_id=f"PUR_{int(datetime.now(timezone.utc).timestamp())}_{uuid.uuid4().hex[:8]}",
                     user_id=user.id,
                     item_id=cart_item.item_id,
                     item_type=ItemType(cart_item.item_type),
                     item_title=cart_item.item_title,
                     developer_id=developer.id,
-                    developer_username=developer.username,
+                    developer_username=developer.display_username,
                     original_price_inr=cart_item.price_inr,
                     original_price_usd=cart_item.price_usd,
                     paid_amount_inr=cart_item.price_inr,
                     paid_currency="INR",
-                    razorpay_order_id=razorpay_order["id"] if razorpay_order else f"mock_batch_{batch_purchase_id}",
+                    developer_earnings_inr=0,
+                    platform_fee_inr=0,
+                    razorpay_order_id=razorpay_order_id,
                     status=PurchaseStatus.PENDING
                 )
-                
                 purchase.calculate_revenue_split()
-                await purchase.insert()
-                purchase_ids.append(purchase_id)
+                purchases.append(purchase)
+            
+            if purchases:
+                await ItemPurchase.insert_many(purchases)
             
             return {
                 "success": True,
                 "batch_purchase_id": batch_purchase_id,
-                "purchase_ids": purchase_ids,
-                "razorpay_order_id": razorpay_order["id"] if razorpay_order else f"mock_batch_{batch_purchase_id}",
+                "purchase_ids": [purchase.purchase_id for purchase in purchases],
+                "razorpay_order_id": razorpay_order_id,
                 "total_amount_inr": total_amount_inr,
                 "amount_paisa": amount_paisa,
                 "currency": "INR",
@@ -389,36 +396,28 @@ class PaymentService:
                 raise ValueError("No pending purchases found for this order")
             
             # Verify signature (similar to individual item)
-            if self.razorpay_client and not razorpay_order_id.startswith("mock_"):
+            if self.gateway and not razorpay_order_id.startswith("mock_"):
                 try:
-                    params_dict = {
-                        'razorpay_order_id': razorpay_order_id,
-                        'razorpay_payment_id': razorpay_payment_id,
-                        'razorpay_signature': razorpay_signature
-                    }
-                    self.razorpay_client.utility.verify_payment_signature(params_dict)
+                    if not self.gateway.verify_payment_signature(
+                        razorpay_order_id, razorpay_payment_id, razorpay_signature
+                    ):
+                        raise ValueError("Invalid payment signature")
                 except Exception as e:
                     print(f"Cart payment verification failed: {e}")
                     if not razorpay_order_id.startswith("mock_"):
                         raise ValueError("Payment verification failed")
             
-            # Mark all purchases as completed
-            completed_items = []
-            for purchase in purchases:
-                purchase.mark_completed(razorpay_payment_id, razorpay_signature)
-                await purchase.save()
-                
-                # Update developer earnings
-                await self._update_developer_earnings(purchase)
-                
-                # Update item sales count
-                await self._update_item_sales_count(purchase)
-                
-                completed_items.append({
+            # Complete the purchases and credit developers and items in one transaction
+            await self._complete_cart_purchases(purchases, razorpay_payment_id, razorpay_signature)
+            
+            completed_items = [
+                {
                     "id": str(purchase.item_id),
                     "title": purchase.item_title,
                     "type": purchase.item_type
-                })
+                }
+                for purchase in purchases
+            ]
             
             return {
                 "success": True,
@@ -434,26 +433,99 @@ class PaymentService:
                 "error": str(e)
             }
     
+    async def _load_item_owners(self, cart_items: List[CartItem]) -> Dict[Tuple[str, PydanticObjectId], Optional[PydanticObjectId]]:
+        """Map (item_type, item_id) to the owning developer's ID with one query per item collection"""
+        ids_by_type: Dict[str, List[PydanticObjectId]] = defaultdict(list)
+        for cart_item in cart_items:
+            ids_by_type[ItemType(cart_item.item_type).value].append(cart_item.item_id)
+        
+        owners = {}
+        for item_type, ItemModel in (("template", Template), ("component", Component)):
+            if not ids_by_type.get(item_type):
+                continue
+            async for item in ItemModel.find({"_id": {"$in": ids_by_type[item_type]}}).project(ItemOwnerView):
+                owners[(item_type, item.id)] = item.user_id
+        return owners
+    
+    async def _load_developers(self, developer_ids: Set[PydanticObjectId]) -> Dict[PydanticObjectId, "DeveloperView"]:
+        """Fetch developers by ID in a single $in query"""
+        if not developer_ids:
+            return {}
+        developers = await User.find({"_id": {"$in": list(developer_ids)}}).project(DeveloperView).to_list()
+        return {developer.id: developer for developer in developers}
+    
+    async def _complete_cart_purchases(
+        self,
+        purchases: List[ItemPurchase],
+        razorpay_payment_id: str,
+        razorpay_signature: str
+    ):
+        """
+        Mark purchases completed and apply earnings and sales counters with
+        grouped bulk writes: one summary update per developer and one per item.
+        """
+        for purchase in purchases:
+            purchase.mark_completed(razorpay_payment_id, razorpay_signature)
+        now = purchases[0].payment_completed_at
+        completed = {"$set": {
+            "status": PurchaseStatus.COMPLETED.value,
+            "razorpay_payment_id": razorpay_payment_id,
+            "razorpay_signature": razorpay_signature,
+            "payment_completed_at": now,
+            "access_granted": True,
+            "updated_at": now
+        }}
+        
+        purchase_collection = ItemPurchase.get_pymongo_collection()
+        async with transaction(purchase_collection.database.client) as session:
+            if session is not None:
+                result = await purchase_collection.update_many(
+                    {
+                        "_id": {"$in": [purchase.id for purchase in purchases]},
+                        "status": PurchaseStatus.PENDING.value
+                    },
+                    completed,
+                    session=session
+                )
+                if result.modified_count != len(purchases):
+                    # Another request verified (part of) this order first; the transaction rolls back
+                    raise ValueError("Order is already being verified")
+                claimed = purchases
+            else:
+                # No transaction (standalone server): claim purchases one by one, so a concurrent
+                # verification of the same order splits it and each request credits what it claimed
+                claimed = []
+                for purchase in purchases:
+                    result = await purchase_collection.update_one(
+                        {"_id": purchase.id, "status": PurchaseStatus.PENDING.value},
+                        completed
+                    )
+                    if result.modified_count:
+                        claimed.append(purchase)
+                if not claimed:
+                    raise ValueError("Order is already being verified")
+            
+            await record_sales(claimed, session=session)
+            
+            sales_by_item: Dict[str, Counter] = {"template": Counter(), "component": Counter()}
+            for purchase in claimed:
+                sales_by_item[ItemType(purchase.item_type).value][purchase.item_id] += 1
+            for item_type, ItemModel in (("template", Template), ("component", Component)):
+                if sales_by_item[item_type]:
+                    await ItemModel.get_pymongo_collection().bulk_write(
+                        [
+                            UpdateOne({"_id": item_id}, {"$inc": {"purchase_count": count}})
+                            for item_id, count in sales_by_item[item_type].items()
+                        ],
+                        ordered=False,
+                        session=session
+                    )
+    
+
     async def _update_developer_earnings(self, purchase: ItemPurchase):
         """Update developer earnings after successful purchase"""
         try:
-            # Get or create developer earnings record
-            earnings = await DeveloperEarnings.find_one({"developer_id": purchase.developer_id})
-            if not earnings:
-                earnings = DeveloperEarnings(
-                    developer_id=purchase.developer_id,
-                    developer_username=purchase.developer_username
-                )
-            
-            # Add sale earnings
-            earnings.add_sale_earnings(
-                purchase.paid_amount_inr,
-                str(purchase.item_id),
-                purchase.item_type
-            )
-            
-            await earnings.save()
-            
+            await record_sales([purchase])
         except Exception as e:
             print(f"Update developer earnings error: {e}")
     
@@ -0,0 +1,156 @@
+"""
+Health of LLM providers, per (provider, model).
+
+Every upstream call records its latency and whether the provider failed
+(timeouts, connection errors, 429 and 5xx; a 400 is the caller's fault and
+counts as healthy). From a rolling window of those outcomes:
+
+- a circuit breaker opens after llm_breaker_consecutive_failures failures in a
+  row, or once the window holds llm_breaker_min_requests calls with an error
+  rate of at least llm_breaker_error_rate. While open, calls skip the provider
+  (the proxy fails over instead of waiting for another timeout). After
+  llm_breaker_open_seconds one trial call is let through: success closes the
+  breaker, failure keeps it open for another period.
+- hedge_delay() is the window's p95 success latency, used to decide when a
+  slow call is worth racing against a second one.
+
+State is per worker process; each worker learns about a degraded provider
+from its own calls.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.config import settings
+from app.utils.metrics import llm_circuit_state
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class ProviderHealth:
+    """Rolling outcomes and breaker state for one (provider, model)"""
+
+    MAX_SAMPLES = 512
+
+    def __init__(self):
+        # (monotonic time, latency seconds, ok)
+        self.samples: Deque[Tuple[float, float, bool]] = deque(maxlen=self.MAX_SAMPLES)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def _prune(self, now: float) -> None:
+        horizon = now - settings.llm_health_window_seconds
+        while self.samples and self.samples[0][0] < horizon:
+            self.samples.popleft()
+
+    def error_rate(self) -> float:
+        self._prune(time.monotonic())
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, _, ok in self.samples if not ok) / len(self.samples)
+
+    def p95(self) -> Optional[float]:
+        """p95 latency of successful calls, once there are enough to trust it"""
+        self._prune(time.monotonic())
+        latencies = sorted(latency for _, latency, ok in self.samples if ok)
+        if len(latencies) < settings.llm_hedge_min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+
+class ProviderHealthRegistry:
+    """Breakers and latency windows for every (provider, model) this worker has called"""
+
+    def __init__(self):
+        self._health: Dict[Tuple[str, str], ProviderHealth] = {}
+
+    def _get(self, provider: str, model: str) -> ProviderHealth:
+        health = self._health.get((provider, model))
+        if health is None:
+            health = self._health[(provider, model)] = ProviderHealth()
+        return health
+
+    def _set_state(self, provider: str, model: str, health: ProviderHealth, state: str) -> None:
+        if health.state != state:
+            if state == OPEN:
+                logger.warning(f"Circuit open for {provider}/{model} "
+                               f"(error rate {health.error_rate():.0%}, {health.consecutive_failures} failures in a row)")
+            elif state == CLOSED:
+                logger.info(f"Circuit closed for {provider}/{model}")
+            health.state = state
+            llm_circuit_state(provider, model).set(STATE_VALUES[state])
+
+    def allow(self, provider: str, model: str) -> bool:
+        """Whether to call the provider now; claims the trial call of an open breaker"""
+        health = self._get(provider, model)
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN:
+            if time.monotonic() - health.opened_at < settings.llm_breaker_open_seconds:
+                return False
+            self._set_state(provider, model, health, HALF_OPEN)
+        if health.trial_in_flight:
+            return False
+        health.trial_in_flight = True
+        return True
+
+    def record(self, provider: str, model: str, latency: float, ok: bool) -> None:
+        health = self._get(provider, model)
+        now = time.monotonic()
+        health.samples.append((now, latency, ok))
+        health.trial_in_flight = False
+
+        if ok:
+            health.consecutive_failures = 0
+            if health.state == HALF_OPEN:
+                self._set_state(provider, model, health, CLOSED)
+            return
+
+        health.consecutive_failures += 1
+        if health.state == HALF_OPEN or (
+            health.state == CLOSED and (
+                health.consecutive_failures >= settings.llm_breaker_consecutive_failures
+                or (len(health.samples) >= settings.llm_breaker_min_requests
+                    and health.error_rate() >= settings.llm_breaker_error_rate)
+            )
+        ):
+            health.opened_at = now
+            self._set_state(provider, model, health, OPEN)
+
+    def cancelled(self, provider: str, model: str) -> None:
+        """A call was abandoned (e.g. lost a hedge race) without an outcome"""
+        self._get(provider, model).trial_in_flight = False
+
+    def hedge_delay(self, provider: str, model: str) -> Optional[float]:
+        """How long to wait before hedging a call, or None without enough history"""
+        p95 = self._get(provider, model).p95()
+        if p95 is None:
+            return None
+        return max(p95, settings.llm_hedge_min_delay_seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            f"{provider}/{model}": {
+                "state": health.state,
+                "error_rate": round(health.error_rate(), 4),
+                "p95_seconds": health.p95(),
+                "calls_in_window": len(health.samples),
+            }
+            for (provider, model), health in self._health.items()
+        }
+
+    def reset(self) -> None:
+        self._health.clear()
+
+
+# Global provider health registry
+provider_health = ProviderHealthRegistry()
@@ -1,6 +1,6 @@
 """Razorpay payment service for handling payments in INR."""
 
-import razorpay
+import asyncio
 import os
 from typing import Dict, Any, Optional
 from decimal import Decimal
@@ -8,6 +8,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime, timezone
 import logging
 from ..config import settings
+from .payment_gateway import get_payment_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +18,12 @@ class RazorpayService:
     
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self.client = razorpay.Client(
-            auth=(
-                settings.razorpay_key_id,
-                settings.razorpay_key_secret
-            )
-        )
+        self.gateway = get_payment_gateway()
+    
+    def _require_gateway(self):
+        if self.gateway is None:
+            raise RuntimeError("Razorpay is not configured (set RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET)")
+        return self.gateway
     
     async def create_order(
         self, 
@@ -61,7 +62,7 @@ class RazorpayService:
             }
             
             # Create order with Razorpay
-            order = self.client.order.create(data=order_data)
+            order = await self._require_gateway().create_order(order_data)
             
             # Store order in database
             await self._store_order(order, user_id, plan_name, amount_inr)
@@ -105,19 +106,17 @@ class RazorpayService:
             Dict containing verification result
         """
         try:
-            # Verify signature
-            params_dict = {
-                'razorpay_order_id': razorpay_order_id,
-                'razorpay_payment_id': razorpay_payment_id,
-                'razorpay_signature': razorpay_signature
-            }
+            gateway = self._require_gateway()
             
-            # This will raise an exception if signature is invalid
-            self.client.utility.verify_payment_signature(params_dict)
+            # Verify signature locally
+            if not gateway.verify_payment_signature(razorpay_order_id, razorpay_payment_id, razorpay_signature):
+                raise ValueError("Razorpay signature verification failed")
             
-            # Get payment details
-            payment = self.client.payment.fetch(razorpay_payment_id)
-            order = self.client.order.fetch(razorpay_order_id)
+            # Get payment and order details concurrently
+            payment, order = await asyncio.gather(
+                gateway.fetch_payment(razorpay_payment_id),
+                gateway.fetch_order(razorpay_order_id)
+            )
             
             # Update order status in database
             await self._update_order_status(
@@ -152,7 +151,7 @@ class RazorpayService:
     async def get_payment_details(self, payment_id: str) -> Dict[str, Any]:
         """Get payment details from Razorpay."""
         try:
-            payment = self.client.payment.fetch(payment_id)
+            payment = await self._require_gateway().fetch_payment(payment_id)
             return payment
         except Exception as e:
             logger.error(f"Failed to fetch payment details: {str(e)}")
@@ -165,7 +164,7 @@ class RazorpayService:
             if amount:
                 refund_data["amount"] = amount
             
-            refund = self.client.payment.refund(payment_id, refund_data)
+            refund = await self._require_gateway().refund_payment(payment_id, refund_data)
             return refund
         except Exception as e:
             logger.error(f"Failed to refund payment: {str(e)}")
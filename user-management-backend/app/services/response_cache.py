@@ -0,0 +1,266 @@
+"""
+HTTP response cache for public catalog reads.
+Anonymous GET responses are cached per path + normalized query in a two-tier
+store (in-process LRU in front of Redis) and served with ETag and
+stale-while-revalidate validators. Content writes invalidate a tag by bumping
+its generation counter, which every worker picks up within a second.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import redis.asyncio as aioredis
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.config import settings
+from app.services.cache_service import LRUCache
+from app.utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Tags shared by the catalog routes and the write paths that invalidate them
+TEMPLATES_TAG = "templates"
+COMPONENTS_TAG = "components"
+
+
+class CachedResponse:
+    """A serialized response body and its validators"""
+    __slots__ = ("body", "etag", "stored_at")
+
+    def __init__(self, body: bytes, etag: str, stored_at: float):
+        self.body = body
+        self.etag = etag
+        self.stored_at = stored_at
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def is_anonymous(request: Request) -> bool:
+    """True when the request carries no credentials"""
+    return "authorization" not in request.headers and "x-api-key" not in request.headers
+
+
+def normalized_request_key(request: Request) -> str:
+    """Hash of the path and sorted, non-empty query parameters"""
+    query = sorted((k, v) for k, v in request.query_params.multi_items() if v != "")
+    raw = f"{request.url.path.rstrip('/')}?{urlencode(query)}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+class ResponseCache:
+    """Two-tier cache of serialized public responses"""
+
+    # Skip Redis for this long after a connection failure
+    REDIS_RETRY_SECONDS = 30.0
+
+    def __init__(
+        self,
+        prefix: str = "http",
+        max_entries: int = 1024,
+        generation_check_seconds: float = 1.0,
+    ):
+        self.prefix = prefix
+        self.local = LRUCache(max_entries)
+        self.generation_check_seconds = generation_check_seconds
+        self._redis: Optional[aioredis.Redis] = None
+        self._redis_retry_at = 0.0
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._pending: Dict[str, "asyncio.Future[CachedResponse]"] = {}
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        if time.monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(
+                settings.redis_url,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5,
+            )
+        return self._redis
+
+    def _redis_failed(self, error: Exception) -> None:
+        logger.warning(f"Response cache Redis error, using local cache only: {error}")
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+
+    def _generation_key(self, tag: str) -> str:
+        return f"{self.prefix}:gen:{tag}"
+
+    async def _generation(self, tag: str) -> int:
+        now = time.monotonic()
+        cached = self._generations.get(tag)
+        if cached and now - cached[1] < self.generation_check_seconds:
+            return cached[0]
+
+        generation = cached[0] if cached else 0
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                generation = int(await redis.get(self._generation_key(tag)) or 0)
+            except Exception as e:
+                self._redis_failed(e)
+
+        self._generations[tag] = (generation, now)
+        return generation
+
+    async def invalidate(self, *tags: str) -> None:
+        """Invalidate every cached response for the given tags"""
+        now = time.monotonic()
+        redis = self._get_redis()
+        for tag in tags:
+            local_generation = self._generations.get(tag, (0, now))[0] + 1
+            generation = local_generation
+            if redis is not None:
+                try:
+                    generation = max(local_generation, await redis.incr(self._generation_key(tag)))
+                except Exception as e:
+                    self._redis_failed(e)
+            self._generations[tag] = (generation, now)
+
+    async def _load(self, key: str) -> Optional[CachedResponse]:
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+
+        redis = self._get_redis()
+        if redis is None:
+            return None
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.hgetall(key)
+            pipe.ttl(key)
+            data, ttl = await pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+        if not data or ttl <= 0:
+            return None
+
+        entry = CachedResponse(
+            body=data[b"body"],
+            etag=data[b"etag"].decode(),
+            stored_at=float(data[b"stored_at"]),
+        )
+        self.local.set(key, entry, ttl)
+        return entry
+
+    async def _store(self, key: str, content: Any, ttl: int) -> CachedResponse:
+        body = dumps(content)
+        entry = CachedResponse(
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            stored_at=time.time(),
+        )
+        self.local.set(key, entry, ttl)
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                pipe = redis.pipeline(transaction=False)
+                pipe.hset(key, mapping={"body": body, "etag": entry.etag, "stored_at": str(entry.stored_at)})
+                pipe.expire(key, ttl)
+                await pipe.execute()
+            except Exception as e:
+                self._redis_failed(e)
+        return entry
+
+    async def _build_once(self, key: str, build: Callable[[], Awaitable[Any]], ttl: int) -> CachedResponse:
+        """Build and store a response, sharing one build between concurrent callers"""
+        future = self._pending.get(key)
+        if future is None:
+            async def _run():
+                return await self._store(key, await build(), ttl)
+
+            future = asyncio.ensure_future(_run())
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    def _refresh_in_background(self, key: str, build: Callable[[], Awaitable[Any]], ttl: int) -> None:
+        if key in self._pending:
+            return
+
+        async def _refresh():
+            try:
+                await self._build_once(key, build, ttl)
+            except Exception as e:
+                logger.warning(f"Background refresh of {key} failed: {e}")
+
+        asyncio.ensure_future(_refresh())
+
+    async def serve(
+        self,
+        request: Request,
+        tag: str,
+        build: Callable[[], Awaitable[Any]],
+        max_age: Optional[int] = None,
+        stale_while_revalidate: Optional[int] = None,
+    ) -> Response:
+        """
+        Serve a public response from cache, building it with `build` on a miss.
+
+        Authenticated requests bypass the cache. Stale entries within the
+        stale-while-revalidate window are served immediately while a single
+        background rebuild refreshes them.
+        """
+        if max_age is None:
+            max_age = settings.catalog_cache_max_age
+        if stale_while_revalidate is None:
+            stale_while_revalidate = settings.catalog_cache_stale_while_revalidate
+
+        if request.method not in ("GET", "HEAD") or not is_anonymous(request):
+            return Response(
+                content=dumps(await build()),
+                media_type="application/json",
+                headers={"Cache-Control": "private, no-cache"}
+            )
+
+        ttl = max_age + stale_while_revalidate
+        generation = await self._generation(tag)
+        key = f"{self.prefix}:{tag}:{generation}:{normalized_request_key(request)}"
+
+        entry = await self._load(key)
+        if entry is None or time.time() - entry.stored_at >= ttl:
+            entry = await self._build_once(key, build, ttl)
+        elif time.time() - entry.stored_at >= max_age:
+            self._refresh_in_background(key, build, ttl)
+
+        # max-age counts from when the entry was built, not from this response
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}",
+            "Age": str(max(0, int(time.time() - entry.stored_at))),
+        }
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# Global response cache instance
+response_cache = ResponseCache(max_entries=settings.catalog_cache_max_entries)
+
+
+async def invalidate_catalog(*tags: str) -> None:
+    """Invalidate cached catalog responses after a content write or approval change"""
+    try:
+        await response_cache.invalidate(*(tags or (TEMPLATES_TAG, COMPONENTS_TAG)))
+    except Exception as e:
+        logger.warning(f"Catalog cache invalidation failed: {e}")
@@ -2,8 +2,9 @@
 Screenshot service for capturing website previews.
 Uses Playwright to capture screenshots of websites.
 """
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import Response, JSONResponse
+from fastapi import APIRouter, HTTPException, Query, Request, Depends, File, Form, UploadFile
+from fastapi.responses import Response, JSONResponse, RedirectResponse
+from typing import Optional
 import asyncio
 import hashlib
 import os
@@ -11,9 +12,23 @@ from pathlib import Path
 from datetime import datetime, timezone
 import logging
 
+from app.middleware.auth import require_admin
+from app.services.thumbnail_service import (
+    THUMBNAIL_DIR,
+    THUMBNAIL_FILENAME_RE,
+    THUMBNAIL_SIZES,
+    MEDIA_TYPES,
+    IMMUTABLE_CACHE_CONTROL,
+    generate_thumbnails,
+    schedule_thumbnails,
+    negotiate_format,
+    thumbnail_etag,
+)
+from app.utils.serialization import FastJSONRoute
+
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 # Cache directory for screenshots
 CACHE_DIR = Path("/tmp/screenshots")
@@ -22,6 +37,10 @@ CACHE_DIR.mkdir(exist_ok=True)
 # In-memory cache for screenshot URLs
 screenshot_cache = {}
 
+# Largest preview image accepted by the upload endpoint
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
 async def capture_screenshot(url: str, width: int = 1280, height: int = 720) -> bytes:
     """
     Capture a screenshot of a website using Playwright.
@@ -101,6 +120,53 @@ def get_cache_path(url: str) -> Path:
     url_hash = hashlib.md5(url.encode()).hexdigest()
     return CACHE_DIR / f"{url_hash}.png"
 
+def normalize_url(url: str) -> str:
+    """Default bare hostnames to https."""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+async def load_or_capture(url: str, width: int = 1280, height: int = 720) -> bytes:
+    """Return the cached screenshot for a URL, capturing (and thumbnailing) it on a miss."""
+    cache_path = get_cache_path(url)
+    
+    if cache_path.exists():
+        # Return cached screenshot
+        with open(cache_path, 'rb') as f:
+            return f.read()
+    
+    # Capture new screenshot
+    try:
+        screenshot_data = await capture_screenshot(url, width, height)
+        
+        # Save to cache
+        with open(cache_path, 'wb') as f:
+            f.write(screenshot_data)
+        
+        # Pre-render card thumbnails off the request path
+        schedule_thumbnails(screenshot_data)
+        return screenshot_data
+            
+    except Exception as e:
+        logger.error(f"Screenshot capture failed: {e}")
+        # Generate placeholder on error
+        return generate_placeholder_image(url, width, height)
+
+def thumbnail_urls(manifest: dict) -> dict:
+    """Map a thumbnail manifest to public variant URLs."""
+    return {
+        size_name: {
+            fmt: {
+                "url": f"/api/screenshot/thumbs/{entry['file']}",
+                "bytes": entry["bytes"],
+                "width": entry["width"],
+                "height": entry["height"],
+            }
+            for fmt, entry in formats.items()
+        }
+        for size_name, formats in manifest["variants"].items()
+    }
+
 @router.get("/screenshot")
 async def get_screenshot(
     url: str = Query(..., description="URL of the website to screenshot"),
@@ -116,29 +182,8 @@ async def get_screenshot(
     - **height**: Screenshot height (default: 720)
     - **format**: Response format - 'image' returns PNG, 'url' returns JSON with data URL
     """
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url
-    
-    # Check cache
-    cache_path = get_cache_path(url)
-    
-    if cache_path.exists():
-        # Return cached screenshot
-        with open(cache_path, 'rb') as f:
-            screenshot_data = f.read()
-    else:
-        # Capture new screenshot
-        try:
-            screenshot_data = await capture_screenshot(url, width, height)
-            
-            # Save to cache
-            with open(cache_path, 'wb') as f:
-                f.write(screenshot_data)
-                
-        except Exception as e:
-            logger.error(f"Screenshot capture failed: {e}")
-            # Generate placeholder on error
-            screenshot_data = generate_placeholder_image(url, width, height)
+    url = normalize_url(url)
+    screenshot_data = await load_or_capture(url, width, height)
     
     if format == "url":
         import base64
@@ -169,3 +214,128 @@ async def clear_screenshot_cache():
         count += 1
     
     return {"success": True, "cleared": count}
+
+@router.get("/screenshot/thumbnails")
+async def get_screenshot_thumbnails(
+    url: str = Query(..., description="URL of the website to screenshot")
+):
+    """
+    List the pre-rendered thumbnail variants of a website screenshot.
+    
+    Variants are generated on first request if the capture predates the
+    thumbnail pipeline.
+    """
+    url = normalize_url(url)
+    screenshot_data = await load_or_capture(url)
+    
+    try:
+        manifest = await generate_thumbnails(screenshot_data)
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Thumbnail encoding is not available")
+    
+    return {
+        "success": True,
+        "url": url,
+        "source_bytes": manifest["source_bytes"],
+        "variants": thumbnail_urls(manifest)
+    }
+
+@router.get("/screenshot/thumbnail")
+async def get_screenshot_thumbnail(
+    request: Request,
+    url: str = Query(..., description="URL of the website to screenshot"),
+    size: str = Query("md", description="Card size: 'sm', 'md' or 'lg'")
+):
+    """
+    Redirect to the best thumbnail variant for the client's Accept header.
+    
+    The redirect target is content-addressed and cached immutably; only this
+    negotiation step is revalidated.
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown thumbnail size: {size}")
+    
+    url = normalize_url(url)
+    screenshot_data = await load_or_capture(url)
+    
+    try:
+        manifest = await generate_thumbnails(screenshot_data)
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Thumbnail encoding is not available")
+    
+    available = manifest["variants"].get(size, {})
+    fmt = negotiate_format(request.headers.get("accept"), available)
+    if fmt is None:
+        raise HTTPException(status_code=404, detail="No thumbnail variant available")
+    
+    return RedirectResponse(
+        url=f"/api/screenshot/thumbs/{available[fmt]['file']}",
+        status_code=307,
+        headers={
+            "Cache-Control": "public, max-age=3600",
+            "Vary": "Accept"
+        }
+    )
+
+@router.get("/screenshot/thumbs/{filename}")
+async def get_thumbnail_file(filename: str, request: Request):
+    """Serve a content-addressed thumbnail variant with a strong ETag."""
+    if not THUMBNAIL_FILENAME_RE.match(filename):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    
+    path = THUMBNAIL_DIR / filename
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    
+    etag = thumbnail_etag(filename)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL
+    }
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    
+    extension = filename.rsplit(".", 1)[1]
+    media_type = MEDIA_TYPES["jpeg" if extension == "jpg" else extension]
+    with open(path, 'rb') as f:
+        data = f.read()
+    return Response(content=data, media_type=media_type, headers=headers)
+
+@router.post("/screenshot/upload")
+async def upload_screenshot(
+    file: UploadFile = File(..., description="Preview image"),
+    url: Optional[str] = Form(None, description="Website URL this preview belongs to"),
+    current_user = Depends(require_admin)
+):
+    """
+    Upload a preview image and pre-render its thumbnail variants.
+    
+    PNG uploads tied to a URL also replace the cached screenshot for that URL.
+    """
+    data = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Preview image too large")
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    
+    try:
+        manifest = await generate_thumbnails(data)
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Thumbnail encoding is not available")
+    except Exception as e:
+        logger.error(f"Thumbnail generation failed for upload: {e}")
+        raise HTTPException(status_code=400, detail="Unsupported or corrupt image")
+    
+    if url and data.startswith(PNG_SIGNATURE):
+        url = normalize_url(url)
+        with open(get_cache_path(url), 'wb') as f:
+            f.write(data)
+    
+    return {
+        "success": True,
+        "url": url,
+        "source_bytes": manifest["source_bytes"],
+        "variants": thumbnail_urls(manifest)
+    }
@@ -1,128 +1,436 @@
 """
 Background jobs for subscription management.
-Run these jobs daily via cron or a scheduler like APScheduler.
+The daily jobs stream matching users from a cursor in _id order, process them in
+batches with bounded concurrency, and checkpoint progress so an interrupted run
+resumes where it stopped. SubscriptionJobScheduler runs them inside the app;
+run_daily_subscription_jobs() can still be called from cron.
 """
 
+import asyncio
 import logging
+import os
+import socket
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from app.models.user import User
-from app.services.subscription_service import PlanSubscriptionService
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.models.job_checkpoint import JobCheckpoint
+from app.models.user import User, SubscriptionPlan
+from app.services.key_pool_allocator import release_pool_keys
 from app.utils.email_service import email_service
 
 logger = logging.getLogger(__name__)
 
+PAID_TIERS = [SubscriptionPlan.PRO.value, SubscriptionPlan.ULTRA.value]
+
+# A run holds its checkpoint lease this long without progress before another worker may take over
+LEASE_SECONDS = 600
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SubscriptionUserView(BaseModel):
+    """The user fields the jobs and notification emails need"""
+    id: PydanticObjectId = Field(alias="_id")
+    email: str
+    name: Optional[str] = None
+    full_name: Optional[str] = None
+    subscription_end_date: Optional[datetime] = None
+
+    class Settings:
+        projection = {"_id": 1, "email": 1, "name": 1, "full_name": 1, "subscription_end_date": 1}
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Mongo returns naive datetimes; treat them as UTC"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def _stream_batches(
+    query: Dict[str, Any],
+    after_id: Optional[PydanticObjectId],
+    batch_size: int,
+) -> AsyncIterator[List[SubscriptionUserView]]:
+    """Stream users matching `query` in _id order, yielding fixed-size batches"""
+    if after_id is not None:
+        query = {**query, "_id": {"$gt": after_id}}
+
+    batch: List[SubscriptionUserView] = []
+    async for user in User.find(query).sort("+_id").project(SubscriptionUserView):
+        batch.append(user)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _run_bounded(
+    items: List[Any],
+    handler: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+) -> Tuple[int, int]:
+    """Run `handler` over items with at most `concurrency` in flight; returns (succeeded, failed)"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item) -> bool:
+        async with semaphore:
+            try:
+                return bool(await handler(item))
+            except Exception as e:
+                logger.error(f"Subscription job failed for {getattr(item, 'email', item)}: {e}")
+                return False
+
+    results = await asyncio.gather(*(run(item) for item in items))
+    succeeded = sum(results)
+    return succeeded, len(results) - succeeded
+
+
+async def _acquire_checkpoint(name: str) -> Optional[JobCheckpoint]:
+    """
+    Take the lease on a job run's checkpoint, creating it if needed.
+    Returns None while another worker holds an unexpired lease.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await JobCheckpoint.get_pymongo_collection().find_one_and_update(
+            {
+                "name": name,
+                "$or": [
+                    {"lease_expires_at": None},
+                    {"lease_expires_at": {"$lt": now}},
+                    {"lease_owner": WORKER_ID},
+                ],
+            },
+            {
+                "$set": {
+                    "lease_owner": WORKER_ID,
+                    "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+                    "updated_at": now,
+                },
+                "$setOnInsert": {
+                    "status": "running",
+                    "last_id": None,
+                    "pending_ids": [],
+                    "processed": 0,
+                    "failed": 0,
+                    "started_at": now,
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The checkpoint exists and its lease belongs to someone else
+        return None
+    return await JobCheckpoint.find_one(JobCheckpoint.name == name)
+
+
+async def _save_progress(checkpoint: JobCheckpoint, **fields) -> None:
+    """Persist checkpoint fields and extend the lease"""
+    now = datetime.now(timezone.utc)
+    fields.update({
+        "updated_at": now,
+        "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+    })
+    await checkpoint.set(fields)
+
+
+async def _finish(checkpoint: JobCheckpoint, status: str = "completed", error: Optional[str] = None) -> None:
+    now = datetime.now(timezone.utc)
+    await checkpoint.set({
+        "status": status,
+        "error": error,
+        "completed_at": now if status == "completed" else None,
+        "updated_at": now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+    })
+
 
-async def check_expiring_subscriptions(days_before: int = 3) -> int:
+async def check_expiring_subscriptions(
+    days_before: int = 3,
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+) -> int:
     """
     Find users whose subscriptions are expiring soon and send reminder emails.
-    
+    Runs at most once per day; a rerun after an interruption only reminds the
+    users that weren't reached.
+
     Args:
         days_before: Days before expiry to send reminder (default: 3)
-    
+        concurrency: Emails in flight at once (default: settings.subscription_jobs_concurrency)
+        batch_size: Users per batch (default: settings.subscription_jobs_batch_size)
+
     Returns:
-        Number of reminder emails sent
+        Number of reminder emails sent in this run
     """
+    concurrency = concurrency or settings.subscription_jobs_concurrency
+    batch_size = batch_size or settings.subscription_jobs_batch_size
     now = datetime.now(timezone.utc)
     expiry_threshold = now + timedelta(days=days_before)
-    
+
+    checkpoint = await _acquire_checkpoint(f"expiring_reminders:{now.date().isoformat()}")
+    if checkpoint is None:
+        logger.info("Expiry reminders are already running in another worker")
+        return 0
+    if checkpoint.status == "completed":
+        logger.info("Expiry reminders were already sent today")
+        await _finish(checkpoint)
+        return 0
+
+    async def remind(user: SubscriptionUserView) -> bool:
+        days_remaining = (_as_utc(user.subscription_end_date) - now).days
+        return await email_service.send_subscription_expiring_email(user, days_remaining)
+
     # Find users expiring within the threshold
-    expiring_users = await User.find({
-        "subscription_end_date": {
-            "$gt": now,
-            "$lt": expiry_threshold
-        },
-        "subscription": {"$in": ["pro", "ultra"]}
-    }).to_list()
-    
+    query = {
+        "subscription_end_date": {"$gt": now, "$lt": expiry_threshold},
+        "subscription": {"$in": PAID_TIERS}
+    }
+
     sent_count = 0
-    for user in expiring_users:
-        try:
-            days_remaining = (user.subscription_end_date - now).days
-            await email_service.send_subscription_expiring_email(user, days_remaining)
-            sent_count += 1
-            logger.info(f"Sent expiry reminder to {user.email} ({days_remaining} days remaining)")
-        except Exception as e:
-            logger.error(f"Failed to send expiry reminder to {user.email}: {e}")
-    
+    try:
+        async for batch in _stream_batches(query, checkpoint.last_id, batch_size):
+            sent, failed = await _run_bounded(batch, remind, concurrency)
+            sent_count += sent
+            checkpoint.processed += sent
+            checkpoint.failed += failed
+            await _save_progress(
+                checkpoint,
+                last_id=batch[-1].id,
+                processed=checkpoint.processed,
+                failed=checkpoint.failed,
+            )
+    except Exception as e:
+        await _finish(checkpoint, status="failed", error=str(e))
+        raise
+
+    await _finish(checkpoint)
     logger.info(f"Sent {sent_count} subscription expiry reminders")
     return sent_count
 
 
-async def check_expired_subscriptions(db=None) -> int:
+async def downgrade_users(user_ids: List[PydanticObjectId], now: Optional[datetime] = None) -> List[SubscriptionUserView]:
+    """
+    Downgrade a batch of expired users to the free tier and release their pool keys.
+
+    Users who renewed after being selected are left alone. Returns the users
+    that are on the free tier afterwards, including any already downgraded by
+    an interrupted earlier run.
+    """
+    if not user_ids:
+        return []
+    now = now or datetime.now(timezone.utc)
+
+    await User.find({
+        "_id": {"$in": user_ids},
+        "subscription": {"$in": PAID_TIERS},
+        "subscription_end_date": {"$lt": now}
+    }).update({"$set": {
+        "subscription": SubscriptionPlan.FREE.value,
+        "subscription_plan": None,
+        "subscription_start_date": None,
+        "subscription_end_date": None,
+        "glm_api_key": None,
+        "bytez_api_key": None,
+        "updated_at": now
+    }})
+
+    downgraded = await User.find({
+        "_id": {"$in": user_ids},
+        "subscription": SubscriptionPlan.FREE.value,
+        "subscription_end_date": None
+    }).project(SubscriptionUserView).to_list()
+
+    downgraded_ids = [user.id for user in downgraded]
+    if downgraded_ids:
+        # Release every pool key held by the batch in one update
+        await release_pool_keys(downgraded_ids)
+
+    return downgraded
+
+
+async def check_expired_subscriptions(
+    db=None,
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+) -> int:
     """
     Find users with expired subscriptions, downgrade them, and send notifications.
-    
+
+    Each batch is recorded as pending before it is downgraded, so a run that is
+    interrupted mid-batch finishes that batch's downgrades and emails on resume.
+
     Returns:
-        Number of users downgraded
+        Number of users downgraded in this run
     """
+    concurrency = concurrency or settings.subscription_jobs_concurrency
+    batch_size = batch_size or settings.subscription_jobs_batch_size
     now = datetime.now(timezone.utc)
-    
-    # Find expired users
-    expired_users = await User.find({
-        "subscription_end_date": {"$lt": now},
-        "subscription": {"$in": ["pro", "ultra"]}
-    }).to_list()
-    
-    if not expired_users:
-        logger.info("No expired subscriptions found")
+
+    checkpoint = await _acquire_checkpoint(f"expired_subscriptions:{now.date().isoformat()}")
+    if checkpoint is None:
+        logger.info("Expired subscription downgrades are already running in another worker")
         return 0
-    
+    if checkpoint.status == "completed":
+        # Downgrades are driven by current state, so a later run today just starts a new pass
+        checkpoint.last_id = None
+        checkpoint.pending_ids = []
+        checkpoint.processed = 0
+        checkpoint.failed = 0
+        await _save_progress(checkpoint, status="running", last_id=None, pending_ids=[], processed=0, failed=0)
+
+    async def process(user_ids: List[PydanticObjectId]) -> int:
+        await _save_progress(checkpoint, pending_ids=user_ids)
+        downgraded = await downgrade_users(user_ids, now)
+        _, failed = await _run_bounded(downgraded, email_service.send_subscription_expired_email, concurrency)
+        checkpoint.processed += len(downgraded)
+        checkpoint.failed += failed
+        await _save_progress(
+            checkpoint,
+            last_id=max(user_ids),
+            pending_ids=[],
+            processed=checkpoint.processed,
+            failed=checkpoint.failed,
+        )
+        return len(downgraded)
+
     downgraded_count = 0
-    plan_service = PlanSubscriptionService(db)
-    
-    for user in expired_users:
-        try:
-            # Downgrade user
-            await plan_service.downgrade_user(user)
-            
-            # Send expiry notification
-            await email_service.send_subscription_expired_email(user)
-            
-            downgraded_count += 1
-            logger.info(f"Downgraded expired user: {user.email}")
-        except Exception as e:
-            logger.error(f"Failed to downgrade user {user.email}: {e}")
-    
-    logger.info(f"Downgraded {downgraded_count} expired subscriptions")
+    try:
+        if checkpoint.pending_ids:
+            logger.info(f"Resuming interrupted batch of {len(checkpoint.pending_ids)} users")
+            downgraded_count += await process(checkpoint.pending_ids)
+
+        query = {
+            "subscription_end_date": {"$lt": now},
+            "subscription": {"$in": PAID_TIERS}
+        }
+        async for batch in _stream_batches(query, checkpoint.last_id, batch_size):
+            downgraded_count += await process([user.id for user in batch])
+    except Exception as e:
+        await _finish(checkpoint, status="failed", error=str(e))
+        raise
+
+    await _finish(checkpoint)
+    if downgraded_count:
+        logger.info(f"Downgraded {downgraded_count} expired subscriptions")
+    else:
+        logger.info("No expired subscriptions found")
     return downgraded_count
 
 
 async def run_daily_subscription_jobs(db=None) -> dict:
     """
     Run all daily subscription maintenance jobs.
-    Call this function daily via cron or scheduler.
-    
+    Called by SubscriptionJobScheduler, or daily via cron.
+
     Returns:
         Summary of job results
     """
     logger.info("Starting daily subscription jobs...")
-    
+
     results = {
         "expiring_reminders_sent": 0,
         "expired_downgraded": 0,
         "run_at": datetime.now(timezone.utc).isoformat()
     }
-    
+
     try:
         # Send expiry reminders (3 days before)
         results["expiring_reminders_sent"] = await check_expiring_subscriptions(days_before=3)
     except Exception as e:
         logger.error(f"Failed to check expiring subscriptions: {e}")
         results["expiring_error"] = str(e)
-    
+
     try:
         # Downgrade expired subscriptions
         results["expired_downgraded"] = await check_expired_subscriptions(db)
     except Exception as e:
         logger.error(f"Failed to check expired subscriptions: {e}")
         results["expired_error"] = str(e)
-    
+
     logger.info(f"Daily subscription jobs completed: {results}")
     return results
 
 
+class SubscriptionJobScheduler:
+    """
+    Runs the daily subscription jobs inside the app at a fixed UTC time.
+
+    Every worker runs a scheduler; checkpoint leases make sure only one of them
+    processes a given day's run. If the app was down at the scheduled time,
+    the missed run starts shortly after startup.
+    """
+
+    STARTUP_DELAY_SECONDS = 30
+
+    def __init__(self, run_at: str = "02:00"):
+        hour, minute = run_at.split(":")
+        self.hour = int(hour)
+        self.minute = int(minute)
+        self._task: Optional[asyncio.Task] = None
+
+    def next_run(self, now: Optional[datetime] = None) -> datetime:
+        now = now or datetime.now(timezone.utc)
+        run = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        return run if run > now else run + timedelta(days=1)
+
+    async def _missed_todays_run(self) -> bool:
+        now = datetime.now(timezone.utc)
+        scheduled = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if now < scheduled:
+            return False
+        checkpoint = await JobCheckpoint.find_one(
+            JobCheckpoint.name == f"expired_subscriptions:{now.date().isoformat()}"
+        )
+        return checkpoint is None or checkpoint.status != "completed"
+
+    async def _run_safely(self) -> None:
+        try:
+            await run_daily_subscription_jobs()
+        except Exception as e:
+            logger.error(f"Daily subscription jobs failed: {e}")
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(self.STARTUP_DELAY_SECONDS)
+        try:
+            if await self._missed_todays_run():
+                logger.info("Running missed daily subscription jobs")
+                await self._run_safely()
+        except Exception as e:
+            logger.error(f"Failed to check for a missed subscription job run: {e}")
+
+        while True:
+            delay = (self.next_run() - datetime.now(timezone.utc)).total_seconds()
+            await asyncio.sleep(max(delay, 0))
+            await self._run_safely()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Subscription jobs scheduled daily at {self.hour:02d}:{self.minute:02d} UTC")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Global scheduler instance
+subscription_job_scheduler = SubscriptionJobScheduler(settings.subscription_jobs_run_at)
+
+
 # Admin endpoint helper for manual triggering
 async def get_subscription_stats() -> dict:
     """
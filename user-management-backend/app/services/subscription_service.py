@@ -6,6 +6,35 @@ from decimal import Decimal
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from ..models.user import User, SubscriptionPlanModel, UserSubscription
+from .cache_service import cached
+
+# Plans change rarely; every write to a plan must call invalidate_plan_cache, the TTL only bounds a missed one
+PLAN_CACHE_TTL = 300
+
+
+@cached(ttl_seconds=PLAN_CACHE_TTL, key="plan:id:{plan_id}", model=SubscriptionPlanModel)
+async def get_plan_by_id(plan_id) -> Optional[SubscriptionPlanModel]:
+    """Get a subscription plan by ID (cached)."""
+    return await SubscriptionPlanModel.get(plan_id)
+
+
+@cached(ttl_seconds=PLAN_CACHE_TTL, key="plan:name:{plan_name}:{active_only}", model=SubscriptionPlanModel)
+async def get_plan_by_name(plan_name: str, active_only: bool = True) -> Optional[SubscriptionPlanModel]:
+    """Get a subscription plan by name (cached)."""
+    if active_only:
+        return await SubscriptionPlanModel.find_one(
+            SubscriptionPlanModel.name == plan_name,
+            SubscriptionPlanModel.is_active == True
+        )
+    return await SubscriptionPlanModel.find_one(SubscriptionPlanModel.name == plan_name)
+
+
+async def invalidate_plan_cache(plan: SubscriptionPlanModel, previous_name: Optional[str] = None) -> None:
+    """Drop a plan's cached lookups after it is created, edited or deactivated (pass the old name on a rename)"""
+    await get_plan_by_id.invalidate(plan.id)
+    for name in {plan.name, previous_name or plan.name}:
+        for active_only in (True, False):
+            await get_plan_by_name.invalidate(name, active_only)
 
 
 class SubscriptionService:
@@ -22,10 +51,7 @@ class SubscriptionService:
     
     async def get_plan_by_name(self, plan_name: str) -> Optional[SubscriptionPlanModel]:
         """Get a subscription plan by name."""
-        return await SubscriptionPlanModel.find_one(
-            SubscriptionPlanModel.name == plan_name,
-            SubscriptionPlanModel.is_active == True
-        )
+        return await get_plan_by_name(plan_name)
     
     async def get_user_subscription(self, user: User) -> Optional[UserSubscription]:
         """Get user's current active subscription."""
@@ -39,7 +65,7 @@ class SubscriptionService:
         subscription = await self.get_user_subscription(user)
         if subscription:
             # Need to fetch the plan details as UserSubscription only stores plan_id
-            plan = await SubscriptionPlanModel.get(subscription.plan_id)
+            plan = await get_plan_by_id(subscription.plan_id)
             if plan:
                 return plan
         
@@ -67,6 +93,7 @@ class SubscriptionService:
             is_active=True
         )
         await free_plan.insert()
+        await invalidate_plan_cache(free_plan)
         return free_plan
     
     async def subscribe_user_to_plan(self, user: User, plan_name: str, stripe_subscription_id: Optional[str] = None) -> UserSubscription:
@@ -314,7 +341,6 @@ class PlanSubscriptionService:
         
         Returns activation result with api_keys status.
         """
-        from ..models.api_key_pool import ApiKeyPool
         from ..models.user import SubscriptionPlan
         from .openrouter_keys import (
             provision_openrouter_key_with_limit,
@@ -399,21 +425,13 @@ class PlanSubscriptionService:
     async def _assign_key_from_pool(self, user: User, key_type: str) -> Optional[str]:
         """
         Assign an API key to user from the pool.
-        Finds a key with capacity and assigns the user.
+        Atomically adds the user to the least-loaded key with capacity.
         """
-        from ..models.api_key_pool import ApiKeyPool
+        from .key_pool_allocator import allocate_pool_key
         
-        # Find available key with capacity
-        available_keys = await ApiKeyPool.find({
-            "key_type": key_type,
-            "is_active": True
-        }).to_list()
-        
-        for key in available_keys:
-            if key.has_capacity:
-                if key.assign_user(user.id):
-                    await key.save()
-                    return key.key_value
+        key = await allocate_pool_key(user.id, key_type)
+        if key:
+            return key.key_value
         
         # No available key found
         print(f"Warning: No {key_type} key available for user {user.id}")
@@ -424,16 +442,10 @@ class PlanSubscriptionService:
         Release all API keys assigned to a user back to the pool.
         Called when subscription expires.
         """
-        from ..models.api_key_pool import ApiKeyPool
-        
-        # Find all keys assigned to this user
-        assigned_keys = await ApiKeyPool.find({
-            "assigned_user_ids": user.id
-        }).to_list()
+        from .key_pool_allocator import release_pool_keys
         
-        for key in assigned_keys:
-            key.release_user(user.id)
-            await key.save()
+        # Remove this user from every key that has them in one update
+        await release_pool_keys([user.id])
         
         # Clear user's API keys
         user.glm_api_key = None
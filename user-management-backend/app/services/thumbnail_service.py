@@ -0,0 +1,213 @@
+"""
+Thumbnail pipeline for screenshot previews.
+Encodes resized AVIF/WebP/JPEG card variants in a process pool and stores them
+next to the screenshot cache under content-hash file names, so they can be
+served with strong ETags and immutable caching.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Thumbnails live alongside the screenshot cache
+THUMBNAIL_DIR = Path("/tmp/screenshots/thumbs")
+THUMBNAIL_DIR.mkdir(parents=True, exist_ok=True)
+
+# Marketplace card sizes (16:9, matching the 1280x720 capture)
+THUMBNAIL_SIZES: Dict[str, Tuple[int, int]] = {
+    "sm": (320, 180),
+    "md": (640, 360),
+    "lg": (960, 540),
+}
+
+# Preferred order when negotiating against the Accept header
+THUMBNAIL_FORMATS: Tuple[str, ...] = ("avif", "webp", "jpeg")
+
+MEDIA_TYPES = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+FILE_EXTENSIONS = {
+    "avif": "avif",
+    "webp": "webp",
+    "jpeg": "jpg",
+}
+
+ENCODE_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "avif": {"quality": 55, "speed": 8},
+    "webp": {"quality": 80, "method": 4},
+    "jpeg": {"quality": 82, "optimize": True, "progressive": True},
+}
+
+# Variant files are named by content hash, so they never change once written
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+THUMBNAIL_FILENAME_RE = re.compile(r"^[0-9a-f]{32}\.(avif|webp|jpg)$")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+# The event loop only keeps weak references to tasks; scheduled jobs live here until done
+_tasks: Set["asyncio.Task[None]"] = set()
+
+
+def encode_variants(
+    source: bytes,
+    sizes: Optional[Dict[str, Tuple[int, int]]] = None,
+    formats: Tuple[str, ...] = THUMBNAIL_FORMATS,
+) -> List[Tuple[str, str, bytes]]:
+    """
+    Decode a source image and encode every (size, format) variant.
+
+    Runs inside a worker process; formats the local Pillow build cannot
+    write (typically AVIF on older builds) are skipped.
+    """
+    from PIL import Image, ImageOps
+
+    Image.init()
+    sizes = sizes or THUMBNAIL_SIZES
+
+    with Image.open(io.BytesIO(source)) as img:
+        img = img.convert("RGB")
+
+    variants = []
+    for size_name, dimensions in sizes.items():
+        resized = ImageOps.fit(img, dimensions, Image.LANCZOS)
+        for fmt in formats:
+            if fmt.upper() not in Image.SAVE:
+                continue
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), **ENCODE_OPTIONS[fmt])
+            variants.append((size_name, fmt, buffer.getvalue()))
+    return variants
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the shared encoder process pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        workers = settings.thumbnail_workers or os.cpu_count() or 1
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """Shut down the encoder process pool."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def source_digest(source: bytes) -> str:
+    """Content hash identifying a source image."""
+    return hashlib.sha256(source).hexdigest()
+
+
+def thumbnail_etag(filename: str) -> str:
+    """Strong ETag for a content-addressed variant file."""
+    return f'"{filename.split(".", 1)[0]}"'
+
+
+def _manifest_path(digest: str) -> Path:
+    return THUMBNAIL_DIR / f"{digest}.json"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(digest: str) -> Optional[Dict[str, Any]]:
+    """Load the variant manifest for a source image, if it has been built."""
+    path = _manifest_path(digest)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+async def _build_thumbnails(source: bytes, digest: str) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    variants = await loop.run_in_executor(get_executor(), encode_variants, source)
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    for size_name, fmt, data in variants:
+        filename = f"{hashlib.sha256(data).hexdigest()[:32]}.{FILE_EXTENSIONS[fmt]}"
+        path = THUMBNAIL_DIR / filename
+        if not path.exists():
+            _write_atomic(path, data)
+        width, height = THUMBNAIL_SIZES[size_name]
+        entries.setdefault(size_name, {})[fmt] = {
+            "file": filename,
+            "bytes": len(data),
+            "width": width,
+            "height": height,
+        }
+
+    manifest = {
+        "source": digest,
+        "source_bytes": len(source),
+        "variants": entries,
+    }
+    _write_atomic(_manifest_path(digest), json.dumps(manifest).encode())
+    return manifest
+
+
+async def generate_thumbnails(source: bytes) -> Dict[str, Any]:
+    """
+    Build (or load) all thumbnail variants for a source image.
+
+    Concurrent calls for the same image share a single encode job.
+    """
+    digest = source_digest(source)
+    manifest = load_manifest(digest)
+    if manifest is not None:
+        return manifest
+
+    future = _pending.get(digest)
+    if future is None:
+        future = asyncio.ensure_future(_build_thumbnails(source, digest))
+        _pending[digest] = future
+        future.add_done_callback(lambda _: _pending.pop(digest, None))
+    return await asyncio.shield(future)
+
+
+def schedule_thumbnails(source: bytes) -> None:
+    """Generate thumbnails in the background without delaying the caller."""
+    async def _run():
+        try:
+            await generate_thumbnails(source)
+        except Exception as e:
+            logger.error(f"Thumbnail generation failed: {e}")
+
+    task = asyncio.ensure_future(_run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def negotiate_format(accept: Optional[str], available: Dict[str, Any]) -> Optional[str]:
+    """Pick the best available format the client accepts (JPEG is the fallback)."""
+    accept = (accept or "").lower()
+    for fmt in THUMBNAIL_FORMATS:
+        if fmt not in available:
+            continue
+        if fmt == "jpeg" or MEDIA_TYPES[fmt] in accept:
+            return fmt
+    return None
@@ -0,0 +1,237 @@
+"""
+Token reservations shared by every worker, kept in Redis.
+
+Each user has two hashes (the {user_id} hash tag keeps them on one cluster slot):
+
+- tokens:{user_id}:balance   limit and used for the current billing period, a
+  snapshot loaded from MongoDB on first use and kept up to date by
+  settlements; it expires at the end of the period or after
+  token_balance_snapshot_seconds (so plan changes show up), then is reloaded
+- tokens:{user_id}:reserved  reservation id -> "amount|expires_ms|metadata"
+
+Reserving and settling are Lua scripts (releasing is a single HDEL), so a
+check and the write it depends on can't interleave with another worker's: outstanding
+reservations count against the balance, two requests can never both take the
+last tokens, and a reservation whose request died simply stops counting once
+it expires. Settlement records a marker per reservation, so a retried
+settlement is a no-op instead of a second charge.
+"""
+
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from app.config import settings
+from app.utils.metrics import Timer, redis_command_duration, token_reservations
+
+logger = logging.getLogger(__name__)
+
+# (monthly limit, tokens used this period, period end) from MongoDB
+BalanceLoader = Callable[[], Awaitable[Tuple[int, int, datetime]]]
+
+# Settlement markers outlive any retry of the request that settles
+SETTLED_MARKER_SECONDS = 24 * 3600
+
+# KEYS: balance, reserved
+# ARGV: reservation id, amount, now ms, expires ms, metadata, [limit, used, snapshot ttl ms]
+# Returns {1, available after} when reserved, {0, available} when short, {-1, 0} when the balance must be loaded
+RESERVE_SCRIPT = """
+local limit = redis.call('HGET', KEYS[1], 'limit')
+local used = redis.call('HGET', KEYS[1], 'used')
+if not limit then
+    if not ARGV[6] then
+        return {-1, 0}
+    end
+    limit, used = ARGV[6], ARGV[7]
+    redis.call('HSET', KEYS[1], 'limit', limit, 'used', used)
+    redis.call('PEXPIRE', KEYS[1], ARGV[8])
+end
+
+local now = tonumber(ARGV[3])
+local reserved = 0
+local entries = redis.call('HGETALL', KEYS[2])
+for i = 1, #entries, 2 do
+    local amount, expires = string.match(entries[i + 1], '^(%d+)|(%d+)|')
+    if tonumber(expires) <= now then
+        redis.call('HDEL', KEYS[2], entries[i])
+    else
+        reserved = reserved + tonumber(amount)
+    end
+end
+
+local available = tonumber(limit) - tonumber(used) - reserved
+local amount = tonumber(ARGV[2])
+if amount > available then
+    return {0, available}
+end
+
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2] .. '|' .. ARGV[4] .. '|' .. ARGV[5])
+local ttl = tonumber(ARGV[4]) - now
+if redis.call('PTTL', KEYS[2]) < ttl then
+    redis.call('PEXPIRE', KEYS[2], ttl)
+end
+return {1, available - amount}
+"""
+
+# KEYS: balance, reserved, settled marker
+# ARGV: reservation id, actual tokens, marker ttl ms
+# Returns {1, entry or false} when settled now, {0} when it was already settled
+SETTLE_SCRIPT = """
+if not redis.call('SET', KEYS[3], ARGV[2], 'NX', 'PX', ARGV[3]) then
+    return {0}
+end
+local entry = redis.call('HGET', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'used', ARGV[2])
+end
+return {1, entry}
+"""
+
+
+def reservation_user_id(reservation_id: str) -> str:
+    """Reservation ids are "<user_id>:<random>", so settling needs nothing but the id"""
+    return reservation_id.split(":", 1)[0]
+
+
+def reservation_redis(url: str, max_connections: Optional[int] = None,
+                      pool_timeout: Optional[float] = None) -> aioredis.Redis:
+    """
+    A client on a blocking pool: past max_connections, commands wait up to
+    pool_timeout for a free connection (then raise ConnectionError) instead
+    of failing at once
+    """
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=max_connections or settings.token_reservation_redis_max_connections,
+        timeout=settings.token_reservation_redis_pool_timeout_seconds if pool_timeout is None else pool_timeout,
+        decode_responses=True,
+        socket_connect_timeout=0.5,
+        socket_timeout=0.5,
+    )
+    return aioredis.Redis.from_pool(pool)
+
+
+def _keys(user_id: str) -> Tuple[str, str]:
+    return f"tokens:{{{user_id}}}:balance", f"tokens:{{{user_id}}}:reserved"
+
+
+def _settled_key(reservation_id: str) -> str:
+    user_id, token = reservation_id.split(":", 1)
+    return f"tokens:{{{user_id}}}:settled:{token}"
+
+
+class TokenReservationStore:
+    """Reserve, settle and release tokens atomically across workers"""
+
+    def __init__(self, redis: Optional[aioredis.Redis] = None):
+        """`redis` must decode responses; by default a client for settings.redis_url is created on first use"""
+        self._redis: Optional[aioredis.Redis] = None
+        if redis is not None:
+            self._bind(redis)
+
+    def _bind(self, redis: aioredis.Redis) -> None:
+        self._redis = redis
+        self._reserve = redis.register_script(RESERVE_SCRIPT)
+        self._settle = redis.register_script(SETTLE_SCRIPT)
+
+    def _get_redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._bind(reservation_redis(settings.redis_url))
+        return self._redis
+
+    async def reserve(
+        self,
+        user_id: Any,
+        amount: int,
+        load_balance: BalanceLoader,
+        metadata: Optional[Dict[str, Any]] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> Tuple[Optional[str], int]:
+        """
+        Hold `amount` tokens for a request. Returns (reservation id, tokens
+        still available) or (None, tokens available) when there aren't enough.
+
+        `load_balance` is only called when Redis has no snapshot of the
+        user's period usage. Raises redis.RedisError when Redis is unavailable.
+        """
+        self._get_redis()
+        user_id = str(user_id)
+        keys = _keys(user_id)
+        reservation_id = f"{user_id}:{uuid.uuid4().hex}"
+        now_ms = int(time.time() * 1000)
+        ttl = settings.token_reservation_ttl_seconds if ttl_seconds is None else ttl_seconds
+        args = [reservation_id, int(amount), now_ms, now_ms + int(ttl * 1000), json.dumps(metadata or {})]
+
+        with Timer(redis_command_duration("token_reserve")):
+            result = await self._reserve(keys=keys, args=args)
+        if result[0] == -1:
+            limit, used, period_end = await load_balance()
+            if period_end.tzinfo is None:
+                period_end = period_end.replace(tzinfo=timezone.utc)
+            until_period_end = (period_end - datetime.now(timezone.utc)).total_seconds()
+            snapshot_ttl = max(1.0, min(settings.token_balance_snapshot_seconds, until_period_end))
+            with Timer(redis_command_duration("token_reserve")):
+                result = await self._reserve(keys=keys, args=args + [int(limit), int(used), int(snapshot_ttl * 1000)])
+
+        if result[0] == 1:
+            token_reservations("reserved").inc()
+            return reservation_id, int(result[1])
+        token_reservations("rejected").inc()
+        return None, max(0, int(result[1]))
+
+    async def settle(self, reservation_id: str, actual_tokens: int) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Charge `actual_tokens` against the reservation's user and drop the hold.
+
+        Returns (False, {}) when the reservation was already settled, else
+        (True, metadata given at reserve time; {} if the hold had expired).
+        """
+        self._get_redis()
+        balance_key, reserved_key = _keys(reservation_user_id(reservation_id))
+        with Timer(redis_command_duration("token_settle")):
+            result = await self._settle(
+                keys=[balance_key, reserved_key, _settled_key(reservation_id)],
+                args=[reservation_id, int(actual_tokens), SETTLED_MARKER_SECONDS * 1000],
+            )
+        if result[0] == 0:
+            token_reservations("duplicate_settle").inc()
+            return False, {}
+        token_reservations("settled").inc()
+        entry = result[1] if len(result) > 1 else None
+        if not entry:
+            return True, {}
+        return True, json.loads(entry.split("|", 2)[2])
+
+    async def release(self, reservation_id: str) -> None:
+        """Drop a hold without charging (the request failed); releasing twice is harmless"""
+        redis = self._get_redis()
+        _, reserved_key = _keys(reservation_user_id(reservation_id))
+        with Timer(redis_command_duration("token_release")):
+            await redis.hdel(reserved_key, reservation_id)
+        token_reservations("released").inc()
+
+    async def reserved(self, user_id: Any) -> int:
+        """Tokens held by the user's unexpired reservations"""
+        redis = self._get_redis()
+        now_ms = int(time.time() * 1000)
+        total = 0
+        for value in (await redis.hgetall(_keys(str(user_id))[1])).values():
+            amount, expires, _ = value.split("|", 2)
+            if int(expires) > now_ms:
+                total += int(amount)
+        return total
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+# Global store instance
+token_reservation_store = TokenReservationStore()
@@ -1,11 +1,24 @@
 """Token management service with real business logic."""
 
+import logging
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, Optional, Tuple
 from decimal import Decimal
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from redis.exceptions import RedisError
 
 from ..models.user import User, TokenUsageLog, SubscriptionPlanModel, UserSubscription
+from .subscription_service import get_plan_by_id, get_plan_by_name, invalidate_plan_cache
+from .token_reservations import reservation_user_id, token_reservation_store
+from .usage_log_writer import usage_log_writer
+from ..utils.metrics import tokens_consumed, token_reservations
+
+logger = logging.getLogger(__name__)
+
+
+class TokenReservationUnavailable(Exception):
+    """Redis couldn't hold the tokens, so the request is refused rather than run unmetered"""
 
 
 class TokenService:
@@ -22,14 +35,12 @@ class TokenService:
         )
         
         if subscription and subscription.plan_id:
-            plan = await SubscriptionPlanModel.get(subscription.plan_id)
+            plan = await get_plan_by_id(subscription.plan_id)
             if plan:
                 return plan
         
         # Return free plan as default
-        free_plan = await SubscriptionPlanModel.find_one(
-            SubscriptionPlanModel.name == "free"
-        )
+        free_plan = await get_plan_by_name("free", active_only=False)
         
         if not free_plan:
             # Create default free plan if it doesn't exist
@@ -42,6 +53,7 @@ class TokenService:
                 is_active=True
             )
             await free_plan.insert()
+            await invalidate_plan_cache(free_plan)
         
         return free_plan
     
@@ -85,13 +97,15 @@ class TokenService:
         """Get user's current token balance and limits."""
         plan = await self.get_user_subscription_plan(user)
         tokens_used = await self.get_tokens_used_this_period(user)
-        tokens_remaining = max(0, plan.monthly_tokens - tokens_used)
+        tokens_reserved = await self.get_reserved_tokens(user)
+        tokens_remaining = max(0, plan.monthly_tokens - tokens_used - tokens_reserved)
         
         period_start, period_end = await self.get_current_period_dates(user)
         
         return {
             "tokens_remaining": tokens_remaining,
             "tokens_used": tokens_used,
+            "tokens_reserved": tokens_reserved,
             "monthly_limit": plan.monthly_tokens,
             "plan_name": plan.name,
             "plan_display_name": plan.display_name,
@@ -169,7 +183,10 @@ class TokenService:
         sub_user_limits = sub_user.sub_user_limits or {}
         monthly_limit = sub_user_limits.get("monthly_tokens", sub_user.monthly_limit)
         
-        if sub_user.tokens_used + tokens > monthly_limit:
+        # Charge the sub-user, then the parent; each check and increment is one
+        # atomic update, so concurrent settlements can neither lose a charge
+        # nor both take the last tokens
+        if await self._charge(sub_user, tokens, monthly_limit) is None:
             return False, {
                 "error": "Sub-user monthly token limit exceeded",
                 "limit": monthly_limit,
@@ -177,8 +194,8 @@ class TokenService:
                 "requested": tokens
             }
         
-        # Check parent user has enough tokens
-        if parent_user.tokens_used + tokens > parent_user.monthly_limit:
+        if await self._charge(parent_user, tokens, parent_user.monthly_limit) is None:
+            await self._charge(sub_user, -tokens)
             return False, {
                 "error": "Parent user monthly token limit exceeded",
                 "parent_limit": parent_user.monthly_limit,
@@ -186,20 +203,11 @@ class TokenService:
                 "requested": tokens
             }
         
-        # Consume tokens from both sub-user and parent user
-        sub_user.tokens_used += tokens
-        sub_user.tokens_remaining = max(0, monthly_limit - sub_user.tokens_used)
-        
-        parent_user.tokens_used += tokens
-        parent_user.tokens_remaining = max(0, parent_user.monthly_limit - parent_user.tokens_used)
-        
         # Log usage for both users
         await self._log_token_usage(sub_user, tokens, model_name, request_metadata, api_key_id, is_sub_user=True)
         await self._log_token_usage(parent_user, tokens, model_name, request_metadata, api_key_id, sub_user_id=str(sub_user.id))
         
-        # Save users
-        await sub_user.save()
-        await parent_user.save()
+        tokens_consumed("sub_user").inc(tokens)
         
         return True, {
             "success": True,
@@ -218,7 +226,7 @@ class TokenService:
     ) -> Tuple[bool, Dict[str, Any]]:
         """Consume tokens for a regular user"""
         
-        if user.tokens_used + tokens > user.monthly_limit:
+        if await self._charge(user, tokens, user.monthly_limit) is None:
             return False, {
                 "error": "Monthly token limit exceeded",
                 "limit": user.monthly_limit,
@@ -226,14 +234,10 @@ class TokenService:
                 "requested": tokens
             }
         
-        # Consume tokens
-        user.tokens_used += tokens
-        user.tokens_remaining = max(0, user.monthly_limit - user.tokens_used)
-        
         # Log usage
         await self._log_token_usage(user, tokens, model_name, request_metadata, api_key_id)
         
-        await user.save()
+        tokens_consumed("user").inc(tokens)
         
         return True, {
             "success": True,
@@ -241,6 +245,27 @@ class TokenService:
             "remaining": user.tokens_remaining
         }
     
+    async def _charge(self, user: User, tokens: int, limit: Optional[int] = None) -> Optional[User]:
+        """
+        Add `tokens` to the user's usage in one atomic $inc, unless that would
+        take it past `limit`; negative tokens refund. Updates `user` from the
+        stored counters and returns it, or None when the limit would be passed.
+        """
+        query: Dict[str, Any] = {"_id": user.id}
+        if limit is not None:
+            query["tokens_used"] = {"$lte": limit - tokens}
+        document = await User.get_pymongo_collection().find_one_and_update(
+            query,
+            {"$inc": {"tokens_used": tokens, "tokens_remaining": -tokens},
+             "$set": {"updated_at": datetime.now(timezone.utc)}},
+            projection={"tokens_used": 1, "tokens_remaining": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if document is None:
+            return None
+        user.tokens_used, user.tokens_remaining = document["tokens_used"], document["tokens_remaining"]
+        return user
+    
     async def _log_token_usage(
         self,
         user: User,
@@ -251,12 +276,15 @@ class TokenService:
         is_sub_user: bool = False,
         sub_user_id: Optional[str] = None
     ):
-        """Log token usage for analytics and billing"""
+        """Log token usage for analytics and billing (written in bulk by the usage log writer)"""
         
         usage_log = TokenUsageLog(
             user_id=user.id,
+            provider=(request_metadata or {}).get("provider", "unknown"),
             tokens_used=tokens,
             model_name=model_name,
+            request_type=(request_metadata or {}).get("request_type", "chat"),
+            cost_usd=(request_metadata or {}).get("cost_usd"),
             request_metadata=request_metadata or {},
             api_key_id=api_key_id,
             timestamp=datetime.now(timezone.utc)
@@ -271,7 +299,7 @@ class TokenService:
                 "billing_user_id": str(user.id)
             })
         
-        await usage_log.insert()
+        await usage_log_writer.record(usage_log)
     
     async def get_sub_user_usage_summary(self, sub_user_id: str, days: int = 30) -> Dict[str, Any]:
         """Get usage summary for a sub-user"""
@@ -434,40 +462,57 @@ class TokenService:
         balance = await self.get_token_balance(user)
         return balance["tokens_remaining"]
 
-    async def reserve_tokens_advanced(self, user: User, tokens: int, request_type: str, metadata: Dict[str, Any]) -> str:
-        """Reserve tokens for a request and return reservation ID."""
-        # For now, this is a simple implementation that just checks availability
-        # In a production system, you might want to actually reserve tokens in a separate table
-        available, message = await self.check_token_availability(user, tokens)
-        if not available:
-            raise ValueError(f"Cannot reserve tokens: {message}")
-        
-        # Generate a simple reservation ID
-        import uuid
-        reservation_id = str(uuid.uuid4())
-        
-        # Store reservation info (in production, you'd store this in the database)
-        if not hasattr(self, '_reservations'):
-            self._reservations = {}
-        
-        self._reservations[reservation_id] = {
-            "user_id": user.id,
-            "tokens": tokens,
-            "request_type": request_type,
-            "metadata": metadata,
-            "timestamp": datetime.now(timezone.utc)
-        }
-        
+    async def get_reserved_tokens(self, user: User) -> int:
+        """Tokens held by the user's in-flight requests (0 if Redis is unavailable)."""
+        try:
+            return await token_reservation_store.reserved(user.id)
+        except RedisError as e:
+            logger.warning(f"Token reservation store unavailable: {e}")
+            return 0
+
+    async def reserve_tokens_advanced(self, user: User, tokens: int, request_type: str, metadata: Dict[str, Any],
+                                      ttl_seconds: Optional[float] = None) -> str:
+        """
+        Reserve tokens for a request and return the reservation ID.
+
+        The reservation lives in Redis and counts against the balance for every
+        worker until it is consumed, released or expires (after ttl_seconds,
+        token_reservation_ttl_seconds by default). Raises ValueError without
+        enough tokens and TokenReservationUnavailable when Redis can't take
+        the hold: granting tokens without one would let concurrent requests
+        spend the same balance.
+        """
+        async def load_balance():
+            plan = await self.get_user_subscription_plan(user)
+            tokens_used = await self.get_tokens_used_this_period(user)
+            _, period_end = await self.get_current_period_dates(user)
+            return plan.monthly_tokens, tokens_used, period_end
+
+        try:
+            reservation_id, available = await token_reservation_store.reserve(
+                user.id, tokens, load_balance, {**metadata, "request_type": request_type}, ttl_seconds
+            )
+        except RedisError as e:
+            logger.warning(f"Token reservation store unavailable, refusing the request: {e}")
+            token_reservations("error").inc()
+            raise TokenReservationUnavailable("Token reservations are temporarily unavailable") from e
+
+        if reservation_id is None:
+            raise ValueError(f"Cannot reserve tokens: Insufficient tokens. Requested: {tokens}, Available: {available}")
         return reservation_id
 
     async def consume_reserved_tokens(self, reservation_id: str, actual_tokens: int, cost_usd: float, response_metadata: Dict[str, Any]):
-        """Consume tokens that were previously reserved."""
-        if not hasattr(self, '_reservations') or reservation_id not in self._reservations:
-            raise ValueError(f"Reservation {reservation_id} not found")
-        
-        reservation = self._reservations[reservation_id]
-        user = await User.get(reservation["user_id"])
-        
+        """Consume tokens that were previously reserved. Consuming the same reservation twice charges once."""
+        metadata: Dict[str, Any] = {}
+        try:
+            settled, metadata = await token_reservation_store.settle(reservation_id, actual_tokens)
+            if not settled:
+                return
+        except RedisError as e:
+            logger.warning(f"Token reservation store unavailable, charging without a settlement marker: {e}")
+            token_reservations("error").inc()
+
+        user = await User.get(reservation_user_id(reservation_id))
         if not user:
             raise ValueError("User not found for reservation")
         
@@ -475,25 +520,25 @@ class TokenService:
         success, result = await self.consume_tokens(
             user=user,
             tokens=actual_tokens,
-            model_name=reservation["metadata"].get("model", "unknown"),
+            model_name=metadata.get("model", "unknown"),
             request_metadata={
-                **reservation["metadata"],
+                **metadata,
                 **response_metadata,
                 "reservation_id": reservation_id,
                 "cost_usd": cost_usd
             }
         )
         
-        # Remove the reservation
-        del self._reservations[reservation_id]
-        
         if not success:
             raise ValueError(f"Failed to consume tokens: {result}")
 
-    def release_reserved_tokens(self, reservation_id: str):
+    async def release_reserved_tokens(self, reservation_id: str):
         """Release tokens that were reserved but not consumed (e.g., on error)."""
-        if hasattr(self, '_reservations') and reservation_id in self._reservations:
-            del self._reservations[reservation_id]
+        try:
+            await token_reservation_store.release(reservation_id)
+        except RedisError as e:
+            # The hold expires on its own
+            logger.warning(f"Could not release token reservation {reservation_id}: {e}")
 
 
 class TokenPricingService:
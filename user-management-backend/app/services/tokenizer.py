@@ -0,0 +1,233 @@
+"""
+Token counting for reservations and usage estimates.
+
+Models map to a tokenizer by family (MODEL_FAMILIES). OpenAI's BPE encodings
+(o200k_base, cl100k_base) are used through tiktoken, and cl100k_base stands in
+for families whose tokenizers aren't public (Claude, Gemini, Llama, ...). The
+encoding files are bundled with the deployment by
+scripts/setup/fetch_tokenizers.py at image build time and are never fetched at
+request time: if tiktoken or a bundled file is missing, counting falls back to
+HeuristicTokenizer, which still splits code, numbers and non-Latin scripts
+roughly the way BPE does.
+
+Encoders load lazily on first use and are kept per encoding. Chat messages are
+counted one at a time and each message's count is cached by content hash, so a
+conversation that grows by a message per turn only tokenizes the new one.
+Inputs longer than tokenizer_thread_min_chars are encoded on a thread pool
+(tiktoken releases the GIL while encoding) instead of on the event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.cache_service import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# First matching model-name fragment wins; the value is a tiktoken encoding name
+MODEL_FAMILIES: Tuple[Tuple[str, str], ...] = (
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("gpt-5", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+    ("text-embedding", "cl100k_base"),
+)
+DEFAULT_ENCODING = "cl100k_base"
+BUNDLED_ENCODINGS = ("cl100k_base", "o200k_base")
+
+# Chat framing added by the provider: per message, and once to prime the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Backend root, for resolving a relative tokenizer_data_dir
+BASE_DIR = Path(__file__).resolve().parents[2]
+MANIFEST_FILE = "encodings.json"
+
+_MESSAGE_COUNT_TTL = 3600
+
+
+class Tokenizer:
+    """Counts tokens in text for one encoding"""
+
+    name = "base"
+
+    def count(self, text: str) -> int:
+        raise NotImplementedError
+
+
+class TiktokenTokenizer(Tokenizer):
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = encoding.name
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+
+class HeuristicTokenizer(Tokenizer):
+    """
+    BPE-shaped estimate without a vocabulary: words cost a token per ~6
+    letters, digits group by three, punctuation runs by two, whitespace runs
+    one each (indentation included), and non-ASCII text a token per ~3 UTF-8
+    bytes (about one per CJK character). Errs on the high side for prose.
+    """
+
+    name = "heuristic"
+    PIECE = re.compile(r" ?[A-Za-z]+| ?[0-9]{1,3}| ?[!-/:-@\[-`{-~]+|[^\x00-\x7f]+|\s+")
+
+    def count(self, text: str) -> int:
+        tokens = 0
+        for piece in self.PIECE.findall(text):
+            if not piece.isascii():
+                tokens += max(1, len(piece.encode("utf-8")) // 3)
+                continue
+            body = piece.lstrip(" ") or piece
+            if body[0].isalpha():
+                tokens += 1 + (len(body) - 1) // 6
+            elif body[0].isdigit() or body.isspace():
+                tokens += 1
+            else:
+                tokens += (len(body) + 1) // 2
+        return tokens
+
+
+def encoding_for_model(model: str) -> str:
+    """The encoding used to count tokens for a model (provider prefixes ignored)"""
+    name = model.lower().rsplit("/", 1)[-1]
+    for fragment, encoding in MODEL_FAMILIES:
+        if name.startswith(fragment):
+            return encoding
+    return DEFAULT_ENCODING
+
+
+class TokenizerRegistry:
+    """Lazily loaded tokenizers, per-message count cache and the encoding thread pool"""
+
+    def __init__(self, message_cache_entries: int = 4096):
+        self._tokenizers: Dict[str, Tokenizer] = {}
+        self._lock = threading.Lock()
+        self._bundled: Optional[List[str]] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.message_counts = LRUCache(message_cache_entries)
+        self.heuristic = HeuristicTokenizer()
+
+    def _data_dir(self) -> Path:
+        path = Path(settings.tokenizer_data_dir)
+        return path if path.is_absolute() else BASE_DIR / path
+
+    def _bundled_encodings(self) -> List[str]:
+        if self._bundled is None:
+            try:
+                with open(self._data_dir() / MANIFEST_FILE, "rb") as f:
+                    self._bundled = json.loads(f.read()).get("encodings", [])
+            except (OSError, ValueError):
+                self._bundled = []
+        return self._bundled
+
+    def _load(self, encoding: str) -> Tokenizer:
+        if encoding not in self._bundled_encodings():
+            logger.warning(f"Tokenizer {encoding} is not bundled, estimating token counts heuristically "
+                           f"(run scripts/setup/fetch_tokenizers.py)")
+            return self.heuristic
+        try:
+            import tiktoken
+        except ImportError:
+            logger.warning("tiktoken not installed, estimating token counts heuristically")
+            return self.heuristic
+
+        # tiktoken reads the bundled files from its cache directory instead of downloading them
+        os.environ["TIKTOKEN_CACHE_DIR"] = str(self._data_dir())
+        try:
+            return TiktokenTokenizer(tiktoken.get_encoding(encoding))
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {encoding}, estimating token counts heuristically: {e}")
+            return self.heuristic
+
+    def get(self, model: str) -> Tokenizer:
+        """The tokenizer for a model's family, loaded on first use"""
+        encoding = encoding_for_model(model)
+        tokenizer = self._tokenizers.get(encoding)
+        if tokenizer is None:
+            with self._lock:
+                tokenizer = self._tokenizers.get(encoding)
+                if tokenizer is None:
+                    tokenizer = self._tokenizers[encoding] = self._load(encoding)
+        return tokenizer
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            workers = settings.tokenizer_threads or os.cpu_count() or 1
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tokenizer")
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _tokenizer(self, model: str) -> Tokenizer:
+        # Loading an encoding reads and parses a few MB, so the first load runs off the event loop
+        tokenizer = self._tokenizers.get(encoding_for_model(model))
+        if tokenizer is None:
+            loop = asyncio.get_running_loop()
+            tokenizer = await loop.run_in_executor(self._get_executor(), self.get, model)
+        return tokenizer
+
+    async def _count_all(self, tokenizer: Tokenizer, texts: List[str]) -> List[int]:
+        if sum(len(text) for text in texts) < settings.tokenizer_thread_min_chars:
+            return [tokenizer.count(text) for text in texts]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), lambda: [tokenizer.count(text) for text in texts]
+        )
+
+    async def count_text(self, model: str, text: str) -> int:
+        tokenizer = await self._tokenizer(model)
+        return (await self._count_all(tokenizer, [text]))[0]
+
+    async def count_texts(self, model: str, texts: List[str]) -> List[int]:
+        tokenizer = await self._tokenizer(model)
+        return await self._count_all(tokenizer, texts)
+
+    async def count_messages(self, model: str, messages: List[Dict[str, Any]]) -> int:
+        """Prompt tokens for a chat request, including the per-message framing"""
+        tokenizer = await self._tokenizer(model)
+        total = TOKENS_PER_REPLY + TOKENS_PER_MESSAGE * len(messages)
+
+        # Only messages not seen before are tokenized; the cache is only touched on the event loop
+        uncounted: List[Tuple[str, str]] = []
+        for message in messages:
+            content = message.get("content") or ""
+            if not isinstance(content, str):
+                content = json.dumps(content)
+            text = f"{message.get('role', '')}\n{content}"
+            key = f"{tokenizer.name}:{hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()}"
+            count = self.message_counts.get(key)
+            if count is None:
+                uncounted.append((key, text))
+            else:
+                total += count
+
+        if uncounted:
+            counts = await self._count_all(tokenizer, [text for _, text in uncounted])
+            for (key, _), count in zip(uncounted, counts):
+                self.message_counts.set(key, count, _MESSAGE_COUNT_TTL)
+                total += count
+        return total
+
+
+# Global tokenizer registry
+tokenizers = TokenizerRegistry()
@@ -0,0 +1,376 @@
+"""
+Write-behind ingestion of token usage logs.
+
+Every charged request used to insert its TokenUsageLog on the request path
+(two for a sub-user: its own and its parent's). With the writer running,
+record() gives the log its ObjectId, appends it to this worker's write-ahead
+segment and to an in-memory buffer, and returns. A background task writes
+the buffer every usage_log_flush_interval_ms, or sooner once
+usage_log_flush_max_records are waiting. Each flush is one unordered
+insert_many followed by one bulk update of the per-user TokenUsageDaily
+rollups for the same logs.
+
+Delivery is at least once:
+
+- A flush that fails keeps its segment on disk. It is retried with backoff
+  until MongoDB is back.
+- A worker that dies leaves its segments behind, and the next worker to
+  start adopts them. Each worker holds a flock on its own directory, so a
+  directory that can be locked belongs to a dead worker.
+- Writing a flush twice is harmless. Logs already inserted are skipped by
+  _id, and each rollup remembers the recent flushes counted into it.
+
+With usage_log_wal_dir = "" the buffer lives only in memory, and a crash
+loses up to one flush interval of logs. When the writer isn't running
+(scripts, tests, usage_log_write_behind off), record() inserts the log
+directly.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import suppress
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.config import settings
+from app.models.user import TokenUsageDaily, TokenUsageLog
+from app.utils.metrics import usage_log_flush_duration, usage_log_flush_size, usage_logs_buffered
+
+try:
+    import fcntl
+except ImportError:  # Windows: segments left by other workers aren't adopted
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+# Backend root, for resolving a relative usage_log_wal_dir
+BASE_DIR = Path(__file__).resolve().parents[2]
+LOCK_FILE = "lock"
+SEGMENT_SUFFIX = ".wal"
+
+# Flushes remembered per rollup; replaying a flush older than this would count it again
+ROLLUP_FLUSH_HISTORY = 100
+
+RETRY_BASE_SECONDS = 1.0
+
+
+class Segment:
+    """One flush worth of logs, in memory until a failed attempt leaves it only on disk"""
+
+    __slots__ = ("flush_id", "count", "path", "logs")
+
+    def __init__(self, flush_id: str, count: int, path: Optional[Path] = None,
+                 logs: Optional[List[TokenUsageLog]] = None):
+        self.flush_id = flush_id
+        self.count = count
+        self.path = path
+        self.logs = logs
+
+
+def read_segment(path: Path) -> List[TokenUsageLog]:
+    """Logs in a write-ahead segment; a torn last line (the worker died mid-write) is skipped"""
+    logs = []
+    with open(path, "rb") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                logs.append(TokenUsageLog.model_validate_json(line))
+            except ValueError as e:
+                logger.warning(f"Skipping unreadable usage log in {path.name}: {e}")
+    return logs
+
+
+def _count_lines(path: Path) -> int:
+    with open(path, "rb") as file:
+        return sum(1 for line in file if line.strip())
+
+
+async def _update_rollups(flush_id: str, logs: List[TokenUsageLog]):
+    totals: Dict[Tuple[PydanticObjectId, str], Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+    for log in logs:
+        counters = totals[(log.user_id, log.created_at.strftime("%Y-%m-%d"))]
+        counters["tokens_used"] += log.tokens_used
+        counters["request_count"] += 1
+        counters["cost_usd"] += log.cost_usd or 0.0
+
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            # A rollup that already counted this flush doesn't match, so its upsert fails on the unique index
+            {"user_id": user_id, "day": day, "flushes": {"$ne": flush_id}},
+            {
+                "$inc": dict(counters),
+                "$set": {"updated_at": now},
+                "$push": {"flushes": {"$each": [flush_id], "$slice": -ROLLUP_FLUSH_HISTORY}},
+            },
+            upsert=True,
+        )
+        for (user_id, day), counters in totals.items()
+    ]
+    collection = TokenUsageDaily.get_pymongo_collection()
+    for _ in range(2):
+        try:
+            await collection.bulk_write(operations, ordered=False)
+            return
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+            # Either the flush was counted already or another worker created the rollup first; a retry tells them apart
+            operations = [operations[error["index"]] for error in errors]
+
+
+async def write_logs(flush_id: str, logs: List[TokenUsageLog]) -> int:
+    """
+    Insert one flush of usage logs and add them to the daily rollups. Safe to
+    repeat for the same flush. Returns the number of logs newly inserted.
+    """
+    if not logs:
+        return 0
+
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        inserted = len(logs)
+        try:
+            await TokenUsageLog.insert_many(logs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+            inserted -= len(errors)
+        await _update_rollups(flush_id, logs)
+        outcome = "ok"
+        usage_log_flush_size.observe(len(logs))
+        return inserted
+    finally:
+        usage_log_flush_duration(outcome).observe(time.perf_counter() - started)
+
+
+class UsageLogWriter:
+    """Buffers usage logs and writes them to MongoDB in bulk from a background task"""
+
+    def __init__(self):
+        self.worker = ""
+        self._buffer: List[TokenUsageLog] = []
+        self._pending: Deque[Segment] = deque()
+        self._sequence = 0
+        self._directory: Optional[Path] = None
+        self._lock = None  # Open lock file of this worker's directory
+        self._segment = None  # Open write-ahead file of the buffer
+        self._flushing = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._retry_delay = 0.0
+
+    @property
+    def buffered(self) -> int:
+        """Logs recorded but not yet written"""
+        return len(self._buffer) + sum(segment.count for segment in self._pending)
+
+    async def record(self, log: TokenUsageLog):
+        """Queue a usage log for the next flush (inserted right away if the writer isn't running)"""
+        if self._task is None:
+            await log.insert()
+            return
+
+        if log.id is None:
+            log.id = PydanticObjectId()
+        if self._directory is not None:
+            self._append(log)
+        self._buffer.append(log)
+        usage_logs_buffered.inc()
+        if len(self._buffer) >= settings.usage_log_flush_max_records:
+            self._wakeup.set()
+
+    def _append(self, log: TokenUsageLog):
+        try:
+            if self._segment is None:
+                self._segment = open(self._directory / f"{self._flush_id()}{SEGMENT_SUFFIX}", "ab")
+            self._segment.write(log.model_dump_json(by_alias=True).encode() + b"\n")
+            self._segment.flush()
+        except OSError as e:
+            # The buffer's segment is now incomplete, so the buffer is kept in memory instead
+            logger.error(f"Usage log write-ahead file unavailable, buffering in memory only: {e}")
+            if self._segment is not None:
+                with suppress(OSError):
+                    self._segment.close()
+                    os.unlink(self._segment.name)
+            self._segment = None
+            self._directory = None
+
+    def _flush_id(self) -> str:
+        return f"{self.worker}-{self._sequence:08d}"
+
+    async def _seal(self):
+        """Move the buffer into a pending segment"""
+        if not self._buffer:
+            return
+        logs, self._buffer = self._buffer, []
+        segment = Segment(self._flush_id(), len(logs), logs=logs)
+        self._sequence += 1
+        file, self._segment = self._segment, None
+        if file is not None:
+            try:
+                await asyncio.to_thread(os.fsync, file.fileno())
+                segment.path = Path(file.name)
+            except OSError as e:
+                logger.error(f"Could not sync usage log segment {file.name}, keeping it in memory: {e}")
+            finally:
+                file.close()
+        self._pending.append(segment)
+
+    async def flush(self) -> bool:
+        """Write the buffer and any failed flushes; False if logs are still waiting for MongoDB"""
+        async with self._flushing:
+            await self._seal()
+            while self._pending:
+                segment = self._pending[0]
+                try:
+                    logs = segment.logs
+                    if logs is None:
+                        logs = await asyncio.to_thread(read_segment, segment.path)
+                    await write_logs(segment.flush_id, logs)
+                except Exception as e:
+                    # Segments on disk don't need their logs in memory while MongoDB is away
+                    for waiting in self._pending:
+                        if waiting.path is not None:
+                            waiting.logs = None
+                    self._retry_delay = min(max(self._retry_delay * 2, RETRY_BASE_SECONDS),
+                                            settings.usage_log_retry_max_seconds)
+                    logger.warning(f"Usage log flush failed ({self.buffered} logs waiting), "
+                                   f"retrying in {self._retry_delay:.0f}s: {e}")
+                    return False
+
+                self._pending.popleft()
+                usage_logs_buffered.dec(segment.count)
+                if segment.path is not None:
+                    segment.path.unlink(missing_ok=True)
+                self._retry_delay = 0.0
+            return True
+
+    async def _run(self):
+        interval = settings.usage_log_flush_interval_ms / 1000
+        while True:
+            if self._retry_delay:
+                await asyncio.sleep(self._retry_delay)
+            else:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Usage log writer error: {e}")
+
+    def _open_directory(self):
+        root = Path(settings.usage_log_wal_dir)
+        root = root if root.is_absolute() else BASE_DIR / root
+        directory = root / self.worker
+        directory.mkdir(parents=True, exist_ok=True)
+        self._lock = open(directory / LOCK_FILE, "a")
+        if fcntl is not None:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._directory = directory
+        self._adopt(root)
+
+    def _adopt(self, root: Path):
+        """Take over the segments of workers that died (their directory lock is free)"""
+        if fcntl is None:
+            return
+        adopted = 0
+        for directory in root.iterdir():
+            if not directory.is_dir() or directory == self._directory:
+                continue
+            try:
+                lock = open(directory / LOCK_FILE, "a")
+            except OSError:
+                continue
+            with lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Its worker is alive
+                for path in sorted(directory.glob(f"*{SEGMENT_SUFFIX}")):
+                    target = self._directory / path.name
+                    os.replace(path, target)
+                    count = _count_lines(target)
+                    self._pending.append(Segment(target.stem, count, path=target))
+                    usage_logs_buffered.inc(count)
+                    adopted += count
+                (directory / LOCK_FILE).unlink(missing_ok=True)
+                with suppress(OSError):
+                    directory.rmdir()
+        if adopted:
+            print(f"🧾 Adopted {adopted} unwritten usage logs from stopped workers")
+
+    def _close_directory(self):
+        """Release this worker's directory, removing it if nothing is left in it"""
+        if self._lock is None:
+            return
+        directory = Path(self._lock.name).parent
+        if not any(directory.glob(f"*{SEGMENT_SUFFIX}")):
+            (directory / LOCK_FILE).unlink(missing_ok=True)
+            with suppress(OSError):
+                directory.rmdir()
+        self._lock.close()
+        self._lock = None
+        self._directory = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self.worker = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        if settings.usage_log_wal_dir:
+            try:
+                self._open_directory()
+            except OSError as e:
+                logger.error(f"Usage log write-ahead directory unavailable, buffering in memory only: {e}")
+                if self._lock is not None:
+                    self._lock.close()
+                    self._lock = None
+                self._directory = None
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        print(f"🧾 Usage log writer started (write-ahead: {self._directory or 'off'})")
+
+    async def stop(self):
+        """Write what's buffered; whatever MongoDB doesn't take stays on disk for the next worker"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wakeup = None
+
+        if not await self.flush():
+            on_disk = sum(segment.count for segment in self._pending if segment.path is not None)
+            if on_disk:
+                logger.warning(f"{on_disk} usage logs left in {Path(self._lock.name).parent} for the next worker")
+            if self.buffered > on_disk:
+                logger.error(f"{self.buffered - on_disk} usage logs could not be written and are lost")
+        usage_logs_buffered.dec(self.buffered)
+        self._close_directory()
+        self._pending.clear()
+        self._retry_delay = 0.0
+
+
+# Global usage log writer instance
+usage_log_writer = UsageLogWriter()
@@ -8,6 +8,7 @@ import logging
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from beanie.odm.fields import PydanticObjectId
+from pymongo import ASCENDING, ReturnDocument
 # Removed SQLAlchemy imports
 # from sqlalchemy.orm import Session
 # from sqlalchemy import func, and_
@@ -502,19 +503,17 @@ async def deactivate_managed_api_key(key_id: PydanticObjectId) -> bool:
 
 
 async def _assign_new_managed_key(user: User) -> ManagedApiKey:
-    available_list = await ManagedApiKey.find(
-        ManagedApiKey.is_active == True,
-        ManagedApiKey.assigned_user_id == None
-    ).sort("+created_at").limit(1).to_list()
-    if not available_list:
-        raise ValueError("No managed API keys available. Please ask an admin to add more keys.")
-    available_key = available_list[0]
-
+    # Claim the oldest free key in one atomic update so concurrent callers never share it
     now = datetime.now(timezone.utc)
-    available_key.assigned_user_id = user.id
-    available_key.assigned_at = now
-    available_key.last_rotated_at = now
-    await available_key.save()
+    document = await ManagedApiKey.get_pymongo_collection().find_one_and_update(
+        {"is_active": True, "assigned_user_id": None},
+        {"$set": {"assigned_user_id": user.id, "assigned_at": now, "last_rotated_at": now}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if document is None:
+        raise ValueError("No managed API keys available. Please ask an admin to add more keys.")
+    available_key = ManagedApiKey.model_validate(document)
 
     user.glm_api_key = available_key.key_value
     user.updated_at = now
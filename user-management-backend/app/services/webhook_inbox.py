@@ -0,0 +1,335 @@
+"""
+Durable, idempotent webhook inbox.
+
+The webhook endpoint only verifies the signature and inserts the event into
+the webhook_events collection (keyed by the gateway's event ID, so gateway
+retries are dropped by the unique index), then acknowledges immediately.
+
+A pool of background workers leases pending events one at a time and runs the
+event handlers. Events for the same payment are processed in the order they
+were received: an event is deferred while an earlier event for its payment is
+still pending or in flight. Failures are retried with exponential backoff and
+jitter; after max_attempts an event is dead-lettered (status "dead") and can be
+re-queued with replay_events() / scripts/db/replay_webhooks.py.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.models.user import User
+from app.models.webhook_event import WebhookEvent, WebhookEventStatus
+from app.services.payment_gateway import verify_webhook_signature
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+LEASE_SECONDS = 120
+ORDERING_DEFER_SECONDS = 1.0
+
+
+class InvalidWebhook(Exception):
+    """The webhook failed signature verification or isn't valid JSON"""
+
+
+# ---------------------------------------------------------------------------
+# Event handlers. They raise on failure so the event is retried.
+# ---------------------------------------------------------------------------
+
+async def handle_payment_captured(payload: Dict[str, Any]):
+    """Handle successful payment."""
+    payment = payload.get("payload", {}).get("payment", {}).get("entity", {})
+    notes = payment.get("notes") or {}
+    user_email = notes.get("user_email")
+    plan_name = notes.get("plan_name")
+
+    if user_email and plan_name:
+        user = await User.find_one({"email": user_email})
+        if user:
+            logger.info(f"Webhook: Payment captured for {user_email}, plan: {plan_name}")
+            # Note: Actual subscription activation is done via /verify-payment endpoint
+            # This webhook is for logging and backup processing
+
+
+async def handle_payment_failed(payload: Dict[str, Any]):
+    """Handle failed payment."""
+    payment = payload.get("payload", {}).get("payment", {}).get("entity", {})
+    notes = payment.get("notes") or {}
+    user_email = notes.get("user_email")
+    error_description = payment.get("error_description", "Payment failed")
+
+    if user_email:
+        user = await User.find_one({"email": user_email})
+        if user:
+            logger.warning(f"Webhook: Payment failed for {user_email}: {error_description}")
+            # Could send failure notification email here
+
+
+async def handle_refund_processed(payload: Dict[str, Any]):
+    """Handle processed refund."""
+    refund = payload.get("payload", {}).get("refund", {}).get("entity", {})
+    payment_id = refund.get("payment_id")
+    amount = refund.get("amount", 0) / 100  # Convert from paisa
+
+    logger.info(f"Webhook: Refund processed for payment {payment_id}, amount: ₹{amount}")
+
+    # Find user by payment_id and potentially downgrade
+    user = await User.find_one({"last_payment_id": payment_id})
+    if user:
+        # Could implement subscription cancellation on refund
+        logger.info(f"Refund for user: {user.email}")
+
+
+WEBHOOK_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]] = {
+    "payment.captured": handle_payment_captured,
+    "payment.failed": handle_payment_failed,
+    "refund.processed": handle_refund_processed,
+}
+
+
+# ---------------------------------------------------------------------------
+# Ingestion
+# ---------------------------------------------------------------------------
+
+def _ordering_key(payload: Dict[str, Any]) -> Optional[str]:
+    """The payment an event belongs to"""
+    entities = payload.get("payload", {})
+    payment = entities.get("payment", {}).get("entity", {})
+    if payment.get("id"):
+        return payment["id"]
+    refund = entities.get("refund", {}).get("entity", {})
+    return refund.get("payment_id")
+
+
+async def enqueue_webhook(event_id: str, payload: Dict[str, Any], provider: str = "razorpay") -> bool:
+    """Store an event in the inbox. Returns False if it was already received."""
+    event = WebhookEvent(
+        event_id=event_id,
+        provider=provider,
+        event=payload.get("event", "unknown"),
+        ordering_key=_ordering_key(payload),
+        payload=payload,
+    )
+    try:
+        await event.insert()
+    except DuplicateKeyError:
+        return False
+    webhook_worker_pool.notify()
+    return True
+
+
+async def ingest_razorpay_webhook(body: bytes, signature: Optional[str], event_id: Optional[str]) -> bool:
+    """
+    Verify and store a Razorpay webhook. Returns False for a duplicate delivery.
+    Without X-Razorpay-Event-Id the body hash is used as the event ID.
+    """
+    webhook_secret = settings.razorpay_webhook_secret
+    if webhook_secret and not verify_webhook_signature(body, signature or "", webhook_secret):
+        raise InvalidWebhook("Invalid signature")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise InvalidWebhook("Invalid JSON payload")
+    if not isinstance(payload, dict):
+        raise InvalidWebhook("Invalid JSON payload")
+    return await enqueue_webhook(event_id or hashlib.sha256(body).hexdigest(), payload)
+
+
+# ---------------------------------------------------------------------------
+# Processing
+# ---------------------------------------------------------------------------
+
+def _retry_delay(attempts: int) -> float:
+    """Exponential backoff, jittered over the upper half of the window"""
+    cap = min(settings.webhook_retry_max_seconds, settings.webhook_retry_base_seconds * (2 ** (attempts - 1)))
+    return random.uniform(cap / 2, cap)
+
+
+async def _claim_next(worker_id: str) -> Optional[WebhookEvent]:
+    """Lease the oldest event that is due (or whose lease expired)"""
+    now = datetime.now(timezone.utc)
+    document = await WebhookEvent.get_pymongo_collection().find_one_and_update(
+        {"$or": [
+            {"status": WebhookEventStatus.PENDING, "next_attempt_at": {"$lte": now}},
+            {"status": WebhookEventStatus.PROCESSING, "lease_expires_at": {"$lt": now}},
+        ]},
+        {
+            "$set": {
+                "status": WebhookEventStatus.PROCESSING,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("_id", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+    return WebhookEvent.model_validate(document) if document else None
+
+
+async def _blocked_until(event: WebhookEvent, now: datetime) -> Optional[datetime]:
+    """
+    When to look at the event again if an earlier event for the same payment
+    hasn't finished: no sooner than the earlier event's own next attempt, so an
+    event queued behind one in backoff isn't re-claimed on every poll. None when
+    nothing blocks it.
+    """
+    if not event.ordering_key:
+        return None
+    earlier = await WebhookEvent.get_pymongo_collection().find_one(
+        {
+            "ordering_key": event.ordering_key,
+            "_id": {"$lt": event.id},
+            "status": {"$in": [WebhookEventStatus.PENDING, WebhookEventStatus.PROCESSING]},
+        },
+        projection={"status": 1, "next_attempt_at": 1},
+        sort=[("_id", ASCENDING)],
+    )
+    if earlier is None:
+        return None
+    retry_at = now + timedelta(seconds=ORDERING_DEFER_SECONDS)
+    if earlier["status"] == WebhookEventStatus.PENDING:
+        next_attempt_at = earlier["next_attempt_at"]
+        if next_attempt_at.tzinfo is None:
+            next_attempt_at = next_attempt_at.replace(tzinfo=timezone.utc)
+        retry_at = max(retry_at, next_attempt_at)
+    return retry_at
+
+
+async def _release(event: WebhookEvent, worker_id: str, fields: Dict[str, Any], inc: Optional[Dict[str, int]] = None):
+    """Drop the lease and record the outcome (a no-op if the lease was lost)"""
+    update: Dict[str, Any] = {"$set": {"lease_owner": None, "lease_expires_at": None, **fields}}
+    if inc:
+        update["$inc"] = inc
+    await WebhookEvent.get_pymongo_collection().update_one({"_id": event.id, "lease_owner": worker_id}, update)
+
+
+async def process_next_webhook(worker_id: str = WORKER_ID) -> bool:
+    """Process one due event. Returns False when nothing was due."""
+    event = await _claim_next(worker_id)
+    if event is None:
+        return False
+
+    now = datetime.now(timezone.utc)
+    blocked_until = await _blocked_until(event, now)
+    if blocked_until is not None:
+        # Not a real attempt: put it back until the earlier event can be done
+        await _release(event, worker_id, {
+            "status": WebhookEventStatus.PENDING,
+            "next_attempt_at": blocked_until,
+        }, inc={"attempts": -1})
+        return True
+
+    handler = WEBHOOK_HANDLERS.get(event.event)
+    try:
+        if handler is None:
+            logger.info(f"Webhook {event.event_id}: no handler for {event.event}, skipping")
+        else:
+            await handler(event.payload)
+    except Exception as e:
+        dead = event.attempts >= settings.webhook_max_attempts
+        if dead:
+            logger.error(f"Webhook {event.event_id} ({event.event}) dead-lettered after {event.attempts} attempts: {e}")
+        else:
+            logger.warning(f"Webhook {event.event_id} ({event.event}) attempt {event.attempts} failed: {e}")
+        await _release(event, worker_id, {
+            "status": WebhookEventStatus.DEAD if dead else WebhookEventStatus.PENDING,
+            "last_error": str(e)[:1000],
+            "next_attempt_at": now + timedelta(seconds=0 if dead else _retry_delay(event.attempts)),
+        })
+        return True
+
+    await _release(event, worker_id, {
+        "status": WebhookEventStatus.PROCESSED,
+        "processed_at": datetime.now(timezone.utc),
+        "last_error": None,
+    })
+    return True
+
+
+async def replay_events(query: Dict[str, Any]) -> int:
+    """Re-queue matching events (e.g. dead-lettered ones) for a fresh set of attempts"""
+    result = await WebhookEvent.get_pymongo_collection().update_many(
+        query,
+        {"$set": {
+            "status": WebhookEventStatus.PENDING,
+            "attempts": 0,
+            "next_attempt_at": datetime.now(timezone.utc),
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "processed_at": None,
+        }},
+    )
+    webhook_worker_pool.notify()
+    return result.modified_count
+
+
+class WebhookWorkerPool:
+    """Background workers draining the webhook inbox"""
+
+    def __init__(self, concurrency: int = 4, poll_interval: float = 1.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self):
+        """Wake idle workers after an insert (other processes are picked up by polling)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, index: int):
+        worker_id = f"{WORKER_ID}:{index}"
+        while True:
+            try:
+                if await process_next_webhook(worker_id):
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook worker error: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        print(f"📬 Webhook workers started ({self.concurrency})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    async def drain(self) -> int:
+        """Process due events with `concurrency` workers until none are left"""
+        processed = 0
+
+        async def work(index: int):
+            nonlocal processed
+            while await process_next_webhook(f"{WORKER_ID}:drain:{index}"):
+                processed += 1
+
+        await asyncio.gather(*(work(i) for i in range(self.concurrency)))
+        return processed
+
+
+webhook_worker_pool = WebhookWorkerPool(concurrency=settings.webhook_worker_concurrency)
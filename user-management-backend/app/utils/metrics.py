@@ -0,0 +1,293 @@
+"""
+Prometheus metrics for the API.
+
+All metrics are module-level. Hot paths never call .labels() with keyword
+arguments: they look up a label child that was bound once per distinct label
+values (BoundMetric), so recording a sample is a dict lookup plus the
+observation itself. Label values that come from user input (model names) are
+capped so a misbehaving client can't explode the series count.
+
+Multiple workers: start uvicorn/gunicorn with PROMETHEUS_MULTIPROC_DIR pointing
+at an empty, writable directory (wiped on each deploy). Every worker then
+writes its samples to memory-mapped files there and /metrics aggregates all
+workers; without it each worker only reports its own requests.
+"""
+
+import os
+import time
+from typing import Any, Dict, Hashable, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Label value used once a metric has seen too many distinct values
+OVERFLOW_LABEL = "other"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BACKEND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+
+class BoundMetric:
+    """
+    Label children of a metric, bound once per distinct label values.
+
+    Values are passed positionally and may be any hashable (e.g. an int
+    status code); they are converted to strings only when the child is first
+    created. After `max_series` children, new values map to OVERFLOW_LABEL.
+    """
+
+    def __init__(self, metric, max_series: int = 1000):
+        self.metric = metric
+        self.max_series = max_series
+        self._children: Dict[Tuple[Hashable, ...], Any] = {}
+
+    def __call__(self, *values: Hashable):
+        child = self._children.get(values)
+        if child is None:
+            child = self._bind(values)
+        return child
+
+    def _bind(self, values: Tuple[Hashable, ...]):
+        if len(self._children) >= self.max_series:
+            overflow = (OVERFLOW_LABEL,) * len(values)
+            child = self._children.get(overflow)
+            if child is None:
+                child = self._children[overflow] = self.metric.labels(*overflow)
+            return child
+        child = self._children[values] = self.metric.labels(*(str(value) for value in values))
+        return child
+
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template",
+    ["method", "route", "status"], buckets=HTTP_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being served",
+    ["method"], multiprocess_mode="livesum",
+)
+http_request_duration = BoundMetric(HTTP_REQUEST_DURATION)
+http_requests_in_flight = BoundMetric(HTTP_REQUESTS_IN_FLIGHT)
+
+# Rate limiting
+RATE_LIMIT_DECISIONS = Counter(
+    "rate_limit_decisions_total", "Rate limit checks by tier and outcome (allowed, limited, error)",
+    ["tier", "decision"],
+)
+rate_limit_decisions = BoundMetric(RATE_LIMIT_DECISIONS)
+
+# LLM providers
+LLM_REQUEST_DURATION = Histogram(
+    "llm_provider_request_duration_seconds", "LLM provider call latency",
+    ["provider", "model"], buckets=LLM_BUCKETS,
+)
+LLM_REQUEST_ERRORS = Counter(
+    "llm_provider_errors_total", "Failed LLM provider calls",
+    ["provider", "model"],
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported by LLM providers, by kind (prompt, completion)",
+    ["provider", "model", "kind"],
+)
+LLM_CACHE_LOOKUPS = Counter(
+    "llm_response_cache_lookups_total",
+    "Chat completion cache lookups by result (hit, miss, bypass for non-deterministic requests)",
+    ["result"],
+)
+LLM_CACHE_SAVED_TOKENS = Counter(
+    "llm_response_cache_saved_tokens_total", "Provider tokens not billed because the response came from the cache",
+)
+LLM_COALESCED_REQUESTS = Counter(
+    "llm_coalesced_requests_total", "Chat requests that shared an identical in-flight provider call",
+)
+LLM_CIRCUIT_STATE = Gauge(
+    "llm_provider_circuit_state", "Circuit breaker per provider and model (0 closed, 1 half-open, 2 open), worst worker",
+    ["provider", "model"], multiprocess_mode="max",
+)
+LLM_FAILOVERS = Counter(
+    "llm_provider_failovers_total", "Chat requests retried on another provider after a provider failure or open circuit",
+    ["from_provider", "to_provider"],
+)
+LLM_HEDGED_REQUESTS = Counter(
+    "llm_hedged_requests_total", "Chat requests raced against a second call after the p95 delay, by which call won",
+    ["winner"],
+)
+LLM_SCHEDULER_WAIT = Histogram(
+    "llm_scheduler_wait_seconds", "Time upstream LLM calls waited for a provider slot, by tier",
+    ["tier"], buckets=HTTP_BUCKETS,
+)
+LLM_SCHEDULER_REJECTIONS = Counter(
+    "llm_scheduler_rejections_total", "LLM calls answered with 429 by the scheduler, by tier and reason "
+    "(queue_full, deadline, user_limit)",
+    ["tier", "reason"],
+)
+LLM_SCHEDULER_QUEUED = Gauge(
+    "llm_scheduler_queued", "Upstream LLM calls waiting for a provider slot, summed over live workers",
+    ["provider"], multiprocess_mode="livesum",
+)
+LLM_BATCH_ITEMS = Counter(
+    "llm_batch_items_total", "Batch job requests processed, by outcome (succeeded, failed, cancelled)",
+    ["outcome"],
+)
+EMBEDDING_BATCH_INPUTS = Histogram(
+    "embedding_batch_inputs", "Inputs per upstream embeddings call (requests are micro-batched)",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    "embedding_cache_lookups_total", "Embeddings cache lookups per input, by result (hit, miss)",
+    ["result"],
+)
+EMBEDDING_CACHE_LOCAL_BYTES = Gauge(
+    "embedding_cache_local_bytes", "Bytes of packed vectors in the in-process embeddings cache, summed over live workers",
+    multiprocess_mode="livesum",
+)
+llm_request_duration = BoundMetric(LLM_REQUEST_DURATION, max_series=200)
+llm_request_errors = BoundMetric(LLM_REQUEST_ERRORS, max_series=200)
+llm_tokens = BoundMetric(LLM_TOKENS, max_series=400)
+llm_cache_lookups = BoundMetric(LLM_CACHE_LOOKUPS)
+llm_cache_saved_tokens = LLM_CACHE_SAVED_TOKENS
+llm_coalesced_requests = LLM_COALESCED_REQUESTS
+llm_circuit_state = BoundMetric(LLM_CIRCUIT_STATE, max_series=200)
+llm_failovers = BoundMetric(LLM_FAILOVERS)
+llm_hedged_requests = BoundMetric(LLM_HEDGED_REQUESTS)
+llm_scheduler_wait = BoundMetric(LLM_SCHEDULER_WAIT)
+llm_scheduler_rejections = BoundMetric(LLM_SCHEDULER_REJECTIONS)
+llm_scheduler_queued = BoundMetric(LLM_SCHEDULER_QUEUED)
+llm_batch_items = BoundMetric(LLM_BATCH_ITEMS)
+embedding_batch_inputs = EMBEDDING_BATCH_INPUTS
+embedding_cache_lookups = BoundMetric(EMBEDDING_CACHE_LOOKUPS)
+embedding_cache_local_bytes = EMBEDDING_CACHE_LOCAL_BYTES
+
+# Token accounting
+TOKENS_CONSUMED = Counter(
+    "tokens_consumed_total", "Tokens charged to user balances, by account type (user, sub_user)",
+    ["account"],
+)
+TOKEN_RESERVATIONS = Counter(
+    "token_reservations_total",
+    "Token reservation operations by outcome (reserved, rejected, settled, duplicate_settle, released, error)",
+    ["outcome"],
+)
+USAGE_LOGS_BUFFERED = Gauge(
+    "usage_logs_buffered", "Token usage logs recorded but not yet written to MongoDB, summed over live workers",
+    multiprocess_mode="livesum",
+)
+USAGE_LOG_FLUSH_DURATION = Histogram(
+    "usage_log_flush_duration_seconds", "Time to write one flush of usage logs and its daily rollups, by outcome (ok, error)",
+    ["outcome"], buckets=BACKEND_BUCKETS,
+)
+USAGE_LOG_FLUSH_SIZE = Histogram(
+    "usage_log_flush_size", "Usage logs per flush (insert_many)",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+tokens_consumed = BoundMetric(TOKENS_CONSUMED)
+token_reservations = BoundMetric(TOKEN_RESERVATIONS)
+usage_logs_buffered = USAGE_LOGS_BUFFERED
+usage_log_flush_duration = BoundMetric(USAGE_LOG_FLUSH_DURATION)
+usage_log_flush_size = USAGE_LOG_FLUSH_SIZE
+
+# Backends
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency",
+    ["command"], buckets=BACKEND_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands",
+    ["command"],
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds", "Redis round-trip latency, by cache operation",
+    ["operation"], buckets=BACKEND_BUCKETS,
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "MongoDB round trips per request, by route template",
+    ["route"], buckets=QUERY_COUNT_BUCKETS,
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent in MongoDB per request, by route template",
+    ["route"], buckets=HTTP_BUCKETS,
+)
+DB_QUERY_BUDGET_EXCEEDED = Counter(
+    "db_query_budget_exceeded_total",
+    "Requests over the query budget (queries) or repeating a query shape (duplicates)",
+    ["route", "reason"],
+)
+mongo_command_duration = BoundMetric(MONGO_COMMAND_DURATION, max_series=100)
+mongo_command_failures = BoundMetric(MONGO_COMMAND_FAILURES, max_series=100)
+redis_command_duration = BoundMetric(REDIS_COMMAND_DURATION)
+db_queries_per_request = BoundMetric(DB_QUERIES_PER_REQUEST)
+db_time_per_request = BoundMetric(DB_TIME_PER_REQUEST)
+db_query_budget_exceeded = BoundMetric(DB_QUERY_BUDGET_EXCEEDED)
+
+# Cache (hit ratio = hits / all lookups)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Cache lookups by result (l1_hit, l2_hit, miss)",
+    ["result"],
+)
+CACHE_L1_HIT = CACHE_LOOKUPS.labels("l1_hit")
+CACHE_L2_HIT = CACHE_LOOKUPS.labels("l2_hit")
+CACHE_MISS = CACHE_LOOKUPS.labels("miss")
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding the MongoDB latency metrics"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_command_duration(event.command_name).observe(event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        mongo_command_duration(event.command_name).observe(event.duration_micros / 1_000_000)
+        mongo_command_failures(event.command_name).inc()
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+class Timer:
+    """Context manager observing elapsed seconds on a histogram child"""
+
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition payload and content type for /metrics"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead() -> None:
+    """Drop this worker's live gauges from the shared metrics directory on shutdown"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
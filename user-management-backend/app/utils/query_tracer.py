@@ -0,0 +1,148 @@
+"""
+Per-request MongoDB query tracing and N+1 detection.
+
+A pymongo command listener (registered globally on import, so it sees every
+Motor client created afterwards) counts round trips, total database time and
+query shapes into the QueryTrace of the current context. Motor runs commands
+on executor threads with a copy of the caller's context, so the trace started
+by the request middleware follows the request into those threads and into
+any tasks it spawns.
+
+A query shape is the command, collection and filter field names with the
+values dropped, e.g. "find users {_id}". The same shape repeated many times
+within one request is the signature of a query in a loop (N+1).
+"""
+
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from app.config import settings
+from app.utils.metrics import db_queries_per_request, db_query_budget_exceeded, db_time_per_request
+
+logger = logging.getLogger(__name__)
+
+# Cursor bookkeeping: counted as round trips but not as query shapes
+CURSOR_COMMANDS = frozenset({"getMore", "killCursors", "endSessions"})
+
+_current_trace: ContextVar[Optional["QueryTrace"]] = ContextVar("query_trace", default=None)
+
+
+def _filter_fields(filter_doc: Any) -> str:
+    """Field names (and operators) of a filter, without values"""
+    if not isinstance(filter_doc, dict):
+        return "{}"
+    parts = []
+    for key in sorted(filter_doc):
+        value = filter_doc[key]
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            parts.append(f"{key}[{'|'.join(_filter_fields(clause) for clause in value)}]")
+        elif isinstance(value, dict) and value and all(str(op).startswith("$") for op in value):
+            parts.append(f"{key}:{','.join(sorted(value))}")
+        else:
+            parts.append(key)
+    return "{" + ",".join(parts) + "}"
+
+
+def query_shape(command_name: str, command: Dict[str, Any]) -> str:
+    """e.g. "find users {_id}", "update item_purchases {_id,status}", "aggregate users {parent_user_id} $facet" """
+    collection = command.get(command_name)
+    if command_name == "aggregate":
+        stages = [next(iter(stage)) for stage in command.get("pipeline", []) if stage]
+        first = command["pipeline"][0] if stages else {}
+        fields = _filter_fields(first.get("$match")) if "$match" in first else "{}"
+        return f"aggregate {collection} {fields} {' '.join(stage for stage in stages if stage != '$match')}".rstrip()
+    if command_name in ("update", "delete"):
+        statements = command.get(f"{command_name}s") or [{}]
+        return f"{command_name} {collection} {_filter_fields(statements[0].get('q'))}"
+    if command_name == "insert":
+        return f"insert {collection}"
+    filter_doc = command.get("filter", command.get("query"))
+    return f"{command_name} {collection} {_filter_fields(filter_doc)}"
+
+
+class QueryTrace:
+    """MongoDB round trips, database time and query shapes for one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def duplicates(self, threshold: int) -> List[Tuple[str, int]]:
+        """Shapes issued at least `threshold` times, most repeated first"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def describe(self, limit: int = 10) -> str:
+        lines = [f"{self.count} round trips, {self.duration * 1000:.1f} ms in MongoDB"]
+        lines += [f"  {count:>4} x {shape}" for shape, count in self.shapes.most_common(limit)]
+        return "\n".join(lines)
+
+
+class QueryTraceListener(monitoring.CommandListener):
+    """Feeds command events into the current context's QueryTrace, if any"""
+
+    def started(self, event):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        shape = None
+        if event.command_name not in CURSOR_COMMANDS:
+            shape = query_shape(event.command_name, event.command)
+        with trace._lock:
+            trace.count += 1
+            if shape is not None:
+                trace.shapes[shape] += 1
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    @staticmethod
+    def _finished(event):
+        trace = _current_trace.get()
+        if trace is not None:
+            with trace._lock:
+                trace.duration += event.duration_micros / 1_000_000
+
+
+query_trace_listener = QueryTraceListener()
+monitoring.register(query_trace_listener)
+
+
+@contextmanager
+def trace_queries() -> Iterator[QueryTrace]:
+    """Trace the MongoDB commands issued inside the block (including from tasks it starts)"""
+    trace = QueryTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def report_request(trace: QueryTrace, method: str, route: str) -> None:
+    """Record a finished request's trace; warn when it's over the query budget or repeats a query shape"""
+    db_queries_per_request(route).observe(trace.count)
+    db_time_per_request(route).observe(trace.duration)
+
+    if trace.count > settings.query_trace_max_queries:
+        db_query_budget_exceeded(route, "queries").inc()
+        logger.warning(
+            f"{method} {route} made {trace.count} MongoDB round trips "
+            f"(budget {settings.query_trace_max_queries})\n{trace.describe()}"
+        )
+
+    repeated = trace.duplicates(settings.query_trace_duplicate_threshold)
+    if repeated:
+        db_query_budget_exceeded(route, "duplicates").inc()
+        shapes = "\n".join(f"  {count:>4} x {shape}" for shape, count in repeated[:5])
+        logger.warning(f"{method} {route} repeated a query shape (possible N+1):\n{shapes}")
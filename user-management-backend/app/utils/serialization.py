@@ -0,0 +1,112 @@
+"""
+Fast JSON serialization for API responses.
+Responses are rendered with orjson, which handles datetime, UUID, Enum and
+dataclasses natively; ObjectId and a few other types are handled by
+orjson_default. Routes without a response_model skip FastAPI's
+jsonable_encoder pass entirely.
+"""
+
+import functools
+import inspect
+from decimal import Decimal
+from typing import Any, Callable
+
+import orjson
+from bson import ObjectId
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def orjson_default(obj: Any) -> Any:
+    """Serialize types orjson doesn't handle natively, matching jsonable_encoder output"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to JSON bytes"""
+    return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
+
+
+class PreRenderedJSON(str):
+    """
+    JSON text that has already been serialized.
+
+    A str subclass passes through jsonable_encoder untouched, which lets
+    FastJSONRoute skip the encoder while FastAPI still applies the route's
+    status code, headers and background tasks.
+    """
+    __slots__ = ()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, PreRenderedJSON):
+            return content.encode("utf-8")
+        return dumps(content)
+
+
+def _prerender(call: Callable) -> Callable:
+    """Wrap an endpoint so plain return values are serialized with orjson directly"""
+
+    def render(result: Any) -> Any:
+        # Responses built by the endpoint itself are returned as-is
+        if isinstance(result, Response):
+            return result
+        return PreRenderedJSON(dumps(result).decode("utf-8"))
+
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_endpoint(*args, **kwargs):
+            return render(await call(*args, **kwargs))
+        wrapped = async_endpoint
+    else:
+        @functools.wraps(call)
+        def sync_endpoint(*args, **kwargs):
+            return render(call(*args, **kwargs))
+        wrapped = sync_endpoint
+
+    wrapped.__prerendered__ = True
+    return wrapped
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Route class that bypasses jsonable_encoder for routes without a response_model.
+
+    Routes with a response_model keep FastAPI's validation and encoding and
+    are still rendered by FastJSONResponse.
+    """
+
+    def get_route_handler(self) -> Callable:
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+
+        call = self.dependant.call
+        if (
+            self.response_field is None
+            and inspect.isclass(response_class)
+            and issubclass(response_class, FastJSONResponse)
+            and call is not None
+            and not getattr(call, "__prerendered__", False)
+        ):
+            self.dependant.call = _prerender(call)
+
+        return super().get_route_handler()
@@ -0,0 +1,227 @@
+"""
+Benchmark cart checkout and verification against a local MongoDB.
+
+Seeds a catalog of templates and components owned by a handful of developers,
+then times create_cart_order + verify_cart_purchase for a 50-item cart using
+the previous implementation (a get per item and developer, one insert per
+purchase, per-item earnings and counter saves) and the batched one ($in
+fetches, insert_many and grouped bulk writes in a transaction). Razorpay is
+disabled so both sides take the mock-order path and only database work is
+measured.
+
+Usage:
+    python scripts/benchmarks/bench_cart_checkout.py [--mongo-url URL] [--items N]
+        [--developers N] [--rounds N]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from beanie import init_beanie  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from app.models.component import Component  # noqa: E402
+from app.models.developer_earnings import (  # noqa: E402
+    DeveloperEarnings,
+    DeveloperEarningsMonthly,
+    EarningsLedgerEntry,
+)
+from app.models.item_purchase import ItemPurchase, ItemType, PurchaseStatus  # noqa: E402
+from app.models.shopping_cart import CartItem, CartItemType  # noqa: E402
+from app.models.template import Template  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.payment_service import PaymentService  # noqa: E402
+
+
+async def seed(database, items: int, developers: int):
+    """Insert a buyer, `developers` developers and `items` catalog items; return the buyer and cart"""
+    for name in ("users", "templates", "components", "item_purchases", "developer_earnings",
+                 "developer_earnings_ledger", "developer_earnings_monthly"):
+        await database[name].delete_many({})
+
+    now = datetime.now(timezone.utc)
+    developer_ids = [ObjectId() for _ in range(developers)]
+    buyer_id = ObjectId()
+    await database.users.insert_many([
+        {"_id": user_id, "email": f"bench-{i}@example.com", "name": f"Bench {i}", "username": f"bench{i}",
+         "created_at": now, "updated_at": now, "is_active": True}
+        for i, user_id in enumerate([buyer_id, *developer_ids])
+    ])
+
+    cart = []
+    for i in range(items):
+        item_type = "template" if i % 2 == 0 else "component"
+        item_id = ObjectId()
+        await database[f"{item_type}s"].insert_one({
+            "_id": item_id,
+            "title": f"Bench {item_type} {i}",
+            "category": "Layout",
+            "type": "React",
+            "language": "TypeScript",
+            "difficulty_level": "Easy",
+            "plan_type": "Premium",
+            "short_description": "Benchmark item",
+            "full_description": "Benchmark item " * 50,
+            "developer_name": "Bench",
+            "developer_experience": "5 years",
+            "user_id": developer_ids[i % developers],
+            "purchase_count": 0,
+            "created_at": now,
+            "updated_at": now,
+        })
+        cart.append(CartItem(
+            item_id=item_id,
+            item_type=CartItemType(item_type),
+            item_title=f"Bench {item_type} {i}",
+            developer_username=f"bench{1 + i % developers}",
+            price_inr=99 + i,
+            price_usd=2,
+        ))
+
+    return await User.get(buyer_id), cart
+
+
+async def legacy_checkout(user: User, cart_items):
+    """The previous create_cart_order + verify_cart_purchase, one document at a time"""
+    order_id = f"mock_batch_BATCH_{uuid.uuid4().hex[:8]}"
+    for cart_item in cart_items:
+        if cart_item.item_type == "template":
+            item = await Template.get(cart_item.item_id)
+        else:
+            item = await Component.get(cart_item.item_id)
+        if not item:
+            continue
+        developer = await User.get(item.user_id)
+        if not developer:
+            continue
+        purchase = ItemPurchase(
+            purchase_id=f"PUR_{int(datetime.now(timezone.utc).timestamp())}_{uuid.uuid4().hex[:8]}",
+            user_id=user.id,
+            item_id=cart_item.item_id,
+            item_type=ItemType(cart_item.item_type),
+            item_title=cart_item.item_title,
+            developer_id=developer.id,
+            developer_username=developer.username,
+            original_price_inr=cart_item.price_inr,
+            original_price_usd=cart_item.price_usd,
+            paid_amount_inr=cart_item.price_inr,
+            developer_earnings_inr=0,
+            platform_fee_inr=0,
+            razorpay_order_id=order_id,
+            status=PurchaseStatus.PENDING
+        )
+        purchase.calculate_revenue_split()
+        await purchase.insert()
+
+    purchases = await ItemPurchase.find({
+        "razorpay_order_id": order_id,
+        "user_id": user.id,
+        "status": PurchaseStatus.PENDING
+    }).to_list()
+    for purchase in purchases:
+        purchase.mark_completed("pay_bench", "sig_bench")
+        await purchase.save()
+
+        earnings = await DeveloperEarnings.find_one({"developer_id": purchase.developer_id})
+        if not earnings:
+            earnings = DeveloperEarnings(
+                developer_id=purchase.developer_id,
+                developer_username=purchase.developer_username
+            )
+        # The old DeveloperEarnings.add_sale_earnings, applied in Python and saved whole
+        share = int(purchase.paid_amount_inr * 0.70)
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+        earnings.total_earnings_inr += share
+        earnings.available_balance_inr += share
+        earnings.total_sales_count += 1
+        if purchase.item_type == "template":
+            earnings.template_sales_count += 1
+        else:
+            earnings.component_sales_count += 1
+        earnings.average_sale_amount_inr = earnings.total_earnings_inr // earnings.total_sales_count
+        earnings.monthly_earnings[month] = earnings.monthly_earnings.get(month, 0) + share
+        earnings.monthly_sales[month] = earnings.monthly_sales.get(month, 0) + 1
+        earnings.updated_at = datetime.now(timezone.utc)
+        await earnings.save()
+
+        ItemModel = Template if purchase.item_type == "template" else Component
+        item = await ItemModel.get(purchase.item_id)
+        if item:
+            await item.update({"$inc": {"purchase_count": 1}})
+    return len(purchases)
+
+
+async def batched_checkout(service: PaymentService, user: User, cart_items):
+    order = await service.create_cart_order(user, cart_items)
+    assert order["success"], order
+    result = await service.verify_cart_purchase(user, {
+        "razorpay_order_id": order["razorpay_order_id"],
+        "razorpay_payment_id": "pay_bench",
+        "razorpay_signature": "sig_bench",
+    })
+    assert result["success"], result
+    return len(result["completed_items"])
+
+
+async def measure(name: str, database, args, checkout) -> float:
+    user, cart = await seed(database, args.items, args.developers)
+    timings = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        completed = await checkout(user, cart)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert completed == args.items, f"{name}: completed {completed} of {args.items}"
+
+    earnings = await DeveloperEarnings.find_all().to_list()
+    sales = sum(record.total_sales_count for record in earnings)
+    expected = args.items * args.rounds
+    median = statistics.median(timings)
+    print(f"   {name:<22}median {median:8.1f} ms   min {min(timings):8.1f} ms   "
+          f"({len(earnings)} earnings records)")
+    if sales != expected:
+        print(f"   ⚠️ recorded {sales} sales, expected {expected}")
+    return median
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/bench_cart_checkout")
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--developers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    database = client.get_default_database()
+    await init_beanie(
+        database=database,
+        document_models=[User, Template, Component, ItemPurchase, DeveloperEarnings,
+                         EarningsLedgerEntry, DeveloperEarningsMonthly]
+    )
+
+    service = PaymentService()
+    service.gateway = None
+
+    try:
+        print(f"\n📊 Cart checkout + verify ({args.items} items, {args.developers} developers, "
+              f"{args.rounds} rounds)")
+        old = await measure("per-item (old)", database, args, legacy_checkout)
+        new = await measure("batched (new)", database, args,
+                            lambda user, cart: batched_checkout(service, user, cart))
+        print(f"   speedup: {old / new:.1f}x")
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+"""
+Benchmark the developer earnings dashboard against a local MongoDB.
+
+Seeds one developer with 100k completed sales spread over three years, in both
+shapes:
+
+- legacy: ItemPurchase documents plus a DeveloperEarnings summary carrying the
+  monthly_earnings / monthly_sales dicts; recent sales come from sorting the
+  developer's purchases
+- ledger: the earnings ledger, the $inc-maintained summary and one
+  DeveloperEarningsMonthly rollup per month (seeded through record_sales)
+
+Then times the dashboard reads of both and fires concurrent sales at each
+write path, reporting lost updates (the old read-modify-write save drops
+increments under concurrency; the ledger's $inc doesn't).
+
+Usage:
+    python scripts/benchmarks/bench_earnings_dashboard.py [--mongo-url URL] [--sales N]
+        [--runs N] [--concurrent-sales N]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from beanie import init_beanie  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from app.models.developer_earnings import (  # noqa: E402
+    DeveloperEarnings,
+    DeveloperEarningsMonthly,
+    EarningsLedgerEntry,
+    PayoutRequest,
+    PayoutStatus,
+)
+from app.models.item_purchase import ItemPurchase, ItemType, PurchaseStatus  # noqa: E402
+from app.services.earnings_ledger import get_earnings_dashboard, record_sales  # noqa: E402
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+BATCH = 5_000
+
+
+def make_purchase(developer_id, i: int, completed_at: datetime) -> ItemPurchase:
+    amount = 99 + i % 400
+    return ItemPurchase(
+        purchase_id=f"PUR_bench_{uuid.uuid4().hex}",
+        user_id=ObjectId(),
+        item_id=ObjectId(),
+        item_type=ItemType.TEMPLATE if i % 3 else ItemType.COMPONENT,
+        item_title=f"Bench item {i % 200}",
+        developer_id=developer_id,
+        developer_username="bench_dev",
+        original_price_inr=amount,
+        original_price_usd=2,
+        paid_amount_inr=amount,
+        developer_earnings_inr=int(amount * 0.70),
+        platform_fee_inr=amount - int(amount * 0.70),
+        status=PurchaseStatus.COMPLETED,
+        payment_completed_at=completed_at,
+    )
+
+
+async def seed(legacy_id, ledger_id, sales: int):
+    """Write `sales` sales for each developer, in the legacy and ledger shapes"""
+    span = timedelta(days=3 * 365) / sales
+    legacy = DeveloperEarnings(developer_id=legacy_id, developer_username="bench_dev")
+    for offset in range(0, sales, BATCH):
+        indexes = range(offset, min(sales, offset + BATCH))
+        legacy_batch = [make_purchase(legacy_id, i, START + span * i) for i in indexes]
+        await ItemPurchase.insert_many(legacy_batch)
+        for purchase in legacy_batch:
+            month = purchase.payment_completed_at.strftime("%Y-%m")
+            legacy.total_earnings_inr += purchase.developer_earnings_inr
+            legacy.available_balance_inr += purchase.developer_earnings_inr
+            legacy.total_sales_count += 1
+            legacy.monthly_earnings[month] = legacy.monthly_earnings.get(month, 0) + purchase.developer_earnings_inr
+            legacy.monthly_sales[month] = legacy.monthly_sales.get(month, 0) + 1
+        await record_sales([make_purchase(ledger_id, i, START + span * i) for i in indexes])
+    await legacy.insert()
+
+
+async def legacy_dashboard(developer_id):
+    """The previous get_developer_earnings reads"""
+    earnings = await DeveloperEarnings.find_one({"developer_id": developer_id})
+    analytics = earnings.get_analytics_summary()
+    recent_sales = await ItemPurchase.find({
+        "developer_id": developer_id,
+        "status": PurchaseStatus.COMPLETED
+    }).sort([("payment_completed_at", -1)]).limit(10).to_list()
+    analytics["recent_sales"] = [sale.item_title for sale in recent_sales]
+    analytics["pending_payouts"] = await pending_payouts(developer_id)
+    return earnings.to_dict(), analytics
+
+
+async def ledger_dashboard(developer_id):
+    summary, analytics = await get_earnings_dashboard(developer_id, "bench_dev")
+    analytics["pending_payouts"] = await pending_payouts(developer_id)
+    return summary.to_dict(), analytics
+
+
+async def pending_payouts(developer_id):
+    payouts = await PayoutRequest.find({
+        "developer_id": developer_id,
+        "status": {"$in": [PayoutStatus.PENDING, PayoutStatus.APPROVED, PayoutStatus.PROCESSING]}
+    }).sort([("created_at", -1)]).to_list()
+    return [payout.to_dict() for payout in payouts]
+
+
+async def time_runs(dashboard, developer_id, runs: int):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await dashboard(developer_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+
+
+async def legacy_sale(purchase: ItemPurchase):
+    """The old DeveloperEarnings.add_sale_earnings: load, add in Python, save the whole document"""
+    earnings = await DeveloperEarnings.find_one({"developer_id": purchase.developer_id})
+    month = purchase.payment_completed_at.strftime("%Y-%m")
+    earnings.total_earnings_inr += purchase.developer_earnings_inr
+    earnings.available_balance_inr += purchase.developer_earnings_inr
+    earnings.total_sales_count += 1
+    earnings.monthly_earnings[month] = earnings.monthly_earnings.get(month, 0) + purchase.developer_earnings_inr
+    earnings.monthly_sales[month] = earnings.monthly_sales.get(month, 0) + 1
+    await earnings.save()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/bench_earnings_dashboard")
+    parser.add_argument("--sales", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--concurrent-sales", type=int, default=500)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    database = client.get_default_database()
+    await init_beanie(
+        database=database,
+        document_models=[ItemPurchase, DeveloperEarnings, PayoutRequest, EarningsLedgerEntry, DeveloperEarningsMonthly]
+    )
+    legacy_id, ledger_id = ObjectId(), ObjectId()
+
+    try:
+        start = time.perf_counter()
+        await seed(legacy_id, ledger_id, args.sales)
+        print(f"\n📊 Seeded {args.sales:,} sales per developer in {time.perf_counter() - start:.1f}s")
+
+        # Warm up both paths
+        await legacy_dashboard(legacy_id)
+        await ledger_dashboard(ledger_id)
+
+        for label, dashboard, developer_id in (
+            ("legacy (old)", legacy_dashboard, legacy_id),
+            ("ledger (new)", ledger_dashboard, ledger_id),
+        ):
+            median, p95 = await time_runs(dashboard, developer_id, args.runs)
+            print(f"   {label:<14} dashboard  median {median:7.2f} ms   p95 {p95:7.2f} ms")
+
+        # Concurrent sales: count increments that survive
+        now = datetime.now(timezone.utc)
+        for label, developer_id, write in (
+            ("legacy (old)", legacy_id, legacy_sale),
+            ("ledger (new)", ledger_id, lambda purchase: record_sales([purchase])),
+        ):
+            before = await DeveloperEarnings.find_one({"developer_id": developer_id})
+            purchases = [make_purchase(developer_id, i, now) for i in range(args.concurrent_sales)]
+            start = time.perf_counter()
+            await asyncio.gather(*(write(purchase) for purchase in purchases))
+            elapsed = time.perf_counter() - start
+            after = await DeveloperEarnings.find_one({"developer_id": developer_id})
+            lost = args.concurrent_sales - (after.total_sales_count - before.total_sales_count)
+            print(f"   {label:<14} {args.concurrent_sales} concurrent sales in {elapsed:6.2f}s  "
+                  f"{'✅ no lost updates' if lost == 0 else f'⚠️ {lost} lost updates'}")
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
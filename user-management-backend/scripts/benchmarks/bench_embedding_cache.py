@@ -0,0 +1,110 @@
+"""
+Benchmark the embeddings cache: memory per cached vector and hit latency.
+
+For --dims-dimension vectors, reports the bytes one vector takes:
+
+- as a JSON list (what caching the provider response would store)
+- as a Python list of floats (what the API handler holds)
+- packed float32 / float16 (what the cache stores)
+
+and, per dtype, the median/p95 time to look up a request's worth of inputs
+(--batch) when every one is a hit:
+
+- L2 hit: Redis MGET + unpack (in-process LRU cleared before each lookup)
+- L1 hit: the in-process LRU + unpack
+
+If Redis isn't reachable, only L1 is timed.
+
+Usage:
+    python scripts/benchmarks/bench_embedding_cache.py [--redis-url URL] [--dims N] [--batch N] [--runs N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+
+def list_bytes(dims: int) -> int:
+    """Heap bytes of a Python list of `dims` floats"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    vector = [random.uniform(-1, 1) for _ in range(dims)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del vector
+    return size
+
+
+async def time_runs(call, runs: int, before=None):
+    timings = []
+    for _ in range(runs):
+        if before:
+            before()
+        start = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/14")
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--batch", type=int, default=64, help="Inputs looked up per request")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["REDIS_URL"] = args.redis_url
+    from app.config import settings
+    from app.services.embedding_cache import EmbeddingCache, embedding_key, pack
+
+    vector = [random.uniform(-0.1, 0.1) for _ in range(args.dims)]
+    print(f"\n📊 Memory per cached {args.dims}-dimension vector")
+    print(f"   JSON list        {len(json.dumps(vector)):>8,} bytes")
+    print(f"   Python list      {list_bytes(args.dims):>8,} bytes")
+    for dtype in ("float32", "float16"):
+        print(f"   packed {dtype}  {len(pack(vector, dtype)):>8,} bytes")
+
+    cache = EmbeddingCache()
+    keys = [embedding_key("bench-user", "bench-model", f"def snippet_{n}(): pass") for n in range(args.batch)]
+    vectors = [[random.uniform(-0.1, 0.1) for _ in range(args.dims)] for _ in keys]
+    redis_ok = True
+    try:
+        await cache._get_redis().ping()
+    except Exception as e:
+        print(f"\n⚠️ Redis not reachable at {args.redis_url} ({e}); timing the in-process cache only")
+        redis_ok = False
+        settings.embedding_cache_backend = "local"
+
+    print(f"\n📊 Lookup of {args.batch} cached inputs, {args.runs} runs")
+    try:
+        for dtype in ("float32", "float16"):
+            settings.embedding_cache_dtype = dtype
+            await cache.set_many(dict(zip(keys, vectors)))
+            line = f"   {dtype}   "
+            if redis_ok:
+                l2_median, l2_p95 = await time_runs(lambda: cache.get_many(keys), args.runs, before=cache.local.clear)
+                line += f"L2 hit median {l2_median:6.2f} ms  p95 {l2_p95:6.2f} ms   "
+            l1_median, l1_p95 = await time_runs(lambda: cache.get_many(keys), args.runs)
+            line += (f"L1 hit median {l1_median:6.3f} ms  p95 {l1_p95:6.3f} ms   "
+                     f"({l1_median * 1000 / args.batch:5.1f} µs per input, "
+                     f"{cache.local.bytes / len(cache.local):,.0f} bytes per entry in the LRU)")
+            print(line)
+    finally:
+        if redis_ok:
+            await cache._get_redis().delete(*keys)
+        await cache.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
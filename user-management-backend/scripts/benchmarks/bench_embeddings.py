@@ -0,0 +1,124 @@
+"""
+Benchmark embeddings throughput with and without micro-batching.
+
+Embeds N code snippets (default 10,000) against the stub provider from the
+load suite, with --concurrency requests in flight, each for one snippet as the
+editor extension sends them while indexing:
+
+- unbatched: one upstream call per snippet (the old behaviour)
+- batched: through the EmbeddingBatcher, which coalesces concurrent requests
+  into upstream calls of up to --max-batch inputs
+
+Both share --upstream-connections connections to the provider, standing in
+for a provider's concurrency limit. Reports snippets/sec, upstream calls, and
+per-request p50/p95.
+
+Usage:
+    python scripts/benchmarks/bench_embeddings.py [--snippets N] [--concurrency C]
+        [--upstream-connections N] [--provider-latency S] [--window-ms MS] [--max-batch N]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+
+from scripts.benchmarks.load.environment import STUB_API_KEY, StubLLMServer  # noqa: E402
+
+MODEL = "text-embedding-3-small"
+
+
+def snippets(count: int):
+    lines = []
+    for path in sorted((ROOT / "app").rglob("*.py")):
+        lines.extend(line for line in path.read_text(encoding="utf-8", errors="ignore").splitlines() if line.strip())
+    return [lines[i % len(lines)] + f"  # {i}" for i in range(count)]
+
+
+async def drive(embed_one, texts, concurrency: int):
+    """Embed every text with `concurrency` closed-loop workers; per-request latencies in ms"""
+    queue = list(reversed(texts))
+    latencies = []
+
+    async def worker():
+        while queue:
+            text = queue.pop()
+            start = time.perf_counter()
+            response = await embed_one(text)
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def report(label: str, elapsed: float, latencies, texts, stub: StubLLMServer, calls_before: int):
+    calls = stub.embedding_requests - calls_before
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"   {label:<10} {len(texts) / elapsed:8.0f} snippets/s   {elapsed:6.2f} s   "
+          f"{calls:>6} upstream calls ({len(texts) / calls:5.1f} inputs each)   "
+          f"p50 {statistics.median(latencies):7.1f} ms   p95 {p95:7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--snippets", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--upstream-connections", type=int, default=8)
+    parser.add_argument("--provider-latency", type=float, default=0.05, help="Seconds per upstream call")
+    parser.add_argument("--window-ms", type=float, default=10.0)
+    parser.add_argument("--max-batch", type=int, default=256)
+    args = parser.parse_args()
+
+    stub = StubLLMServer(latency=args.provider_latency, jitter=args.provider_latency / 5).start()
+    os.environ["A4F_BASE_URL"] = os.environ["OPENROUTER_API_BASE"] = stub.base_url
+    os.environ["A4F_API_KEY"] = os.environ["OPENROUTER_API_KEY"] = STUB_API_KEY
+    os.environ["EMBEDDING_BATCH_WINDOW_MS"] = str(args.window_ms)
+    os.environ["EMBEDDING_BATCH_MAX_INPUTS"] = str(args.max_batch)
+    from app.services.embedding_batcher import EmbeddingBatcher
+    from app.services.llm_proxy_service import OpenRouterClient
+    from app.services.tokenizer import tokenizers
+
+    def provider_client():
+        client = OpenRouterClient()
+        client.client = httpx.AsyncClient(limits=httpx.Limits(max_connections=args.upstream_connections), timeout=60)
+        return client
+
+    texts = snippets(args.snippets)
+    print(f"\n📊 {len(texts):,} snippets, {args.concurrency} concurrent requests, "
+          f"{args.upstream_connections} upstream connections, stub latency {args.provider_latency * 1000:.0f} ms per call")
+    try:
+        client = provider_client()
+        calls_before = stub.embedding_requests
+        elapsed, latencies = await drive(lambda text: client.embeddings([text], MODEL), texts, args.concurrency)
+        report("unbatched", elapsed, latencies, texts, stub, calls_before)
+        await client.close()
+
+        batcher = EmbeddingBatcher()
+        batcher._clients["openrouter"] = provider_client()
+
+        async def batched(text):
+            counts = await tokenizers.count_texts(MODEL, [text])
+            return await batcher.embed("openrouter", OpenRouterClient, MODEL, [text], counts)
+
+        calls_before = stub.embedding_requests
+        elapsed, latencies = await drive(batched, texts, args.concurrency)
+        report("batched", elapsed, latencies, texts, stub, calls_before)
+        await batcher.close()
+    finally:
+        tokenizers.shutdown()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
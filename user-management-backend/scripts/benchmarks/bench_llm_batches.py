@@ -0,0 +1,149 @@
+"""
+Benchmark batch completion jobs against per-request completions.
+
+Runs N chat completions (default 1,000) against the stub provider from the
+load suite, two ways:
+
+- per request: the client sends each completion itself over
+  --client-connections connections, holding one open per completion (as
+  the editor extension does for bulk features today)
+- batch: one submission stored in MongoDB, processed by the batch worker
+  pool with --item-concurrency requests in flight, results written as they
+  finish
+
+Both go through the same provider routing and scheduler. Reports
+completions/sec, time to the first and last result, and upstream calls.
+Needs a local MongoDB (--mongo-url); the database is dropped afterwards.
+
+Usage:
+    python scripts/benchmarks/bench_llm_batches.py [--mongo-url URL] [--requests N]
+        [--client-connections N] [--item-concurrency N] [--provider-latency S]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+
+from scripts.benchmarks.load.environment import STUB_API_KEY, StubLLMServer  # noqa: E402
+
+MODEL = "gpt-4o-mini"
+
+
+def batch_requests(count: int):
+    return [{
+        "custom_id": f"fn-{n}",
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": "Write a one-line docstring for the function."},
+            {"role": "user", "content": f"def handler_{n}(event, context):\n    return process(event)"},
+        ],
+        "params": {"temperature": 0.2, "max_tokens": 64},
+    } for n in range(count)]
+
+
+async def per_request(service, requests, connections: int):
+    """Each completion on its own call, `connections` at a time; (elapsed, first result, failures)"""
+    queue = list(reversed(requests))
+    first = None
+    failures = 0
+    started = time.perf_counter()
+
+    async def client():
+        nonlocal first, failures
+        while queue:
+            request = queue.pop()
+            response, _ = await service._call_routes(request["model"], request["messages"], dict(request["params"]),
+                                                     tier="pro")
+            failures += "error" in response
+            if first is None:
+                first = time.perf_counter() - started
+
+    await asyncio.gather(*(client() for _ in range(connections)))
+    return time.perf_counter() - started, first, failures
+
+
+async def batched(pool, requests):
+    """Submit one batch and process it; (submit time, elapsed, first result, failures)"""
+    from app.models.llm_batch import LLMBatch, LLMBatchItem
+    from app.services.llm_batches import enqueue_batch
+
+    started = time.perf_counter()
+    batch = await enqueue_batch("bench-user", "pro", requests)
+    submitted = time.perf_counter() - started
+    await pool.drain()
+    elapsed = time.perf_counter() - started
+
+    first_item = await LLMBatchItem.find({"batch_id": str(batch.id), "sequence": 1}).first_or_none()
+    first = (first_item.completed_at.timestamp() - batch.created_at.timestamp()) if first_item else None
+    batch = await LLMBatch.get(batch.id)
+    return submitted, elapsed, first, batch.failed_count
+
+
+def report(label: str, count: int, elapsed: float, first, failures: int, calls: int, extra: str = ""):
+    first_text = f"{first * 1000:7.0f} ms" if first is not None else "      –"
+    print(f"   {label:<12} {count / elapsed:8.0f} completions/s   all results {elapsed:6.2f} s   "
+          f"first result {first_text}   {calls:>6} upstream calls   {failures} failed{extra}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/bench_llm_batches")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--client-connections", type=int, default=6)
+    parser.add_argument("--item-concurrency", type=int, default=64)
+    parser.add_argument("--provider-latency", type=float, default=0.3, help="Seconds per upstream call")
+    args = parser.parse_args()
+
+    stub = StubLLMServer(latency=args.provider_latency, jitter=args.provider_latency / 5).start()
+    os.environ["A4F_BASE_URL"] = os.environ["OPENROUTER_API_BASE"] = stub.base_url
+    os.environ["A4F_API_KEY"] = os.environ["OPENROUTER_API_KEY"] = STUB_API_KEY
+    os.environ["LLM_BATCH_ITEM_CONCURRENCY"] = str(args.item_concurrency)
+    from beanie import init_beanie
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from app.models.llm_batch import LLMBatch, LLMBatchItem
+    from app.services.llm_batches import LLMBatchWorkerPool
+    from app.services.llm_proxy_service import LLMProxyService
+    from app.services.tokenizer import tokenizers
+
+    client = AsyncIOMotorClient(args.mongo_url, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        print(f"❌ MongoDB not reachable at {args.mongo_url}: {e}")
+        stub.stop()
+        return
+    database = client.get_default_database()
+    await init_beanie(database=database, document_models=[LLMBatch, LLMBatchItem])
+
+    requests = batch_requests(args.requests)
+    print(f"\n📊 {len(requests):,} completions, stub latency {args.provider_latency * 1000:.0f} ms, "
+          f"{args.client_connections} client connections vs {args.item_concurrency} batch items in flight")
+    try:
+        service = LLMProxyService(None)
+        calls_before = stub.requests
+        elapsed, first, failures = await per_request(service, requests, args.client_connections)
+        report("per request", len(requests), elapsed, first, failures, stub.requests - calls_before)
+        await service.close()
+
+        pool = LLMBatchWorkerPool(concurrency=1)
+        calls_before = stub.requests
+        submitted, elapsed, first, failures = await batched(pool, requests)
+        report("batch", len(requests), elapsed, first, failures, stub.requests - calls_before,
+               f"   (submitted in {submitted * 1000:.0f} ms)")
+        await pool.stop()
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+        tokenizers.shutdown()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Benchmark LLM response cache hits against a provider round trip.
+
+Builds chat completions of a few sizes and times, per size:
+
+- provider (miss): a stub provider call over httpx with --provider-latency
+- L2 hit: Redis GET + decompress (in-process L1 cleared before each lookup)
+- L1 hit: the in-process LRU
+
+and reports the compressed entry size.
+
+Usage:
+    python scripts/benchmarks/bench_llm_cache.py [--redis-url URL] [--runs N] [--provider-latency S]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import httpx  # noqa: E402
+
+
+def completion(tokens: int) -> dict:
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "model": "bench-model",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "def handler(event):\n    return event\n" * (tokens // 10)},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 200, "completion_tokens": tokens, "total_tokens": 200 + tokens},
+    }
+
+
+async def time_runs(call, runs: int, before=None):
+    timings = []
+    for _ in range(runs):
+        if before:
+            before()
+        start = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/14")
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--provider-latency", type=float, default=0.8, help="Seconds per stub provider call")
+    args = parser.parse_args()
+
+    os.environ["REDIS_URL"] = args.redis_url
+    os.environ["LLM_RESPONSE_CACHE_ENABLED"] = "true"
+    from app.services.llm_response_cache import LLMResponseCache, cache_key  # noqa: E402
+
+    cache = LLMResponseCache()
+    print(f"\n📊 {args.runs} lookups per size, stub provider latency {args.provider_latency * 1000:.0f} ms")
+    try:
+        for tokens in (100, 1_000, 4_000):
+            response = completion(tokens)
+
+            async def provider(request: httpx.Request) -> httpx.Response:
+                await asyncio.sleep(args.provider_latency)
+                return httpx.Response(200, json=response)
+
+            async with httpx.AsyncClient(transport=httpx.MockTransport(provider)) as client:
+                miss_median, miss_p95 = await time_runs(
+                    lambda: client.post("http://provider/v1/chat/completions", json={}), max(3, args.runs // 50)
+                )
+
+            key = cache_key("bench", "bench-model", [{"role": "user", "content": f"explain {tokens}"}],
+                            {"temperature": 0})
+            await cache.set(key, response)
+            blob = cache.local.get(key)
+            l2_median, l2_p95 = await time_runs(lambda: cache.get(key, "pro"), args.runs, before=cache.local.clear)
+            l1_median, l1_p95 = await time_runs(lambda: cache.get(key, "pro"), args.runs)
+
+            print(f"   {tokens:>5} completion tokens ({len(blob) / 1024:6.1f} KiB compressed)   "
+                  f"provider median {miss_median:7.1f} ms  p95 {miss_p95:7.1f} ms   "
+                  f"L2 hit median {l2_median:6.2f} ms  p95 {l2_p95:6.2f} ms   "
+                  f"L1 hit median {l1_median:6.3f} ms  p95 {l1_p95:6.3f} ms")
+    finally:
+        redis = cache._get_redis()
+        if redis is not None:
+            keys = [key async for key in redis.scan_iter("llm:resp:v1:bench:*")]
+            if keys:
+                await redis.delete(*keys)
+        await cache.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+Simulate mixed-tier LLM load with and without the tier-aware scheduler.
+
+A simulated provider serves at most --provider-limit calls at once (each
+taking --latency seconds, ±20%) and answers anything beyond that with an
+upstream 429, like a provider's concurrency limit. Load, over --duration
+seconds:
+
+- free: a burst of --free-burst requests from 200 users in the first second,
+  then 20/s
+- pro: 20/s from 50 users
+- ultra: 10/s from 20 users
+
+Runs it twice: every request straight to the provider (the old behaviour),
+then through LLMScheduler with the provider budget set to --provider-limit.
+Per tier, reports requests served, rejected by the scheduler (429 with
+Retry-After), failed upstream, and p50/p95 latency of served requests.
+
+Usage:
+    python scripts/benchmarks/bench_llm_scheduler.py [--duration S] [--free-burst N]
+        [--provider-limit N] [--latency S]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+# tier -> (users, steady requests per second)
+STEADY_LOAD = {"free": (200, 20), "pro": (50, 20), "ultra": (20, 10)}
+
+
+class SimulatedProvider:
+    def __init__(self, limit: int, latency: float):
+        self.limit = limit
+        self.latency = latency
+        self.in_flight = 0
+
+    async def call(self) -> bool:
+        if self.in_flight >= self.limit:
+            await asyncio.sleep(0.005)
+            return False
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latency * random.uniform(0.8, 1.2))
+            return True
+        finally:
+            self.in_flight -= 1
+
+
+def arrivals(duration: float, free_burst: int):
+    """(start offset seconds, tier, user id), sorted by offset"""
+    schedule = [(random.uniform(0, 1), "free", f"free-{random.randrange(200)}") for _ in range(free_burst)]
+    for tier, (users, rate) in STEADY_LOAD.items():
+        offset = random.expovariate(rate)
+        while offset < duration:
+            schedule.append((offset, tier, f"{tier}-{random.randrange(users)}"))
+            offset += random.expovariate(rate)
+    return sorted(schedule)
+
+
+async def run(schedule, provider: SimulatedProvider, scheduler=None):
+    from app.services.llm_scheduler import LLMOverloaded
+
+    outcomes = defaultdict(lambda: defaultdict(int))
+    latencies = defaultdict(list)
+
+    async def request(tier: str, user_id: str):
+        started = time.perf_counter()
+        try:
+            if scheduler is None:
+                ok = await provider.call()
+            else:
+                with scheduler.admit(user_id, tier):
+                    async with scheduler.slot("stub", tier):
+                        ok = await provider.call()
+        except LLMOverloaded:
+            outcomes[tier]["rejected"] += 1
+            return
+        if ok:
+            outcomes[tier]["served"] += 1
+            latencies[tier].append((time.perf_counter() - started) * 1000)
+        else:
+            outcomes[tier]["upstream_errors"] += 1
+
+    started = time.perf_counter()
+    tasks = []
+    for offset, tier, user_id in schedule:
+        delay = offset - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(request(tier, user_id)))
+    await asyncio.gather(*tasks)
+    return outcomes, latencies
+
+
+def report(label: str, outcomes, latencies):
+    print(f"\n   {label}")
+    for tier in ("ultra", "pro", "free"):
+        counts = outcomes[tier]
+        served = sorted(latencies[tier])
+        line = (f"      {tier:<6} served {counts['served']:>5}   rejected (429) {counts['rejected']:>5}   "
+                f"upstream errors {counts['upstream_errors']:>5}")
+        if served:
+            p95 = served[min(len(served) - 1, int(0.95 * len(served)))]
+            line += f"   p50 {statistics.median(served):7.0f} ms   p95 {p95:7.0f} ms"
+        print(line)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--free-burst", type=int, default=2000)
+    parser.add_argument("--provider-limit", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per provider call")
+    args = parser.parse_args()
+
+    os.environ["LLM_SCHEDULER_PROVIDER_CONCURRENCY"] = json.dumps({"stub": args.provider_limit})
+    from app.services.llm_scheduler import LLMScheduler
+
+    random.seed(7)
+    schedule = arrivals(args.duration, args.free_burst)
+    print(f"\n📊 {len(schedule):,} requests over {args.duration:.0f} s, provider limit {args.provider_limit} "
+          f"concurrent calls of ~{args.latency * 1000:.0f} ms")
+
+    report("unscheduled", *await run(schedule, SimulatedProvider(args.provider_limit, args.latency)))
+    report("scheduled", *await run(schedule, SimulatedProvider(args.provider_limit, args.latency), LLMScheduler()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
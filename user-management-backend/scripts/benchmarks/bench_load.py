@@ -0,0 +1,179 @@
+"""
+Load-test the whole app with local stand-ins and report per-route latency.
+
+Boots app.main:app (lifespan included) against MongoDB (a local server, or
+mongomock-motor), Redis (a local server, or fakeredis), a stub LLM provider
+and a stub Razorpay, seeds synthetic users, templates and usage logs, then
+drives each scenario with closed-loop workers:
+
+- chat: editor-extension chat completions (plus the model list)
+- marketplace: template listing, filtering, search, detail and categories
+- login: password login bursts from many addresses
+- admin: admin analytics and the sub-user dashboard
+
+Every run writes JSON (per route: requests, errors, status codes, throughput,
+p50, p95, p99) tagged with the git commit, so runs can be compared across
+commits with --compare. Any non-2xx response counts as an error rather than
+a latency sample, and the run exits non-zero when a route's error rate is
+over --max-error-rate (0 by default). Requests go through httpx's ASGI transport by default; use
+--transport http to serve the app with uvicorn on a local port instead.
+
+Usage:
+    python scripts/benchmarks/bench_load.py [--scale small|medium|large] [--users N] [--templates N]
+        [--usage-logs N] [--scenarios chat,marketplace,login,admin] [--concurrency C] [--duration S]
+        [--mongo URL|mock] [--redis URL|fake] [--llm-latency S] [--transport asgi|http]
+        [--output PATH] [--compare BASELINE.json] [--keep-data] [--max-error-rate R]
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+
+from scripts.benchmarks.load import environment  # noqa: E402
+
+
+@asynccontextmanager
+async def serve(app, transport: str):
+    """An httpx client talking to the running app (lifespan started)"""
+    if transport == "asgi":
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                         timeout=60.0) as client:
+                yield client
+        return
+
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    limits = httpx.Limits(max_connections=1_000, max_keepalive_connections=1_000)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60.0) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=["small", "medium", "large"], default="small")
+    parser.add_argument("--users", type=int, help="Override the scale's user count")
+    parser.add_argument("--sub-users", type=int, help="Override the scale's sub-user count")
+    parser.add_argument("--templates", type=int, help="Override the scale's template count")
+    parser.add_argument("--usage-logs", type=int, help="Override the scale's token usage log count")
+    parser.add_argument("--scenarios", default="chat,marketplace,login,admin")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per scenario")
+    parser.add_argument("--max-requests", type=int, help="Stop a scenario after this many requests")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unrecorded seconds before each scenario")
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/bench_load", help="MongoDB URL, or 'mock'")
+    parser.add_argument("--redis", default="fake", help="Redis URL, or 'fake'")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub provider latency in seconds")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--razorpay-latency", type=float, default=0.05)
+    parser.add_argument("--transport", choices=["asgi", "http"], default="asgi")
+    parser.add_argument("--output", type=Path, help="JSON report path (default load-results/load-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="Previous JSON report to compare against")
+    parser.add_argument("--keep-data", action="store_true", help="Don't drop the seeded database afterwards")
+    parser.add_argument("--max-error-rate", type=float, default=0.0,
+                        help="Fail the run when a route's share of non-2xx responses is higher (e.g. with "
+                             "--llm-failure-rate)")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    llm = environment.StubLLMServer(latency=args.llm_latency, failure_rate=args.llm_failure_rate).start()
+    environment.configure(args.mongo, args.redis, llm, args.razorpay_latency)
+
+    # Only now: settings, clients and the payment gateway are created on import
+    from app.main import app  # noqa: E402
+    from app.models.user import User  # noqa: E402
+    from scripts.benchmarks.load.report import (  # noqa: E402
+        build_report, failed_routes, print_comparison, print_summary, summarize, write_report,
+    )
+    from scripts.benchmarks.load.scenarios import SCENARIOS, run_scenario  # noqa: E402
+    from scripts.benchmarks.load.seed import SCALES, seed  # noqa: E402
+
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    if args.redis == "fake":
+        environment.install_fake_redis()
+
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        override = getattr(args, key)
+        if override is not None:
+            scale[key] = override
+
+    results = {}
+    try:
+        async with serve(app, args.transport) as client:
+            database = User.get_pymongo_collection().database
+            try:
+                start = time.perf_counter()
+                fixture = await seed(scale)
+                print(f"\n🌱 Seeded {scale['users']:,} users, {scale['sub_users']:,} sub-users, "
+                      f"{scale['templates']:,} templates, {scale['usage_logs']:,} usage logs "
+                      f"in {time.perf_counter() - start:.1f}s")
+
+                for name in scenarios:
+                    if args.warmup:
+                        await run_scenario(client, name, fixture, args.concurrency, args.warmup, seed=1)
+                    samples, wall = await run_scenario(client, name, fixture, args.concurrency, args.duration,
+                                                       args.max_requests)
+                    results[name] = summarize(samples, wall)
+                    print_summary(name, results[name])
+            finally:
+                if not args.keep_data:
+                    await database.client.drop_database(database.name)
+    finally:
+        llm.stop()
+
+    config = {
+        "scale": args.scale, **scale, "scenarios": scenarios, "concurrency": args.concurrency,
+        "duration": args.duration, "max_requests": args.max_requests, "warmup": args.warmup,
+        "mongo": "mock" if args.mongo == "mock" else "server", "redis": "fake" if args.redis == "fake" else "server",
+        "llm_latency": args.llm_latency, "llm_failure_rate": args.llm_failure_rate,
+        "razorpay_latency": args.razorpay_latency, "transport": args.transport,
+    }
+    report = build_report(results, config, ROOT)
+    output = args.output
+    if output is None:
+        revision = report["git"]["commit"][:10] or "unknown"
+        output = ROOT / "load-results" / f"load-{revision}{'-dirty' if report['git']['dirty'] else ''}.json"
+    write_report(report, output)
+    print(f"\n✅ Report written to {output}")
+
+    if args.compare:
+        print_comparison(json.loads(args.compare.read_text()), report)
+
+    failures = [f"{name}: {route}" for name, summary in results.items()
+                for route in failed_routes(summary, args.max_error_rate)]
+    if failures:
+        print(f"\n❌ Error rate over {args.max_error_rate:.2%}, latencies above exclude these requests:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Benchmark middleware overhead on a trivial route.
+
+Compares the previous BaseHTTPMiddleware implementation of
+PerformanceAndRateLimitMiddleware with the pure ASGI one. The rate limiter is
+stubbed out so only the middleware plumbing is measured.
+
+Usage:
+    python scripts/benchmarks/bench_middleware.py [--requests N] [--concurrency C]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from app.middleware import performance  # noqa: E402
+from app.middleware.rate_limiting import rate_limit_middleware, add_rate_limit_headers  # noqa: E402
+
+
+async def stub_check_rate_limit(request, db):
+    return {"limit": 1000, "remaining": 999, "reset": int(time.time()) + 3600, "tier": "free"}
+
+
+class LegacyPerformanceAndRateLimitMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation this benchmark compares against"""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        if request.method != "OPTIONS" and request.url.path not in ["/", "/health", "/docs", "/redoc", "/openapi.json"]:
+            try:
+                from app.database import get_database
+                from app.middleware.rate_limiting import rate_limit_middleware
+
+                db = get_database()
+                try:
+                    request.state.rate_limit_info = await rate_limit_middleware.check_rate_limit(request, db)
+                except Exception:
+                    request.state.rate_limit_info = {
+                        "limit": 100, "remaining": 99, "reset": int(time.time()) + 3600, "tier": "fallback"
+                    }
+            except Exception as e:
+                print(f"Rate limiting initialization error: {e}")
+
+        response = await call_next(request)
+        response.headers["X-Process-Time"] = str(time.time() - start_time)
+        if hasattr(request.state, "rate_limit_info"):
+            add_rate_limit_headers(response, request.state.rate_limit_info)
+        return response
+
+
+def build_app(middleware_class) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/api/stream")
+    async def stream():
+        async def chunks():
+            for i in range(50):
+                yield f"data: {i}\n\n".encode()
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    app.add_middleware(middleware_class)
+    return app
+
+
+async def drive(app: FastAPI, path: str, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up
+        for _ in range(50):
+            await client.get(path)
+
+        remaining = total
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get(path)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    rate_limit_middleware.check_rate_limit = stub_check_rate_limit
+
+    stacks = {
+        "BaseHTTPMiddleware (old)": LegacyPerformanceAndRateLimitMiddleware,
+        "pure ASGI (new)": performance.PerformanceAndRateLimitMiddleware,
+    }
+
+    print(f"📊 {args.requests} requests, concurrency {args.concurrency}")
+    for path in ("/api/ping", "/api/stream"):
+        print(f"\n{path}")
+        results = {}
+        for name, middleware_class in stacks.items():
+            results[name] = await drive(build_app(middleware_class), path, args.requests, args.concurrency)
+            print(f"   {name:<28}{results[name]:>10.0f} req/s")
+        old, new = results.values()
+        print(f"   speedup: {new / old:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
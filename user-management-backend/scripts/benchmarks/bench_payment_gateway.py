@@ -0,0 +1,112 @@
+"""
+Benchmark gateway calls from async code: blocking SDK vs async adapter.
+
+Issues N concurrent create-order + fetch-payment round trips with a fixed
+simulated gateway latency. The blocking side calls a synchronous client from
+the coroutine, as the razorpay SDK did; the async side goes through
+RazorpayGateway on an httpx MockTransport that serves FakePaymentGateway, so
+the adapter's request, retry and pooling code is exercised end to end
+without network access. A heartbeat task measures event-loop lag, which is
+what every other request on the worker sees while the gateway is slow.
+
+Usage:
+    python scripts/benchmarks/bench_payment_gateway.py [--requests N] [--latency-ms MS]
+        [--failure-rate R]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.payment_gateway import FakePaymentGateway, RazorpayGateway  # noqa: E402
+
+
+class BlockingClient:
+    """Stand-in for the synchronous SDK: each call holds the thread for the round trip"""
+
+    def __init__(self, fake: FakePaymentGateway, latency: float):
+        self.fake = fake
+        self.latency = latency
+
+    def create_order(self, data):
+        time.sleep(self.latency)
+        order = {"id": f"order_{uuid.uuid4().hex[:14]}", "status": "created", **data}
+        self.fake.orders[order["id"]] = order
+        return order
+
+    def fetch_payment(self, payment_id):
+        time.sleep(self.latency)
+        return self.fake.payments[payment_id]
+
+
+async def heartbeat(lags, stop: asyncio.Event, interval: float = 0.005):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(name: str, requests: int, checkout) -> None:
+    lags = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(checkout(i) for i in range(requests)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    failed = sum(isinstance(result, Exception) for result in results)
+    max_lag = max(lags, default=0) * 1000
+    print(f"   {name:<18}{elapsed:8.2f}s  ({requests / elapsed:8.1f} checkouts/s)  "
+          f"max loop lag {max_lag:8.1f} ms  failed {failed}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    order_data = {"amount": 49900, "currency": "INR", "receipt": "bench", "notes": {}}
+
+    blocking_fake = FakePaymentGateway()
+    blocking = BlockingClient(blocking_fake, latency)
+
+    async def blocking_checkout(i):
+        order = blocking.create_order(order_data)
+        payment = blocking_fake.pay(order["id"])
+        blocking.fetch_payment(payment["razorpay_payment_id"])
+
+    async_fake = FakePaymentGateway(latency=latency, failure_rate=args.failure_rate)
+    gateway = RazorpayGateway(
+        async_fake.key_id, async_fake.key_secret,
+        backoff_base=0.05, max_connections=100, transport=async_fake.as_transport()
+    )
+
+    async def async_checkout(i):
+        order = await gateway.create_order(order_data)
+        payment = async_fake.pay(order["id"])
+        assert gateway.verify_payment_signature(
+            payment["razorpay_order_id"], payment["razorpay_payment_id"], payment["razorpay_signature"]
+        )
+        await gateway.fetch_payment(payment["razorpay_payment_id"])
+
+    print(f"\n📊 {args.requests} concurrent checkouts, gateway latency {args.latency_ms:.0f} ms "
+          f"(failure rate {args.failure_rate:.0%} on the async side)")
+    try:
+        await run("blocking SDK", args.requests, blocking_checkout)
+        await run("async adapter", args.requests, async_checkout)
+    finally:
+        await gateway.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
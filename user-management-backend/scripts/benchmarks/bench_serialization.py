@@ -0,0 +1,117 @@
+"""
+Benchmark JSON serialization and compression for a 100-template page.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json, as rendered
+by JSONResponse) with the orjson path used by FastJSONRoute/FastJSONResponse,
+and reports response size with gzip and brotli.
+
+Usage:
+    python scripts/benchmarks/bench_serialization.py [--page-size N] [--rounds N]
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app.middleware.compression import compress, brotli  # noqa: E402
+from app.utils.serialization import dumps  # noqa: E402
+
+
+def synthetic_template(i: int) -> dict:
+    """A template document shaped like Template.to_dict(), with native types"""
+    created = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(hours=i)
+    return {
+        "id": ObjectId(),
+        "title": f"Modern SaaS Landing Page {i}",
+        "category": ["Landing Page", "Dashboard", "Portfolio", "E-commerce"][i % 4],
+        "type": ["React", "Vue", "Angular", "HTML/CSS"][i % 4],
+        "language": "TypeScript",
+        "difficulty_level": ["Easy", "Medium", "Tough"][i % 3],
+        "plan_type": ["Free", "Premium"][i % 2],
+        "rating": 4.5,
+        "downloads": 1200 + i,
+        "views": 15000 + i * 7,
+        "likes": 300 + i,
+        "short_description": "A responsive landing page template with hero, pricing and testimonials sections.",
+        "full_description": "Built with modern tooling. " * 20,
+        "preview_images": [f"https://res.cloudinary.com/demo/image/upload/v1/templates/{i}-{n}.png" for n in range(3)],
+        "git_repo_url": f"https://github.com/example/template-{i}",
+        "live_demo_url": f"https://template-{i}.example.com",
+        "dependencies": ["react", "react-dom", "tailwindcss", "framer-motion"],
+        "tags": ["saas", "landing", "responsive", "dark-mode"],
+        "developer_name": "Jordan Example",
+        "developer_experience": "5 years",
+        "is_available_for_dev": True,
+        "featured": i % 10 == 0,
+        "popular": i % 5 == 0,
+        "code": None,
+        "readme_content": "# Setup\n\nnpm install && npm run dev\n" * 5,
+        "user_id": ObjectId(),
+        "created_at": created,
+        "updated_at": created + timedelta(days=3),
+        "is_active": True,
+        "status": "approved",
+        "approval_status": "approved",
+    }
+
+
+def default_render(page: dict) -> bytes:
+    """What FastAPI does today: jsonable_encoder, then JSONResponse.render"""
+    encoded = jsonable_encoder(page, custom_encoder={ObjectId: str})
+    return json.dumps(encoded, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn, page, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(page)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    page = {
+        "templates": [synthetic_template(i) for i in range(args.page_size)],
+        "total": 5000,
+        "page": 1,
+        "limit": args.page_size,
+    }
+
+    baseline_ms = timed(default_render, page, args.rounds)
+    orjson_ms = timed(dumps, page, args.rounds)
+
+    print(f"📊 Serializing a {args.page_size}-template page ({args.rounds} rounds)")
+    print(f"   jsonable_encoder + json: {baseline_ms:8.3f} ms")
+    print(f"   orjson:                  {orjson_ms:8.3f} ms  ({baseline_ms / orjson_ms:.1f}x faster)")
+
+    body = dumps(page)
+    print(f"\n📦 Response size")
+    print(f"   identity: {len(body):>9,} bytes")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            compressed = compress(body, encoding)
+        elapsed_ms = (time.perf_counter() - start) / args.rounds * 1000
+        print(
+            f"   {encoding:<8}: {len(compressed):>9,} bytes "
+            f"({len(compressed) / len(body):.1%}, {elapsed_ms:.3f} ms to compress)"
+        )
+    if brotli is None:
+        print("   br      : skipped (brotli not installed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark the sub-user dashboard against a local MongoDB.
+
+Seeds a parent account with 500 sub-users, their API keys and 1M token usage
+logs spread over the last 90 days, then times each dashboard endpoint:
+
+- per-user (old): the previous endpoints' access pattern on Beanie, i.e. load
+  every sub-user, then count keys / fetch today's logs / fetch the last log per
+  sub-user and group usage trends in Python
+- aggregated (new): the endpoints' aggregation helpers
+
+Usage:
+    python scripts/benchmarks/bench_sub_user_dashboard.py [--mongo-url URL] [--sub-users N]
+        [--logs N] [--runs N]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from beanie import init_beanie  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from app.api.sub_user_dashboard import get_activity, get_limits, get_overview_stats, get_trends  # noqa: E402
+from app.models.user import ApiKey, TokenUsageLog, User  # noqa: E402
+
+BATCH = 50_000
+
+
+async def seed(database, sub_users: int, logs: int):
+    """Insert a parent, `sub_users` sub-users with two API keys each and `logs` usage logs"""
+    now = datetime.now(timezone.utc)
+    parent_id = ObjectId()
+    await database.users.insert_one({"_id": parent_id, "email": "parent@example.com", "name": "Parent",
+                                     "created_at": now, "updated_at": now})
+
+    sub_user_ids = [ObjectId() for _ in range(sub_users)]
+    await database.users.insert_many([
+        {"_id": user_id, "email": f"sub-{i}@example.com", "name": f"Sub {i}", "parent_user_id": parent_id,
+         "is_sub_user": True, "is_active": i % 10 != 0, "tokens_used": random.randint(0, 100_000),
+         "monthly_limit": 100_000, "created_at": now, "updated_at": now}
+        for i, user_id in enumerate(sub_user_ids)
+    ])
+    await database.api_keys.insert_many([
+        {"user_id": user_id, "key_hash": f"hash-{user_id}-{n}", "key_preview": "sk-bench", "name": f"key {n}",
+         "is_active": n == 0, "created_at": now}
+        for user_id in sub_user_ids for n in range(2)
+    ])
+
+    for offset in range(0, logs, BATCH):
+        await database.token_usage_logs.insert_many([
+            {"user_id": random.choice(sub_user_ids), "provider": "openrouter", "model_name": "bench-model",
+             "tokens_used": random.randint(10, 2_000), "request_type": "chat",
+             "created_at": now - timedelta(seconds=random.uniform(0, 90 * 86400))}
+            for _ in range(min(BATCH, logs - offset))
+        ])
+    return parent_id
+
+
+async def legacy_sub_users(parent_id):
+    return await User.find({"parent_user_id": parent_id, "is_sub_user": True}).to_list()
+
+
+async def legacy_overview(parent_id):
+    sub_users = await legacy_sub_users(parent_id)
+    total_api_keys = 0
+    for sub_user in sub_users:
+        total_api_keys += await ApiKey.find({"user_id": sub_user.id, "is_active": True}).count()
+    return sorted(sub_users, key=lambda u: u.tokens_used, reverse=True)[:5], total_api_keys
+
+
+async def legacy_activity(parent_id):
+    sub_users = await legacy_sub_users(parent_id)
+    today = datetime.combine(datetime.now(timezone.utc).date(), datetime.min.time(), tzinfo=timezone.utc)
+    activities = []
+    for sub_user in sub_users:
+        today_logs = await TokenUsageLog.find({"user_id": sub_user.id, "created_at": {"$gte": today}}).to_list()
+        last_log = await TokenUsageLog.find({"user_id": sub_user.id}).sort([("created_at", -1)]).first_or_none()
+        activities.append((sub_user.id, sum(log.tokens_used for log in today_logs), len(today_logs),
+                           last_log.created_at if last_log else None))
+    return activities
+
+
+async def legacy_trends(parent_id, days: int):
+    sub_users = await legacy_sub_users(parent_id)
+    from_date = datetime.now(timezone.utc) - timedelta(days=days)
+    usage_logs = await TokenUsageLog.find({
+        "user_id": {"$in": [u.id for u in sub_users]},
+        "created_at": {"$gte": from_date}
+    }).to_list()
+    daily_usage = {}
+    for log in usage_logs:
+        day = daily_usage.setdefault(log.created_at.date().isoformat(), [0, 0, set()])
+        day[0] += log.tokens_used
+        day[1] += 1
+        day[2].add(log.user_id)
+    return daily_usage
+
+
+async def legacy_limits(parent_id):
+    sub_users = await legacy_sub_users(parent_id)
+    return [u.tokens_used / u.monthly_limit * 100 if u.monthly_limit > 0 else 0 for u in sub_users]
+
+
+async def time_runs(call, runs: int):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017",
+                        help="MongoDB server; the benchmark seeds (and then drops) its own throwaway database")
+    parser.add_argument("--sub-users", type=int, default=500)
+    parser.add_argument("--logs", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    # Never the URL's database: it is dropped afterwards
+    database = client[f"bench_sub_user_dashboard_{ObjectId()}"]
+    await init_beanie(database=database, document_models=[User, ApiKey, TokenUsageLog])
+
+    try:
+        start = time.perf_counter()
+        parent_id = await seed(database, args.sub_users, args.logs)
+        print(f"\n📊 {args.sub_users} sub-users, {args.logs:,} usage logs "
+              f"(seeded in {time.perf_counter() - start:.1f}s), {args.runs} runs each")
+
+        endpoints = [
+            ("overview", lambda: legacy_overview(parent_id), lambda: get_overview_stats(parent_id)),
+            ("activity", lambda: legacy_activity(parent_id), lambda: get_activity(parent_id)),
+            ("usage-trends", lambda: legacy_trends(parent_id, 30), lambda: get_trends(parent_id, 30)),
+            ("limits-analysis", lambda: legacy_limits(parent_id), lambda: get_limits(parent_id)),
+        ]
+        for name, legacy, aggregated in endpoints:
+            legacy_median, legacy_p95 = await time_runs(legacy, args.runs)
+            new_median, new_p95 = await time_runs(aggregated, args.runs)
+            print(f"   {name:<16} per-user (old) median {legacy_median:9.1f} ms  p95 {legacy_p95:9.1f} ms   "
+                  f"aggregated (new) median {new_median:8.1f} ms  p95 {new_p95:8.1f} ms   "
+                  f"{legacy_median / max(new_median, 1e-9):6.1f}x")
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+"""
+Benchmark the daily subscription jobs against a local MongoDB.
+
+Seeds users whose subscriptions are about to expire or have expired, plus a key
+pool they are assigned to, then compares the previous implementation
+(to_list() and one user at a time) with the streaming, batched jobs. Email
+delivery is stubbed with a fixed latency so both sides pay the same SMTP cost.
+The legacy run uses fewer users by default because it is sequential; results
+are reported as users per second.
+
+Usage:
+    python scripts/benchmarks/bench_subscription_jobs.py [--mongo-url URL] [--users N]
+        [--legacy-users N] [--email-latency-ms MS]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from beanie import init_beanie  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from app.models.api_key_pool import ApiKeyPool  # noqa: E402
+from app.models.job_checkpoint import JobCheckpoint  # noqa: E402
+from app.models.user import User, SubscriptionPlan  # noqa: E402
+from app.services import subscription_jobs  # noqa: E402
+from app.utils.email_service import email_service  # noqa: E402
+
+USERS_PER_KEY = 50
+
+
+async def seed(database, count: int, expired: bool) -> None:
+    """Insert `count` paid users expiring in two days (or expired yesterday) and their pool keys"""
+    await database.users.delete_many({})
+    await database.api_key_pool.delete_many({})
+    await database.job_checkpoints.delete_many({})
+
+    now = datetime.now(timezone.utc)
+    end_date = now - timedelta(days=1) if expired else now + timedelta(days=2)
+    ids = [ObjectId() for _ in range(count)]
+    users = [
+        {
+            "_id": user_id,
+            "email": f"bench-{i}@example.com",
+            "name": f"Bench User {i}",
+            "subscription": "ultra" if i % 3 == 0 else "pro",
+            "subscription_plan": "ultra" if i % 3 == 0 else "pro",
+            "subscription_start_date": end_date - timedelta(days=30),
+            "subscription_end_date": end_date,
+            "glm_api_key": "glm-bench-key",
+            "created_at": now,
+            "updated_at": now,
+            "is_active": True,
+        }
+        for i, user_id in enumerate(ids)
+    ]
+    for start in range(0, count, 10_000):
+        await database.users.insert_many(users[start:start + 10_000], ordered=False)
+
+    keys = [
+        {
+            "key_type": "glm",
+            "key_value": f"glm-bench-{start}",
+            "max_users": USERS_PER_KEY,
+            "assigned_user_ids": ids[start:start + USERS_PER_KEY],
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for start in range(0, count, USERS_PER_KEY)
+    ]
+    if keys:
+        await database.api_key_pool.insert_many(keys)
+
+
+async def legacy_expiring(days_before: int = 3) -> int:
+    """The previous check_expiring_subscriptions: load everything, send one at a time"""
+    now = datetime.now(timezone.utc)
+    users = await User.find({
+        "subscription_end_date": {"$gt": now, "$lt": now + timedelta(days=days_before)},
+        "subscription": {"$in": ["pro", "ultra"]}
+    }).to_list()
+    sent = 0
+    for user in users:
+        end_date = user.subscription_end_date.replace(tzinfo=timezone.utc)
+        await email_service.send_subscription_expiring_email(user, (end_date - now).days)
+        sent += 1
+    return sent
+
+
+async def legacy_expired() -> int:
+    """The previous check_expired_subscriptions: per-key saves and two user saves per user"""
+    now = datetime.now(timezone.utc)
+    users = await User.find({
+        "subscription_end_date": {"$lt": now},
+        "subscription": {"$in": ["pro", "ultra"]}
+    }).to_list()
+    for user in users:
+        for key in await ApiKeyPool.find({"assigned_user_ids": user.id}).to_list():
+            key.release_user(user.id)
+            await key.save()
+        user.glm_api_key = None
+        user.bytez_api_key = None
+        user.updated_at = datetime.now(timezone.utc)
+        await user.save()
+        user.subscription = SubscriptionPlan.FREE
+        user.subscription_plan = None
+        user.subscription_start_date = None
+        user.subscription_end_date = None
+        await user.save()
+        await email_service.send_subscription_expired_email(user)
+    return len(users)
+
+
+async def measure(name: str, database, count: int, expired: bool, job) -> float:
+    await seed(database, count, expired)
+    start = time.perf_counter()
+    processed = await job()
+    elapsed = time.perf_counter() - start
+
+    remaining = await database.users.count_documents({"subscription": {"$in": ["pro", "ultra"]}})
+    held = await database.api_key_pool.count_documents({"assigned_user_ids.0": {"$exists": True}})
+    rate = processed / elapsed if elapsed else 0
+    print(f"   {name:<22}{processed:>8,} users in {elapsed:8.2f}s  ({rate:>8,.0f} users/s)")
+    if expired and (remaining or held):
+        print(f"   ⚠️ {remaining} users still paid, {held} keys still assigned")
+    return rate
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/bench_subscription_jobs")
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--legacy-users", type=int, default=2_000)
+    parser.add_argument("--email-latency-ms", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    database = client.get_default_database()
+    await init_beanie(database=database, document_models=[User, ApiKeyPool, JobCheckpoint])
+
+    latency = args.email_latency_ms / 1000
+
+    async def fake_send(*_args, **_kwargs):
+        await asyncio.sleep(latency)
+        return True
+
+    email_service.send_subscription_expiring_email = fake_send
+    email_service.send_subscription_expired_email = fake_send
+
+    try:
+        for label, expired, legacy, current in (
+            ("Expiry reminders", False, legacy_expiring,
+             lambda: subscription_jobs.check_expiring_subscriptions(
+                 concurrency=args.concurrency, batch_size=args.batch_size)),
+            ("Expired downgrades", True, legacy_expired,
+             lambda: subscription_jobs.check_expired_subscriptions(
+                 concurrency=args.concurrency, batch_size=args.batch_size)),
+        ):
+            print(f"\n📊 {label} (email latency {args.email_latency_ms:.0f} ms)")
+            old = await measure("sequential (old)", database, args.legacy_users, expired, legacy)
+            new = await measure("streaming (new)", database, args.users, expired, current)
+            print(f"   speedup: {new / old:.1f}x")
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
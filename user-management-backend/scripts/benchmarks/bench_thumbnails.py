@@ -0,0 +1,106 @@
+"""
+Benchmark the screenshot thumbnail pipeline.
+
+Reports payload reduction of each card variant against the full 1280x720 PNG
+(and its base64 data URL), plus encode throughput per core and for the full
+process pool.
+
+Usage:
+    python scripts/benchmarks/bench_thumbnails.py [image.png ...] [--rounds N]
+"""
+
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.thumbnail_service import encode_variants, THUMBNAIL_SIZES  # noqa: E402
+
+
+def synthetic_screenshot(seed: int = 0) -> bytes:
+    """Build a 1280x720 PNG with gradients, blocks and text, like a landing page."""
+    from PIL import Image, ImageDraw
+
+    width, height = 1280, 720
+    img = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(img)
+    for y in range(height):
+        shade = (y * 255) // height
+        draw.line([(0, y), (width, y)], fill=(shade, (shade + 80 + seed) % 255, 200))
+    for i in range(24):
+        x = (i * 97 + seed * 13) % (width - 200)
+        y = (i * 53 + seed * 7) % (height - 120)
+        draw.rectangle([x, y, x + 180, y + 100], fill=((i * 40) % 255, 60, (i * 90) % 255))
+        draw.text((x + 10, y + 10), f"Card {i} - Sample heading text", fill=(255, 255, 255))
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def report_payloads(source: bytes) -> None:
+    variants = encode_variants(source)
+    data_url_bytes = len(f"data:image/png;base64,{base64.b64encode(source).decode()}")
+
+    print(f"\n📦 Source PNG: {len(source):,} bytes (format=url data URL: {data_url_bytes:,} bytes)")
+    print(f"{'size':<6}{'format':<8}{'bytes':>10}{'vs PNG':>10}{'vs data URL':>14}")
+    for size_name, fmt, data in variants:
+        print(
+            f"{size_name:<6}{fmt:<8}{len(data):>10,}"
+            f"{len(data) / len(source):>9.1%}"
+            f"{len(data) / data_url_bytes:>13.1%}"
+        )
+
+
+def bench_single_core(sources, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for source in sources:
+            encode_variants(source)
+    elapsed = time.perf_counter() - start
+    return (rounds * len(sources)) / elapsed
+
+
+def bench_pool(sources, rounds: int, workers: int) -> float:
+    jobs = [source for _ in range(rounds) for source in sources]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Warm up the workers so process start-up isn't measured
+        list(pool.map(encode_variants, sources[:workers]))
+        start = time.perf_counter()
+        list(pool.map(encode_variants, jobs))
+        elapsed = time.perf_counter() - start
+    return len(jobs) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", nargs="*", help="PNG screenshots to use (synthetic if omitted)")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.images:
+        sources = [Path(p).read_bytes() for p in args.images]
+    else:
+        sources = [synthetic_screenshot(seed) for seed in range(4)]
+
+    report_payloads(sources[0])
+
+    variants_per_image = len(encode_variants(sources[0]))
+    cores = os.cpu_count() or 1
+
+    per_core = bench_single_core(sources, args.rounds)
+    pooled = bench_pool(sources, args.rounds, cores)
+
+    print(f"\n⚙️  {variants_per_image} variants per image ({len(THUMBNAIL_SIZES)} sizes)")
+    print(f"   Single core: {per_core:.2f} images/s ({per_core * variants_per_image:.1f} variants/s)")
+    print(f"   Pool x{cores}: {pooled:.2f} images/s ({pooled / cores:.2f} images/s per core)")
+
+
+if __name__ == "__main__":
+    main()
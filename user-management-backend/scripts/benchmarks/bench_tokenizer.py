@@ -0,0 +1,109 @@
+"""
+Benchmark token counting on large code prompts.
+
+Prompts are built from this repository's own Python sources. For each
+tokenizer (the bundled BPE encodings if present, and the heuristic fallback)
+reports:
+
+- tokens/sec on one core, and per core with all --threads encoding at once
+- the count against the old len(text) // 4 estimate
+- count_messages on a long conversation, cold and after one new message
+  (the per-message cache only tokenizes the new message)
+
+Usage:
+    python scripts/benchmarks/bench_tokenizer.py [--prompt-chars N] [--runs N] [--threads N]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+
+from app.services.tokenizer import TokenizerRegistry, encoding_for_model  # noqa: E402
+
+
+def code_corpus(chars: int) -> str:
+    text = []
+    size = 0
+    for path in sorted((ROOT / "app").rglob("*.py")):
+        source = path.read_text(encoding="utf-8", errors="ignore")
+        text.append(source)
+        size += len(source)
+        if size >= chars:
+            break
+    return "\n".join(text)[:chars]
+
+
+def time_runs(call, runs: int):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def parallel_rate(tokenizer, prompt: str, tokens: int, threads: int, runs: int) -> float:
+    """Aggregate tokens/sec with `threads` threads each encoding the prompt"""
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: tokenizer.count(prompt), range(threads * runs)))
+        elapsed = time.perf_counter() - start
+    return tokens * threads * runs / elapsed
+
+
+async def conversation_timings(tokenizer, model: str, prompt: str):
+    registry = TokenizerRegistry()
+    registry._tokenizers[encoding_for_model(model)] = tokenizer
+    turns = [prompt[i:i + 2000] for i in range(0, min(len(prompt), 80_000), 2000)]
+    messages = [{"role": "user" if n % 2 == 0 else "assistant", "content": turn} for n, turn in enumerate(turns)]
+
+    start = time.perf_counter()
+    await registry.count_messages(model, messages[:-1])
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    await registry.count_messages(model, messages)
+    incremental = time.perf_counter() - start
+    registry.shutdown()
+    return len(messages), cold * 1000, incremental * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--prompt-chars", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    registry = TokenizerRegistry()
+    prompt = code_corpus(args.prompt_chars)
+    candidates = [("cl100k_base", "gpt-4", registry.get("gpt-4")), ("o200k_base", "gpt-4o", registry.get("gpt-4o"))]
+
+    print(f"\n📊 {len(prompt):,} chars of Python, {args.runs} runs, {args.threads} threads")
+    print(f"   len // 4 estimate: {len(prompt) // 4:,} tokens")
+    for label, model, tokenizer in candidates + [("heuristic", "gpt-4", registry.heuristic)]:
+        if tokenizer.name != label:
+            print(f"   {label}: not bundled (run scripts/setup/fetch_tokenizers.py)")
+            continue
+
+        tokens = tokenizer.count(prompt)
+        single = tokens / time_runs(lambda: tokenizer.count(prompt), args.runs)
+        parallel = parallel_rate(tokenizer, prompt, tokens, args.threads, args.runs)
+        messages, cold_ms, incremental_ms = await conversation_timings(tokenizer, model, prompt)
+        print(f"   {label:<12} {tokens:>9,} tokens ({tokens / (len(prompt) // 4):4.2f}x len//4)   "
+              f"1 core {single / 1e6:5.2f} M tok/s   "
+              f"{args.threads} threads {parallel / 1e6:5.2f} M tok/s ({parallel / args.threads / 1e6:5.2f} per core)   "
+              f"{messages}-message chat cold {cold_ms:6.1f} ms, +1 message {incremental_ms:5.2f} ms")
+
+    registry.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
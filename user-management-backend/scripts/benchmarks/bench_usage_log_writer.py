@@ -0,0 +1,146 @@
+"""
+Benchmark usage logging: one insert per log on the request path against the
+write-behind writer.
+
+Simulates --requests charged requests from --concurrency clients. Each
+request logs --logs-per-request usage logs, 2 for sub-users (their own and
+their parent's). This runs twice:
+
+- inline: each log is inserted as the request finishes (the old behaviour)
+- write-behind: the log is handed to UsageLogWriter, which writes in bulk
+  and updates the daily rollups
+
+Reports:
+
+- logging time added to each request (p50/p99)
+- logs/sec until everything is in MongoDB
+- MongoDB write commands issued
+
+Needs a local MongoDB (--mongo-url); the database is dropped afterwards.
+
+Usage:
+    python scripts/benchmarks/bench_usage_log_writer.py [--mongo-url URL] [--requests N]
+        [--concurrency N] [--logs-per-request N] [--flush-ms MS]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pymongo import monitoring
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+
+
+class WriteCommands(monitoring.CommandListener):
+    """pymongo command listener counting write commands"""
+
+    WRITES = {"insert", "update", "delete"}
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in self.WRITES:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def run(record, requests: int, concurrency: int, logs_per_request: int, users):
+    """Per-request logging latencies in ms"""
+    from app.models.user import TokenUsageLog
+
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def client():
+        for n in remaining:
+            user_id = users[n % len(users)]
+            started = time.perf_counter()
+            for _ in range(logs_per_request):
+                await record(TokenUsageLog(user_id=user_id, provider="a4f", model_name="gpt-4o-mini",
+                                           tokens_used=120 + n % 50, request_type="chat", cost_usd=0.0002))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def report(label: str, logs: int, elapsed: float, latencies, writes: int):
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    print(f"   {label:<13} {logs / elapsed:8.0f} logs/s   request p50 {statistics.median(latencies):6.2f} ms   "
+          f"p99 {p99:6.2f} ms   {writes:>6} MongoDB writes")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/bench_usage_log_writer")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--logs-per-request", type=int, default=2, help="2 for sub-user requests")
+    parser.add_argument("--flush-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    os.environ["USAGE_LOG_FLUSH_INTERVAL_MS"] = str(args.flush_ms)
+    wal_dir = tempfile.mkdtemp(prefix="usage-wal-")
+    os.environ["USAGE_LOG_WAL_DIR"] = wal_dir
+    from beanie import PydanticObjectId, init_beanie
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from app.models.user import TokenUsageDaily, TokenUsageLog
+    from app.services.usage_log_writer import UsageLogWriter
+
+    writes = WriteCommands()
+    client = AsyncIOMotorClient(args.mongo_url, serverSelectionTimeoutMS=2000, event_listeners=[writes])
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        print(f"❌ MongoDB not reachable at {args.mongo_url}: {e}")
+        return
+    database = client.get_default_database()
+    await init_beanie(database=database, document_models=[TokenUsageLog, TokenUsageDaily])
+
+    users = [PydanticObjectId() for _ in range(500)]
+    logs = args.requests * args.logs_per_request
+    print(f"\n📊 {args.requests:,} requests from {args.concurrency} clients, {args.logs_per_request} usage log(s) each")
+    try:
+        async def insert(log):
+            await log.insert()
+
+        before = writes.count
+        started = time.perf_counter()
+        latencies = await run(insert, args.requests, args.concurrency, args.logs_per_request, users)
+        report("inline", logs, time.perf_counter() - started, latencies, writes.count - before)
+
+        writer = UsageLogWriter()
+        writer.start()
+        before = writes.count
+        started = time.perf_counter()
+        latencies = await run(writer.record, args.requests, args.concurrency, args.logs_per_request, users)
+        await writer.stop()
+        report("write-behind", logs, time.perf_counter() - started, latencies, writes.count - before)
+
+        stored = await TokenUsageLog.count()
+        if stored != 2 * logs:
+            print(f"   ⚠️ {stored:,} logs stored, expected {2 * logs:,}")
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+        shutil.rmtree(wal_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
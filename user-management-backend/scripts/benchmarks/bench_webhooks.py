@@ -0,0 +1,177 @@
+"""
+Benchmark webhook ingestion against a local MongoDB.
+
+Generates synthetic signed Razorpay events (a payment.captured and a
+refund.processed per payment, plus redelivered duplicates) and compares:
+
+- inline (old): each request verifies, parses and runs the handler before
+  acknowledging, so ack latency includes the processing time
+- inbox (new): each request verifies and inserts into the webhook inbox, then
+  the worker pool drains it
+
+Handler work is simulated with a fixed latency so both sides pay the same cost.
+Reports ack latency percentiles, ingest throughput and worker drain throughput,
+and checks that duplicates were dropped and every payment's events were
+processed in order.
+
+Usage:
+    python scripts/benchmarks/bench_webhooks.py [--mongo-url URL] [--payments N]
+        [--duplicate-rate R] [--handler-latency-ms MS] [--workers N] [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from beanie import init_beanie  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.webhook_event import WebhookEvent, WebhookEventStatus  # noqa: E402
+from app.services import webhook_inbox  # noqa: E402
+from app.services.payment_gateway import verify_webhook_signature  # noqa: E402
+
+SECRET = "bench_webhook_secret"
+
+
+def synthetic_events(payments: int, duplicate_rate: float):
+    """Signed (event_id, body, signature) deliveries, duplicates included"""
+    deliveries = []
+    for _ in range(payments):
+        payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+        for event, entity in (
+            ("payment.captured", {"payment": {"entity": {
+                "id": payment_id, "amount": 49900, "currency": "INR", "status": "captured",
+                "notes": {"user_email": "bench@example.com", "plan_name": "pro"}}}}),
+            ("refund.processed", {"refund": {"entity": {
+                "id": f"rfnd_{uuid.uuid4().hex[:14]}", "payment_id": payment_id, "amount": 49900}}}),
+        ):
+            body = json.dumps({"entity": "event", "event": event, "payload": entity}).encode()
+            signature = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+            delivery = (f"evt_{uuid.uuid4().hex[:14]}", body, signature)
+            deliveries.append(delivery)
+            if random.random() < duplicate_rate:
+                deliveries.append(delivery)
+    return deliveries
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000  # noqa: E731
+    return f"p50 {pick(0.50):7.1f} ms  p95 {pick(0.95):7.1f} ms  p99 {pick(0.99):7.1f} ms"
+
+
+async def deliver_all(deliveries, concurrency: int, receive):
+    """Send deliveries with bounded concurrency; return per-request latencies"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def send(delivery):
+        async with semaphore:
+            start = time.perf_counter()
+            await receive(*delivery)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(send(delivery) for delivery in deliveries))
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/bench_webhooks")
+    parser.add_argument("--payments", type=int, default=5_000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--handler-latency-ms", type=float, default=50.0)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=100, help="Concurrent webhook deliveries")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    database = client.get_default_database()
+    await init_beanie(database=database, document_models=[User, WebhookEvent])
+    settings.razorpay_webhook_secret = SECRET
+
+    latency = args.handler_latency_ms / 1000
+    order = []
+
+    def simulated(event_name):
+        async def handler(payload):
+            await asyncio.sleep(latency)
+            entities = payload["payload"]
+            entity = entities.get("payment", entities.get("refund"))["entity"]
+            order.append((entity.get("payment_id", entity["id"]), event_name))
+        return handler
+
+    for event_name in list(webhook_inbox.WEBHOOK_HANDLERS):
+        webhook_inbox.WEBHOOK_HANDLERS[event_name] = simulated(event_name)
+
+    deliveries = synthetic_events(args.payments, args.duplicate_rate)
+    unique = len({event_id for event_id, _, _ in deliveries})
+    print(f"\n📊 {len(deliveries):,} deliveries ({unique:,} unique events), handler latency "
+          f"{args.handler_latency_ms:.0f} ms, {args.concurrency} concurrent deliveries")
+
+    try:
+        # Inline: verify, parse and process before acknowledging
+        async def receive_inline(event_id, body, signature):
+            if not verify_webhook_signature(body, signature, SECRET):
+                raise ValueError("bad signature")
+            payload = json.loads(body)
+            await webhook_inbox.WEBHOOK_HANDLERS[payload["event"]](payload)
+
+        start = time.perf_counter()
+        latencies = await deliver_all(deliveries, args.concurrency, receive_inline)
+        elapsed = time.perf_counter() - start
+        print(f"   inline (old)   ack {percentiles(latencies)}   {len(deliveries) / elapsed:8,.0f} req/s  "
+              f"handler runs {len(order):,}")
+
+        # Inbox: store and acknowledge, then drain with the worker pool
+        await WebhookEvent.get_pymongo_collection().delete_many({})
+        order.clear()
+
+        async def receive_inbox(event_id, body, signature):
+            await webhook_inbox.ingest_razorpay_webhook(body, signature, event_id)
+
+        start = time.perf_counter()
+        latencies = await deliver_all(deliveries, args.concurrency, receive_inbox)
+        elapsed = time.perf_counter() - start
+        stored = await WebhookEvent.find_all().count()
+        print(f"   inbox (new)    ack {percentiles(latencies)}   {len(deliveries) / elapsed:8,.0f} req/s  "
+              f"stored {stored:,}")
+
+        pool = webhook_inbox.WebhookWorkerPool(concurrency=args.workers)
+        start = time.perf_counter()
+        while await WebhookEvent.find({"status": {"$ne": WebhookEventStatus.PROCESSED}}).count():
+            if not await pool.drain():
+                await asyncio.sleep(0.1)  # Only deferred (ordering) events left
+        elapsed = time.perf_counter() - start
+        print(f"   workers        drained {len(order):,} events in {elapsed:6.2f}s  "
+              f"({len(order) / elapsed:8,.0f} events/s with {args.workers} workers)")
+
+        seen = {}
+        out_of_order = 0
+        for payment_id, event_name in order:
+            if event_name == "refund.processed" and seen.get(payment_id) != "payment.captured":
+                out_of_order += 1
+            seen[payment_id] = event_name
+        if stored != unique or len(order) != unique or out_of_order:
+            print(f"   ⚠️ stored {stored}, processed {len(order)}, expected {unique}; "
+                  f"{out_of_order} refunds processed before their capture")
+        else:
+            print(f"   duplicates dropped: {len(deliveries) - unique:,}; per-payment order preserved")
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,8 @@
+"""
+Load-testing suite for the whole app (see scripts/benchmarks/bench_load.py).
+
+- environment: local stand-ins for MongoDB, Redis, the LLM providers and Razorpay
+- seed: synthetic users, sub-users, templates and token usage logs
+- scenarios: traffic mixes driven against the app
+- report: per-route latency percentiles and throughput as JSON, and run comparison
+"""
@@ -0,0 +1,236 @@
+"""
+Local stand-ins for everything the app talks to.
+
+configure() must run before anything under `app` is imported: settings are read
+from the environment once, and the database clients and payment gateway are
+created at import time.
+
+- MongoDB: a real local server (default), or mongomock-motor with --mongo mock
+  (in-process; no per-request query tracing, and some aggregation stages are
+  unsupported, which shows up as 500s in the report)
+- Redis: a real server, or fakeredis with --redis fake
+- LLM providers: a stub OpenAI-compatible server on a random local port, with
+  configurable latency; OpenRouter and A4F are pointed at it
+- Razorpay: the real RazorpayGateway adapter on FakePaymentGateway's transport
+"""
+
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+STUB_API_KEY = "bench-key"
+RAZORPAY_KEY_ID = "rzp_test_bench"
+RAZORPAY_KEY_SECRET = "bench_secret"
+
+
+class StubLLMServer:
+    """
+    OpenAI-compatible chat/embeddings/models endpoints served by uvicorn on
+    its own thread and event loop, so the stub's work doesn't queue behind
+    the app's. An embeddings call costs `latency` plus `per_input_latency`
+    for each input.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.1, failure_rate: float = 0.0,
+                 per_input_latency: float = 0.0002, embedding_dims: int = 256):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.per_input_latency = per_input_latency
+        self.embedding_dims = embedding_dims
+        self.requests = 0
+        self.embedding_requests = 0
+        self.embedding_inputs = 0
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self.port: Optional[int] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def _app(self):
+        from starlette.applications import Starlette
+        from starlette.responses import JSONResponse
+        from starlette.routing import Route
+
+        async def chat_completions(request):
+            self.requests += 1
+            body = await request.json()
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+            if self.failure_rate and random.random() < self.failure_rate:
+                return JSONResponse({"error": {"message": "stub provider overloaded"}}, status_code=503)
+            prompt_tokens = max(1, sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4)
+            completion_tokens = min(body.get("max_tokens") or 256, 256)
+            return JSONResponse({
+                "id": f"chatcmpl-bench-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "ok " * (completion_tokens // 2)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+        async def embeddings(request):
+            self.embedding_requests += 1
+            body = await request.json()
+            inputs = body.get("input") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self.embedding_inputs += len(inputs)
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+                                + self.per_input_latency * len(inputs))
+            if self.failure_rate and random.random() < self.failure_rate:
+                return JSONResponse({"error": {"message": "stub provider overloaded"}}, status_code=503)
+            tokens = sum(max(1, len(text) // 4) for text in inputs)
+            return JSONResponse({
+                "object": "list",
+                "model": body.get("model"),
+                "data": [
+                    {"object": "embedding", "index": index, "embedding": [(len(text) % 97) / 97] * self.embedding_dims}
+                    for index, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        async def models(request):
+            return JSONResponse({"data": [
+                {"id": f"bench-model-{n}", "name": f"Bench Model {n}", "context_length": 8192}
+                for n in range(20)
+            ]})
+
+        return Starlette(routes=[
+            Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+            Route("/v1/embeddings", embeddings, methods=["POST"]),
+            Route("/v1/models", models, methods=["GET"]),
+        ])
+
+    def start(self) -> "StubLLMServer":
+        import uvicorn
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+
+        config = uvicorn.Config(self._app(), log_level="warning", lifespan="off", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [sock]}, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Stub LLM server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+
+def mock_motor_client():
+    """
+    mongomock-motor's client class, patched where the app and Beanie go beyond
+    what it wraps: get_default_database() (otherwise a plain mongomock database,
+    without buildInfo) and list_collection_names() options it doesn't accept.
+    """
+    try:
+        from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockDatabase
+    except ImportError:
+        raise SystemExit("❌ --mongo mock needs mongomock-motor (pip install mongomock-motor)")
+
+    class MockDatabase(AsyncMongoMockDatabase):
+        async def list_collection_names(self, session=None, filter=None, **kwargs):
+            return self.delegate.list_collection_names(session=session, filter=filter)
+
+    class MockClient(AsyncMongoMockClient):
+        def get_database(self, *args, **kwargs):
+            return MockDatabase(self, super().get_database(*args, **kwargs).delegate)
+
+        def get_default_database(self, *args, **kwargs):
+            return self.get_database(super().__getattr__("get_default_database")(*args, **kwargs).name)
+
+    return MockClient
+
+
+def configure(mongo: str, redis: str, llm: StubLLMServer, razorpay_latency: float) -> None:
+    """Point the app's settings at the stand-ins; call before importing `app`"""
+    if mongo == "mock":
+        import motor.motor_asyncio
+        # app.database and app.main look the client class up on import
+        motor.motor_asyncio.AsyncIOMotorClient = mock_motor_client()
+        os.environ["DATABASE_URL"] = "mongodb://localhost:27017/bench_load"
+    else:
+        os.environ["DATABASE_URL"] = mongo
+
+    if redis != "fake":
+        parsed = urlparse(redis)
+        os.environ["REDIS_URL"] = redis
+        os.environ["REDIS_HOST"] = parsed.hostname or "localhost"
+        os.environ["REDIS_PORT"] = str(parsed.port or 6379)
+        os.environ["REDIS_PASSWORD"] = parsed.password or ""
+    else:
+        # Nothing listens here: the import-time clients fall back until install_fake_redis()
+        os.environ["REDIS_URL"] = "redis://127.0.0.1:1"
+        os.environ["REDIS_HOST"] = "127.0.0.1"
+        os.environ["REDIS_PORT"] = "1"
+
+    os.environ["OPENROUTER_API_BASE"] = llm.base_url
+    os.environ["OPENROUTER_API_KEY"] = STUB_API_KEY
+    os.environ["A4F_BASE_URL"] = llm.base_url
+    os.environ["A4F_API_KEY"] = STUB_API_KEY
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-load-secret")
+    os.environ["RAZORPAY_KEY_ID"] = RAZORPAY_KEY_ID
+    os.environ["RAZORPAY_KEY_SECRET"] = RAZORPAY_KEY_SECRET
+    os.environ["SUBSCRIPTION_JOBS_ENABLED"] = "false"
+    os.environ["WEBHOOK_WORKERS_ENABLED"] = "false"
+    os.environ["DEBUG"] = "false"
+    os.environ.pop("ENVIRONMENT", None)
+
+    # Before app.main is imported: the payment service binds the gateway on import
+    from app.services.payment_gateway import FakePaymentGateway, RazorpayGateway, set_payment_gateway
+    fake = FakePaymentGateway(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET, latency=razorpay_latency)
+    set_payment_gateway(RazorpayGateway(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET, transport=fake.as_transport()))
+
+
+def install_fake_redis() -> None:
+    """Swap every Redis client the app created on import for fakeredis"""
+    try:
+        import fakeredis
+        import fakeredis.aioredis
+    except ImportError:
+        raise SystemExit("❌ --redis fake needs fakeredis with Lua support (pip install 'fakeredis[lua]')")
+
+    from app import database
+    from app.middleware.rate_limiting import rate_limit_middleware
+    from app.services.cache_service import cache_service
+    from app.services.llm_response_cache import llm_response_cache
+    from app.services.response_cache import response_cache
+    from app.services.token_reservations import token_reservation_store
+
+    server = fakeredis.FakeServer()
+    sync_redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    database.redis_client = sync_redis
+    rate_limit_middleware.rate_limiter.redis = sync_redis
+    cache_service._redis = fakeredis.aioredis.FakeRedis(server=server)
+    cache_service._redis_retry_at = 0.0
+    response_cache._redis = fakeredis.aioredis.FakeRedis(server=server)
+    response_cache._redis_retry_at = 0.0
+    llm_response_cache._redis = fakeredis.aioredis.FakeRedis(server=server)
+    llm_response_cache._redis_retry_at = 0.0
+    # Reservations run Lua scripts: fakeredis needs the lupa package for those
+    token_reservation_store._bind(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
@@ -0,0 +1,134 @@
+"""
+Summaries of a load run, as JSON for comparing runs across commits.
+"""
+
+import json
+import platform
+import subprocess
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .scenarios import Sample
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def is_error(sample: Sample) -> bool:
+    """Anything but a 2xx (including requests that raised) is an error, not a latency sample"""
+    return not 200 <= sample.status < 300
+
+
+def summarize(samples: List[Sample], wall_seconds: float) -> Dict[str, Any]:
+    """
+    Per-route request counts, errors, status codes, throughput and latency
+    percentiles (ms, over successful requests only; None when there were none)
+    """
+    by_route: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_route[sample.route].append(sample)
+
+    routes = {}
+    for route, route_samples in sorted(by_route.items()):
+        timings = sorted(sample.seconds * 1000 for sample in route_samples if not is_error(sample))
+        errors = len(route_samples) - len(timings)
+        statuses = Counter(str(sample.status) for sample in route_samples)
+        routes[route] = {
+            "requests": len(route_samples),
+            "errors": errors,
+            "error_rate": round(errors / len(route_samples), 4),
+            "status_codes": dict(sorted(statuses.items())),
+            "throughput_rps": round(len(route_samples) / wall_seconds, 2),
+            "mean_ms": round(sum(timings) / len(timings), 2) if timings else None,
+            "p50_ms": round(percentile(timings, 0.50), 2) if timings else None,
+            "p95_ms": round(percentile(timings, 0.95), 2) if timings else None,
+            "p99_ms": round(percentile(timings, 0.99), 2) if timings else None,
+            "max_ms": round(timings[-1], 2) if timings else None,
+        }
+    errors = sum(route["errors"] for route in routes.values())
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+        "routes": routes,
+    }
+
+
+def git_revision(cwd: Path) -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def build_report(results: Dict[str, Dict[str, Any]], config: Dict[str, Any], cwd: Path) -> Dict[str, Any]:
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git": git_revision(cwd),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "scenarios": results,
+    }
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value:8.1f}" if value is not None else "       -"
+
+
+def print_summary(name: str, summary: Dict[str, Any]) -> None:
+    print(f"\n📊 {name}: {summary['requests']:,} requests in {summary['wall_seconds']:.1f}s "
+          f"({summary['throughput_rps']:.1f} req/s, {summary['errors']:,} errors)")
+    for route, stats in summary["routes"].items():
+        statuses = " ".join(f"{code}x{count}" for code, count in stats["status_codes"].items())
+        print(f"   {route:<48} {stats['throughput_rps']:8.1f} req/s  p50 {_ms(stats['p50_ms'])}  "
+              f"p95 {_ms(stats['p95_ms'])}  p99 {_ms(stats['p99_ms'])} ms  [{statuses}]")
+
+
+def _change(old: Optional[float], new: Optional[float]) -> str:
+    if not old or new is None:
+        return "     n/a"
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def print_comparison(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """Latency and throughput change per route against a previous run"""
+    print(f"\n🔍 Compared with {baseline['git'].get('commit', '')[:10] or 'baseline'} "
+          f"({baseline['created_at']}); negative latency and positive throughput changes are improvements")
+    for name, summary in current["scenarios"].items():
+        old_routes = baseline.get("scenarios", {}).get(name, {}).get("routes", {})
+        for route, stats in summary["routes"].items():
+            old = old_routes.get(route)
+            if old is None:
+                print(f"   {name:<12} {route:<48} (new route)")
+                continue
+            print(f"   {name:<12} {route:<48} p50 {_change(old['p50_ms'], stats['p50_ms'])}  "
+                  f"p95 {_change(old['p95_ms'], stats['p95_ms'])}  p99 {_change(old['p99_ms'], stats['p99_ms'])}  "
+                  f"req/s {_change(old['throughput_rps'], stats['throughput_rps'])}")
+
+
+def failed_routes(summary: Dict[str, Any], max_error_rate: float) -> List[str]:
+    """Routes whose error rate is over `max_error_rate`, with their status codes"""
+    return [
+        f"{route} {stats['errors']}/{stats['requests']} errors {stats['status_codes']}"
+        for route, stats in summary["routes"].items()
+        if stats["error_rate"] > max_error_rate
+    ]
+
+
+def write_report(report: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2) + "\n")
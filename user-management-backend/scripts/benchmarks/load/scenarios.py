@@ -0,0 +1,165 @@
+"""
+Traffic mixes for the load suite.
+
+A scenario is a weighted list of request builders. Each builder returns a
+Call whose `route` is the route template (so /api/templates/{template_id} is
+one row in the report, not one per id). Workers run a closed loop: each
+sends a request, waits for the response, then picks the next one.
+
+Anonymous traffic is spread over many X-Forwarded-For addresses, as it would
+be in production, so the per-IP rate limit doesn't turn the run into a 429
+benchmark.
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .seed import CATEGORIES, SEARCH_WORDS, Fixture
+
+
+@dataclass
+class Call:
+    route: str  # "METHOD /route/template"
+    method: str
+    url: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    json: Optional[Dict[str, Any]] = None
+
+
+Builder = Callable[[random.Random, Fixture], Call]
+
+
+@dataclass
+class Sample:
+    route: str
+    status: int  # 0 when the request raised (timeout, connection error)
+    seconds: float
+
+
+def _auth(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _visitor(rng: random.Random) -> Dict[str, str]:
+    return {"X-Forwarded-For": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"}
+
+
+def _chat(rng: random.Random, fixture: Fixture) -> Call:
+    model = rng.choice(["a4f/provider-1/bench-model", "openrouter/bench-model"])
+    turns = rng.randint(1, 6)
+    messages = [{"role": "system", "content": "You are a coding assistant inside the editor."}]
+    for turn in range(turns):
+        messages.append({"role": "user" if turn % 2 == 0 else "assistant",
+                         "content": "Refactor this function please. " * rng.randint(5, 80)})
+    return Call("POST /api/llm/chat/completions", "POST", "/api/llm/chat/completions",
+                _auth(rng.choice(fixture.user_tokens)),
+                {"model": model, "messages": messages, "max_tokens": 256})
+
+
+def _models(rng: random.Random, fixture: Fixture) -> Call:
+    return Call("GET /api/llm/models", "GET", "/api/llm/models", _auth(rng.choice(fixture.user_tokens)))
+
+
+def _browse_headers(rng: random.Random, fixture: Fixture) -> Dict[str, str]:
+    # A third of marketplace visitors are signed in
+    return _auth(rng.choice(fixture.user_tokens)) if rng.random() < 0.33 else _visitor(rng)
+
+
+def _template_list(rng: random.Random, fixture: Fixture) -> Call:
+    return Call("GET /api/templates/", "GET", f"/api/templates/?page={rng.randint(1, 5)}&limit=20",
+                _browse_headers(rng, fixture))
+
+
+def _template_category(rng: random.Random, fixture: Fixture) -> Call:
+    return Call("GET /api/templates/", "GET", f"/api/templates/?category={rng.choice(CATEGORIES)}&limit=20",
+                _browse_headers(rng, fixture))
+
+
+def _template_search(rng: random.Random, fixture: Fixture) -> Call:
+    return Call("GET /api/templates/", "GET", f"/api/templates/?search={rng.choice(SEARCH_WORDS)}&limit=20",
+                _browse_headers(rng, fixture))
+
+
+def _template_detail(rng: random.Random, fixture: Fixture) -> Call:
+    # Popular templates get most of the views
+    index = min(len(fixture.template_ids) - 1, int(rng.paretovariate(1.2)) - 1)
+    return Call("GET /api/templates/{template_id}", "GET", f"/api/templates/{fixture.template_ids[index]}",
+                _browse_headers(rng, fixture))
+
+
+def _template_categories(rng: random.Random, fixture: Fixture) -> Call:
+    return Call("GET /api/templates/categories", "GET", "/api/templates/categories", _browse_headers(rng, fixture))
+
+
+def _login(rng: random.Random, fixture: Fixture) -> Call:
+    return Call("POST /api/auth/login-json", "POST", "/api/auth/login-json", _visitor(rng),
+                {"email": rng.choice(fixture.user_emails), "password": fixture.password})
+
+
+def _admin(path: str) -> Builder:
+    return lambda rng, fixture: Call(f"GET {path}", "GET", path, _auth(fixture.admin_token))
+
+
+def _sub_user_dashboard(path: str, query: str = "") -> Builder:
+    return lambda rng, fixture: Call(f"GET {path}", "GET", path + query, _auth(fixture.parent_token))
+
+
+SCENARIOS: Dict[str, List[Tuple[int, Builder]]] = {
+    # The editor extension: chat requests, plus the model list it fetches on startup
+    "chat": [(20, _chat), (1, _models)],
+    "marketplace": [
+        (30, _template_list), (15, _template_category), (15, _template_search),
+        (35, _template_detail), (5, _template_categories),
+    ],
+    "login": [(1, _login)],
+    "admin": [
+        (1, _admin("/api/admin/analytics")),
+        (1, _admin("/api/admin/system-stats")),
+        (1, _admin("/api/admin/usage-stats")),
+        (2, _sub_user_dashboard("/dashboard/sub-users/overview")),
+        (2, _sub_user_dashboard("/dashboard/sub-users/activity")),
+        (1, _sub_user_dashboard("/dashboard/sub-users/usage-trends", "?days=30")),
+        (1, _sub_user_dashboard("/dashboard/sub-users/limits-analysis")),
+    ],
+}
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    fixture: Fixture,
+    concurrency: int,
+    duration: float,
+    max_requests: Optional[int] = None,
+    seed: int = 0,
+) -> Tuple[List[Sample], float]:
+    """Drive `concurrency` closed-loop workers for `duration` seconds; returns the samples and wall time"""
+    mix = SCENARIOS[name]
+    builders = [builder for _, builder in mix]
+    weights = [weight for weight, _ in mix]
+    samples: List[Sample] = []
+    deadline = time.perf_counter() + duration
+    budget = [max_requests if max_requests is not None else float("inf")]
+
+    async def worker(worker_id: int):
+        rng = random.Random(seed * 1_000 + worker_id)
+        while time.perf_counter() < deadline and budget[0] > 0:
+            budget[0] -= 1
+            call = rng.choices(builders, weights)[0](rng, fixture)
+            started = time.perf_counter()
+            try:
+                response = await client.request(call.method, call.url, headers=call.headers, json=call.json)
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.append(Sample(call.route, status, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return samples, time.perf_counter() - started
@@ -0,0 +1,130 @@
+"""
+Synthetic data for the load suite, inserted in bulk straight into the
+collections of the (already initialized) Beanie models.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from bson import ObjectId
+
+from app.auth.jwt import create_access_token, get_password_hash
+from app.models.template import Template
+from app.models.user import ApiKey, TokenUsageLog, User
+
+BATCH = 10_000
+PASSWORD = "bench-password-1"
+
+SCALES: Dict[str, Dict[str, int]] = {
+    "small": {"users": 1_000, "sub_users": 50, "templates": 500, "usage_logs": 100_000},
+    "medium": {"users": 10_000, "sub_users": 200, "templates": 5_000, "usage_logs": 1_000_000},
+    "large": {"users": 100_000, "sub_users": 500, "templates": 20_000, "usage_logs": 5_000_000},
+}
+
+CATEGORIES = ["Navigation", "Layout", "Forms", "Data Display", "Feedback", "Authentication", "Dashboard", "E-commerce"]
+FRAMEWORKS = ["React", "Vue", "Angular", "HTML/CSS", "Svelte", "Flutter"]
+SEARCH_WORDS = ["dashboard", "login", "navbar", "table", "modal", "chart", "pricing", "sidebar"]
+
+
+@dataclass
+class Fixture:
+    """What the scenarios need to know about the seeded data"""
+
+    user_ids: List[ObjectId] = field(default_factory=list)
+    user_emails: List[str] = field(default_factory=list)
+    user_tokens: List[str] = field(default_factory=list)  # Bearer tokens for a sample of users
+    template_ids: List[ObjectId] = field(default_factory=list)
+    admin_token: str = ""
+    parent_token: str = ""
+    password: str = PASSWORD
+
+
+def _bearer(user_id: ObjectId) -> str:
+    return create_access_token({"sub": str(user_id)}, expires_delta=timedelta(days=1))
+
+
+async def _insert(collection, documents_factory, count: int) -> None:
+    for offset in range(0, count, BATCH):
+        await collection.insert_many(documents_factory(offset, min(BATCH, count - offset)), ordered=False)
+
+
+async def seed(scale: Dict[str, int], token_sample: int = 500) -> Fixture:
+    """Insert users (one admin, one parent with sub-users), templates and usage logs"""
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    password_hash = get_password_hash(PASSWORD)  # one bcrypt hash shared by every user keeps seeding fast
+    fixture = Fixture()
+
+    def user_doc(user_id: ObjectId, email: str, **overrides):
+        doc = {
+            "_id": user_id, "email": email, "name": email.split("@")[0], "username": email.split("@")[0],
+            "password_hash": password_hash, "subscription": "ultra", "tokens_remaining": 10_000_000,
+            "tokens_used": 0, "monthly_limit": 10_000_000, "is_active": True, "role": "user",
+            # Set so logins never try to provision a provider key
+            "openrouter_api_key": "sk-or-bench", "created_at": now - timedelta(days=rng.uniform(0, 365)),
+            "updated_at": now,
+        }
+        doc.update(overrides)
+        return doc
+
+    admin_id, parent_id = ObjectId(), ObjectId()
+    await User.get_pymongo_collection().insert_many([
+        user_doc(admin_id, "admin@bench.example.com", role="admin"),
+        user_doc(parent_id, "parent@bench.example.com"),
+    ])
+    fixture.admin_token = _bearer(admin_id)
+    fixture.parent_token = _bearer(parent_id)
+
+    fixture.user_ids = [ObjectId() for _ in range(scale["users"])]
+    fixture.user_emails = [f"user-{n}@bench.example.com" for n in range(scale["users"])]
+    await _insert(User.get_pymongo_collection(), lambda offset, size: [
+        user_doc(fixture.user_ids[n], fixture.user_emails[n],
+                 tokens_used=rng.randint(0, 500_000), last_login_at=now - timedelta(hours=rng.uniform(0, 720)))
+        for n in range(offset, offset + size)
+    ], scale["users"])
+    fixture.user_tokens = [_bearer(user_id) for user_id in fixture.user_ids[:token_sample]]
+
+    sub_user_ids = [ObjectId() for _ in range(scale["sub_users"])]
+    await User.get_pymongo_collection().insert_many([
+        user_doc(user_id, f"sub-{n}@bench.example.com", parent_user_id=parent_id, is_sub_user=True,
+                 tokens_used=rng.randint(0, 120_000), monthly_limit=100_000, is_active=n % 10 != 0)
+        for n, user_id in enumerate(sub_user_ids)
+    ])
+    await ApiKey.get_pymongo_collection().insert_many([
+        {"user_id": user_id, "key_hash": f"bench-{user_id}-{n}", "key_preview": "sk-bench", "name": f"key {n}",
+         "is_active": n == 0, "created_at": now}
+        for user_id in sub_user_ids for n in range(2)
+    ])
+
+    developers = fixture.user_ids[:max(1, len(fixture.user_ids) // 20)]
+    fixture.template_ids = [ObjectId() for _ in range(scale["templates"])]
+    await _insert(Template.get_pymongo_collection(), lambda offset, size: [
+        {"_id": fixture.template_ids[n],
+         "title": f"{rng.choice(SEARCH_WORDS).title()} {rng.choice(CATEGORIES)} template {n}",
+         "category": rng.choice(CATEGORIES), "type": rng.choice(FRAMEWORKS), "language": "TypeScript",
+         "difficulty_level": rng.choice(["Easy", "Medium", "Tough"]),
+         "plan_type": "Free" if n % 3 else "Paid", "rating": round(rng.uniform(1, 5), 1),
+         "downloads": rng.randint(0, 5_000), "views": rng.randint(0, 50_000), "likes": rng.randint(0, 2_000),
+         "short_description": f"A {rng.choice(SEARCH_WORDS)} component",
+         "full_description": "Synthetic template seeded for load testing. " * 20,
+         "tags": rng.sample(SEARCH_WORDS, 3), "developer_name": "Bench Developer",
+         "developer_experience": "5 years", "featured": n % 25 == 0, "popular": n % 10 == 0,
+         "user_id": rng.choice(developers), "code": "export default () => null;\n" * 40,
+         "approval_status": "approved", "is_active": True,
+         "created_at": now - timedelta(days=rng.uniform(0, 365)), "updated_at": now}
+        for n in range(offset, offset + size)
+    ], scale["templates"])
+
+    # Most usage belongs to the sub-users, so the sub-user dashboard has real work to do
+    log_owners = sub_user_ids + fixture.user_ids[:1_000]
+    await _insert(TokenUsageLog.get_pymongo_collection(), lambda offset, size: [
+        {"user_id": rng.choice(log_owners), "provider": rng.choice(["openrouter", "a4f"]),
+         "model_name": f"bench-model-{rng.randint(0, 19)}", "tokens_used": rng.randint(10, 2_000),
+         "cost_usd": round(rng.uniform(0.0001, 0.05), 6), "request_type": "chat",
+         "created_at": now - timedelta(seconds=rng.uniform(0, 90 * 86400))}
+        for _ in range(size)
+    ], scale["usage_logs"])
+
+    return fixture
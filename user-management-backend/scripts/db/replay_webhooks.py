@@ -0,0 +1,87 @@
+"""
+Re-queue stored webhook events for processing.
+
+By default replays every dead-lettered event. Events are reset to pending with
+a fresh set of attempts; the running app's webhook workers pick them up, or
+pass --process to run them here and now.
+
+Usage:
+    python scripts/db/replay_webhooks.py [--status dead] [--event-id ID ...]
+        [--payment-id ID] [--event payment.captured] [--since 2025-01-31]
+        [--dry-run] [--process]
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from beanie import init_beanie  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.webhook_event import WebhookEvent, WebhookEventStatus  # noqa: E402
+from app.services.webhook_inbox import replay_events, webhook_worker_pool  # noqa: E402
+
+
+def build_query(args) -> dict:
+    query = {}
+    if args.event_id:
+        query["event_id"] = {"$in": args.event_id}
+    elif args.status != "any":
+        query["status"] = args.status
+    if args.payment_id:
+        query["ordering_key"] = args.payment_id
+    if args.event:
+        query["event"] = args.event
+    if args.since:
+        query["received_at"] = {"$gte": datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc)}
+    return query
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=settings.database_url)
+    parser.add_argument("--status", default=WebhookEventStatus.DEAD.value,
+                        choices=[WebhookEventStatus.DEAD.value, WebhookEventStatus.PENDING.value,
+                                 WebhookEventStatus.PROCESSED.value, "any"])
+    parser.add_argument("--event-id", action="append", help="Replay specific events (repeatable, ignores --status)")
+    parser.add_argument("--payment-id", help="Only events for this payment")
+    parser.add_argument("--event", help="Only this event type, e.g. payment.captured")
+    parser.add_argument("--since", help="Only events received on/after this ISO date")
+    parser.add_argument("--dry-run", action="store_true", help="List matching events without replaying")
+    parser.add_argument("--process", action="store_true", help="Process the replayed events in this process")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    await init_beanie(database=client.get_default_database(), document_models=[User, WebhookEvent])
+    query = build_query(args)
+
+    try:
+        events = await WebhookEvent.find(query).sort("+_id").to_list()
+        print(f"🔎 {len(events)} matching webhook events")
+        for event in events[:50]:
+            print(f"   {event.event_id:<40} {event.event:<20} {event.status:<10} "
+                  f"attempts={event.attempts} {event.last_error or ''}")
+        if len(events) > 50:
+            print(f"   ... and {len(events) - 50} more")
+        if args.dry_run or not events:
+            return
+
+        replayed = await replay_events(query)
+        print(f"🔁 Re-queued {replayed} events")
+
+        if args.process:
+            processed = await webhook_worker_pool.drain()
+            dead = await WebhookEvent.find({**query, "status": WebhookEventStatus.DEAD}).count()
+            print(f"✅ Processed {processed} events ({dead} dead-lettered again)")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+"""
+Bundle the BPE tokenizer files the API counts tokens with.
+
+Downloads each encoding in app.services.tokenizer.BUNDLED_ENCODINGS into
+settings.tokenizer_data_dir and writes the manifest the API checks before
+loading one. Run once at image build (see Dockerfile), so the API never
+downloads tokenizer files at request time.
+
+Usage:
+    python scripts/setup/fetch_tokenizers.py
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import tiktoken  # noqa: E402
+
+from app.services.tokenizer import BUNDLED_ENCODINGS, MANIFEST_FILE, tokenizers  # noqa: E402
+
+
+def main():
+    data_dir = tokenizers._data_dir()
+    data_dir.mkdir(parents=True, exist_ok=True)
+    # tiktoken stores what it downloads under its cache directory, keyed by source URL
+    os.environ["TIKTOKEN_CACHE_DIR"] = str(data_dir)
+
+    for name in BUNDLED_ENCODINGS:
+        encoding = tiktoken.get_encoding(name)
+        print(f"✅ {name}: {encoding.n_vocab} tokens")
+
+    (data_dir / MANIFEST_FILE).write_text(json.dumps({"encodings": list(BUNDLED_ENCODINGS)}))
+    print(f"📦 Tokenizers bundled in {data_dir}")
+
+
+if __name__ == "__main__":
+    main()
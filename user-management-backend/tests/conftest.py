@@ -0,0 +1,174 @@
+"""
+Shared pytest fixtures.
+
+Tests that need MongoDB or Redis run against disposable databases: set
+TEST_MONGODB_URL / TEST_REDIS_URL to point elsewhere. They are skipped when
+the server isn't reachable.
+"""
+
+import asyncio
+import json
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+MONGODB_URL = os.getenv("TEST_MONGODB_URL", "mongodb://localhost:27017/test_user_management")
+REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+
+class StubProvider:
+    """
+    OpenAI-compatible chat endpoint for an httpx mock transport, with
+    injectable latency and failures. Prompts containing "fail" get a 400.
+    """
+
+    def __init__(self, latency: float = 0.0, status: int = 200):
+        self.latency = latency
+        self.status = status
+        self.calls = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        self.calls.append(body)
+        await asyncio.sleep(self.latency)
+        if self.status != 200:
+            return httpx.Response(self.status, json={"error": {"message": "stub failure"}})
+        if "fail" in json.loads(body)["messages"][-1]["content"]:
+            return httpx.Response(400, json={"error": {"message": "bad request"}})
+        return httpx.Response(200, json={
+            "id": "chatcmpl-stub",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+
+class StubEmbeddingsClient:
+    """
+    Embeds each input as [len(text)], listed in reverse order; reports 2
+    tokens per input. `batches` records what reaches the provider and `fail`
+    makes every call return a retryable error.
+    """
+
+    batches = []
+    fail = False
+
+    async def embeddings(self, inputs, model, **kwargs):
+        StubEmbeddingsClient.batches.append(list(inputs))
+        await asyncio.sleep(0.01)
+        if StubEmbeddingsClient.fail:
+            return {"error": "stub failure", "retryable": True}
+        return {
+            "data": [{"index": i, "embedding": [float(len(text))]} for i, text in reversed(list(enumerate(inputs)))],
+            "usage": {"prompt_tokens": 2 * len(inputs)},
+        }
+
+    async def close(self):
+        pass
+
+
+class NullTokenService:
+    """Token service that always has tokens to reserve"""
+
+    async def reserve_tokens_advanced(self, user, tokens, request_type, metadata):
+        return f"{user.id}:reservation"
+
+    async def consume_reserved_tokens(self, reservation_id, actual_tokens, cost_usd, response_metadata):
+        return True
+
+    async def release_reserved_tokens(self, reservation_id):
+        pass
+
+    async def get_available_tokens(self, user):
+        return 1000
+
+
+@pytest.fixture
+def max_queries():
+    """
+    Fail the test when a block makes more MongoDB round trips than allowed:
+
+        with max_queries(4):
+            await get_earnings_dashboard(developer_id, "dev")
+
+    Use it inside the coroutine under test (or around asyncio.run) so queries
+    from every task the block starts are counted. The failure message lists
+    the query shapes, which points straight at a query in a loop.
+    """
+    from app.utils.query_tracer import trace_queries
+
+    @contextmanager
+    def check(limit: int):
+        with trace_queries() as trace:
+            yield trace
+        assert trace.count <= limit, f"expected at most {limit} MongoDB round trips, got {trace.describe()}"
+
+    return check
+
+
+@pytest.fixture
+def run_with_mongo():
+    """
+    Run a scenario with Beanie initialized on an empty test database, which is
+    dropped afterwards:
+
+        asyncio.run(run_with_mongo([TokenUsageLog, TokenUsageDaily], scenario))
+    """
+    from beanie import init_beanie
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def run(document_models, scenario):
+        client = AsyncIOMotorClient(MONGODB_URL, serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            client.close()
+            pytest.skip(f"MongoDB not reachable at {MONGODB_URL}")
+
+        database = client.get_default_database()
+        try:
+            await client.drop_database(database.name)
+            await init_beanie(database=database, document_models=document_models)
+            return await scenario()
+        finally:
+            await client.drop_database(database.name)
+            client.close()
+
+    return run
+
+
+@pytest.fixture
+def redis_url():
+    return REDIS_URL
+
+
+@pytest.fixture
+def run_with_redis(redis_url):
+    """
+    Run a scenario with a client for the test Redis database, which is
+    flushed afterwards:
+
+        asyncio.run(run_with_redis(scenario))  # scenario(redis)
+    """
+    import redis.asyncio as aioredis
+
+    async def run(scenario):
+        redis = aioredis.from_url(redis_url, decode_responses=True, socket_connect_timeout=1)
+        try:
+            await redis.ping()
+        except Exception:
+            await redis.aclose()
+            pytest.skip(f"Redis not reachable at {redis_url}")
+
+        try:
+            return await scenario(redis)
+        finally:
+            await redis.flushdb()
+            await redis.aclose()
+
+    return run
@@ -0,0 +1,118 @@
+"""
+Concurrency tests for the developer earnings ledger.
+
+Records many sales for one developer at once and checks that no update is
+lost, that rollups match the ledger and that replays are no-ops. Set
+TEST_MONGODB_URL to point at a disposable database; the tests are skipped when
+MongoDB isn't reachable.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from app.models.developer_earnings import (
+    DeveloperEarnings,
+    DeveloperEarningsMonthly,
+    EarningsLedgerEntry,
+    LedgerEntryType,
+)
+from app.models.item_purchase import ItemPurchase, ItemType, PurchaseStatus
+from app.services.earnings_ledger import get_earnings_dashboard, record_payout, record_sales
+
+SALES = 1000
+DOCUMENT_MODELS = [DeveloperEarnings, EarningsLedgerEntry, DeveloperEarningsMonthly, ItemPurchase]
+
+
+def _purchase(developer_id, i: int, completed_at: datetime) -> ItemPurchase:
+    amount = 100 + i % 50
+    return ItemPurchase(
+        purchase_id=f"PUR_test_{i}",
+        user_id=ObjectId(),
+        item_id=ObjectId(),
+        item_type=ItemType.TEMPLATE if i % 3 else ItemType.COMPONENT,
+        item_title=f"Item {i}",
+        developer_id=developer_id,
+        developer_username="popular_dev",
+        original_price_inr=amount,
+        original_price_usd=2,
+        paid_amount_inr=amount,
+        developer_earnings_inr=int(amount * 0.70),
+        platform_fee_inr=amount - int(amount * 0.70),
+        status=PurchaseStatus.COMPLETED,
+        payment_completed_at=completed_at,
+    )
+
+
+def test_concurrent_sales_lose_no_updates(run_with_mongo, max_queries):
+    developer_id = ObjectId()
+    months = [datetime(2025, 1, 15, tzinfo=timezone.utc), datetime(2025, 2, 15, tzinfo=timezone.utc)]
+
+    async def scenario():
+        # Documents can only be built once Beanie is initialized
+        purchases = [_purchase(developer_id, i, months[i % 2]) for i in range(SALES)]
+
+        # First sales for a brand-new developer, all at once
+        applied = await asyncio.gather(*(record_sales([purchase]) for purchase in purchases))
+        assert sum(applied) == SALES
+
+        summaries = await DeveloperEarnings.find({"developer_id": developer_id}).to_list()
+        assert len(summaries) == 1
+        summary = summaries[0]
+        expected = sum(purchase.developer_earnings_inr for purchase in purchases)
+        assert summary.total_sales_count == SALES
+        assert summary.total_earnings_inr == expected
+        assert summary.available_balance_inr == expected
+        assert summary.template_sales_count + summary.component_sales_count == SALES
+        assert summary.developer_username == "popular_dev"
+
+        rollups = await DeveloperEarningsMonthly.find({"developer_id": developer_id}).to_list()
+        assert {bucket.month for bucket in rollups} == {"2025-01", "2025-02"}
+        assert sum(bucket.sales_count for bucket in rollups) == SALES
+        assert sum(bucket.earnings_inr for bucket in rollups) == expected
+        assert await EarningsLedgerEntry.find({"developer_id": developer_id}).count() == SALES
+
+        # Redelivered sales (e.g. a retried verification) are ignored
+        assert await record_sales(purchases) == 0
+        summary = await DeveloperEarnings.find_one({"developer_id": developer_id})
+        assert summary.total_sales_count == SALES
+        assert summary.total_earnings_inr == expected
+
+        # Summary upsert + read, rollups, recent sales
+        with max_queries(4):
+            _, analytics = await get_earnings_dashboard(developer_id, "popular_dev")
+        assert sum(analytics["monthly_sales"].values()) == SALES
+        assert len(analytics["recent_sales"]) == 10
+
+    asyncio.run(run_with_mongo(DOCUMENT_MODELS, scenario))
+
+
+def test_concurrent_payout_requests_never_overdraw(run_with_mongo):
+    developer_id = ObjectId()
+
+    async def scenario():
+        purchases = [_purchase(developer_id, i, datetime.now(timezone.utc)) for i in range(10)]
+        await record_sales(purchases)
+        available = sum(purchase.developer_earnings_inr for purchase in purchases)
+
+        results = await asyncio.gather(*(
+            record_payout(developer_id, f"PAYOUT_{i}", 100, LedgerEntryType.PAYOUT_REQUESTED)
+            for i in range(30)
+        ))
+        granted = sum(results)
+        assert granted == available // 100
+
+        summary = await DeveloperEarnings.find_one({"developer_id": developer_id})
+        assert summary.available_balance_inr == available - granted * 100
+        assert summary.pending_balance_inr == granted * 100
+
+        # Each step applies once per request
+        assert await record_payout(developer_id, "PAYOUT_0", 100, LedgerEntryType.PAYOUT_COMPLETED)
+        assert not await record_payout(developer_id, "PAYOUT_0", 100, LedgerEntryType.PAYOUT_COMPLETED)
+        summary = await DeveloperEarnings.find_one({"developer_id": developer_id})
+        assert summary.withdrawn_total_inr == 100
+        assert summary.pending_balance_inr == (granted - 1) * 100
+        assert summary.last_payout_date is not None
+
+    asyncio.run(run_with_mongo(DOCUMENT_MODELS, scenario))
@@ -0,0 +1,83 @@
+"""
+Tests for embeddings micro-batching: concurrent requests share upstream
+calls, and each gets its own embeddings and token share back.
+"""
+
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.embedding_batcher import EmbeddingBatcher
+from tests.conftest import StubEmbeddingsClient
+
+
+@pytest.fixture(autouse=True)
+def stub_client(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_batch_window_ms", 20.0)
+    StubEmbeddingsClient.batches = []
+    StubEmbeddingsClient.fail = False
+
+
+def _embed(batcher, inputs):
+    return batcher.embed("stub", StubEmbeddingsClient, "embed-model", inputs, [1] * len(inputs))
+
+
+def test_concurrent_requests_share_one_upstream_call():
+    async def scenario():
+        batcher = EmbeddingBatcher()
+        requests = [["a"], ["bb", "ccc"], ["dddd"]]
+        results = await asyncio.gather(*(_embed(batcher, inputs) for inputs in requests))
+
+        assert len(StubEmbeddingsClient.batches) == 1
+        assert [result["data"] for result in results] == [[[1.0]], [[2.0], [3.0]], [[4.0]]]
+        # The batch's 8 reported tokens are split by each request's share of the inputs
+        assert [result["prompt_tokens"] for result in results] == [2, 4, 2]
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+
+def test_full_queues_are_split_into_capped_batches(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_batch_max_inputs", 4)
+
+    async def scenario():
+        batcher = EmbeddingBatcher()
+        results = await asyncio.gather(_embed(batcher, [str(n) for n in range(6)]), _embed(batcher, ["x"] * 3))
+
+        # The 6-input request fills the queue and goes out at once; the other waits for the window
+        assert [len(batch) for batch in StubEmbeddingsClient.batches] == [4, 2, 3]
+        assert len(results[0]["data"]) == 6 and len(results[1]["data"]) == 3
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+
+def test_upstream_errors_reach_every_caller():
+    StubEmbeddingsClient.fail = True
+
+    async def scenario():
+        batcher = EmbeddingBatcher()
+        results = await asyncio.gather(_embed(batcher, ["a"]), _embed(batcher, ["b"]))
+        assert all(result["error"] == "stub failure" for result in results)
+        assert results[0] is not results[1]
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+
+def test_embeddings_endpoint_returns_upstream_errors_as_400():
+    from fastapi import HTTPException
+
+    from app.api.llm import EmbeddingsRequest, embeddings
+
+    class FailingProxy:
+        async def embeddings(self, user, inputs, model):
+            return {"error": "stub failure"}
+
+    async def scenario():
+        with pytest.raises(HTTPException) as failed:
+            await embeddings(EmbeddingsRequest(model="embed-model", input=["a"]), None, FailingProxy())
+        assert failed.value.status_code == 400 and failed.value.detail == "stub failure"
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+"""
+Tests for the content-addressed embeddings cache: keys, packed vectors, the
+byte-bounded LRU, and partial hits inside a request (no Redis needed).
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services.embedding_cache import ByteBudgetLRU, EmbeddingCache, embedding_key, pack, unpack
+from tests.conftest import NullTokenService, StubEmbeddingsClient
+
+MODEL = "text-embedding-3-small"
+
+
+@pytest.fixture(autouse=True)
+def local_cache(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_cache_backend", "local")
+    monkeypatch.setattr(settings, "embedding_batch_window_ms", 1.0)
+
+
+def test_keys_ignore_line_endings_and_trailing_whitespace():
+    key = embedding_key("user-1", MODEL, "def f():\n    return 1\n")
+    assert key == embedding_key("user-1", MODEL, "def f():\r\n    return 1")
+    assert key == embedding_key("user-1", MODEL, "def f():\n    return 1   \n\n")
+    assert key != embedding_key("user-1", MODEL, "def f():\n    return 2\n")
+    assert key != embedding_key("user-1", "text-embedding-3-large", "def f():\n    return 1\n")
+    assert key != embedding_key("user-2", MODEL, "def f():\n    return 1\n")
+
+
+def test_vectors_are_packed_compactly():
+    vector = [0.0123, -0.5, 0.25, 0.999]
+    blob = pack(vector, "float16")
+    assert len(blob) == 1 + 2 * len(vector)
+    assert unpack(blob) == pytest.approx(vector, abs=1e-3)
+    assert unpack(pack(vector, "float32")) == pytest.approx(vector, abs=1e-7)
+
+
+def test_lru_evicts_by_bytes():
+    entry_size = len(pack([0.0] * 100)) + ByteBudgetLRU.ENTRY_OVERHEAD
+    lru = ByteBudgetLRU(max_bytes=3 * entry_size)
+    for name in "abc":
+        lru.set(name, pack([0.0] * 100))
+    lru.get("a")
+    lru.set("d", pack([0.0] * 100))
+
+    assert lru.get("b") is None
+    assert all(lru.get(name) is not None for name in "acd")
+    assert lru.bytes == 3 * entry_size
+
+
+def test_cache_round_trip():
+    async def scenario():
+        cache = EmbeddingCache()
+        keys = [embedding_key("user-1", MODEL, text) for text in ("a", "b")]
+        await cache.set_many({keys[0]: [0.5, 0.25]})
+        assert await cache.get_many(keys) == [[0.5, 0.25], None]
+
+    asyncio.run(scenario())
+
+
+def test_only_uncached_inputs_reach_the_provider(monkeypatch):
+    from app.services import llm_proxy_service
+    from app.services.embedding_batcher import EmbeddingBatcher
+
+    cache = EmbeddingCache()
+    batcher = EmbeddingBatcher()
+    batcher._clients["openrouter"] = StubEmbeddingsClient()
+    monkeypatch.setattr(llm_proxy_service, "embedding_cache", cache)
+    monkeypatch.setattr(llm_proxy_service, "embedding_batcher", batcher)
+    StubEmbeddingsClient.batches = []
+
+    async def scenario():
+        service = llm_proxy_service.LLMProxyService(None)
+        service.token_service = NullTokenService()
+        user = SimpleNamespace(id="user-1", subscription="pro")
+
+        await service.embeddings(user, ["a", "bb"], MODEL)
+        response = await service.embeddings(user, ["a", "ccc", "ccc\r\n", "bb"], MODEL)
+
+        # Cached inputs are served locally; a repeated new input is embedded once
+        assert StubEmbeddingsClient.batches == [["a", "bb"], ["ccc"]]
+        assert [entry["embedding"] for entry in response["data"]] == [[1.0], [3.0], [3.0], [2.0]]
+        assert response["_usage_info"]["cached_inputs"] == [0, 3]
+
+        # Another user's identical inputs aren't served from (or reported as) this user's entries
+        other = SimpleNamespace(id="user-2", subscription="pro")
+        response = await service.embeddings(other, ["a", "bb"], MODEL)
+        assert response["_usage_info"]["cached_inputs"] == []
+        assert StubEmbeddingsClient.batches[-1] == ["a", "bb"]
+        await batcher.close()
+        await service.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,128 @@
+"""
+Stress test for the atomic API key pool allocator.
+
+Runs 1,000 concurrent plan activations against a real MongoDB and checks that
+no key ever exceeds max_users. Set TEST_MONGODB_URL to point at a disposable
+database; the test is skipped when MongoDB isn't reachable.
+"""
+
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+from app.models.api_key_pool import ApiKeyPool
+from app.services.key_pool_allocator import assign_pool_key, release_pool_keys, update_pool_key
+from app.services.subscription_service import PlanSubscriptionService
+
+ACTIVATIONS = 1000
+
+
+async def _seed_pool(keys):
+    await ApiKeyPool.insert_many([
+        ApiKeyPool(key_type=key_type, key_value=f"{key_type}-key-{i:03d}-padding", max_users=max_users)
+        for i, (key_type, max_users) in enumerate(keys)
+    ])
+
+
+async def _activate_concurrently(count: int, key_type: str = "glm"):
+    service = PlanSubscriptionService(db=None)
+    users = [SimpleNamespace(id=ObjectId()) for _ in range(count)]
+    results = await asyncio.gather(*(service._assign_key_from_pool(user, key_type) for user in users))
+    return users, results
+
+
+def test_concurrent_activations_never_exceed_capacity(run_with_mongo):
+    # 20 keys x 40 seats = 800 seats for 1,000 activations
+    keys = [("glm", 40)] * 20
+
+    async def scenario():
+        await _seed_pool(keys)
+        users, results = await _activate_concurrently(ACTIVATIONS)
+        pool = await ApiKeyPool.find(ApiKeyPool.key_type == "glm").to_list()
+
+        for key in pool:
+            assert len(key.assigned_user_ids) <= key.max_users, key.key_value
+            assert len(set(key.assigned_user_ids)) == len(key.assigned_user_ids)
+            assert key.assigned_count == len(key.assigned_user_ids)
+
+        assigned = [user_id for key in pool for user_id in key.assigned_user_ids]
+        assert len(assigned) == 800
+        assert len(set(assigned)) == 800
+        assert sum(result is not None for result in results) == 800
+        assert sum(result is None for result in results) == ACTIVATIONS - 800
+
+        # Each user got the key they were recorded on
+        holder = {user_id: key.key_value for key in pool for user_id in key.assigned_user_ids}
+        for user, key_value in zip(users, results):
+            assert holder.get(user.id) == key_value
+
+    asyncio.run(run_with_mongo([ApiKeyPool], scenario))
+
+
+def test_concurrent_activations_spread_across_least_loaded_keys(run_with_mongo):
+    # Plenty of capacity: 50 keys x 100 seats for 1,000 activations
+    keys = [("glm", 100)] * 50 + [("bytez", 100)]
+
+    async def scenario():
+        await _seed_pool(keys)
+        _, results = await _activate_concurrently(ACTIVATIONS)
+        assert all(result is not None for result in results)
+
+        loads = Counter(results)
+        assert len(loads) == 50
+        assert max(loads.values()) - min(loads.values()) <= 2
+
+        bytez = await ApiKeyPool.find_one(ApiKeyPool.key_type == "bytez")
+        assert bytez.assigned_user_ids == []
+
+    asyncio.run(run_with_mongo([ApiKeyPool], scenario))
+
+
+def test_release_frees_capacity_and_keeps_counts(run_with_mongo):
+    keys = [("glm", 5)] * 2
+
+    async def scenario():
+        await _seed_pool(keys)
+        users, results = await _activate_concurrently(12)
+        assert sum(result is not None for result in results) == 10
+
+        released = [user.id for user, result in zip(users, results) if result is not None][:3]
+        await release_pool_keys(released)
+
+        pool = await ApiKeyPool.find(ApiKeyPool.key_type == "glm").to_list()
+        assert sum(key.assigned_count for key in pool) == 7
+        for key in pool:
+            assert key.assigned_count == len(key.assigned_user_ids)
+            assert not set(released) & set(key.assigned_user_ids)
+
+        _, results = await _activate_concurrently(10)
+        assert sum(result is not None for result in results) == 3
+
+    asyncio.run(run_with_mongo([ApiKeyPool], scenario))
+
+
+def test_key_updates_keep_assignments(run_with_mongo):
+    keys = [("glm", 3)]
+
+    async def scenario():
+        await _seed_pool(keys)
+        key = await ApiKeyPool.find_one(ApiKeyPool.key_type == "glm")
+
+        # A specific key still never takes more than max_users
+        users = [ObjectId() for _ in range(5)]
+        assigned = await asyncio.gather(*(assign_pool_key(key.id, user_id) for user_id in users))
+        assert sum(result is not None for result in assigned) == 3
+
+        # Settings changes from a copy read before the assignments leave them intact
+        updated = await update_pool_key(key.id, {"label": "primary", "max_users": 4})
+        assert updated.label == "primary" and updated.max_users == 4
+        assert updated.assigned_count == len(updated.assigned_user_ids) == 3
+        assert key.assigned_user_ids == []
+
+        holder = next(user_id for user_id, result in zip(users, assigned) if result is not None)
+        assert await assign_pool_key(key.id, holder) is None
+        assert await update_pool_key(ObjectId(), {"label": "missing"}) is None
+
+    asyncio.run(run_with_mongo([ApiKeyPool], scenario))
@@ -0,0 +1,117 @@
+"""
+Tests for LLM batch jobs: parsing submissions, and processing a batch end to
+end against a real MongoDB with the provider stubbed by an httpx mock
+transport. Set TEST_MONGODB_URL to point at a disposable database; the
+processing tests are skipped when MongoDB isn't reachable.
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.models.llm_batch import LLMBatch, LLMBatchItem, LLMBatchStatus
+from app.services import llm_batches
+from app.services.llm_batches import InvalidBatch, LLMBatchWorkerPool, parse_batch
+from app.services.llm_proxy_service import LLMProxyService
+from tests.conftest import StubProvider
+
+DOCUMENT_MODELS = [LLMBatch, LLMBatchItem]
+
+
+def test_parses_ndjson_and_openai_batch_lines():
+    body = b"\n".join([
+        json.dumps({"custom_id": "a", "model": "gpt-4", "messages": [{"role": "user", "content": "hi"}],
+                    "temperature": 0, "user_field": "dropped"}).encode(),
+        b"",
+        json.dumps({"custom_id": 7, "method": "POST", "url": "/v1/chat/completions",
+                    "body": {"model": "gpt-4", "messages": [{"role": "user", "content": "yo"}], "max_tokens": 5}}).encode(),
+    ])
+    requests = parse_batch(body, "application/x-ndjson")
+    assert [request["custom_id"] for request in requests] == ["a", "7"]
+    assert requests[0]["params"] == {"temperature": 0}
+    assert requests[1]["params"] == {"max_tokens": 5}
+
+    as_json = parse_batch(json.dumps({"requests": [json.loads(line) for line in body.splitlines() if line]}).encode(),
+                          "application/json; charset=utf-8")
+    assert as_json == requests
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"", "no requests"),
+    (b"{not json", "Invalid JSON"),
+    (b'{"model": "gpt-4"}', "messages"),
+    (b'{"messages": [{"role": "user", "content": "hi"}]}', "model"),
+    (b'{"model": "gpt-4", "messages": [{"role": "user", "content": "hi"}], "stream": true}', "streaming"),
+])
+def test_rejects_invalid_batches(body, message):
+    with pytest.raises(InvalidBatch, match=message):
+        parse_batch(body, "application/x-ndjson")
+
+
+def test_rejects_oversized_batches(monkeypatch):
+    monkeypatch.setattr(settings, "llm_batch_max_requests", 2)
+    line = b'{"model": "gpt-4", "messages": [{"role": "user", "content": "hi"}]}'
+    with pytest.raises(InvalidBatch, match="At most 2"):
+        parse_batch(b"\n".join([line] * 3))
+
+
+def _pool(provider: StubProvider) -> LLMBatchWorkerPool:
+    pool = LLMBatchWorkerPool(concurrency=1)
+    pool._service = LLMProxyService(None)
+    for client in pool._service.providers.values():
+        client.client = httpx.AsyncClient(transport=httpx.MockTransport(provider))
+    return pool
+
+
+def _requests(contents):
+    return [{"custom_id": str(n), "model": "gpt-4", "messages": [{"role": "user", "content": content}], "params": {}}
+            for n, content in enumerate(contents)]
+
+
+def test_batch_is_processed_and_results_are_paged(run_with_mongo, monkeypatch):
+    monkeypatch.setattr(settings, "llm_coalescing_enabled", False)
+    provider = StubProvider()
+
+    async def scenario():
+        batch = await llm_batches.enqueue_batch("user-1", "pro", _requests(["a", "b", "fail", "c", "d"]))
+        pool = _pool(provider)
+        assert await pool.drain() == 1
+
+        batch = await LLMBatch.get(batch.id)
+        assert batch.status == LLMBatchStatus.COMPLETED
+        assert (batch.succeeded_count, batch.failed_count) == (4, 1)
+        assert batch.used_tokens == 60
+
+        first = await llm_batches.batch_results(str(batch.id), after=0, limit=3)
+        rest = await llm_batches.batch_results(str(batch.id), after=first[-1]["sequence"], limit=3)
+        results = first + rest
+        assert [result["sequence"] for result in results] == [1, 2, 3, 4, 5]
+        assert sorted(result["custom_id"] for result in results) == ["0", "1", "2", "3", "4"]
+        failed = next(result for result in results if result["custom_id"] == "2")
+        assert failed["status"] == "failed" and failed["response"] is None
+
+        lines = [line async for line in llm_batches.stream_results(str(batch.id))]
+        assert [json.loads(line)["sequence"] for line in lines] == [1, 2, 3, 4, 5]
+        await pool.stop()
+
+    asyncio.run(run_with_mongo(DOCUMENT_MODELS, scenario))
+
+
+def test_cancelled_batch_keeps_finished_results(run_with_mongo):
+    provider = StubProvider()
+
+    async def scenario():
+        batch = await llm_batches.enqueue_batch("user-1", "free", _requests(["a"] * 4))
+        await llm_batches.cancel_batch(batch)
+        pool = _pool(provider)
+        await pool.drain()
+
+        batch = await LLMBatch.get(batch.id)
+        assert batch.status == LLMBatchStatus.CANCELLED
+        assert batch.cancelled_count == 4 and provider.calls == []
+        await pool.stop()
+
+    asyncio.run(run_with_mongo(DOCUMENT_MODELS, scenario))
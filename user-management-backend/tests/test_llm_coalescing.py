@@ -0,0 +1,136 @@
+"""
+Tests for single-flight coalescing of identical LLM calls.
+
+N concurrent identical deterministic chat requests must reach the provider
+once, while every caller is still billed for its own tokens.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from app.services.llm_coalescing import SingleFlight
+
+CALLERS = 50
+MESSAGES = [{"role": "user", "content": "Summarize this diff"}]
+
+
+class CountingProvider:
+    """Provider client that answers after a delay and counts upstream calls"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = 0
+
+    async def chat_completion(self, messages, model, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return {
+            "id": f"chatcmpl-{self.calls}",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 30, "completion_tokens": 12, "total_tokens": 42},
+        }
+
+    async def close(self):
+        pass
+
+
+class RecordingTokenService:
+    """Token accounting that records what each caller was charged"""
+
+    def __init__(self):
+        self.reserved = {}
+        self.consumed = []
+
+    async def reserve_tokens_advanced(self, user, tokens, request_type, metadata):
+        reservation_id = f"{user.id}:{len(self.reserved)}"
+        self.reserved[reservation_id] = tokens
+        return reservation_id
+
+    async def consume_reserved_tokens(self, reservation_id, actual_tokens, cost_usd, response_metadata):
+        self.consumed.append((reservation_id, actual_tokens))
+        return True
+
+    async def release_reserved_tokens(self, reservation_id):
+        self.reserved.pop(reservation_id, None)
+
+    async def get_available_tokens(self, user):
+        return 1000
+
+
+def test_identical_calls_share_one_flight():
+    async def scenario():
+        flights = SingleFlight()
+        upstream_calls = 0
+
+        async def call():
+            nonlocal upstream_calls
+            upstream_calls += 1
+            await asyncio.sleep(0.05)
+            return {"choices": [{"text": "ok"}]}
+
+        results = await asyncio.gather(*(flights.run("same", call) for _ in range(CALLERS)))
+        assert upstream_calls == 1
+        assert [shared for _, shared in results].count(False) == 1
+        # Everyone gets an equal but separate copy to annotate
+        responses = [response for response, _ in results]
+        assert all(response == responses[0] for response in responses)
+        assert len({id(response) for response in responses}) == CALLERS
+        assert flights.pending() == 0
+
+        # Once finished, the next identical call goes upstream again
+        await flights.run("same", call)
+        assert upstream_calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_leader_going_away_does_not_cancel_the_flight():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.ensure_future(flights.run("same", call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.run("same", call))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await follower == ("done", True)
+
+    asyncio.run(scenario())
+
+
+def test_proxy_coalesces_concurrent_identical_requests():
+    from app.services.llm_proxy_service import LLMProxyService
+
+    async def scenario():
+        service = LLMProxyService(None)
+        provider = CountingProvider()
+        service.providers = {name: provider for name in service.providers}
+        service.token_service = RecordingTokenService()
+        users = [SimpleNamespace(id=f"user-{n}", subscription="pro") for n in range(CALLERS)]
+
+        responses = await asyncio.gather(*(
+            service.chat_completion(user, MESSAGES, "gpt-4", temperature=0, max_tokens=64) for user in users
+        ))
+
+        assert provider.calls == 1
+        assert all("error" not in response for response in responses)
+        assert [response["_usage_info"].get("coalesced", False) for response in responses].count(False) == 1
+        # Each caller reserved and settled its own tokens at the real usage
+        assert len(service.token_service.reserved) == CALLERS
+        assert sorted(service.token_service.consumed) == sorted(
+            (reservation_id, 42) for reservation_id in service.token_service.reserved
+        )
+
+        # A non-deterministic request always gets its own call
+        await asyncio.gather(*(
+            service.chat_completion(users[0], MESSAGES, "gpt-4", temperature=0.7) for _ in range(3)
+        ))
+        assert provider.calls == 4
+        await service.close()
+
+    asyncio.run(scenario())
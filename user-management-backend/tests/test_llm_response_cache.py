@@ -0,0 +1,29 @@
+"""
+Tests for the LLM response cache's request keys (no Redis needed).
+"""
+
+from app.services.llm_response_cache import cache_key, is_deterministic
+
+MESSAGES = [{"role": "system", "content": "Explain code."}, {"role": "user", "content": "print(1)"}]
+
+
+def test_only_deterministic_requests_are_cacheable():
+    assert is_deterministic({"temperature": 0})
+    assert is_deterministic({"temperature": 0.7, "seed": 42})
+    assert not is_deterministic({"temperature": 0.7})
+    assert not is_deterministic({"temperature": 0, "stream": True})
+    assert not is_deterministic({"temperature": 0, "n": 3})
+
+
+def test_key_is_canonical():
+    key = cache_key("user-1", "gpt-4", MESSAGES, {"temperature": 0, "max_tokens": 100})
+    # Parameter order and unset parameters don't matter
+    assert key == cache_key("user-1", "gpt-4", MESSAGES, {"max_tokens": 100, "temperature": 0, "seed": None})
+    # Anything that changes the output does
+    assert key != cache_key("user-1", "gpt-4", MESSAGES, {"temperature": 0, "max_tokens": 200})
+    assert key != cache_key("user-1", "gpt-4o", MESSAGES, {"temperature": 0, "max_tokens": 100})
+    assert key != cache_key("user-1", "gpt-4", MESSAGES[1:], {"temperature": 0, "max_tokens": 100})
+    assert key != cache_key("user-1", "gpt-4", MESSAGES, {"temperature": 0, "max_tokens": 100,
+                                                          "tools": [{"type": "function"}]})
+    # Entries are scoped per user unless shared globally
+    assert key != cache_key("user-2", "gpt-4", MESSAGES, {"temperature": 0, "max_tokens": 100})
@@ -0,0 +1,113 @@
+"""
+Tests for LLM admission control: weighted fair queuing by tier, shedding the
+lowest-priority waiter when the queue is full, queue deadlines and per-user
+in-flight limits.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services.llm_scheduler import (
+    DEADLINE, QUEUE_FULL, USER_LIMIT, LLMOverloaded, LLMScheduler, scheduler_tier,
+)
+
+
+@pytest.fixture(autouse=True)
+def scheduler_settings(monkeypatch):
+    monkeypatch.setattr(settings, "llm_scheduler_enabled", True)
+    monkeypatch.setattr(settings, "llm_scheduler_provider_concurrency", {"stub": 1})
+    monkeypatch.setattr(settings, "llm_scheduler_max_queue", 100)
+    monkeypatch.setattr(settings, "llm_scheduler_tier_weights", {"free": 1.0, "pro": 4.0, "api_key": 4.0, "ultra": 16.0})
+    monkeypatch.setattr(settings, "llm_scheduler_queue_timeout_seconds", {"free": 5.0, "pro": 5.0, "ultra": 5.0})
+
+
+async def _call(scheduler, tier, order, hold=0.01):
+    async with scheduler.slot("stub", tier):
+        order.append(tier)
+        await asyncio.sleep(hold)
+
+
+def test_higher_tiers_overtake_a_free_backlog():
+    async def scenario():
+        scheduler = LLMScheduler()
+        order = []
+        blocker = asyncio.ensure_future(_call(scheduler, "free", order, hold=0.05))
+        await asyncio.sleep(0)
+        calls = [asyncio.ensure_future(_call(scheduler, "free", order)) for _ in range(6)]
+        await asyncio.sleep(0)
+        calls.append(asyncio.ensure_future(_call(scheduler, "ultra", order)))
+        await asyncio.gather(blocker, *calls)
+
+        # The ultra call queued behind six free calls is served after at most one of them
+        assert order.index("ultra") <= 2
+        assert scheduler.queue("stub").in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_sheds_the_lowest_priority_waiter(monkeypatch):
+    monkeypatch.setattr(settings, "llm_scheduler_max_queue", 2)
+
+    async def scenario():
+        scheduler = LLMScheduler()
+        order = []
+        blocker = asyncio.ensure_future(_call(scheduler, "free", order, hold=0.05))
+        await asyncio.sleep(0)
+        free = [asyncio.ensure_future(_call(scheduler, "free", order)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        # Another free call doesn't fit and would be last in line
+        with pytest.raises(LLMOverloaded) as rejected:
+            await _call(scheduler, "free", order)
+        assert rejected.value.reason == QUEUE_FULL and rejected.value.retry_after >= 1
+
+        # An ultra call takes the place of the last free one
+        ultra = asyncio.ensure_future(_call(scheduler, "ultra", order))
+        results = await asyncio.gather(blocker, *free, ultra, return_exceptions=True)
+        assert isinstance(results[2], LLMOverloaded) and results[2].reason == QUEUE_FULL
+        assert order == ["free", "ultra", "free"]
+
+    asyncio.run(scenario())
+
+
+def test_calls_give_up_after_the_queue_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "llm_scheduler_queue_timeout_seconds", {"free": 0.02})
+
+    async def scenario():
+        scheduler = LLMScheduler()
+        order = []
+        blocker = asyncio.ensure_future(_call(scheduler, "free", order, hold=0.1))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloaded) as rejected:
+            await _call(scheduler, "free", order)
+        assert rejected.value.reason == DEADLINE
+        await blocker
+        assert scheduler.queue("stub").queued == 0 and scheduler.queue("stub").in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_per_user_in_flight_limit(monkeypatch):
+    monkeypatch.setattr(settings, "llm_scheduler_user_max_in_flight", {"free": 2})
+    scheduler = LLMScheduler()
+
+    with scheduler.admit("user-1", "free"), scheduler.admit("user-1", "free"):
+        with pytest.raises(LLMOverloaded) as rejected:
+            with scheduler.admit("user-1", "free"):
+                pass
+        assert rejected.value.reason == USER_LIMIT
+        # Other users aren't affected
+        with scheduler.admit("user-2", "free"):
+            pass
+    with scheduler.admit("user-1", "free"):
+        pass
+
+
+def test_api_key_requests_use_the_heavier_tier():
+    assert scheduler_tier(SimpleNamespace(subscription="free"), via_api_key=True) == "api_key"
+    assert scheduler_tier(SimpleNamespace(subscription="ultra"), via_api_key=True) == "ultra"
+    assert scheduler_tier(SimpleNamespace(subscription="pro")) == "pro"
+    assert scheduler_tier(SimpleNamespace(subscription="payg")) == "free"
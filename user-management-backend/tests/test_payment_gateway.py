@@ -0,0 +1,120 @@
+"""
+Tests for the async payment gateway adapter, run against FakePaymentGateway
+through httpx's MockTransport (no network access needed).
+"""
+
+import asyncio
+import hashlib
+import hmac
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.services import payment_gateway
+from app.services.payment_gateway import (
+    FakePaymentGateway,
+    PaymentGatewayError,
+    RazorpayGateway,
+    get_payment_gateway,
+    sign_payment,
+    verify_webhook_signature,
+)
+
+ORDER = {"amount": 49900, "currency": "INR", "receipt": "rcpt_test", "notes": {"plan_name": "pro"}}
+
+
+def _gateway(fake: FakePaymentGateway, **kwargs) -> RazorpayGateway:
+    return RazorpayGateway(fake.key_id, fake.key_secret, backoff_base=0.001, transport=fake.as_transport(), **kwargs)
+
+
+def test_checkout_round_trip_and_local_signature_check():
+    fake = FakePaymentGateway()
+    gateway = _gateway(fake)
+
+    async def scenario():
+        order = await gateway.create_order(ORDER)
+        payment = fake.pay(order["id"])
+        fetched = await gateway.fetch_payment(payment["razorpay_payment_id"])
+        await gateway.close()
+        return order, payment, fetched
+
+    order, payment, fetched = asyncio.run(scenario())
+    assert order["amount"] == 49900 and order["notes"] == {"plan_name": "pro"}
+    assert fetched["order_id"] == order["id"] and fetched["status"] == "captured"
+
+    assert gateway.verify_payment_signature(order["id"], payment["razorpay_payment_id"], payment["razorpay_signature"])
+    assert not gateway.verify_payment_signature(order["id"], payment["razorpay_payment_id"], "0" * 64)
+    assert not gateway.verify_payment_signature(order["id"], "pay_other", payment["razorpay_signature"])
+    assert payment["razorpay_signature"] == sign_payment(order["id"], payment["razorpay_payment_id"], fake.key_secret)
+
+
+def test_transient_failures_are_retried():
+    fake = FakePaymentGateway()
+    failures = {"left": 2}
+    transport = fake.as_transport()
+
+    async def flaky(request):
+        if failures["left"]:
+            failures["left"] -= 1
+            return httpx.Response(503, json={"error": {"description": "Service unavailable"}})
+        return await transport.handle_async_request(request)
+
+    gateway = RazorpayGateway(fake.key_id, fake.key_secret, backoff_base=0.001,
+                              transport=httpx.MockTransport(flaky))
+    order = asyncio.run(gateway.create_order(ORDER))
+    assert order["id"] in fake.orders
+    assert failures["left"] == 0
+
+
+def test_client_errors_and_exhausted_retries_raise():
+    fake = FakePaymentGateway()
+
+    async def unavailable(request):
+        return httpx.Response(503, json={"error": {"description": "Service unavailable"}})
+
+    with pytest.raises(PaymentGatewayError) as missing:
+        asyncio.run(_gateway(fake).fetch_payment("pay_missing"))
+    assert missing.value.status_code == 400 and not missing.value.retryable
+
+    gateway = RazorpayGateway(fake.key_id, fake.key_secret, backoff_base=0.001, max_retries=2,
+                              transport=httpx.MockTransport(unavailable))
+    with pytest.raises(PaymentGatewayError) as exhausted:
+        asyncio.run(gateway.fetch_order("order_x"))
+    assert exhausted.value.status_code == 503
+
+
+def test_refunds_are_not_retried_after_reaching_the_gateway():
+    fake = FakePaymentGateway()
+    calls = {"count": 0}
+
+    async def failing(request):
+        calls["count"] += 1
+        return httpx.Response(502, json={"error": {"description": "Bad gateway"}})
+
+    gateway = RazorpayGateway(fake.key_id, fake.key_secret, backoff_base=0.001,
+                              transport=httpx.MockTransport(failing))
+    with pytest.raises(PaymentGatewayError):
+        asyncio.run(gateway.refund_payment("pay_x", {"amount": 100}))
+    assert calls["count"] == 1
+
+
+def test_webhook_signature():
+    body = b'{"event":"payment.captured"}'
+    signature = hmac.new(b"whsec", body, hashlib.sha256).hexdigest()
+    assert verify_webhook_signature(body, signature, "whsec")
+    assert not verify_webhook_signature(body + b" ", signature, "whsec")
+    assert not verify_webhook_signature(body, "", "whsec")
+
+
+def test_fake_gateway_must_be_allowed_explicitly(monkeypatch):
+    monkeypatch.setattr(payment_gateway, "_gateway", None)
+    monkeypatch.setattr(settings, "payment_gateway", "fake")
+    monkeypatch.setattr(settings, "razorpay_key_secret", "")
+
+    monkeypatch.setattr(settings, "payment_gateway_allow_fake", False)
+    with pytest.raises(RuntimeError):
+        get_payment_gateway()
+
+    monkeypatch.setattr(settings, "payment_gateway_allow_fake", True)
+    assert isinstance(get_payment_gateway(), FakePaymentGateway)
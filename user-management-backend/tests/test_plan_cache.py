@@ -0,0 +1,34 @@
+"""
+Tests for cached plan lookups: writes to a plan invalidate its cached
+lookups by id and by name. Set TEST_MONGODB_URL to point at a disposable
+database; the tests are skipped when MongoDB isn't reachable.
+"""
+
+import asyncio
+
+from app.models.user import SubscriptionPlanModel
+from app.services.subscription_service import get_plan_by_id, get_plan_by_name, invalidate_plan_cache
+
+
+def test_plan_writes_invalidate_cached_lookups(run_with_mongo):
+    async def scenario():
+        plan = SubscriptionPlanModel(name="pro", display_name="Pro", monthly_tokens=1000, price_monthly=9.0)
+        await plan.insert()
+        await invalidate_plan_cache(plan)
+        assert (await get_plan_by_id(plan.id)).monthly_tokens == 1000
+        assert (await get_plan_by_name("pro")).monthly_tokens == 1000
+
+        plan.monthly_tokens = 5000
+        await plan.save()
+        await invalidate_plan_cache(plan)
+        assert (await get_plan_by_id(plan.id)).monthly_tokens == 5000
+        assert (await get_plan_by_name("pro", active_only=False)).monthly_tokens == 5000
+
+        # A rename drops the lookups under the old name too
+        plan.name, plan.is_active = "pro-legacy", False
+        await plan.save()
+        await invalidate_plan_cache(plan, previous_name="pro")
+        assert await get_plan_by_name("pro") is None
+        assert (await get_plan_by_name("pro-legacy", active_only=False)).name == "pro-legacy"
+
+    asyncio.run(run_with_mongo([SubscriptionPlanModel], scenario))
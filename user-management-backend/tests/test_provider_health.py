@@ -0,0 +1,117 @@
+"""
+Tests for provider circuit breakers, failover and hedged requests.
+
+The providers are the real OpenRouter and A4F clients talking to a local stub
+(an httpx mock transport) that injects latency and errors per provider.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.services.llm_proxy_service import LLMProxyService
+from app.services.provider_health import CLOSED, HALF_OPEN, OPEN, provider_health
+from tests.conftest import NullTokenService, StubProvider
+
+MESSAGES = [{"role": "user", "content": "Explain this stack trace"}]
+
+
+@pytest.fixture(autouse=True)
+def health_settings(monkeypatch):
+    monkeypatch.setattr(settings, "llm_breaker_consecutive_failures", 3)
+    monkeypatch.setattr(settings, "llm_breaker_open_seconds", 0.2)
+    monkeypatch.setattr(settings, "llm_hedge_min_samples", 5)
+    monkeypatch.setattr(settings, "llm_hedge_min_delay_seconds", 0.02)
+    monkeypatch.setattr(settings, "llm_coalescing_enabled", False)
+    provider_health.reset()
+    yield
+    provider_health.reset()
+
+
+def _service(a4f: StubProvider, openrouter: StubProvider) -> LLMProxyService:
+    service = LLMProxyService(None)
+    service.token_service = NullTokenService()
+    service.providers["a4f"].client = httpx.AsyncClient(transport=httpx.MockTransport(a4f))
+    service.providers["openrouter"].client = httpx.AsyncClient(transport=httpx.MockTransport(openrouter))
+    return service
+
+
+def test_failing_provider_fails_over_and_opens_its_circuit():
+    async def scenario():
+        a4f, openrouter = StubProvider(status=503), StubProvider()
+        service = _service(a4f, openrouter)
+        user = SimpleNamespace(id="user-1", subscription="pro")
+
+        for _ in range(3):
+            response = await service.chat_completion(user, MESSAGES, "gpt-4")
+            assert response["_usage_info"]["provider"] == "openrouter"
+        assert b'"openai/gpt-4"' in openrouter.calls[0]
+        assert provider_health._get("a4f", "gpt-4").state == OPEN
+
+        # While open, requests go straight to the alternate
+        await service.chat_completion(user, MESSAGES, "gpt-4")
+        assert len(a4f.calls) == 3 and len(openrouter.calls) == 4
+
+        # After the cooldown one trial call reaches the recovered provider and closes the circuit
+        a4f.status = 200
+        await asyncio.sleep(0.25)
+        response = await service.chat_completion(user, MESSAGES, "gpt-4")
+        assert response["_usage_info"]["provider"] == "a4f"
+        assert provider_health._get("a4f", "gpt-4").state == CLOSED
+        await service.close()
+
+    asyncio.run(scenario())
+
+
+def test_request_errors_do_not_trip_the_circuit():
+    async def scenario():
+        a4f, openrouter = StubProvider(status=400), StubProvider()
+        service = _service(a4f, openrouter)
+        user = SimpleNamespace(id="user-1", subscription="pro")
+
+        for _ in range(5):
+            response = await service.chat_completion(user, MESSAGES, "gpt-4")
+            assert "error" in response and "retryable" not in response
+        assert provider_health._get("a4f", "gpt-4").state == CLOSED
+        assert openrouter.calls == []
+        await service.close()
+
+    asyncio.run(scenario())
+
+
+def test_half_open_circuit_allows_a_single_trial():
+    for _ in range(3):
+        provider_health.record("stub", "m", 1.0, ok=False)
+    assert not provider_health.allow("stub", "m")
+
+    time.sleep(0.25)
+    assert provider_health.allow("stub", "m")
+    assert provider_health._get("stub", "m").state == HALF_OPEN
+    assert not provider_health.allow("stub", "m")
+    provider_health.record("stub", "m", 1.0, ok=False)
+    assert provider_health._get("stub", "m").state == OPEN
+
+
+def test_slow_call_is_hedged_after_the_p95_delay(monkeypatch):
+    monkeypatch.setattr(settings, "llm_hedge_plans", ["ultra"])
+
+    async def scenario():
+        a4f, openrouter = StubProvider(latency=0.01), StubProvider(latency=0.01)
+        service = _service(a4f, openrouter)
+        user = SimpleNamespace(id="user-1", subscription="ultra")
+        for _ in range(5):
+            await service.chat_completion(user, MESSAGES, "gpt-4")
+
+        # The primary degrades: the hedge to the alternate answers long before it would
+        a4f.latency = 1.0
+        started = time.perf_counter()
+        response = await service.chat_completion(user, MESSAGES, "gpt-4")
+        assert time.perf_counter() - started < 0.5
+        assert response["_usage_info"]["provider"] == "openrouter"
+        await service.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,67 @@
+"""
+Tests for the per-request query tracer, fed with command events directly
+(no MongoDB needed).
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils.query_tracer import query_shape, query_trace_listener, trace_queries
+
+
+def _run(command_name: str, command: dict, micros: int = 1000):
+    """Deliver a started/succeeded pair like pymongo does"""
+    query_trace_listener.started(SimpleNamespace(command_name=command_name, command=command))
+    query_trace_listener.succeeded(SimpleNamespace(command_name=command_name, duration_micros=micros))
+
+
+def test_query_shape_drops_values():
+    assert query_shape("find", {"find": "users", "filter": {"_id": 1}}) == "find users {_id}"
+    assert query_shape("find", {"find": "users", "filter": {"_id": 2}}) == "find users {_id}"
+    assert query_shape("find", {"find": "users", "filter": {"_id": {"$in": [1, 2]}, "is_active": True}}) == \
+        "find users {_id:$in,is_active}"
+    assert query_shape("update", {"update": "items", "updates": [{"q": {"_id": 1}, "u": {"$inc": {"n": 1}}}]}) == \
+        "update items {_id}"
+    assert query_shape("aggregate", {"aggregate": "users", "pipeline": [
+        {"$match": {"parent_user_id": 1}}, {"$facet": {}}]}) == "aggregate users {parent_user_id} $facet"
+    assert query_shape("insert", {"insert": "logs", "documents": [{}]}) == "insert logs"
+
+
+def test_trace_counts_round_trips_and_duplicate_shapes():
+    with trace_queries() as trace:
+        for user_id in range(12):
+            _run("find", {"find": "users", "filter": {"_id": user_id}})
+        _run("getMore", {"getMore": 1, "collection": "users"})
+
+    assert trace.count == 13
+    assert trace.duration == pytest.approx(0.013)
+    assert trace.duplicates(10) == [("find users {_id}", 12)]
+    assert "getMore users {}" not in trace.shapes
+
+    # Outside a trace nothing is recorded
+    _run("find", {"find": "users", "filter": {"_id": 1}})
+    assert trace.count == 13
+
+
+def test_trace_follows_tasks_started_inside_it():
+    async def scenario():
+        with trace_queries() as trace:
+            await asyncio.gather(*(
+                asyncio.to_thread(_run, "find", {"find": "users", "filter": {"_id": i}}) for i in range(5)
+            ))
+        return trace
+
+    assert asyncio.run(scenario()).count == 5
+
+
+def test_max_queries_fixture_fails_over_budget(max_queries):
+    with max_queries(2):
+        _run("find", {"find": "users", "filter": {"_id": 1}})
+        _run("find", {"find": "users", "filter": {"_id": 2}})
+
+    with pytest.raises(AssertionError, match="at most 2"):
+        with max_queries(2):
+            for user_id in range(3):
+                _run("find", {"find": "users", "filter": {"_id": user_id}})
@@ -0,0 +1,116 @@
+"""
+Tests for rate limiting in PerformanceAndRateLimitMiddleware: limited requests
+get the limiter's 429 without reaching the endpoint, each request records one
+rate limit decision, and only a failing limiter falls back to letting
+requests through. Also covers the /metrics bearer token.
+"""
+
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from prometheus_client import REGISTRY
+
+from app.config import settings
+from app.main import app as main_app
+from app.middleware.performance import PerformanceAndRateLimitMiddleware
+from app.middleware.rate_limiting import rate_limit_middleware
+
+RATE_INFO = {"limit": 10, "remaining": 0, "reset": int(time.time()) + 60, "tier": "free"}
+
+
+def _app():
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/api/things")
+    async def things():
+        app.state.calls += 1
+        return {"ok": True}
+
+    app.add_middleware(PerformanceAndRateLimitMiddleware)
+    return app
+
+
+async def _get(app, path: str = "/api/things", **headers) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+def test_limited_requests_get_a_429_without_running_the_endpoint(monkeypatch):
+    async def limited(request, db):
+        raise HTTPException(
+            status_code=429,
+            detail={"error": "rate_limit_exceeded", "message": "Rate limit exceeded", "rate_limit": RATE_INFO},
+            headers={"Retry-After": "60"},
+        )
+
+    monkeypatch.setattr(rate_limit_middleware, "check_rate_limit", limited)
+    app = _app()
+    response = asyncio.run(_get(app))
+
+    assert response.status_code == 429
+    assert response.json()["detail"]["error"] == "rate_limit_exceeded"
+    assert response.headers["Retry-After"] == "60"
+    assert (response.headers["X-RateLimit-Remaining"], response.headers["X-RateLimit-Tier"]) == ("0", "free")
+    assert app.state.calls == 0
+
+
+class StubRateLimiter:
+    """Allows the first `allowed` checks, then limits"""
+
+    def __init__(self, allowed: int):
+        self.allowed = allowed
+
+    async def check_rate_limit(self, identifier, limit, window_seconds, endpoint):
+        self.allowed -= 1
+        return self.allowed >= 0, dict(RATE_INFO, remaining=max(0, self.allowed))
+
+
+def _decisions():
+    return {
+        decision: REGISTRY.get_sample_value("rate_limit_decisions_total", {"tier": tier, "decision": decision}) or 0
+        for tier, decision in [("ip", "allowed"), ("ip", "limited"), ("fallback", "error")]
+    }
+
+
+def test_each_request_records_one_decision(monkeypatch):
+    monkeypatch.setattr(rate_limit_middleware, "rate_limiter", StubRateLimiter(allowed=2))
+    app = _app()
+    before = _decisions()
+
+    async def scenario():
+        return [(await _get(app)).status_code for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [200, 200, 429]
+    after = _decisions()
+    assert {decision: after[decision] - before[decision] for decision in after} == {
+        "allowed": 2, "limited": 1, "error": 0
+    }
+
+
+def test_a_failing_limiter_lets_requests_through(monkeypatch):
+    async def broken(request, db):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(rate_limit_middleware, "check_rate_limit", broken)
+    app = _app()
+    response = asyncio.run(_get(app))
+
+    assert response.status_code == 200
+    assert response.headers["X-RateLimit-Tier"] == "fallback"
+    assert app.state.calls == 1
+
+
+def test_metrics_require_the_bearer_token(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", True)
+    monkeypatch.setattr(settings, "metrics_token", "s3cret")
+
+    async def scenario():
+        return [
+            (await _get(main_app, "/metrics", **headers)).status_code
+            for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "Bearer s3cret"})
+        ]
+
+    assert asyncio.run(scenario()) == [401, 401, 200]
@@ -0,0 +1,106 @@
+"""
+Tests for the sub-user dashboard, called through the mounted app routes.
+
+The aggregations run against a real MongoDB; set TEST_MONGODB_URL to point at
+a disposable database. Those tests are skipped when MongoDB isn't reachable.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from bson import ObjectId
+
+from app.main import app
+from app.middleware.auth import require_auth
+from app.models.user import ApiKey, TokenUsageLog, User
+
+DOCUMENT_MODELS = [User, ApiKey, TokenUsageLog]
+PREFIX = "/dashboard/sub-users"
+
+
+async def _get(path: str, **params) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(f"{PREFIX}{path}", params=params)
+
+
+async def _seed(now: datetime):
+    """A parent with three sub-users: busy, quiet (last used 10 days ago) and inactive"""
+    parent_id, busy, quiet, inactive = ObjectId(), ObjectId(), ObjectId(), ObjectId()
+    await User.get_pymongo_collection().insert_many([
+        {"_id": user_id, "email": f"{name}@example.com", "name": name, "parent_user_id": parent_id,
+         "is_sub_user": True, "is_active": active, "tokens_used": used, "monthly_limit": 1000,
+         "created_at": now, "updated_at": now}
+        for user_id, name, active, used in [
+            (busy, "busy", True, 950), (quiet, "quiet", True, 50), (inactive, "inactive", False, 500),
+        ]
+    ] + [{"_id": ObjectId(), "email": "stranger@example.com", "is_sub_user": True, "parent_user_id": ObjectId(),
+          "tokens_used": 10_000, "monthly_limit": 1000, "created_at": now, "updated_at": now}])
+    await ApiKey.get_pymongo_collection().insert_many([
+        {"user_id": user_id, "key_hash": f"hash-{user_id}-{n}", "key_preview": "sk-test", "name": f"key {n}",
+         "is_active": n == 0, "created_at": now}
+        for user_id in (busy, quiet) for n in range(2)
+    ])
+    await TokenUsageLog.get_pymongo_collection().insert_many([
+        {"user_id": user_id, "provider": "openrouter", "model_name": "test-model", "tokens_used": tokens,
+         "request_type": "chat", "created_at": created_at}
+        for user_id, tokens, created_at in [
+            (busy, 100, now - timedelta(minutes=5)),
+            (busy, 200, now - timedelta(minutes=1)),
+            (busy, 300, now - timedelta(days=2)),
+            (quiet, 40, now - timedelta(days=10)),
+        ]
+    ])
+    return parent_id
+
+
+@pytest.fixture
+def signed_in():
+    def sign_in(user_id):
+        app.dependency_overrides[require_auth] = lambda: SimpleNamespace(id=user_id)
+
+    yield sign_in
+    app.dependency_overrides.pop(require_auth, None)
+
+
+def test_dashboard_routes_are_mounted():
+    response = asyncio.run(_get("/overview"))
+    assert response.status_code == 401
+
+
+def test_dashboard_aggregates_only_the_parents_sub_users(run_with_mongo, signed_in):
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        parent_id = await _seed(now)
+        signed_in(parent_id)
+
+        overview = (await _get("/overview")).json()
+        assert (overview["total_sub_users"], overview["active_sub_users"]) == (3, 2)
+        assert overview["total_tokens_used"] == 1500 and overview["total_api_keys"] == 2
+        assert overview["monthly_usage_percentage"] == 50.0
+        assert [user["name"] for user in overview["top_consumers"]] == ["busy", "inactive", "quiet"]
+
+        activity = {row["user_name"]: row for row in (await _get("/activity")).json()}
+        assert activity["inactive"]["status"] == "inactive" and activity["inactive"]["last_active"] is None
+        if now - timedelta(minutes=5) >= now.replace(hour=0, minute=0, second=0, microsecond=0):
+            assert (activity["busy"]["tokens_used_today"], activity["busy"]["requests_today"]) == (300, 2)
+        assert activity["busy"]["status"] == "active"
+        # Usage older than `days` doesn't count as recent activity
+        assert activity["quiet"]["last_active"] is None
+        activity = {row["user_name"]: row for row in (await _get("/activity", days=14)).json()}
+        assert activity["quiet"]["last_active"] is not None and activity["quiet"]["status"] == "idle"
+
+        trends = (await _get("/usage-trends", days=7)).json()
+        assert trends["summary"]["total_tokens"] == 600 and trends["summary"]["total_requests"] == 3
+        assert sum(day["unique_users"] for day in trends["trends"]) == len(trends["trends"])
+
+        limits = (await _get("/limits-analysis")).json()
+        assert [user["name"] for user in limits["over_utilized"]] == ["busy"]
+        assert [user["name"] for user in limits["under_utilized"]] == ["quiet"]
+        assert [user["name"] for user in limits["optimal"]] == ["inactive"]
+        assert limits["summary"]["overall_efficiency"] == 50.0
+
+    asyncio.run(run_with_mongo(DOCUMENT_MODELS, scenario))
@@ -0,0 +1,146 @@
+"""
+Concurrency tests for the Redis token reservation store.
+
+Several worker processes reserve against one balance at once and together
+must never hold more than it. Also covers expiry of abandoned reservations
+and idempotent settlement, refusing requests while Redis is down and charging
+settlements to MongoDB atomically. Set TEST_REDIS_URL / TEST_MONGODB_URL to
+point at disposable databases; tests are skipped when a server isn't reachable.
+"""
+
+import asyncio
+import multiprocessing
+import uuid
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.user import TokenUsageLog, User
+from app.services import token_service as token_service_module
+from app.services.token_reservations import TokenReservationStore, reservation_redis
+from app.services.token_service import TokenReservationUnavailable, TokenService
+
+LIMIT = 1000
+PROCESSES = 4
+ATTEMPTS_PER_PROCESS = 400
+# Fewer connections than attempts in flight: the rest wait for one instead of failing
+CONNECTIONS_PER_PROCESS = 50
+
+
+def _balance_loader(limit: int, used: int = 0):
+    async def load():
+        return limit, used, datetime.now(timezone.utc) + timedelta(days=30)
+    return load
+
+
+def _reserve_in_process(redis_url: str, user_id: str, attempts: int, results) -> None:
+    """Worker process: reserve one token at a time and report the ids it got"""
+    async def run():
+        redis = reservation_redis(redis_url, max_connections=CONNECTIONS_PER_PROCESS, pool_timeout=30)
+        store = TokenReservationStore(redis)
+        reserved = await asyncio.gather(*(
+            store.reserve(user_id, 1, _balance_loader(LIMIT)) for _ in range(attempts)
+        ))
+        await redis.aclose()
+        return [reservation_id for reservation_id, _ in reserved if reservation_id]
+
+    results.put(asyncio.run(run()))
+
+
+def test_workers_never_reserve_more_than_the_balance(run_with_redis, redis_url):
+    async def scenario(redis):
+        store, user_id = TokenReservationStore(redis), uuid.uuid4().hex
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        workers = [
+            context.Process(target=_reserve_in_process, args=(redis_url, user_id, ATTEMPTS_PER_PROCESS, results))
+            for _ in range(PROCESSES)
+        ]
+        for worker in workers:
+            worker.start()
+        reservation_ids = [reservation_id for _ in workers for reservation_id in results.get(timeout=60)]
+        for worker in workers:
+            worker.join(timeout=10)
+
+        # 1,600 attempts against 1,000 tokens: exactly the balance is held, never more
+        assert len(reservation_ids) == LIMIT
+        assert len(set(reservation_ids)) == LIMIT
+        assert await store.reserved(user_id) == LIMIT
+        assert (await store.reserve(user_id, 1, _balance_loader(LIMIT)))[0] is None
+
+        # Settling moves held tokens to used; releasing gives them back
+        for reservation_id in reservation_ids[:600]:
+            assert (await store.settle(reservation_id, 1))[0] is True
+        for reservation_id in reservation_ids[600:]:
+            await store.release(reservation_id)
+        assert await store.reserved(user_id) == 0
+        assert int(await redis.hget(f"tokens:{{{user_id}}}:balance", "used")) == 600
+        reservation_id, available = await store.reserve(user_id, 400, _balance_loader(LIMIT))
+        assert reservation_id is not None and available == 0
+
+    asyncio.run(run_with_redis(scenario))
+
+
+def test_abandoned_reservations_expire(run_with_redis):
+    async def scenario(redis):
+        store, user_id = TokenReservationStore(redis), uuid.uuid4().hex
+        reservation_id, _ = await store.reserve(user_id, 100, _balance_loader(100), ttl_seconds=0.2)
+        assert reservation_id is not None
+        assert (await store.reserve(user_id, 1, _balance_loader(100)))[0] is None
+
+        await asyncio.sleep(0.3)
+        assert await store.reserved(user_id) == 0
+        assert (await store.reserve(user_id, 100, _balance_loader(100)))[0] is not None
+
+    asyncio.run(run_with_redis(scenario))
+
+
+def test_settlement_is_idempotent(run_with_redis):
+    async def scenario(redis):
+        store, user_id = TokenReservationStore(redis), uuid.uuid4().hex
+        reservation_id, _ = await store.reserve(user_id, 50, _balance_loader(100, used=10), {"model": "m"})
+
+        results = await asyncio.gather(*(store.settle(reservation_id, 40) for _ in range(10)))
+        assert [settled for settled, _ in results].count(True) == 1
+        assert [metadata for settled, metadata in results if settled] == [{"model": "m"}]
+        assert int(await redis.hget(f"tokens:{{{user_id}}}:balance", "used")) == 50
+
+        # A late settlement after the hold expired still charges, once
+        late_id, _ = await store.reserve(user_id, 10, _balance_loader(100), ttl_seconds=0.1)
+        await asyncio.sleep(0.2)
+        assert await store.settle(late_id, 10) == (True, {})
+        assert await store.settle(late_id, 10) == (False, {})
+        assert int(await redis.hget(f"tokens:{{{user_id}}}:balance", "used")) == 60
+
+    asyncio.run(run_with_redis(scenario))
+
+
+def test_reserving_fails_closed_when_redis_is_down(monkeypatch):
+    unreachable = TokenReservationStore(reservation_redis("redis://127.0.0.1:1/0", pool_timeout=0.1))
+    monkeypatch.setattr(token_service_module, "token_reservation_store", unreachable)
+
+    async def scenario():
+        try:
+            with pytest.raises(TokenReservationUnavailable):
+                await TokenService(None).reserve_tokens_advanced(SimpleNamespace(id="u1"), 10, "chat_completion", {})
+        finally:
+            await unreachable.close()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_settlements_never_lose_a_charge(run_with_mongo):
+    async def scenario():
+        user = User(email="user@example.com", tokens_used=0, tokens_remaining=1000, monthly_limit=1000)
+        await user.insert()
+        # Every settlement starts from its own stale copy of the user, as separate requests would
+        copies = [await User.get(user.id) for _ in range(50)]
+        results = await asyncio.gather(*(TokenService(None).consume_tokens(copy, 30) for copy in copies))
+
+        assert [success for success, _ in results].count(True) == 33
+        stored = await User.get(user.id)
+        assert (stored.tokens_used, stored.tokens_remaining) == (990, 10)
+        assert await TokenUsageLog.find(TokenUsageLog.user_id == user.id).count() == 33
+
+    asyncio.run(run_with_mongo([User, TokenUsageLog], scenario))
@@ -0,0 +1,86 @@
+"""
+Tests for token counting: model families, the offline fallback and
+incremental per-message counting.
+"""
+
+import asyncio
+
+from app.config import settings
+from app.services.tokenizer import (
+    TOKENS_PER_MESSAGE,
+    TOKENS_PER_REPLY,
+    HeuristicTokenizer,
+    TokenizerRegistry,
+    encoding_for_model,
+)
+
+
+class CountingTokenizer(HeuristicTokenizer):
+    """Heuristic counts that record which texts were tokenized"""
+
+    def __init__(self):
+        self.texts = []
+
+    def count(self, text):
+        self.texts.append(text)
+        return super().count(text)
+
+
+def test_models_map_to_their_family_encoding():
+    assert encoding_for_model("gpt-4o-mini") == "o200k_base"
+    assert encoding_for_model("openai/gpt-4.1") == "o200k_base"
+    assert encoding_for_model("gpt-4-turbo") == "cl100k_base"
+    assert encoding_for_model("anthropic/claude-3.5-sonnet") == "cl100k_base"
+
+
+def test_missing_bundle_falls_back_without_downloading(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "tokenizer_data_dir", str(tmp_path))
+    registry = TokenizerRegistry()
+    assert registry.get("gpt-4").name == "heuristic"
+
+
+def test_heuristic_counts_non_latin_text_per_character():
+    text = "这是一个用于测试分词器的中文句子"
+    # Roughly one token per character, where len // 4 would count a quarter of that
+    assert HeuristicTokenizer().count(text) >= len(text) * 0.8
+
+
+def test_only_new_messages_are_tokenized():
+    async def scenario():
+        registry = TokenizerRegistry()
+        tokenizer = registry._tokenizers[encoding_for_model("gpt-4")] = CountingTokenizer()
+        history = [
+            {"role": "system", "content": "You review Python code."},
+            {"role": "user", "content": "def add(a, b):\n    return a + b"},
+            {"role": "assistant", "content": "Consider type hints."},
+        ]
+
+        first = await registry.count_messages("gpt-4", history)
+        assert len(tokenizer.texts) == 3
+        assert first == TOKENS_PER_REPLY + sum(
+            TOKENS_PER_MESSAGE + HeuristicTokenizer().count(f"{m['role']}\n{m['content']}") for m in history
+        )
+
+        followup = {"role": "user", "content": "Add them please."}
+        second = await registry.count_messages("gpt-4", history + [followup])
+        assert tokenizer.texts[3:] == ["user\nAdd them please."]
+        assert second == first + TOKENS_PER_MESSAGE + HeuristicTokenizer().count("user\nAdd them please.")
+
+    asyncio.run(scenario())
+
+
+def test_large_inputs_are_counted_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, "tokenizer_thread_min_chars", 100)
+
+    async def scenario():
+        registry = TokenizerRegistry()
+        tokenizer = registry._tokenizers[encoding_for_model("gpt-4")] = HeuristicTokenizer()
+        assert await registry.count_text("gpt-4", "x = 1") == tokenizer.count("x = 1")
+        assert registry._executor is None
+
+        text = "for i in range(10):\n    print(i)\n" * 50
+        assert await registry.count_text("gpt-4", text) == tokenizer.count(text)
+        assert registry._executor is not None
+        registry.shutdown()
+
+    asyncio.run(scenario())
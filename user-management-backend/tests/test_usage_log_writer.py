@@ -0,0 +1,105 @@
+"""
+Tests for write-behind usage logging: bulk flushes with daily rollups,
+repeated flushes counted once, and a dead worker's write-ahead segments
+adopted by the next one. They run against a real MongoDB; set
+TEST_MONGODB_URL to point at a disposable database. Tests are skipped when
+MongoDB isn't reachable.
+"""
+
+import asyncio
+
+import pytest
+from beanie import PydanticObjectId
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app.config import settings
+from app.models.user import TokenUsageDaily, TokenUsageLog
+from app.services import usage_log_writer as writer_module
+from app.services.usage_log_writer import UsageLogWriter, write_logs
+
+DOCUMENT_MODELS = [TokenUsageLog, TokenUsageDaily]
+
+
+def _log(user_id: PydanticObjectId, tokens: int, cost: float = 0.0) -> TokenUsageLog:
+    return TokenUsageLog(user_id=user_id, provider="a4f", model_name="gpt-4", tokens_used=tokens,
+                         request_type="chat", cost_usd=cost)
+
+
+def test_buffered_logs_are_flushed_with_rollups(run_with_mongo, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "usage_log_wal_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "usage_log_flush_interval_ms", 60000.0)
+    alice, bob = PydanticObjectId(), PydanticObjectId()
+
+    async def scenario():
+        writer = UsageLogWriter()
+        writer.start()
+        for log in (_log(alice, 100, 0.5), _log(alice, 50, 0.25), _log(bob, 10)):
+            await writer.record(log)
+
+        assert await TokenUsageLog.count() == 0
+        assert writer.buffered == 3 and len(list(tmp_path.rglob("*.wal"))) == 1
+
+        assert await writer.flush()
+        assert writer.buffered == 0 and not list(tmp_path.rglob("*.wal"))
+        assert await TokenUsageLog.count() == 3
+        rollup = await TokenUsageDaily.find_one(TokenUsageDaily.user_id == alice)
+        assert (rollup.tokens_used, rollup.request_count, rollup.cost_usd) == (150, 2, 0.75)
+
+        await writer.stop()
+        assert not list(tmp_path.iterdir())
+
+    asyncio.run(run_with_mongo(DOCUMENT_MODELS, scenario))
+
+
+def test_repeated_flush_is_counted_once(run_with_mongo):
+    user_id = PydanticObjectId()
+
+    async def scenario():
+        logs = [_log(user_id, 10), _log(user_id, 20)]
+        assert await write_logs("worker-00000001", logs) == 2
+        assert await write_logs("worker-00000001", logs) == 0
+        await write_logs("worker-00000002", [_log(user_id, 5)])
+
+        assert await TokenUsageLog.count() == 3
+        rollup = await TokenUsageDaily.find_one(TokenUsageDaily.user_id == user_id)
+        assert (rollup.tokens_used, rollup.request_count) == (35, 3)
+        assert rollup.flushes == ["worker-00000001", "worker-00000002"]
+
+    asyncio.run(run_with_mongo(DOCUMENT_MODELS, scenario))
+
+
+@pytest.mark.skipif(writer_module.fcntl is None, reason="needs flock")
+def test_segments_of_a_dead_worker_are_adopted(run_with_mongo, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "usage_log_wal_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "usage_log_flush_interval_ms", 60000.0)
+    user_id = PydanticObjectId()
+
+    async def scenario():
+        async def unavailable(flush_id, logs):
+            raise ServerSelectionTimeoutError("MongoDB is down")
+
+        dead = UsageLogWriter()
+        dead.start()
+        with monkeypatch.context() as patch:
+            patch.setattr(writer_module, "write_logs", unavailable)
+            for tokens in (1, 2, 3):
+                await dead.record(_log(user_id, tokens))
+            assert not await dead.flush()
+        assert await TokenUsageLog.count() == 0
+
+        # The worker dies: its task stops and its directory lock is released without a final flush
+        dead._task.cancel()
+        dead._lock.close()
+
+        successor = UsageLogWriter()
+        successor.start()
+        assert successor.buffered == 3
+        assert await successor.flush()
+        await successor.stop()
+
+        rollup = await TokenUsageDaily.find_one(TokenUsageDaily.user_id == user_id)
+        assert rollup.tokens_used == 6
+        assert await TokenUsageLog.count() == 3
+        assert not list(tmp_path.iterdir())
+
+    asyncio.run(run_with_mongo(DOCUMENT_MODELS, scenario))